@@ -6,7 +6,6 @@ This package provides tools for visualizing and analyzing CI (Calcium Imaging) d
 
 __version__ = "0.1.0"
 
-from . import servers
 from .src.CITank import CITank
 from .src.VirmenTank import VirmenTank
 from .src.ElecTank import ElecTank
@@ -14,4 +13,12 @@ from .src.ElecTank import ElecTank
 __all__ = ['servers', 'CITank', 'ElecTank', 'VirmenTank']
 
 import logging
-logging.getLogger(__name__).addHandler(logging.NullHandler())
\ No newline at end of file
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+
+def __getattr__(name):
+    # the Bokeh apps are imported on first use, so that the tanks and batch jobs do not load Bokeh
+    if name == 'servers':
+        import importlib
+        return importlib.import_module('.servers', __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
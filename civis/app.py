@@ -1,16 +1,50 @@
-from flask import Flask, render_template
+from flask import Flask, render_template, request, g
 import argparse
+import importlib.util
+import itertools
+import multiprocessing
+import os
+import tempfile
 from threading import Thread
 from tornado.ioloop import IOLoop
 from bokeh.server.server import Server
 from bokeh.embed import server_document
 from civis.servers import *
+from civis.src.SessionCache import SessionCache
 
 app = Flask(__name__)
 
 # Global variable to store command-line arguments
 args = None
 
+# Ports of the Bokeh worker processes in production mode, empty when a single Bokeh server runs in a thread
+worker_ports = []
+worker_counter = itertools.count()
+WORKER_COOKIE = 'civis_bokeh_worker'
+
+def bokeh_url(app_name):
+    """
+    URL of a Bokeh app for the current browser.
+
+    A Bokeh session lives in the worker process that created it, so the autoload script and the websocket
+    of a page must reach the same worker. Each browser is assigned a worker round robin on its first page
+    and keeps it through a cookie, which also keeps the sessions of one user on one worker.
+    """
+    if not worker_ports:
+        return f'http://localhost:{args.bokeh_port}/{app_name}'
+
+    worker = request.cookies.get(WORKER_COOKIE, '')
+    if not worker.isdigit() or int(worker) >= len(worker_ports):
+        worker = str(next(worker_counter) % len(worker_ports))
+        g.bokeh_worker = worker
+    return f'http://localhost:{worker_ports[int(worker)]}/{app_name}'
+
+@app.after_request
+def remember_bokeh_worker(response):
+    if 'bokeh_worker' in g:
+        response.set_cookie(WORKER_COOKIE, g.bokeh_worker, samesite='Lax')
+    return response
+
 @app.route('/')
 def home():
     return render_template("index.html")
@@ -19,129 +53,135 @@ def home():
 @app.route('/labeler/v0/')
 def labeler_v0_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/labeler_bkapp_v0')
+    script = server_document(bokeh_url('labeler_bkapp_v0'))
     return render_template("labeler/labeler_v0.html", script=script, template="Flask", port=args.flask_port)
 
 @app.route('/labeler/v1/')
 def labeler_v1_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/labeler_bkapp_v1')
+    script = server_document(bokeh_url('labeler_bkapp_v1'))
     return render_template("labeler/labeler_v1.html", script=script, template="Flask", port=args.flask_port)
 
 @app.route('/labeler/v2/')
 def labeler_v2_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/labeler_bkapp_v2')
+    script = server_document(bokeh_url('labeler_bkapp_v2'))
     return render_template("labeler/labeler_v2.html", script=script, template="Flask", port=args.flask_port)
 
 @app.route('/trajectory/v1/')
 def trajectory_v1_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/trajectory_bkapp_v1')
+    script = server_document(bokeh_url('trajectory_bkapp_v1'))
     return render_template("trajectory/trajectory_v1.html", script=script, template="Flask", port=args.flask_port)
 
 @app.route('/connection/v1/')
 def connection_app_v1():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/connection_bkapp_v1')
+    script = server_document(bokeh_url('connection_bkapp_v1'))
     return render_template("connection_v1.html", script=script, template="Flask", port=args.flask_port)
 
 @app.route('/trajectory/v0/')
 def trajectory_v0_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/trajectory_bkapp_v0')
+    script = server_document(bokeh_url('trajectory_bkapp_v0'))
     return render_template("trajectory/trajectory_v0.html", script=script, template="Flask", port=args.flask_port)
 
 @app.route('/raster/v0/')
 def raster_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/raster_bkapp_v0')
+    script = server_document(bokeh_url('raster_bkapp_v0'))
     return render_template("raster/raster_v0.html", script=script, template="Flask", port=args.flask_port)
 
 @app.route('/trajectory/v2/')
 def trajectory_v2_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/trajectory_bkapp_v2')
+    script = server_document(bokeh_url('trajectory_bkapp_v2'))
     return render_template("trajectory/trajectory_v2.html", script=script, template="Flask", port=args.flask_port)
 
 @app.route('/trajectory/v3/')
 def trajectory_v3_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/trajectory_bkapp_v3')
+    script = server_document(bokeh_url('trajectory_bkapp_v3'))
     return render_template("trajectory/trajectory_v3.html", script=script, template='Flask', port=args.flask_port)
 
 @app.route('/raster/v1/')
 def raster_v1_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/raster_bkapp_v1')
+    script = server_document(bokeh_url('raster_bkapp_v1'))
     return render_template("raster/raster_v1.html", script=script, templates='Flask', port=args.flask_port)
 
 @app.route('/trajectory/v4/')
 def trajectory_v4_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/trajectory_bkapp_v4')
+    script = server_document(bokeh_url('trajectory_bkapp_v4'))
     return render_template("trajectory/trajectory_v4.html", script=script, template='Flask', port=args.flask_port)
 
 @app.route('/trajectory/v5/')
 def trajectory_v5_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/trajectory_bkapp_v5')
+    script = server_document(bokeh_url('trajectory_bkapp_v5'))
     return render_template("trajectory/trajectory_v5.html", script=script, template='Flask', port=args.flask_port)
 
 @app.route('/trajectory/v6/')
 def trajectory_v6_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/trajectory_bkapp_v6')
+    script = server_document(bokeh_url('trajectory_bkapp_v6'))
     return render_template("trajectory/trajectory_v6.html", script=script, template='Flask', port=args.flask_port)
 
 @app.route('/trajectory/v7/')
 def trajectory_v7_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/trajectory_bkapp_v7')
+    script = server_document(bokeh_url('trajectory_bkapp_v7'))
     return render_template("trajectory/trajectory_v7.html", script=script, template='Flask', port=args.flask_port)
 
 @app.route('/trajectory/v8/')
 def trajectory_v8_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/trajectory_bkapp_v8')
+    script = server_document(bokeh_url('trajectory_bkapp_v8'))
     return render_template("trajectory/trajectory_v8.html", script=script, template='Flask', port=args.flask_port)
 
 @app.route('/trajectory/v9/')
 def trajectory_v9_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/trajectory_bkapp_v9')
+    script = server_document(bokeh_url('trajectory_bkapp_v9'))
     return render_template("trajectory/trajectory_v9.html", script=script, template='Flask', port=args.flask_port)
 
 @app.route('/place/v0/')
 def place_v0_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/place_bkapp_v0')
+    script = server_document(bokeh_url('place_bkapp_v0'))
     return render_template("place/place_v0.html", script=script, template='Flask', port=args.flask_port)
 
 @app.route('/place/v1/')
 def place_v1_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/place_bkapp_v1')
+    script = server_document(bokeh_url('place_bkapp_v1'))
     return render_template("place/place_v1.html", script=script, templates='Flask', port=args.flask_port)
 
 @app.route('/place/v2/')
 def place_v2_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/place_bkapp_v2')
+    script = server_document(bokeh_url('place_bkapp_v2'))
     return render_template("place/place_v2.html", script=script, templates='Flask', port=args.flask_port)
 
 @app.route('/place/v3/')
 def place_v3_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/place_bkapp_v3')
+    script = server_document(bokeh_url('place_bkapp_v3'))
     return render_template("place/place_v3.html", script=script, templates='Flask', port=args.flask_port)
 
 @app.route('/place/v4/')
 def place_v4_app():
     global args
-    script = server_document(f'http://localhost:{args.bokeh_port}/place_bkapp_v4')
+    script = server_document(bokeh_url('place_bkapp_v4'))
     return render_template("place/place_v4.html", script=script, templates='Flask', port=args.flask_port)
 
+@app.route('/elec/v0/')
+def elec_v0_app():
+    global args
+    script = server_document(bokeh_url('elec_bkapp_v0'))
+    return render_template("elec/elec_v0.html", script=script, template='Flask', port=args.flask_port)
+
 def bk_worker(bokeh_port, flask_port):
     # Configure the Bokeh server with applications
     bokeh_apps = {
@@ -165,7 +205,8 @@ def bk_worker(bokeh_port, flask_port):
         '/trajectory_bkapp_v9': trajectory_bkapp_v9,
         '/place_bkapp_v2': place_cell_vis_bkapp_v2,
         '/place_bkapp_v3': place_cell_vis_bkapp_v3,
-        '/place_bkapp_v4': place_cell_vis_bkapp_v4
+        '/place_bkapp_v4': place_cell_vis_bkapp_v4,
+        '/elec_bkapp_v0': elec_bkapp_v0
     }
 
     server = Server(bokeh_apps,
@@ -175,6 +216,32 @@ def bk_worker(bokeh_port, flask_port):
     server.start()
     server.io_loop.start()
 
+def serve_flask(flask_port, threads):
+    """Serve the Flask app with the threaded waitress WSGI server."""
+    from waitress import serve
+
+    serve(app, host='localhost', port=flask_port, threads=threads)
+
+def start_bokeh_workers(bokeh_port, flask_port, num_workers, cache_dir):
+    """
+    Start num_workers Bokeh server processes on consecutive ports from bokeh_port.
+    :return: list of the worker processes
+    """
+    # inherited by the workers, so their tanks map the same cached session arrays
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ[SessionCache.ENV_VAR] = cache_dir
+
+    processes = []
+    for port in range(bokeh_port, bokeh_port + num_workers):
+        process = multiprocessing.Process(target=bk_worker, args=(port, flask_port), daemon=True,
+                                          name=f'civis-bokeh-{port}')
+        process.start()
+        processes.append(process)
+        worker_ports.append(port)
+    print(f"Started {num_workers} Bokeh workers on ports {bokeh_port}-{bokeh_port + num_workers - 1}, "
+          f"session cache in {cache_dir}")
+    return processes
+
 def main():
     global args
     parser = argparse.ArgumentParser()
@@ -182,8 +249,23 @@ def main():
                         help='Select port for the Flask server to run on')
     parser.add_argument('-b', '--bokeh-port', default=5006, type=int,
                         help='Select port for the Bokeh server to run on')
+    parser.add_argument('-w', '--workers', default=0, type=int,
+                        help='Production mode: number of Bokeh worker processes on consecutive ports from '
+                             'the Bokeh port, served behind a threaded WSGI server (0 runs the development server)')
+    parser.add_argument('--threads', default=8, type=int,
+                        help='Number of Flask request threads in production mode')
+    parser.add_argument('--cache-dir', default=os.path.join(tempfile.gettempdir(), 'civis_session_cache'),
+                        help='Directory of the session arrays shared by the Bokeh workers in production mode')
     args = parser.parse_args()
 
+    if args.workers > 0:
+        # checked before any worker starts, production mode must not fall back to a development server
+        if importlib.util.find_spec('waitress') is None:
+            parser.error("production mode (--workers) requires waitress, install it with: pip install waitress")
+        start_bokeh_workers(args.bokeh_port, args.flask_port, args.workers, args.cache_dir)
+        serve_flask(args.flask_port, args.threads)
+        return
+
     # Start the Bokeh server in a separate thread with the specified port
     Thread(target=bk_worker, args=(args.bokeh_port, args.flask_port)).start()
 
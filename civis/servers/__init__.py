@@ -3,3 +3,4 @@ from .trajectory_servers import *
 from .place_servers import *
 from .raster_servers import *
 from .connection_servers import *
+from .elec_servers import *
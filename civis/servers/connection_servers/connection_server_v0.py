@@ -2,7 +2,8 @@ from bokeh.plotting import figure
 from bokeh.models import ColumnDataSource, TapTool, HoverTool, Div, TextInput, Button
 from bokeh.layouts import row, column
 import numpy as np
-import h5py
+from civis.src.CITank import CITank
+from civis.src.SessionLoader import SessionLoader
 
 
 def load_data(filename):
@@ -11,30 +12,16 @@ def load_data(filename):
     :param filename: .mat file containing config, spatial, Cn, Coor, ids, etc...
     :return: essential variables for plotting
     """
-    with h5py.File(filename, 'r') as file:
-        data = file['data']
-        Cn = np.transpose(data['Cn'][()])
-        ids = data['ids'][()] - 1
-        Coor_cell_array = data['Coor']
-        Coor = []
-        C_raw = np.transpose(data['C_raw'][()])
-        C = np.transpose(data['C'][()])
-        centroids = np.transpose(data['centroids'][()])
-        virmenPath = data['virmenPath'][()].tobytes().decode('utf-16le')
+    # shared with the tanks, memory maps of the session cache when the apps run in several workers
+    arrays, Coor = CITank.read_session_arrays(filename, ('C', 'C_raw', 'Cn', 'ids', 'centroids', 'virmenPath'))
+    virmenPath = arrays['virmenPath'].tobytes().decode('utf-16le')
 
-        for i in range(Coor_cell_array.shape[1]):
-            ref = Coor_cell_array[0, i]  # Get the reference
-            coor_data = file[ref]  # Use the reference to access the data
-            coor_matrix = np.array(coor_data)  # Convert to a NumPy array
+    # C = np.zeros_like(C_raw)
+    # for i, C_pick in enumerate(C_raw):
+    #     C_base = savgol_filter(C_pick, window_length=2000, polyorder=2, mode='interp')
+    #     C[i] = C_pick - C_base
 
-            Coor.append(np.transpose(coor_matrix))
-
-        # C = np.zeros_like(C_raw)
-        # for i, C_pick in enumerate(C_raw):
-        #     C_base = savgol_filter(C_pick, window_length=2000, polyorder=2, mode='interp')
-        #     C[i] = C_pick - C_base
-
-    return C, C_raw, Cn, ids, Coor, centroids, virmenPath
+    return arrays['C'], arrays['C_raw'], arrays['Cn'], arrays['ids'], Coor, arrays['centroids'], virmenPath
 
 
 def connection_bkapp_v0(doc):
@@ -51,13 +38,25 @@ def connection_bkapp_v0(doc):
     # Placeholder for the plot, to be replaced after data is loaded
     placeholder_div = Div(text="Load data to visualize neurons.")
 
+    loader = SessionLoader(doc)
+
+    def read(neuron_path, correlation_matrix_path, progress):
+        progress("Loading " + neuron_path + "...")
+        [C, C_raw, Cn, ids, Coor, centroids, virmen_path] = load_data(neuron_path)
+        progress("Loading " + correlation_matrix_path + "...")
+        correlation_matrix = np.load(correlation_matrix_path)
+        return Cn, ids, centroids, correlation_matrix
+
     def load_and_display():
-        global source, lines_source
         neuron_path = neuron_path_input.value
         correlation_matrix_path = correlation_matrix_path_input.value
+        loader.load(lambda progress: read(neuron_path, correlation_matrix_path, progress), display,
+                    label=neuron_path)
 
-        [C, C_raw, Cn, ids, Coor, centroids, virmen_path] = load_data(neuron_path)
-        correlation_matrix = np.load(correlation_matrix_path)
+    def display(result):
+        global source, lines_source
+
+        Cn, ids, centroids, correlation_matrix = result
         height, width = Cn.shape
 
         centroids_flipped = np.copy(centroids)
@@ -129,5 +128,5 @@ def connection_bkapp_v0(doc):
 
     load_button.on_click(load_and_display)
     # Initial layout with just the inputs, load button, and details div
-    layout = column(row(neuron_path_input, correlation_matrix_path_input, load_button), details_div)
+    layout = column(row(neuron_path_input, correlation_matrix_path_input, load_button, loader.status), details_div)
     doc.add_root(layout)
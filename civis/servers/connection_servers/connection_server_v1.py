@@ -1,6 +1,6 @@
 from bokeh.plotting import figure, curdoc
 from bokeh.models import ColumnDataSource, TapTool, HoverTool, Div, TextInput, Button, Select, CDSView, GroupFilter, \
-    Spacer
+    Spacer, Slider, BoxSelectTool
 from bokeh.layouts import row, column
 import numpy as np
 import json
@@ -13,41 +13,52 @@ servers_dir = os.path.dirname(current_dir)
 project_root = os.path.dirname(servers_dir)
 sys.path.append(project_root)
 
+# upper bound on the number of edges pushed to the browser at once, strongest edges are kept
+MAX_RENDERED_EDGES = 5000
+
 def connection_bkapp_v1(doc):
     from civis.src.CITank import CITank
-    def load_data(neuron_path_input, category_select):
-        try:
-            config_path = os.path.join(project_root, 'config.json')
-            with open(config_path, 'r') as file:
-                config = json.load(file)
-
-            session_name = neuron_path_input.value
-            # load in the DataTank
-            pairwise_path = os.path.join(config['ProcessedFilePath'], session_name, f'{session_name}_cor.npy')
-            neuron_categories_path = os.path.join(config['ProcessedFilePath'], session_name,
-                                                  f'{session_name}_neuron_categories.pkl')
-            print(f"Loading neuron data {session_name}...")
-            ci = CITank(session_name, height=4)
-            print(f"Successfully loaded: {session_name}")
-
-            print(f"Loading neuronal categories data {session_name}...")
-            with open(neuron_categories_path, 'rb') as f:
-                neuron_categories_all = pickle.load(f)
-            print(f"Successfully loaded: {neuron_categories_path}")
-
-            print(f"Loading pairwise correlation data {session_name}...")
-            correlation_matrix = np.load(pairwise_path)
+    from civis.src.ConnectivityGraph import ConnectivityGraph
+    from civis.src.SessionLoader import SessionLoader
+
+    loader = SessionLoader(doc)
+
+    def load_data(session_name, progress):
+        config_path = os.path.join(project_root, 'config.json')
+        with open(config_path, 'r') as file:
+            config = json.load(file)
+
+        # load in the DataTank
+        pairwise_path = os.path.join(config['ProcessedFilePath'], session_name, f'{session_name}_cor.npy')
+        graph_path = os.path.join(config['ProcessedFilePath'], session_name, f'{session_name}_cor_graph.npz')
+        neuron_categories_path = os.path.join(config['ProcessedFilePath'], session_name,
+                                              f'{session_name}_neuron_categories.pkl')
+        progress(f"Loading neuron data {session_name}...")
+        ci = CITank(session_name, height=4)
+        print(f"Successfully loaded: {session_name}")
+
+        progress(f"Loading neuronal categories data {session_name}...")
+        with open(neuron_categories_path, 'rb') as f:
+            neuron_categories_all = pickle.load(f)
+        print(f"Successfully loaded: {neuron_categories_path}")
+
+        progress(f"Loading pairwise correlation graph {session_name}...")
+        if os.path.exists(graph_path):
+            correlation_graph = ConnectivityGraph.load(graph_path)
+            print(f"Successfully loaded: {graph_path}")
+        else:
+            # convert the legacy dense matrix once and cache the sparse graph next to it
+            correlation_graph = ConnectivityGraph.from_dense(np.load(pairwise_path))
             print(f"Successfully loaded: {pairwise_path}")
+            try:
+                correlation_graph.save(graph_path)
+                print(f"Cached sparse correlation graph: {graph_path}")
+            except OSError as e:
+                print(f"Could not cache correlation graph: {e}")
 
-            exclude_keys = ['velocity', 'lick', 'pstcr']
-            neuron_categories = {k: v for k, v in neuron_categories_all.items() if k not in exclude_keys}
-            category_select.options = ["All"] + sorted(list(neuron_categories.keys()))
-            return ci, neuron_categories, correlation_matrix
-        except FileNotFoundError:
-            print('loading failed')
-            return f"File Not Found."
-        except Exception as e:
-            return f"An unexpected error occurred: {str(e)}"
+        exclude_keys = ['velocity', 'lick', 'pstcr']
+        neuron_categories = {k: v for k, v in neuron_categories_all.items() if k not in exclude_keys}
+        return ci, neuron_categories, correlation_graph
 
     #Create initial empty plot
     TOOLS = "pan, wheel_zoom, zoom_in, zoom_out, box_zoom, reset, save"
@@ -57,7 +68,7 @@ def connection_bkapp_v1(doc):
     p.image(image=[], x=0, y=0, palette="Greys256")
 
     source = ColumnDataSource(data=dict(x=[], y=[], ids=[]))
-    lines_source = ColumnDataSource(data=dict(xs=[], ys=[], colors=[]))
+    lines_source = ColumnDataSource(data=dict(x0=[], y0=[], x1=[], y1=[], colors=[]))
 
     # Initialize TextInput widgets for file paths
     neuron_path_input = TextInput(value="", title="Session Name:")
@@ -67,17 +78,29 @@ def connection_bkapp_v1(doc):
     neuron_categories = {}
     category_select = Select(title="Neuron Category:", value="All",
                              options=["All"] + sorted(list(neuron_categories.keys())))
+    edge_mode_select = Select(title="Edges:", value="Selected Neurons", options=["Selected Neurons", "Category"])
+    weight_slider = Slider(title="Min |Correlation|", start=0, end=1, step=0.01, value=0)
 
     view = CDSView(filter=GroupFilter(column_name='categories', group='All'))
+    # loaded session state, filled in by show_data()
+    state = {'ci': None, 'graph': None, 'neuron_id_strings': None}
     #change this to update data
     def update_data():
-        #loads data from file
-        data = load_data(neuron_path_input,category_select)
-        if (type(data) != str):
-            [ci, neuron_categories,correlation_matrix] = load_data(neuron_path_input,category_select)
+        #loads data from file off the event loop
+        session_name = neuron_path_input.value
+        loader.load(lambda progress: load_data(session_name, progress), show_data, label=session_name,
+                    on_error=show_error)
+
+    def show_error(e):
+        if isinstance(e, FileNotFoundError):
+            print('loading failed')
+            details_div.text = f"File Not Found."
         else:
-            details_div.text = data
-            return
+            details_div.text = f"An unexpected error occurred: {str(e)}"
+
+    def show_data(data):
+        [ci, neuron_categories, correlation_graph] = data
+        category_select.options = ["All"] + sorted(list(neuron_categories.keys()))
 
         neuron_colors = [
             "#F44336",  # Red
@@ -106,6 +129,18 @@ def connection_bkapp_v1(doc):
 
         centroids_flipped = np.copy(ci.centroids)
         centroids_flipped[:, 1] = height - ci.centroids[:, 1]
+        correlation_graph.attach_coordinates(centroids_flipped)
+        neuron_id_strings = np.array([str(i) for i in ci.ids])
+        id_to_index = {int(neuron_id): index for index, neuron_id in enumerate(np.ravel(ci.ids))}
+
+        # precompute the edges within every category so that switching categories is a slice
+        category_indices = {"All": np.arange(len(ci.ids))}
+        for category, neuron_ids in neuron_categories.items():
+            category_indices[category] = [id_to_index[int(n)] for n in neuron_ids if int(n) in id_to_index]
+        correlation_graph.build_group_index(category_indices)
+        state.update(ci=ci, graph=correlation_graph, neuron_id_strings=neuron_id_strings)
+        # indices selected in the previous session do not refer to the same neurons
+        source.selected.indices = []
 
         # Initialize mappings of neuron IDs to colors and categories
         neuron_id_to_color = {}
@@ -132,6 +167,9 @@ def connection_bkapp_v1(doc):
         p.y_range.end = height
         # updates image
         p.image(image=[np.flipud(ci.Cn)], x=0, y=0, dw=width, dh=height, palette="Greys256")
+        # ROI outlines, taken from the packed contour geometry loaded with the CITank
+        p.patches(xs=ci.Coor.xs(), ys=ci.Coor.ys(flipped=True), fill_alpha=0, line_color="white", line_alpha=0.3,
+                  line_width=1)
 
         # Add centroids
         circle_renderer = p.scatter(x='x', y='y', source=source, size=10, fill_color='colors',
@@ -141,7 +179,7 @@ def connection_bkapp_v1(doc):
         circle_renderer.nonselection_glyph = circle_renderer.glyph.clone()
 
         # Add lines (for correlations)
-        p.multi_line(xs="xs", ys="ys", color="colors", line_width=1, alpha=0.7, source=lines_source)
+        p.segment(x0="x0", y0="y0", x1="x1", y1="y1", color="colors", line_width=1, alpha=0.7, source=lines_source)
 
         # HoverTool that only activates when directly over a glyph
         hover = HoverTool(renderers=[circle_renderer], tooltips=[("ID", "@ids"), ("Category", "@categories")])
@@ -149,62 +187,94 @@ def connection_bkapp_v1(doc):
         # Add TapTool to enable selection of neurons
         tap_tool = TapTool(renderers=[circle_renderer])
         p.add_tools(tap_tool)
+        # BoxSelectTool (or shift+tap) selects several neurons at once
+        p.add_tools(BoxSelectTool(renderers=[circle_renderer]))
+
+        # Replace placeholder with the actual plot and details div
+        layout.children[1].children[1] = column(category_select, edge_mode_select, weight_slider, details_div)
+
+    def update_display_based_on_category(attr, old, new):
+        selected_category = category_select.value
 
-        def update_display_based_on_category(attr, old, new):
+        if selected_category == "All":
+            # Add a dummy column to ColumnDataSource data
+            source.data['all'] = ['all'] * len(source.data['x'])
+
+            view.filter = GroupFilter(column_name='all', group='all')
+        else:
+            view.filter = GroupFilter(column_name='categories', group=selected_category)
+
+    def show_edges(edge_idx):
+        segments = state['graph'].edge_segments(edge_idx)
+        positive = segments['signs'] > 0
+        lines_source.data = {'x0': segments['x0'], 'y0': segments['y0'],
+                             'x1': segments['x1'], 'y1': segments['y1'],
+                             'colors': np.where(positive, "red", "blue")}
+        return int(np.count_nonzero(positive)), int(np.count_nonzero(~positive))
+
+    def update_lines(attr, old, new):
+        correlation_graph = state['graph']
+        if correlation_graph is None:
+            return
+        selected_indices = source.selected.indices
+        threshold = weight_slider.value
+
+        if edge_mode_select.value == "Category":
             selected_category = category_select.value
+            edge_idx = correlation_graph.group_edges(selected_category, threshold, MAX_RENDERED_EDGES)
+            total = len(correlation_graph.group_index[selected_category][0])
+            pos_count, neg_count = show_edges(edge_idx)
+            details_div.text = f"Category: {selected_category}<br>" \
+                               f"Edges Shown: {len(edge_idx)} of {total}<br>" \
+                               f"Positively Correlated Edges: {pos_count}<br>" \
+                               f"Negatively Correlated Edges: {neg_count}"
+            return
 
-            if selected_category == "All":
-                # Add a dummy column to ColumnDataSource data
-                source.data['all'] = ['all'] * len(source.data['x'])
-
-                view.filter = GroupFilter(column_name='all', group='all')
-            else:
-                view.filter = GroupFilter(column_name='categories', group=selected_category)
-
-        category_select.on_change('value', update_display_based_on_category)
-
-        def update_lines(attr, old, new):
-            selected_indices = source.selected.indices
-            if not selected_indices:
-                lines_source.data = {'xs': [], 'ys': [], 'colors': []}
-                details_div.text = "No neuron selected"
-                return
-
-            selected_index = selected_indices[0]
-            selected_id = ci.ids[selected_index]
-            pos_correlated_ids = []
-            neg_correlated_ids = []
-
-            new_xs, new_ys, new_colors = [], [], []
-            for i, correlation in enumerate(correlation_matrix[selected_index]):
-                if i != selected_index and correlation != 0:
-                    x0, y0 = centroids_flipped[selected_index]
-                    x1, y1 = centroids_flipped[i]
-                    new_xs.append([x0, x1])
-                    new_ys.append([y0, y1])
-                    color = "red" if correlation > 0 else "blue"
-                    new_colors.append(color)
-                    if correlation > 0:
-                        pos_correlated_ids.append(str(ci.ids[i]))
-                    else:
-                        neg_correlated_ids.append(str(ci.ids[i]))
-
-            lines_source.data = {'xs': new_xs, 'ys': new_ys, 'colors': new_colors}
-            details = f"Selected Neuron: {selected_id}<br>" \
-                      f"Positively Correlated Count: {len(pos_correlated_ids)}<br>" \
-                      f"Negatively Correlated Count: {len(neg_correlated_ids)}<br>" \
-                      f"Positively Correlated: {', '.join(pos_correlated_ids)}<br>" \
-                      f"Negatively Correlated: {', '.join(neg_correlated_ids)}"
-            details_div.text = details
-
-        source.selected.on_change('indices', update_lines)
+        if len(selected_indices) > 1:
+            edge_idx = correlation_graph.prune_edges(correlation_graph.edges_incident(selected_indices),
+                                                     threshold, MAX_RENDERED_EDGES)
+            pos_count, neg_count = show_edges(edge_idx)
+            details_div.text = f"Selected Neurons: {len(selected_indices)}<br>" \
+                               f"Edges Shown: {len(edge_idx)}<br>" \
+                               f"Positively Correlated Edges: {pos_count}<br>" \
+                               f"Negatively Correlated Edges: {neg_count}"
+            return
 
-        # Replace placeholder with the actual plot and details div
-        layout.children[1].children[1] = column(category_select, details_div)
+        if not selected_indices:
+            lines_source.data = {'x0': [], 'y0': [], 'x1': [], 'y1': [], 'colors': []}
+            details_div.text = "No neuron selected"
+            return
+
+        selected_index = selected_indices[0]
+        selected_id = state['ci'].ids[selected_index]
+        neighbors, weights = correlation_graph.neighbors(selected_index)
+        strong = np.abs(weights) >= threshold
+        segments = {key: value[strong] for key, value in correlation_graph.segments(selected_index).items()}
+        neighbors = neighbors[strong]
+        positive = segments['signs'] > 0
+        pos_correlated_ids = state['neuron_id_strings'][neighbors[positive]]
+        neg_correlated_ids = state['neuron_id_strings'][neighbors[~positive]]
+
+        lines_source.data = {'x0': segments['x0'], 'y0': segments['y0'],
+                             'x1': segments['x1'], 'y1': segments['y1'],
+                             'colors': np.where(positive, "red", "blue")}
+        details = f"Selected Neuron: {selected_id}<br>" \
+                  f"Positively Correlated Count: {len(pos_correlated_ids)}<br>" \
+                  f"Negatively Correlated Count: {len(neg_correlated_ids)}<br>" \
+                  f"Positively Correlated: {', '.join(pos_correlated_ids)}<br>" \
+                  f"Negatively Correlated: {', '.join(neg_correlated_ids)}"
+        details_div.text = details
+
+    # registered once, the callbacks read the loaded session from state
+    category_select.on_change('value', update_display_based_on_category)
+    source.selected.on_change('indices', update_lines)
+    category_select.on_change('value', update_lines)
+    edge_mode_select.on_change('value', update_lines)
+    weight_slider.on_change('value_throttled', update_lines)
 
     #formats graph and load button with placeholder for details and category selector
     load_button.on_click(update_data)
-    choose_file = row(neuron_path_input, column(Spacer(height=20), load_button))
+    choose_file = row(neuron_path_input, column(Spacer(height=20), load_button), column(Spacer(height=20), loader.status))
     layout = row(p,column(choose_file, details_div))
     doc.add_root(layout)
 
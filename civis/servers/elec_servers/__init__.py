@@ -0,0 +1 @@
+from .elec_server_v0 import elec_bkapp_v0
@@ -0,0 +1,159 @@
+from bokeh.plotting import figure
+from bokeh.models import ColumnDataSource, TextInput, Button, Select, Div, Spacer, LinearColorMapper, ColorBar
+from bokeh.events import RangesUpdate
+from bokeh.layouts import column, row
+from bokeh.palettes import Turbo256
+import numpy as np
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+servers_dir = os.path.dirname(current_dir)
+project_root = os.path.dirname(servers_dir)
+sys.path.append(project_root)
+
+# upper bound on the number of points per behavior line pushed to the browser at once
+MAX_LINE_POINTS = 5000
+# time range shown right after loading a session, in seconds
+INITIAL_WINDOW = 60
+
+
+def elec_bkapp_v0(doc):
+    from civis.src.ElecTank import ElecTank
+    from civis.src.SessionLoader import SessionLoader
+
+    # loaded session state, filled in by load_data()
+    state = {'tank': None, 'pyramid': None, 'region': None, 'velocity': None, 'lick': None}
+
+    tfr_source = ColumnDataSource({'image': [], 'x': [], 'y': [], 'dw': [], 'dh': []})
+    behavior_source = ColumnDataSource({'t': [], 'velocity': [], 'lick': []})
+
+    # Spectrogram plot
+    color_mapper = LinearColorMapper(palette=Turbo256, low=0, high=1)
+    p = figure(width=1200, height=450, title="Session Spectrogram", x_axis_label='Time (s)',
+               y_axis_label='Frequency (Hz)', x_range=(0, INITIAL_WINDOW), y_range=(1, 100),
+               tools="pan,xwheel_zoom,box_zoom,reset,save", active_scroll='xwheel_zoom', min_border_left=80)
+    p.grid.grid_line_color = None
+    p.image(image='image', x='x', y='y', dw='dw', dh='dh', source=tfr_source, color_mapper=color_mapper)
+    p.add_layout(ColorBar(color_mapper=color_mapper, title="Power (dB)"), 'right')
+
+    # Behavior plot, sharing the time axis
+    b = figure(width=1200, height=200, title="Velocity and Lick (normalized)", x_axis_label='Time (s)',
+               x_range=p.x_range, tools="pan,xwheel_zoom,reset", active_scroll='xwheel_zoom', min_border_left=80)
+    b.line('t', 'velocity', source=behavior_source, color='SteelBlue', legend_label='velocity')
+    b.line('t', 'lick', source=behavior_source, color='SandyBrown', legend_label='lick')
+    b.legend.click_policy = 'hide'
+
+    session_input = TextInput(value="", title="Session Name:")
+    load_button = Button(label="Load Data", button_type="success")
+    channel_select = Select(title="Channel:", value="0", options=["0"])
+    status_div = Div(text="Enter a session name and load it", width=400)
+
+    def visible_time_range():
+        start, end = p.x_range.start, p.x_range.end
+        if start is None or end is None:
+            return 0, INITIAL_WINDOW
+        return start, end
+
+    def show_tfr_region():
+        """Send the pyramid level and tiles matching the current viewport"""
+        pyramid = state['pyramid']
+        if pyramid is None:
+            return
+
+        f_range = (p.y_range.start, p.y_range.end)
+        if None in f_range:
+            f_range = (pyramid.freqs[0], pyramid.freqs[-1])
+
+        region = pyramid.region(visible_time_range(), f_range, p.width)
+        region_key = (region['level'], region['x'], region['y'], region['dw'], region['dh'])
+        if state['region'] == region_key:
+            return
+
+        state['region'] = region_key
+        tfr_source.data = {'image': [region['image']], 'x': [region['x']], 'y': [region['y']],
+                           'dw': [region['dw']], 'dh': [region['dh']]}
+
+    def show_behavior():
+        """Send the velocity and lick traces of the visible time range, pooled to at most MAX_LINE_POINTS"""
+        tank = state['tank']
+        if tank is None:
+            return
+
+        start, end = visible_time_range()
+        i0, i1 = np.searchsorted(tank.t, [start, end])
+        i0, i1 = max(i0 - 1, 0), min(i1 + 1, len(tank.t))
+        step = max(1, -(-(i1 - i0) // MAX_LINE_POINTS))
+        n = (i1 - i0) // step * step
+        if n == 0:
+            behavior_source.data = {'t': [], 'velocity': [], 'lick': []}
+            return
+
+        # mean pooled velocity, max pooled lick so that no lick is lost
+        sl = slice(i0, i0 + n)
+        behavior_source.data = {'t': tank.t[sl][::step],
+                                'velocity': state['velocity'][sl].reshape(-1, step).mean(axis=1),
+                                'lick': state['lick'][sl].reshape(-1, step).max(axis=1)}
+
+    def update_view(event):
+        show_tfr_region()
+        show_behavior()
+
+    p.on_event(RangesUpdate, update_view)
+    b.on_event(RangesUpdate, update_view)
+
+    loader = SessionLoader(doc, status=status_div)
+
+    def show_pyramid(pyramid):
+        state['pyramid'] = pyramid
+        state['region'] = None
+        color_mapper.low, color_mapper.high = pyramid.color_limits()
+        show_tfr_region()
+
+    def load_data():
+        session_name = session_input.value.strip()
+        if not session_name:
+            status_div.text = "<span style='color: red;'>Please enter a session name</span>"
+            return
+
+        def read(progress):
+            progress(f"Loading electrophysiology data {session_name}...")
+            tank = ElecTank(session_name)
+            progress(f"Computing spectrogram of channel {tank.channel}...")
+            return tank, tank.get_tfr_pyramid(channel=tank.channel)
+
+        def show(result):
+            tank, pyramid = result
+
+            # update the channel options before storing the tank so update_channel() does not fire a reload
+            state['tank'] = None
+            channel_select.options = [str(i) for i in range(tank.n_channels)]
+            channel_select.value = str(tank.channel)
+
+            state['tank'] = tank
+            state['velocity'] = tank.normalize_signal(tank.smoothed_velocity)
+            state['lick'] = np.asarray(tank.lick, dtype=float)
+
+            p.x_range.start, p.x_range.end = 0, min(INITIAL_WINDOW, tank.session_duration)
+            show_pyramid(pyramid)
+            show_behavior()
+
+        loader.load(read, show, label=session_name)
+
+    def update_channel(attr, old, new):
+        tank = state['tank']
+        if tank is None or new == old:
+            return
+
+        def read(progress):
+            progress(f"Computing spectrogram of channel {new}...")
+            return tank.get_tfr_pyramid(channel=int(new))
+
+        loader.load(read, show_pyramid, label=f"channel {new}")
+
+    load_button.on_click(load_data)
+    channel_select.on_change('value', update_channel)
+
+    choose_file = row(session_input, column(Spacer(height=20), load_button), channel_select)
+    layout = column(choose_file, status_div, p, b)
+    doc.add_root(layout)
@@ -5,7 +5,6 @@ from bokeh.models import HoverTool, ColumnDataSource, Slider, Button, TextInput,
     TabPanel, ImageRGBA, Toggle, Patches, GlyphRenderer
 from bokeh.layouts import column, row
 import json
-import h5py
 import os
 import sys
 from pathlib import Path
@@ -17,6 +16,9 @@ servers_dir = os.path.dirname(current_dir)
 project_root = os.path.dirname(servers_dir)
 sys.path.append(project_root)
 
+from civis.src.CITank import CITank
+from civis.src.SessionLoader import SessionLoader
+
 CONFIG_PATH = os.path.join(project_root, 'config.json')
 
 
@@ -26,28 +28,13 @@ def load_data(filename):
     :param filename: .mat file containing config, spatial, Cn, Coor, ids, etc...
     :return: essential variables for plotting
     """
-    with h5py.File(filename, 'r') as file:
-        data = file['data']
-        Cn = np.transpose(data['Cn'][()])
-        ids = data['ids'][()] - 1
-        Coor_cell_array = data['Coor']
-        Coor = []
-        C_raw = np.transpose(data['C_raw'][()])
-        C = np.transpose(data['C'][()])
-        C_denoised = np.transpose(data['C_denoised'][()])
-        C_deconvolved = np.transpose(data['C_deconvolved'][()])
-        C_reraw = np.transpose(data['C_reraw'][()])
-        centroids = np.transpose(data['centroids'][()])
-        virmenPath = data['virmenPath'][()].tobytes().decode('utf-16le')
-
-        for i in range(Coor_cell_array.shape[1]):
-            ref = Coor_cell_array[0, i]  # Get the reference
-            coor_data = file[ref]  # Use the reference to access the data
-            coor_matrix = np.array(coor_data)  # Convert to a NumPy array
-
-            Coor.append(np.transpose(coor_matrix))
-
-    return C, C_raw, Cn, ids, Coor, centroids, virmenPath, C_denoised, C_deconvolved, C_reraw
+    # shared with the tanks, memory maps of the session cache when the apps run in several workers
+    arrays, Coor = CITank.read_session_arrays(
+        filename, ('C', 'C_raw', 'Cn', 'ids', 'centroids', 'virmenPath', 'C_denoised', 'C_deconvolved', 'C_reraw'))
+    virmenPath = arrays['virmenPath'].tobytes().decode('utf-16le')
+
+    return (arrays['C'], arrays['C_raw'], arrays['Cn'], arrays['ids'], Coor, arrays['centroids'], virmenPath,
+            arrays['C_denoised'], arrays['C_deconvolved'], arrays['C_reraw'])
 
 
 def load_tiff_image(image_path, color="red"):
@@ -542,10 +529,11 @@ def labeler_bkapp_v1(doc):
     # Filename input
     sessionname_input = TextInput(value=filename, title="SessionName:", width=400)
     load_data_button = Button(label="Load Data", button_type="success")
+    loader = SessionLoader(doc)
 
-    def load_and_update_data(filename):
+    def load_and_update_data(filename, data):
         """
-        Load the data from .mat and update global C, C_raw, etc.
+        Update global C, C_raw, etc. with the data read from the .mat file.
         Then re-populate the spatial_source with new shapes and
         reset labels/data for all neurons to 'unknown' by default.
         """
@@ -581,8 +569,8 @@ def labeler_bkapp_v1(doc):
         orig_tdt_input.value = "m_f_n_001_max.tif"
         adj_tdt_input.value = f"{session_name}_tdt_adjusted_16bit.tif"
 
-        # Load the data
-        [C, C_raw, Cn, ids, Coor, centroids, virmenPath, C_denoised, C_deconvolved, C_reraw] = load_data(filename)
+        # Unpack the data read off the event loop
+        [C, C_raw, Cn, ids, Coor, centroids, virmenPath, C_denoised, C_deconvolved, C_reraw] = data
 
         # Initialize labels as a dictionary with all neurons set to "unknown"
         labels = {str(i): "unknown" for i in range(len(C))}
@@ -691,8 +679,12 @@ def labeler_bkapp_v1(doc):
             config = json.load(file)
         session_name = sessionname_input.value
         neuron_path = os.path.join(config['ProcessedFilePath'], session_name, f'{session_name}_v7.mat')
-        load_and_update_data(neuron_path)
-        print(f"{neuron_path} loaded!")
+
+        def show(data):
+            load_and_update_data(neuron_path, data)
+            print(f"{neuron_path} loaded!")
+
+        loader.load(lambda progress: load_data(neuron_path), show, label=session_name)
 
     load_data_button.on_click(update_data)
 
@@ -868,7 +860,7 @@ def labeler_bkapp_v1(doc):
     spacer2 = Spacer(height=20)
     spacer3 = Spacer(width=20)
 
-    choose_file = row(spacer3, sessionname_input, column(spacer2, load_data_button))
+    choose_file = row(spacer3, sessionname_input, column(spacer2, load_data_button), column(spacer2, loader.status))
 
     controls = row(
         spacer3,
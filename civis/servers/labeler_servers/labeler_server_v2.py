@@ -2,14 +2,13 @@ import numpy as np
 import pandas as pd
 from bokeh.plotting import figure
 from bokeh.models import HoverTool, ColumnDataSource, Slider, Button, TextInput, Spacer, Div, Select, TapTool, Tabs, \
-    TabPanel, ImageRGBA, Toggle, Patches, GlyphRenderer
+    TabPanel, Toggle, Patches, GlyphRenderer, LinearColorMapper
+from bokeh.events import RangesUpdate
 from bokeh.layouts import column, row
 import json
-import h5py
 import os
 import sys
 from pathlib import Path
-from tifffile import imread
 
 # Set up paths similar to place finder server
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -17,8 +16,17 @@ servers_dir = os.path.dirname(current_dir)
 project_root = os.path.dirname(servers_dir)
 sys.path.append(project_root)
 
+from civis.src.CITank import CITank
+from civis.src.SessionLoader import SessionLoader
+from civis.src.ImagePyramid import ImagePyramid
+
 CONFIG_PATH = os.path.join(project_root, 'config.json')
 
+# Labels are stored as int8 codes, the position in this list is the code of each label
+LABEL_NAMES = ["D1", "D2", "cholinergic", "unknown", "discard"]
+LABEL_CODES = {name: code for code, name in enumerate(LABEL_NAMES)}
+UNKNOWN_CODE = LABEL_CODES["unknown"]
+
 
 def load_data(filename):
     """
@@ -26,74 +34,57 @@ def load_data(filename):
     :param filename: .mat file containing config, spatial, Cn, Coor, ids, etc...
     :return: essential variables for plotting
     """
-    with h5py.File(filename, 'r') as file:
-        data = file['data']
-        Cn = np.transpose(data['Cn'][()])
-        ids = data['ids'][()] - 1
-        Coor_cell_array = data['Coor']
-        Coor = []
-        C_raw = np.transpose(data['C_raw'][()])
-        C = np.transpose(data['C'][()])
-        C_denoised = np.transpose(data['C_denoised'][()])
-        C_deconvolved = np.transpose(data['C_deconvolved'][()])
-        C_reraw = np.transpose(data['C_reraw'][()])
-        centroids = np.transpose(data['centroids'][()])
-        virmenPath = data['virmenPath'][()].tobytes().decode('utf-16le')
-
-        for i in range(Coor_cell_array.shape[1]):
-            ref = Coor_cell_array[0, i]  # Get the reference
-            coor_data = file[ref]  # Use the reference to access the data
-            coor_matrix = np.array(coor_data)  # Convert to a NumPy array
-
-            Coor.append(np.transpose(coor_matrix))
-
-    return C, C_raw, Cn, ids, Coor, centroids, virmenPath, C_denoised, C_deconvolved, C_reraw
-
-
-def load_tiff_image(image_path, color="red"):
-    """
-    Load and process a TIFF image into RGBA format
-    :param image_path: Path to the TIFF file
-    :param color: "red", "green", or "blue" to specify the color channel
-    """
-    try:
-        # Load the image
-        gray_image = imread(image_path)
-        gray_image = np.transpose(gray_image)
-        
-        # Normalize to 0-1 range
-        normalized_image = gray_image.astype(float) / gray_image.max()
-        
-        # Create empty uint32 array
-        img = np.empty(gray_image.shape, dtype=np.uint32)
-        
-        # Create view as uint8 to set RGBA values
-        view = img.view(dtype=np.uint8).reshape((*gray_image.shape, 4))
-        
-        # Set all channels to 0 initially
-        view[:, :, :] = 0
-        
-        # Set the appropriate color channel
-        if color == "red":
-            view[:, :, 0] = (np.flipud(normalized_image) * 255).astype(np.uint8)  # Red channel
-        elif color == "green":
-            view[:, :, 1] = (np.flipud(normalized_image) * 255).astype(np.uint8)  # Green channel
-        elif color == "blue":
-            view[:, :, 2] = (np.flipud(normalized_image) * 255).astype(np.uint8)  # Blue channel
-        
-        view[:, :, 3] = 255  # Alpha channel (fully opaque)
-        
-        return img, gray_image.shape
-    except Exception as e:
-        print(f"Error loading image: {e}")
-        return None, None
+    # shared with the tanks, memory maps of the session cache when the apps run in several workers
+    arrays, Coor = CITank.read_session_arrays(
+        filename, ('C', 'C_raw', 'Cn', 'ids', 'centroids', 'virmenPath', 'C_denoised', 'C_deconvolved', 'C_reraw'))
+    virmenPath = arrays['virmenPath'].tobytes().decode('utf-16le')
+
+    return (arrays['C'], arrays['C_raw'], arrays['Cn'], arrays['ids'], Coor, arrays['centroids'], virmenPath,
+            arrays['C_denoised'], arrays['C_deconvolved'], arrays['C_reraw'])
+
+
+def labels_to_codes(labels, num_neurons):
+    """
+    Convert a {neuron index: label} dictionary (the saved JSON format) into an int8 code array
+    :param labels: dictionary with string neuron indices as keys and label names as values
+    :param num_neurons: number of neurons, neurons missing from labels are "unknown"
+    """
+    codes = np.full(num_neurons, UNKNOWN_CODE, dtype=np.int8)
+    for neuron, label in labels.items():
+        index = int(neuron)
+        if 0 <= index < num_neurons:
+            codes[index] = LABEL_CODES.get(label, UNKNOWN_CODE)
+    return codes
+
+
+def codes_to_labels(codes):
+    """
+    Convert an int8 code array back into the {neuron index: label} dictionary used for saving
+    """
+    return {str(i): LABEL_NAMES[code] for i, code in enumerate(codes)}
+
+
+def channel_palette(red, green, blue):
+    """
+    256-color palette going from transparent to the given color, so that channel images drawn
+    on top of each other blend in the browser
+    """
+    return [f"#{red * v // 255:02x}{green * v // 255:02x}{blue * v // 255:02x}{v:02x}" for v in range(256)]
+
+
+# Background image channels: color of each channel in the composite
+IMAGE_CHANNELS = {
+    "gcamp": (0, 255, 0),
+    "orig_tdt": (255, 0, 0),
+    "bfp": (0, 0, 255),
+}
 
 
 def labeler_bkapp_v2(doc):
-    global C, C_raw, ids, labels, image_source, session_name, C_denoised, C_deconvolved, C_reraw
+    global C, C_raw, ids, label_codes, mask_visible, session_name, C_denoised, C_deconvolved, C_reraw
     filename = ''
-    labels = np.zeros((3, 3), dtype=bool)
-    labels[:, 2] = True
+    label_codes = np.zeros(0, dtype=np.int8)
+    mask_visible = np.zeros(0, dtype=bool)
 
     """
     ========================================================================================================================
@@ -141,7 +132,11 @@ def labeler_bkapp_v2(doc):
                                              'y_reraw': []
                                              })
 
-    image_source = ColumnDataSource(data={'image': []})
+    # one image source per channel, only the pyramid level and region matching the viewport are sent
+    image_sources = {image_type: ColumnDataSource(data={'image': [], 'x': [], 'y': [], 'dw': [], 'dh': []})
+                     for image_type in IMAGE_CHANNELS}
+    image_pyramids = {}
+    image_regions = {}
 
     TOOLS = "crosshair,pan,wheel_zoom,zoom_in,zoom_out,box_zoom,undo,redo,reset,save,box_select,poly_select,lasso_select,examine,help"
 
@@ -152,7 +147,10 @@ def labeler_bkapp_v2(doc):
     spatial.grid.visible = False
     spatial.xgrid.visible = False
     spatial.ygrid.visible = False
-    spatial.image_rgba(image='image', x=0, y=0, dw=1, dh=1, source=image_source)
+    for image_type, (red, green, blue) in IMAGE_CHANNELS.items():
+        spatial.image(image='image', x='x', y='y', dw='dw', dh='dh', source=image_sources[image_type],
+                      color_mapper=LinearColorMapper(palette=channel_palette(red, green, blue), low=0, high=255),
+                      level='glyph')
 
     contour_renderer = spatial.patches(xs='xs',
                                        ys='ys',
@@ -317,9 +315,6 @@ def labeler_bkapp_v2(doc):
     load_labels_button = Button(label="Load Labels", button_type="primary", disabled=True)
     file_path_input = TextInput(value="labels.json", title="File Path:", width=400, disabled=True)
 
-    # Initialize labels dictionary (string keys for each shape index)
-    labels = {}
-
     """
     ========================================================================================================================
              Toggles for D1, D2, Unknown, Discard
@@ -352,47 +347,41 @@ def labeler_bkapp_v2(doc):
 
     def update_mask_visibility():
         """Update visibility of masks based on their labels and toggle states"""
-        new_fill_alpha = []
-        new_line_alpha = []
-        
-        # Get current lists of neurons from dropdowns (excluding the default option)
-        d1_neurons = [int(x) for x in d1_neurons_select.options if x != "Click to see options..."]
-        d2_neurons = [int(x) for x in d2_neurons_select.options if x != "Click to see options..."]
-        cholinergic_neurons = [int(x) for x in cholinergic_neurons_select.options if x != "Click to see options..."]
-        unknown_neurons = [int(x) for x in unknown_neurons_select.options if x != "Click to see options..."]
-        discard_neurons = [int(x) for x in discard_neurons_select.options if x != "Click to see options..."]
-        
-        for i in range(len(spatial_source.data['xs'])):
-            # Check which list the neuron belongs to
-            if i in d1_neurons:
-                visible = toggle_d1.active
-            elif i in d2_neurons:
-                visible = toggle_d2.active
-            elif i in discard_neurons:
-                visible = toggle_discard.active
-            elif i in unknown_neurons:
-                visible = toggle_unknown.active
-            elif i in cholinergic_neurons:
-                visible = toggle_cholinergic.active
-            else:
-                visible = toggle_unknown.active  # Default to unknown if not found
-            
-            new_fill_alpha.append(0.2 if visible else 0)
-            new_line_alpha.append(1 if visible else 0)
-        
-        # Update the source data with new alpha values
-        spatial_source.data.update({
-            'fill_alpha': new_fill_alpha,
-            'line_alpha': new_line_alpha
-        })
+        global mask_visible
+        # toggle state of each label code, in LABEL_NAMES order
+        toggle_states = np.array([toggle_d1.active, toggle_d2.active, toggle_cholinergic.active,
+                                  toggle_unknown.active, toggle_discard.active])
+        new_visible = toggle_states[label_codes]
+        changed = np.flatnonzero(new_visible != mask_visible)
+        mask_visible = new_visible
+        if len(changed) == 0:
+            return
+
+        new_fill_alpha = np.where(new_visible, 0.2, 0.0)
+        new_line_alpha = np.where(new_visible, 1.0, 0.0)
+
+        if len(changed) > len(new_visible) // 2:
+            # most masks changed (e.g. a toggle), resend the whole columns
+            spatial_source.data.update({
+                'fill_alpha': new_fill_alpha,
+                'line_alpha': new_line_alpha
+            })
+        else:
+            # only send the masks that changed
+            spatial_source.patch({
+                'fill_alpha': [(int(i), float(new_fill_alpha[i])) for i in changed],
+                'line_alpha': [(int(i), float(new_line_alpha[i])) for i in changed]
+            })
 
     # Make sure to call update_mask_visibility after loading data and after updating labels
     def update_labels(new_label):
-        selected_neuron = str(neuron_id_slider.value)
-        labels[selected_neuron] = new_label
+        selected_neuron = neuron_id_slider.value
+        old_code = label_codes[selected_neuron]
+        new_code = LABEL_CODES[new_label]
+        label_codes[selected_neuron] = new_code
         update_button_styles()
         update_labeled_count()
-        update_dropdowns()
+        update_dropdowns([old_code, new_code])
         update_mask_visibility()
 
     def save_labels(event):
@@ -431,14 +420,14 @@ def labeler_bkapp_v2(doc):
             # Update the label path input box with the new filename
             file_path_input.value = filename
 
-            # Check if labels dictionary is not empty
-            if not labels:
+            # Check if there are labels to save
+            if len(label_codes) == 0:
                 status_div.text = "<span style='color: red;'>Error: No labels to save!</span>"
                 return
 
             # Save the labels
             with open(save_path, 'w') as f:
-                json.dump(labels, f)
+                json.dump(codes_to_labels(label_codes), f)
 
             # Verify the file was created
             if os.path.exists(save_path):
@@ -467,8 +456,11 @@ def labeler_bkapp_v2(doc):
 
     # Function to update button styles based on current label
     def update_button_styles():
-        selected_neuron = str(neuron_id_slider.value)
-        current_label = labels.get(selected_neuron, "unknown")
+        selected_neuron = neuron_id_slider.value
+        if 0 <= selected_neuron < len(label_codes):
+            current_label = LABEL_NAMES[label_codes[selected_neuron]]
+        else:
+            current_label = "unknown"
 
         # Reset all buttons to default
         d1_button.button_type = "default"
@@ -498,11 +490,8 @@ def labeler_bkapp_v2(doc):
 
     # Function to update the counts displayed in the Div
     def update_labeled_count():
-        d1_count = sum(1 for label in labels.values() if label == "D1")
-        d2_count = sum(1 for label in labels.values() if label == "D2")
-        cholinergic_count = sum(1 for label in labels.values() if label == "cholinergic")
-        unknown_count = sum(1 for label in labels.values() if label == "unknown")
-        discard_count = sum(1 for label in labels.values() if label == "discard")
+        d1_count, d2_count, cholinergic_count, unknown_count, discard_count = np.bincount(
+            label_codes, minlength=len(LABEL_NAMES))
         labeled_count_div.text = f"D1: {d1_count} | D2: {d2_count} | Cholinergic: {cholinergic_count} | Unknown: {unknown_count} | Discard: {discard_count}"
 
     """
@@ -516,28 +505,22 @@ def labeler_bkapp_v2(doc):
     unknown_neurons_select = Select(title="Unknown Neurons", options=[], disabled=True)
     discard_neurons_select = Select(title="Discarded Neurons", options=[], disabled=True)
 
-    def update_dropdowns():
-        """Update dropdown menus with current labels"""
-        # Sort neurons by their ID (converting to int for proper numerical sorting)
-        d1_ids = sorted([i for i, label in labels.items() if label == "D1"], key=int)
-        d2_ids = sorted([i for i, label in labels.items() if label == "D2"], key=int)
-        cholinergic_ids = sorted([i for i, label in labels.items() if label == "cholinergic"], key=int)
-        unknown_ids = sorted([i for i, label in labels.items() if label == "unknown"], key=int)
-        discard_ids = sorted([i for i, label in labels.items() if label == "discard"], key=int)
-
-        # Update dropdown options
-        d1_neurons_select.options = ["Click to see options..."] + d1_ids
-        d2_neurons_select.options = ["Click to see options..."] + d2_ids
-        cholinergic_neurons_select.options = ["Click to see options..."] + cholinergic_ids
-        unknown_neurons_select.options = ["Click to see options..."] + unknown_ids
-        discard_neurons_select.options = ["Click to see options..."] + discard_ids
-
-        # Reset selections to default
-        d1_neurons_select.value = "Click to see options..."
-        d2_neurons_select.value = "Click to see options..."
-        cholinergic_neurons_select.value = "Click to see options..."
-        unknown_neurons_select.value = "Click to see options..."
-        discard_neurons_select.value = "Click to see options..."
+    # Select menu of each label code, in LABEL_NAMES order
+    label_selects = [d1_neurons_select, d2_neurons_select, cholinergic_neurons_select, unknown_neurons_select,
+                     discard_neurons_select]
+
+    def update_dropdowns(codes=None):
+        """
+        Update dropdown menus with current labels
+        :param codes: label codes whose menus need refreshing, all menus if None
+        """
+        codes = range(len(LABEL_NAMES)) if codes is None else set(int(code) for code in codes)
+        for code in codes:
+            # np.flatnonzero already returns neurons sorted by index
+            label_selects[code].options = ["Click to see options..."] + \
+                                          [str(i) for i in np.flatnonzero(label_codes == code)]
+            # Reset selection to default
+            label_selects[code].value = "Click to see options..."
 
     def neuron_selected(attr, old, new):
         if new and new != "Click to see options...":
@@ -559,14 +542,15 @@ def labeler_bkapp_v2(doc):
     # Filename input
     sessionname_input = TextInput(value=filename, title="SessionName:", width=400)
     load_data_button = Button(label="Load Data", button_type="success")
+    loader = SessionLoader(doc)
 
-    def load_and_update_data(filename):
+    def load_and_update_data(filename, data):
         """
-        Load the data from .mat and update global C, C_raw, etc.
+        Update global C, C_raw, etc. with the data read from the .mat file.
         Then re-populate the spatial_source with new shapes and
         reset labels/data for all neurons to 'unknown' by default.
         """
-        global C, C_raw, ids, labels, image_source, C_denoised, C_deconvolved, C_reraw
+        global C, C_raw, ids, label_codes, mask_visible, C_denoised, C_deconvolved, C_reraw
         # Enable navigation controls
         neuron_id_slider.disabled = False
         neuron_index_input.disabled = False
@@ -600,28 +584,18 @@ def labeler_bkapp_v2(doc):
         orig_tdt_input.value = "m_f_n_001_tdt_max.tif"
         bfp_input.value = "m_f_n_001_bfp_max.tif"
 
-        # Load the data
-        [C, C_raw, Cn, ids, Coor, centroids, virmenPath, C_denoised, C_deconvolved, C_reraw] = load_data(filename)
+        # Unpack the data read off the event loop
+        [C, C_raw, Cn, ids, Coor, centroids, virmenPath, C_denoised, C_deconvolved, C_reraw] = data
 
-        # Initialize labels as a dictionary with all neurons set to "unknown"
-        labels = {str(i): "unknown" for i in range(len(C))}
+        # Initialize labels with all neurons set to "unknown"
+        label_codes = np.full(len(C), UNKNOWN_CODE, dtype=np.int8)
 
         num_shapes = len(Coor)
         height, width = Cn.shape[:2]
 
-        # Prepare data for Bokeh
-        x_positions_all = []
-        y_positions_all = []
-
-        for i in range(num_shapes):
-            x_positions = Coor[i][0]
-            y_positions = Coor[i][1]
-
-            # Close the shape by ensuring the first point is repeated at the end
-            x_positions_all.append(x_positions)
-            y_positions_all.append(y_positions)
-
-        y_positions_all = [[height - y for y in y_list] for y_list in y_positions_all]
+        # Prepare data for Bokeh, the flipped y coordinates are precomputed by ContourGeometry
+        x_positions_all = Coor.xs()
+        y_positions_all = Coor.ys(flipped=True)
 
         colors = [custom_bright_colors[i % len(custom_bright_colors)] for i in range(num_shapes)]
 
@@ -634,6 +608,7 @@ def labeler_bkapp_v2(doc):
             'fill_alpha': [0.2]*num_shapes,
             'line_alpha': [1]*num_shapes,
         }
+        mask_visible = np.ones(num_shapes, dtype=bool)
 
         # Update temporal_source with data from the first neuron
         temporal_source.data = {
@@ -656,7 +631,7 @@ def labeler_bkapp_v2(doc):
         update_mask_visibility()  # Apply toggles if needed
 
         # Clear any existing image
-        image_source.data = {'image': []}
+        clear_images()
 
         # Update plot ranges
         spatial.x_range.start = 0
@@ -700,18 +675,18 @@ def labeler_bkapp_v2(doc):
         # Update document title
         doc.title = f"Data Loaded: {filename}"
 
-        # Add these lines after initializing spatial_source:
-        spatial_source.data['fill_alpha'] = [0.2] * len(spatial_source.data['xs'])
-        spatial_source.data['line_alpha'] = [1] * len(spatial_source.data['xs'])
-
     def update_data():
         global session_name
         with open(CONFIG_PATH, 'r') as file:
             config = json.load(file)
         session_name = sessionname_input.value
         neuron_path = os.path.join(config['ProcessedFilePath'], session_name, f'{session_name}_v7.mat')
-        load_and_update_data(neuron_path)
-        print(f"{neuron_path} loaded!")
+
+        def show(data):
+            load_and_update_data(neuron_path, data)
+            print(f"{neuron_path} loaded!")
+
+        loader.load(lambda progress: load_data(neuron_path), show, label=session_name)
 
     load_data_button.on_click(update_data)
 
@@ -743,9 +718,8 @@ def labeler_bkapp_v2(doc):
         Load a specific image type (GCaMP, original TDT, or adjusted TDT)
         """
         try:
-            # Save current view state
+            # Current view state, kept unless this is the first load
             current_x_range = (spatial.x_range.start, spatial.x_range.end)
-            current_y_range = (spatial.y_range.start, spatial.y_range.end)
 
             with open(CONFIG_PATH, 'r') as file:
                 config = json.load(file)
@@ -758,57 +732,65 @@ def labeler_bkapp_v2(doc):
                 folder_name = f'{session_name}_tiff_projections'
                 filename = image_input.value
                 image_path = os.path.join(base_path, session_name, folder_name, filename)
-                color = "green"
             elif image_type == "orig_tdt":
                 folder_name = f'{session_name}_alignment_check'
                 filename = image_input.value
                 image_path = os.path.join(base_path, session_name, folder_name, filename)
-                color = "red"
             elif image_type == "bfp":
                 folder_name = f'{session_name}_alignment_check'
                 filename = image_input.value
                 image_path = os.path.join(base_path, session_name, folder_name, filename)
-                color = "blue"
-
-            # Load and process the image
-            img, shape = load_tiff_image(image_path, color)
-            if img is not None:
-                # Remove only the existing image ren1erers
-                spatial.renderers = [r for r in spatial.renderers if not isinstance(r, ImageRGBA)]
-
-                # Add the image with a level between underlay and overlay
-                image_renderer = spatial.image_rgba(image='image',
-                                                    x=0, y=0,
-                                                    dw=shape[1], dh=shape[0],
-                                                    source=image_source,
-                                                    level='glyph')
-
-                # Update image source with the new image
-                image_source.data = {'image': [img]}
-
-                # Only update ranges if they're not already set (i.e., first load)
-                if current_x_range[0] is None or current_x_range[1] is None:
-                    spatial.x_range.start = 0
-                    spatial.x_range.end = shape[1]
-                    spatial.y_range.start = 0
-                    spatial.y_range.end = shape[0]
-                else:
-                    # Restore previous view state
-                    spatial.x_range.start = current_x_range[0]
-                    spatial.x_range.end = current_x_range[1]
-                    spatial.y_range.start = current_y_range[0]
-                    spatial.y_range.end = current_y_range[1]
 
-                status_div.text = f"<span style='color: green;'>{image_type.upper()} image loaded successfully!</span>"
-            else:
-                status_div.text = f"<span style='color: red;'>Failed to load {image_type} image!</span>"
+            # Load the cached pyramid of the image, built on first use
+            pyramid = ImagePyramid.load(image_path)
+            image_pyramids[image_type] = pyramid
+            image_regions.pop(image_type, None)
+
+            # Only update ranges if they're not already set (i.e., first load)
+            if current_x_range[0] is None or current_x_range[1] is None:
+                spatial.x_range.start = 0
+                spatial.x_range.end = pyramid.width
+                spatial.y_range.start = 0
+                spatial.y_range.end = pyramid.height
+
+            show_image_region(image_type)
+            status_div.text = f"<span style='color: green;'>{image_type.upper()} image loaded successfully!</span>"
 
         except Exception as e:
             status_div.text = f"<span style='color: red;'>Error: {str(e)}</span>"
 
+    def show_image_region(image_type):
+        """Send the pyramid level and tiles of an image channel matching the current viewport"""
+        pyramid = image_pyramids[image_type]
+        x_range = (spatial.x_range.start, spatial.x_range.end)
+        y_range = (spatial.y_range.start, spatial.y_range.end)
+        if None in x_range or None in y_range:
+            x_range, y_range = (0, pyramid.width), (0, pyramid.height)
+
+        region = pyramid.region(x_range, y_range, spatial.width, spatial.height)
+        region_key = (region['level'], region['x'], region['y'], region['dw'], region['dh'])
+        if image_regions.get(image_type) == region_key:
+            return
+
+        image_regions[image_type] = region_key
+        image_sources[image_type].data = {'image': [region['image']], 'x': [region['x']], 'y': [region['y']],
+                                          'dw': [region['dw']], 'dh': [region['dh']]}
+
+    def update_image_regions(event):
+        for image_type in image_pyramids:
+            show_image_region(image_type)
+
+    spatial.on_event(RangesUpdate, update_image_regions)
+
+    def clear_images():
+        image_pyramids.clear()
+        image_regions.clear()
+        for image_source in image_sources.values():
+            image_source.data = {'image': [], 'x': [], 'y': [], 'dw': [], 'dh': []}
+
     def remove_image():
-        """Remove the currently displayed image"""
-        image_source.data = {'image': []}
+        """Remove the currently displayed images"""
+        clear_images()
         status_div.text = "<span style='color: blue;'>Image removed</span>"
 
     # Callbacks for the load buttons
@@ -837,6 +819,7 @@ def labeler_bkapp_v2(doc):
     """
     def load_labels(event):
         """Load labels from a JSON file and update the UI."""
+        global label_codes
         try:
             session_name = sessionname_input.value
             if not session_name:
@@ -854,9 +837,8 @@ def labeler_bkapp_v2(doc):
             # Load the labels
             if os.path.exists(labels_path):
                 with open(labels_path, 'r') as f:
-                    # We replace the global labels dict
-                    global labels
-                    labels = json.load(f)
+                    # We replace the global label codes
+                    label_codes = labels_to_codes(json.load(f), len(label_codes))
 
                 # Update all UI elements
                 update_button_styles()
@@ -886,7 +868,7 @@ def labeler_bkapp_v2(doc):
     spacer2 = Spacer(height=20)
     spacer3 = Spacer(width=20)
 
-    choose_file = row(spacer3, sessionname_input, column(spacer2, load_data_button))
+    choose_file = row(spacer3, sessionname_input, column(spacer2, load_data_button), column(spacer2, loader.status))
 
     controls = row(
         spacer3,
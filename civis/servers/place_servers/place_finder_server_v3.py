@@ -63,6 +63,7 @@ def get_data(ciTank, peak_indices_par, neuron_id, normalization_method='percenti
 
 def place_cell_vis_bkapp_v3(doc):
     from civis.src.CITank import CITank
+    from civis.src.SessionLoader import SessionLoader
 
     global session_name, peak_indices, ci, remain_trial_indices, trials, data, \
         peak_trial_source, peak_point_source, remain_trial_source, heatmap_source
@@ -105,46 +106,34 @@ def place_cell_vis_bkapp_v3(doc):
     next_button = Button(label="Next", width=100, disabled=True)
     neuron_index_input = TextInput(value=str(neuron_id_slider.value), title="Neuron Index:", disabled=True)
 
-    def load_data():
-        global session_name, peak_indices, ci, remain_trial_indices, trial_indices, trials, data, \
-            peak_trial_source, peak_point_source, remain_trial_source
+    loader = SessionLoader(doc)
 
-        session_name = session_input.value
+    def read_data(session_name, progress):
         config_path = os.path.join(project_root, 'config.json')
         with open(config_path, 'r') as file:
             config = json.load(file)
 
         # load in the DataTank
         neuron_path = os.path.join(config['ProcessedFilePath'], session_name, f'{session_name}_v7.mat')
-        virmen_path = os.path.join(config['VirmenFilePath'], f'{session_name}.txt')
-        print("Loading neuron data " + session_name + "...")
+        progress("Loading neuron data " + session_name + "...")
         ci = CITank(session_name)
         print("Successfully loaded: " + neuron_path)
 
-        neuron_id_slider.disabled = False
-        previous_button.disabled = False
-        next_button.disabled = False
-        neuron_index_input.disabled = False
-
         # load in the peak indices
         peak_indices_path = config['ProcessedFilePath'] + session_name + "/" + session_name + "_peak_indices.pkl"
         if os.path.exists(peak_indices_path):
-            print("Found peak indices file, loading...")
+            progress("Found peak indices file, loading...")
             with open(peak_indices_path, 'rb') as f:
                 peak_indices = pickle.load(f)
             print("Loaded peak indices!")
         else:
-            print("Peak indices file not found, calculating...")
+            progress("Peak indices file not found, calculating...")
             peak_indices = ci.find_peaks_in_traces(notebook=False)
             with open(peak_indices_path, 'wb') as f:
                 pickle.dump(peak_indices, f)
             print("Saved peak indices!")
 
-        print("Waiting for finalizing visualization...")
-        neuron_id_slider.end = ci.neuron_num - 1
-        neuron_id_slider.value = 0
-        neuron_index_input.value = "0"
-
+        progress("Assigning peaks to trials...")
         trials = ci.virmen_trials
         data = ci.virmen_data
 
@@ -160,6 +149,28 @@ def place_cell_vis_bkapp_v3(doc):
                                    item not in list(trial_indices[i].values())]
             remain_trial_indices.append(remain_trials_index)
 
+        return session_name, ci, peak_indices, trials, data, trial_indices, remain_trial_indices
+
+    def load_data():
+        name = session_input.value
+        loader.load(lambda progress: read_data(name, progress), show_data, label=name)
+
+    def show_data(result):
+        global session_name, peak_indices, ci, remain_trial_indices, trial_indices, trials, data, \
+            peak_trial_source, peak_point_source, remain_trial_source
+
+        session_name, ci, peak_indices, trials, data, trial_indices, remain_trial_indices = result
+
+        neuron_id_slider.disabled = False
+        previous_button.disabled = False
+        next_button.disabled = False
+        neuron_index_input.disabled = False
+
+        print("Waiting for finalizing visualization...")
+        neuron_id_slider.end = ci.neuron_num - 1
+        neuron_id_slider.value = 0
+        neuron_index_input.value = "0"
+
         update_plot(None, None, None)
 
         print("Visualization loaded!")
@@ -228,7 +239,7 @@ def place_cell_vis_bkapp_v3(doc):
 
     file_input_row = row(session_input, column(Spacer(height=20), load_button))
     trial_navigation_row = row(previous_button, next_button)
-    tool_widgets = column(file_input_row, Spacer(height=30), neuron_index_input, neuron_id_slider, trial_navigation_row)
+    tool_widgets = column(file_input_row, loader.status, Spacer(height=30), neuron_index_input, neuron_id_slider, trial_navigation_row)
     images = Tabs(tabs=[image_tab1, image_tab2])
     layout = row(images, Spacer(width=30), tool_widgets)
     doc.add_root(layout)
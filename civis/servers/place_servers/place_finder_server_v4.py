@@ -70,8 +70,9 @@ def get_data(ciTank, peak_indices_par, neuron_id, normalization_method='percenti
 
 def place_cell_vis_bkapp_v4(doc):
     from civis.src.CITank import CITank
+    from civis.src.SessionLoader import SessionLoader
 
-    global session_name, peak_indices, ci, remain_trial_indices, trials, data, \
+    global session_name, peak_indices, ci, trial_tensor, trials, data, \
         peak_trial_source, peak_point_source, remain_trial_source, heatmap_source, \
         maze_type, plot_t1, plot_t2
 
@@ -122,80 +123,73 @@ def place_cell_vis_bkapp_v4(doc):
         disabled=True  # Disabled since we're fixed on straight70
     )
 
-    def load_data():
-        global session_name, peak_indices, ci, remain_trial_indices, trial_indices, trials, data, \
-            peak_trial_source, peak_point_source, remain_trial_source, maze_type, plot_t1, plot_t2
+    def neuron_trial_lines(neuron):
+        """Trajectories of the trials with a peak of the neuron, its peak positions and the remaining trials"""
+        peak_samples, peak_trials, _ = trial_tensor.neuron_peaks(neuron)
+        remain_trials = np.setdiff1d(np.arange(len(trials)), peak_trials)
+
+        trial_lines = {'x': [trials[i]['x'] for i in peak_trials], 'y': [trials[i]['y'] for i in peak_trials]}
+        peak_points = {'px': data['x'].to_numpy()[peak_samples], 'py': data['y'].to_numpy()[peak_samples]}
+        remain_trial_lines = {'rx': [trials[i]['x'] for i in remain_trials], 'ry': [trials[i]['y'] for i in remain_trials]}
+        return trial_lines, peak_points, remain_trial_lines
+
+    loader = SessionLoader(doc)
 
-        session_name = session_input.value
+    def read_data(session_name, progress):
         config_path = os.path.join(project_root, 'config.json')
         with open(config_path, 'r') as file:
             config = json.load(file)
 
         # load in the DataTank
         neuron_path = os.path.join(config['ProcessedFilePath'], session_name, f'{session_name}_v7.mat')
-        virmen_path = os.path.join(config['VirmenFilePath'], f'{session_name}.txt')
-        print("Loading neuron data " + session_name + "...")
+        progress("Loading neuron data " + session_name + "...")
         ci = CITank(session_name)
         print("Successfully loaded: " + neuron_path)
 
-        neuron_id_slider.disabled = False
-        previous_button.disabled = False
-        next_button.disabled = False
-        neuron_index_input.disabled = False
-
         # load in the peak indices
         peak_indices_path = config['ProcessedFilePath'] + session_name + "/" + session_name + "_peak_indices.pkl"
         if os.path.exists(peak_indices_path):
-            print("Found peak indices file, loading...")
+            progress("Found peak indices file, loading...")
             with open(peak_indices_path, 'rb') as f:
                 peak_indices = pickle.load(f)
             print("Loaded peak indices!")
         else:
-            print("Peak indices file not found, calculating...")
-            peak_indices = ci.find_peaks_in_traces(notebook=False)
+            progress("Peak indices file not found, calculating...")
+            peak_indices = ci.peak_indices
             with open(peak_indices_path, 'wb') as f:
                 pickle.dump(peak_indices, f)
             print("Saved peak indices!")
 
+        progress("Assigning peaks to trials...")
+        trials = ci.virmen_trials
+        data = ci.virmen_data
+
+        # trials x neurons peak counts, built once for the session
+        trial_tensor = ci.get_trial_tensor(peak_indices)
+
+        return session_name, ci, peak_indices, trials, data, trial_tensor
+
+    def load_data():
+        name = session_input.value
+        loader.load(lambda progress: read_data(name, progress), show_data, label=name)
+
+    def show_data(result):
+        global session_name, peak_indices, ci, trial_tensor, trials, data, \
+            peak_trial_source, peak_point_source, remain_trial_source, maze_type, plot_t1, plot_t2
+
+        session_name, ci, peak_indices, trials, data, trial_tensor = result
+
+        neuron_id_slider.disabled = False
+        previous_button.disabled = False
+        next_button.disabled = False
+        neuron_index_input.disabled = False
+
         print("Waiting for finalizing visualization...")
         neuron_id_slider.end = ci.neuron_num - 1
         neuron_id_slider.value = 0
         neuron_index_input.value = "0"
 
-        trials = ci.virmen_trials
-        data = ci.virmen_data
-
-        trial_bounds = ci.compute_trial_bounds()
-        trial_indices = []
-        for indices in peak_indices:
-            trial_index = ci.find_trial_for_indices(trial_bounds, indices)
-            trial_indices.append(trial_index)
-
-        remain_trial_indices = []
-        for i in range(ci.neuron_num):
-            remain_trials_index = [item for item in np.array(range(0, len(trials))) if
-                                   item not in list(trial_indices[i].values())]
-            remain_trial_indices.append(remain_trials_index)
-
-        trial_lines = {'x': [], 'y': []}
-        peak_points = {'px': [], 'py': []}
-        remain_trial_lines = {'rx': [], 'ry': []}
-        # Populate data for peak trials and points
-        for i in range(len(trial_indices[0])):
-            trial_lines['x'].append(
-                trials[list(trial_indices[0].values())[i]]['x'])  # Ensure conversion to list if necessary
-            trial_lines['y'].append(trials[list(trial_indices[0].values())[i]]['y'])
-            peak_points['px'].append(data.iloc[peak_indices[0][i]]['x'])
-            peak_points['py'].append(data.iloc[peak_indices[0][i]]['y'])
-
-        # Populate data for remaining trials
-        for i in remain_trial_indices[0]:
-            remain_trial_lines['rx'].append(trials[i]['x'])
-            remain_trial_lines['ry'].append(trials[i]['y'])
-
-        peak_trial_source.data = trial_lines
-        peak_point_source.data = peak_points
-        remain_trial_source.data = remain_trial_lines
+        peak_trial_source.data, peak_point_source.data, remain_trial_source.data = neuron_trial_lines(0)
 
         # Get heatmap and adjusted ranges
         heatmap_data, x_range, y_range = get_data(ci, peak_indices, 0, maze_type=maze_type)
@@ -219,35 +213,16 @@ def place_cell_vis_bkapp_v4(doc):
     load_button.on_click(load_data)
 
     def update_plot(attr, old, new):
-        global session_name, peak_indices, ci, remain_trial_indices, trial_indices, trials, data, \
+        global session_name, peak_indices, ci, trial_tensor, trials, data, \
             peak_trial_source, peak_point_source, remain_trial_source, heatmap_source, maze_type, plot_t1, plot_t2
 
         picked_neuron = neuron_id_slider.value
         neuron_index_input.value = str(picked_neuron)
-        trial_lines = {'x': [], 'y': []}
-        peak_points = {'px': [], 'py': []}
-        remain_trial_lines = {'rx': [], 'ry': []}
-
-        # Populate data for peak trials and points
-        for i in range(len(trial_indices[picked_neuron])):
-            trial_lines['x'].append(
-                trials[list(trial_indices[picked_neuron].values())[i]]['x'])
-            trial_lines['y'].append(trials[list(trial_indices[picked_neuron].values())[i]]['y'])
-            peak_points['px'].append(data.iloc[peak_indices[picked_neuron][i]]['x'])
-            peak_points['py'].append(data.iloc[peak_indices[picked_neuron][i]]['y'])
-
-        # Populate data for remaining trials
-        for i in remain_trial_indices[picked_neuron]:
-            remain_trial_lines['rx'].append(trials[i]['x'])
-            remain_trial_lines['ry'].append(trials[i]['y'])
-
         # Get heatmap and adjusted ranges
         heatmap_data, x_range, y_range = get_data(ci, peak_indices, picked_neuron, maze_type=maze_type)
         heatmap_source.data['image'] = [heatmap_data]
 
-        peak_trial_source.data = trial_lines
-        peak_point_source.data = peak_points
-        remain_trial_source.data = remain_trial_lines
+        peak_trial_source.data, peak_point_source.data, remain_trial_source.data = neuron_trial_lines(picked_neuron)
 
     neuron_id_slider.on_change('value', update_plot)
 
@@ -283,6 +258,7 @@ def place_cell_vis_bkapp_v4(doc):
     trial_navigation_row = row(previous_button, next_button)
     tool_widgets = column(
         file_input_row, 
+        loader.status, 
         Spacer(height=30), 
         maze_type_select,  # Add maze type selector
         neuron_index_input, 
@@ -16,7 +16,11 @@ sys.path.append(project_root)
 
 def raster_bkapp_v0(doc):
     from civis.src.CITank import CITank
-    def load_data(session_name):
+    from civis.src.SessionLoader import SessionLoader
+
+    loader = SessionLoader(doc)
+
+    def load_data(session_name, progress):
         config_path = os.path.join(project_root, 'config.json')
         with open(config_path, 'r') as file:
             config = json.load(file)
@@ -25,22 +29,24 @@ def raster_bkapp_v0(doc):
         peak_indices_path = config['ProcessedFilePath'] + session_name + "/" + session_name + "_peak_indices.pkl"
         virmen_path = config['VirmenFilePath'] + session_name + ".txt"
 
+        progress("Loading calcium data...")
         ci = CITank(session_name)
         print("Successfully loaded: " + neuron_path)
 
         # load in the peak indices
         if os.path.exists(peak_indices_path):
-            print("Found peak indices file, loading...")
+            progress("Found peak indices file, loading...")
             with open(peak_indices_path, 'rb') as f:
                 peak_indices = pickle.load(f)
             print("Loaded peak indices!")
         else:
-            print("Peak indices file not found, calculating...")
+            progress("Peak indices file not found, calculating...")
             peak_indices = ci.find_peaks_in_traces(notebook=False)
             with open(peak_indices_path, 'wb') as f:
                 pickle.dump(peak_indices, f)
             print("Saved peak indices!")
 
+        progress("Computing spike statistics...")
         spike_times = peak_indices
         spike_stats = ci.get_spike_statistics(peak_indices)
 
@@ -107,7 +113,10 @@ def raster_bkapp_v0(doc):
     def update_data():
         print("Loading Data...")
         session_name = session_input.value
-        data, ci, spike_stats = load_data(session_name)
+        loader.load(lambda progress: load_data(session_name, progress), show_data, label=session_name)
+
+    def show_data(result):
+        data, ci, spike_stats = result
         raster_source.data = data
         p.yaxis.ticker = np.arange(0, ci.neuron_num)
         p.yaxis.major_label_overrides = {i: f"Neuron {i}" for i in range(ci.neuron_num)}
@@ -190,5 +199,5 @@ def raster_bkapp_v0(doc):
 
     # Layout
     blank_left = Spacer(width=30)
-    layout = row(blank_left, column(row(session_input, column(Spacer(height=20), load_button)), row(p, neurons_div), v, s))
+    layout = row(blank_left, column(row(session_input, column(Spacer(height=20), load_button), column(Spacer(height=20), loader.status)), row(p, neurons_div), v, s))
     doc.add_root(layout)
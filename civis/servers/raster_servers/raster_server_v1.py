@@ -1,4 +1,4 @@
-from bokeh.models import ColumnDataSource, TextInput, Button, BoxSelectTool, Spacer, Arrow, VeeHead, RangeSlider
+from bokeh.models import ColumnDataSource, TextInput, Button, BoxSelectTool, Spacer, Arrow, VeeHead, RangeSlider, Select, Div
 from bokeh.plotting import figure
 from bokeh.layouts import column, row
 from bokeh.events import SelectionGeometry, Reset
@@ -14,15 +14,21 @@ servers_dir = os.path.dirname(current_dir)
 project_root = os.path.dirname(servers_dir)
 sys.path.append(project_root)
 
+# bin widths of the spike stats plot, in seconds; 0 keeps one bin per frame
+SPIKE_STATS_BINS = {'1 frame': 0, '0.5 s': 0.5, '1 s': 1.0, '5 s': 5.0, '10 s': 10.0}
+
 
 def raster_bkapp_v1(doc):
     from civis.src.CITank import CITank
+    from civis.src.SessionLoader import SessionLoader
 
     # Create initial empty plot
     raster_source = ColumnDataSource({'x_starts': [], 'y_starts': [], 'x_ends': [], 'y_ends': []})
     selected_raster_source = ColumnDataSource({'x_starts': [], 'y_starts': [], 'x_ends': [], 'y_ends': []})
-    line_source = ColumnDataSource({'x': [], 'velocity': [], 'lick': [], 'pstcr': [], 'spike_stats': []})
-    selected_line_source = ColumnDataSource({'x': [], 'velocity': [], 'lick': [], 'pstcr': [], 'spike_stats': []})
+    line_source = ColumnDataSource({'x': [], 'velocity': [], 'lick': [], 'pstcr': []})
+    selected_line_source = ColumnDataSource({'x': [], 'velocity': [], 'lick': [], 'pstcr': []})
+    spike_source = ColumnDataSource({'x': [], 'spike_stats': [], 'active_fraction': []})
+    selected_spike_source = ColumnDataSource({'x': [], 'spike_stats': [], 'active_fraction': []})
 
     # Create shared x-range for all plots
     shared_x_range = figure().x_range
@@ -48,10 +54,15 @@ def raster_bkapp_v1(doc):
 
     # Spike stats plot
     s = figure(width=1000, height=200, x_range=shared_x_range, active_scroll='wheel_zoom', min_border_left=100)
-    s.line('x', 'spike_stats', source=line_source, color='Chocolate', alpha=1, legend_label='spikes count')
-    s.line('x', 'spike_stats', source=selected_line_source, color='Sienna', alpha=1, legend_label='spikes count')
+    s.line('x', 'spike_stats', source=spike_source, color='Chocolate', alpha=1, legend_label='spikes count')
+    s.line('x', 'spike_stats', source=selected_spike_source, color='Sienna', alpha=1, legend_label='spikes count')
+    s.line('x', 'active_fraction', source=spike_source, color='OliveDrab', alpha=1, legend_label='active fraction',
+           visible=False)
     s.legend.click_policy = 'hide'
 
+    spike_bin_select = Select(title="Spike stats bin:", value='1 frame', options=list(SPIKE_STATS_BINS), width=120)
+    synchrony_div = Div(text="", width=300)
+
     box_select_p = BoxSelectTool(dimensions="width")
     p.add_tools(box_select_p)
     v.add_tools(box_select_p)
@@ -63,9 +74,10 @@ def raster_bkapp_v1(doc):
     load_button = Button(label="Load Data", button_type="success")
 
     # Trajectory part
-    global virmen_source, virmen_data, range_slider
+    global virmen_source, virmen_data, range_slider, activity
 
     virmen_data = pd.DataFrame()
+    activity = None
     virmen_source = ColumnDataSource({'x': [], 'y': [], 'face_angle': []})
     plot = figure(width=550, height=800, y_range=(-100,180),title="Mouse Movement Trajectory")
     plot.line('x', 'y', source=virmen_source, line_width=2)
@@ -91,73 +103,86 @@ def raster_bkapp_v1(doc):
     range_slider = RangeSlider(start=0, end=100, value=(0, 100), step=1, width=600, title="Progress")
     range_slider.disabled = True
 
-    def load_data(session_name):
-        global virmen_source, virmen_data, range_slider, ci
+    loader = SessionLoader(doc)
 
+    def load_data(session_name, progress):
+        """Read a session off the event loop; touches no Bokeh model"""
         config_path = os.path.join(project_root, 'config.json')
         with open(config_path, 'r') as file:
             config = json.load(file)
 
         neuron_path = config['ProcessedFilePath'] + session_name + '/' + session_name + '_v7.mat'
         peak_indices_path = config['ProcessedFilePath'] + session_name + "/" + session_name + "_peak_indices.pkl"
-        virmen_path = config['VirmenFilePath'] + session_name + ".txt"
 
+        progress(f"Loading calcium and virmen data of {session_name}...")
         ci = CITank(session_name)
         print("Successfully loaded: " + neuron_path)
 
         # load in the peak indices
         if os.path.exists(peak_indices_path):
-            print("Found peak indices file, loading...")
+            progress("Found peak indices file, loading...")
             with open(peak_indices_path, 'rb') as f:
                 peak_indices = pickle.load(f)
             print("Loaded peak indices!")
         else:
-            print("Peak indices file not found, calculating...")
-            peak_indices = ci.find_peaks_in_traces(notebook=False)
+            progress("Peak indices file not found, saving the detected peaks...")
+            peak_indices = ci.peak_indices
             with open(peak_indices_path, 'wb') as f:
                 pickle.dump(peak_indices, f)
             print("Saved peak indices!")
 
-        spike_times = peak_indices
-        spike_stats = ci.get_spike_statistics(peak_indices)
-
-        data = {'x_starts': [], 'y_starts': [], 'x_ends': [], 'y_ends': []}
-        for neuron_idx, spikes in enumerate(spike_times):
-            for spike_time in spikes:
-                data['x_starts'].append(spike_time / ci.ci_rate)
-                data['y_starts'].append(neuron_idx)
-                data['x_ends'].append(spike_time / ci.ci_rate)
-                data['y_ends'].append(neuron_idx + 0.7)
+        progress("Computing population activity...")
+        activity = ci.get_population_activity(peak_indices)
 
-        virmen_data = ci.virmen_data[:ci.session_duration * ci.ci_rate]
-        if not virmen_data.empty:
-            # Enable the widgets now that data is loaded
-            range_slider.disabled = False
+        x = activity.peaks / ci.ci_rate
+        data = {'x_starts': x, 'y_starts': activity.neurons, 'x_ends': x, 'y_ends': activity.neurons + 0.7}
 
-            new_data = {'x': virmen_data['x'].tolist(),
-                        'y': virmen_data['y'].tolist(),
-                        'face_angle': virmen_data['face_angle'].tolist()}
-            virmen_source.data = new_data
+        return data, ci, activity, ci.virmen_data[:ci.session_duration * ci.ci_rate]
 
-            range_slider.end = ci.t[-1]
-            range_slider.value = (0, 0)
+    def show_spike_stats():
+        """Population spike counts and active neuron fraction at the selected bin width"""
+        if activity is None:
+            return
 
-        return data, ci, spike_stats
+        bin_width = SPIKE_STATS_BINS[spike_bin_select.value] or 1 / ci.ci_rate
+        times, counts = activity.population_counts(bin_width)
+        synchrony = activity.synchrony(bin_width)
+        spike_source.data = dict(x=times, spike_stats=counts, active_fraction=synchrony['active_fraction'])
+        selected_spike_source.data = {'x': [], 'spike_stats': [], 'active_fraction': []}
+        synchrony_div.text = (f"Synchrony χ: {synchrony['chi']:.3f}<br>"
+                              f"Fano factor: {synchrony['fano_factor']:.2f}<br>"
+                              f"Mean rate: {activity.population_rate(bin_width)[1].mean():.3f} Hz")
 
     def update_data():
-        print("Loading Data...")
         session_name = session_input.value
-        data, ci, spike_stats = load_data(session_name)
+        loader.load(lambda progress: load_data(session_name, progress), show_data, label=session_name)
+
+    def show_data(result):
+        global virmen_data, ci, activity
+
+        data, ci, activity, virmen_data = result
         raster_source.data = data
         p.yaxis.ticker = np.arange(0, ci.neuron_num)
         p.yaxis.major_label_overrides = {i: f"Neuron {i}" for i in range(ci.neuron_num)}
         line_source.data = dict(x=ci.t,
                                 velocity=ci.normalize_signal(ci.velocity),
                                 lick=ci.lick,
-                                pstcr=ci.pstcr,
-                                spike_stats=spike_stats)
+                                pstcr=ci.pstcr)
+        show_spike_stats()
+
+        if not virmen_data.empty:
+            # Enable the widgets now that data is loaded
+            range_slider.disabled = False
+
+            virmen_source.data = {'x': virmen_data['x'].tolist(),
+                                  'y': virmen_data['y'].tolist(),
+                                  'face_angle': virmen_data['face_angle'].tolist()}
+
+            range_slider.end = ci.t[-1]
+            range_slider.value = (0, 0)
 
     load_button.on_click(update_data)
+    spike_bin_select.on_change('value', lambda attr, old, new: show_spike_stats())
 
     def update_plot(attr, old, new):
         global virmen_data, ci
@@ -212,27 +237,13 @@ def raster_bkapp_v1(doc):
 
         selected_raster_source.data = filtered_data
 
-        filtered_data_x = []
-        filtered_data_velocity = []
-        filtered_data_lick = []
-        filtered_data_pstcr = []
-        filtered_data_spikes = []
-
-        for i, x_val in enumerate(line_source.data['x']):
-            if x0 <= x_val <= x1:
-                filtered_data_x.append(x_val)
-                filtered_data_velocity.append(line_source.data['velocity'][i])
-                filtered_data_lick.append(line_source.data['lick'][i])
-                filtered_data_pstcr.append(line_source.data['pstcr'][i])
-                filtered_data_spikes.append(line_source.data['spike_stats'][i])
-
-        selected_line_source.data = {
-            'x': filtered_data_x,
-            'velocity': filtered_data_velocity,
-            'lick': filtered_data_lick,
-            'pstcr': filtered_data_pstcr,
-            'spike_stats': filtered_data_spikes,
-        }
+        x = np.asarray(line_source.data['x'])
+        mask = (x0 <= x) & (x <= x1)
+        selected_line_source.data = {key: np.asarray(values)[mask] for key, values in line_source.data.items()}
+
+        spike_x = np.asarray(spike_source.data['x'])
+        mask = (x0 <= spike_x) & (spike_x <= x1)
+        selected_spike_source.data = {key: np.asarray(values)[mask] for key, values in spike_source.data.items()}
 
     p.on_event(SelectionGeometry, selection_handler)
     v.on_event(SelectionGeometry, selection_handler)
@@ -240,14 +251,15 @@ def raster_bkapp_v1(doc):
 
     def clear_selected_sources(event):
         selected_raster_source.data = {'x_starts': [], 'y_starts': [], 'x_ends': [], 'y_ends': []}
-        selected_line_source.data = {'x': [], 'velocity': [], 'lick': [], 'pstcr': [], 'spike_stats': []}
+        selected_line_source.data = {'x': [], 'velocity': [], 'lick': [], 'pstcr': []}
+        selected_spike_source.data = {'x': [], 'spike_stats': [], 'active_fraction': []}
 
     p.on_event(Reset, clear_selected_sources)
     v.on_event(Reset, clear_selected_sources)
     s.on_event(Reset, clear_selected_sources)
 
     # Layout
-    layout = row(Spacer(width=30), column(row(session_input, column(Spacer(height=20), load_button)), p, v, s, ), Spacer(width=30), column(Spacer(height=70), plot, range_slider))
+    layout = row(Spacer(width=30), column(row(session_input, column(Spacer(height=20), load_button), spike_bin_select, synchrony_div), loader.status, p, v, s, ), Spacer(width=30), column(Spacer(height=70), plot, range_slider))
     doc.add_root(layout)
 
 
@@ -19,6 +19,8 @@ def read_and_process_data(file_path, usecols=[0, 1, 2], threshold=[70.0, -70.0])
     return trials
 
 def trajectory_bkapp_v0(doc):
+    from civis.src.SessionLoader import SessionLoader
+
     global source, trials
 
     trials = []
@@ -53,12 +55,16 @@ def trajectory_bkapp_v0(doc):
     progress_slider.disabled = True
     play_button.disabled = True
 
-    def load_data():
-        global source, trials
+    loader = SessionLoader(doc)
 
+    def load_data():
         file = filename_input.value
-        trials = read_and_process_data(file)
+        loader.load(lambda progress: read_and_process_data(file), show_data, label=file)
+
+    def show_data(result):
+        global source, trials
 
+        trials = result
         if trials:
             # Enable the widgets now that data is loaded
             trial_slider.disabled = False
@@ -150,7 +156,7 @@ def trajectory_bkapp_v0(doc):
     play_button.on_click(toggle_play)
 
     file_input_row = row(filename_input, column(Spacer(height=20), load_button))
-    tool_widgets = column(file_input_row, trial_slider, progress_slider, play_button)
+    tool_widgets = column(file_input_row, loader.status, trial_slider, progress_slider, play_button)
     layout = row(plot, Spacer(width=30), tool_widgets)
     doc.add_root(layout)
 
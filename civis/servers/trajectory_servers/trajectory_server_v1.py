@@ -22,6 +22,8 @@ def read_and_process_data(file_path, usecols=[0, 1, 2], threshold=[70.0, -70.0])
 
 
 def trajectory_bkapp_v1(doc):
+    from civis.src.SessionLoader import SessionLoader
+
     global source, trials
 
     trials = []
@@ -60,17 +62,22 @@ def trajectory_bkapp_v1(doc):
     progress_slider.disabled = True
     play_button.disabled = True
 
-    def load_data():
-        global source, trials
+    loader = SessionLoader(doc)
 
+    def load_data():
         with open('config.json', 'r') as file:
             config = json.load(file)
 
         session_name = filename_input.value
         file = config['VirmenFilePath'] + session_name
 
-        trials = read_and_process_data(file, usecols=[0, 1, 2], threshold=[100.0, -100.0])
+        loader.load(lambda progress: read_and_process_data(file, usecols=[0, 1, 2], threshold=[100.0, -100.0]),
+                    show_data, label=session_name)
+
+    def show_data(result):
+        global source, trials
 
+        trials = result
         if trials:
             # Enable the widgets now that data is loaded
             trial_slider.disabled = False
@@ -155,6 +162,6 @@ def trajectory_bkapp_v1(doc):
     play_button.on_click(toggle_play)
 
     file_input_row = row(filename_input, column(Spacer(height=20), load_button))
-    tool_widgets = column(file_input_row, trial_slider, progress_slider, play_button)
+    tool_widgets = column(file_input_row, loader.status, trial_slider, progress_slider, play_button)
     layout = row(plot, Spacer(width=30), tool_widgets)
     doc.add_root(layout)
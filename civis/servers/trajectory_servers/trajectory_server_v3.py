@@ -4,6 +4,7 @@ from bokeh.layouts import column, row
 import numpy as np
 import json
 from civis.src import VirmenTank
+from civis.src.SessionLoader import SessionLoader
 
 
 def trajectory_bkapp_v3(doc):
@@ -51,9 +52,15 @@ def trajectory_bkapp_v3(doc):
     previous_button.disabled = True
     next_button.disabled = True
 
-    def load_data():
-        global source, trials, starts
+    loader = SessionLoader(doc)
+
+    def read_data(file, progress):
+        progress("Loading " + file + "...")
+        vm = VirmenTank(file)
+        print("Successfully loaded: " + file)
+        return vm.virmen_trials, [x/vm.vm_rate for x in vm.trials_start_indices]
 
+    def load_data():
         with open('config.json', 'r') as file:
             config = json.load(file)
 
@@ -63,12 +70,12 @@ def trajectory_bkapp_v3(doc):
         else:
             file = config['VirmenFilePath'] + session_name + ".txt"
 
-        vm = VirmenTank(file)
-        trials = vm.virmen_trials
-        starts = [x/vm.vm_rate for x in vm.trials_start_indices]
+        loader.load(lambda progress: read_data(file, progress), show_data, label=session_name)
 
-        print("Successfully loaded: " + file)
+    def show_data(result):
+        global source, trials, starts
 
+        trials, starts = result
         if trials:
             # Enable the widgets now that data is loaded
             trial_slider.disabled = False
@@ -170,6 +177,6 @@ def trajectory_bkapp_v3(doc):
 
     file_input_row = row(filename_input, column(Spacer(height=20), load_button))
     trial_navigation_row = row(previous_button, next_button)
-    tool_widgets = column(file_input_row, trial_slider, progress_slider, play_button, trial_navigation_row, starts_div)
+    tool_widgets = column(file_input_row, loader.status, trial_slider, progress_slider, play_button, trial_navigation_row, starts_div)
     layout = row(plot, Spacer(width=30), tool_widgets)
     doc.add_root(layout)
@@ -32,6 +32,8 @@ def read_and_process_data(file_path, threshold=None):
     return [trials, starts, data]
 
 def trajectory_bkapp_v4(doc):
+    from civis.src.SessionLoader import SessionLoader
+
     global source, trials
 
     trials = []
@@ -65,9 +67,15 @@ def trajectory_bkapp_v4(doc):
     next_button = Button(label="Next", width=100, disabled=True)
     starts_div = Div(text="Start Time: ", width=400)
 
-    def load_data():
-        global source, trials, starts
+    loader = SessionLoader(doc)
+
+    def read_data(file, progress):
+        progress("Loading " + file + "...")
+        trials, starts, _ = read_and_process_data(file)
+        print("Successfully loaded: " + file)
+        return trials, starts
 
+    def load_data():
         with open('config.json', 'r') as file:
             config = json.load(file)
 
@@ -77,11 +85,12 @@ def trajectory_bkapp_v4(doc):
         else:
             file = config['VirmenFilePath'] + session_name + ".txt"
 
+        loader.load(lambda progress: read_data(file, progress), show_data, label=session_name)
 
-        trials, starts, _ = read_and_process_data(file)
-        print("Successfully loaded: " + file)
-
+    def show_data(result):
+        global source, trials, starts
 
+        trials, starts = result
         if trials:
             # Enable the widgets now that data is loaded
             trial_slider.disabled = False
@@ -193,7 +202,7 @@ def trajectory_bkapp_v4(doc):
     file_input_row = row(filename_input, column(Spacer(height=20), load_button))
     trial_navigation_row = row(previous_button, next_button)
 
-    tool_widgets = column(file_input_row, trial_slider, progress_slider, play_button, trial_navigation_row, starts_div)
+    tool_widgets = column(file_input_row, loader.status, trial_slider, progress_slider, play_button, trial_navigation_row, starts_div)
     layout = row(plot, Spacer(width=30), tool_widgets)
     doc.add_root(layout)
 
@@ -15,6 +15,8 @@ sys.path.append(project_root)
 
 def trajectory_bkapp_v5(doc):
     from civis.src.VirmenTank import VirmenTank
+    from civis.src.SessionLoader import SessionLoader
+
     global source, trials
 
     trials = []
@@ -57,71 +59,75 @@ def trajectory_bkapp_v5(doc):
     previous_button.disabled = True
     next_button.disabled = True
 
+    loader = SessionLoader(doc, status=error_div)
+
+    def read_data(session_name, progress):
+        config_path = os.path.join(project_root, 'config.json')
+        with open(config_path, 'r') as file:
+            config = json.load(file)
+
+        if ".txt" in session_name:
+            file = os.path.join(config['VirmenFilePath'], session_name)
+        else:
+            file = os.path.join(config['VirmenFilePath'], f'{session_name}.txt')
+
+        # Check if the maze type is correct
+        progress("Checking the maze type of " + file + "...")
+        if VirmenTank.determine_maze_type(file).lower() != "straight50":
+            raise ValueError(
+                f"Invalid maze type. Expected 'Straight50', but got '{VirmenTank.determine_maze_type(file)}'")
+        else:
+            progress("Loading " + file + "...")
+            vm = VirmenTank(file)
+
+        trials = vm.virmen_trials
+        starts = [x / vm.vm_rate for x in vm.trials_start_indices]
+
+        print("Successfully loaded: " + file)
+        return trials, starts
+
     def load_data():
+        session_name = filename_input.value
+        loader.load(lambda progress: read_data(session_name, progress), show_data, label=session_name,
+                    on_error=show_error)
+
+    def show_data(result):
         global source, trials, starts
 
-        try:
-            config_path = os.path.join(project_root, 'config.json')
-            with open(config_path, 'r') as file:
-                config = json.load(file)
-
-            session_name = filename_input.value
-            if ".txt" in session_name:
-                file = os.path.join(config['VirmenFilePath'], session_name)
-            else:
-                file = os.path.join(config['VirmenFilePath'], f'{session_name}.txt')
-
-            # Check if the maze type is correct
-            if VirmenTank.determine_maze_type(file).lower() != "straight50":
-                raise ValueError(
-                    f"Invalid maze type. Expected 'Straight50', but got '{VirmenTank.determine_maze_type(file)}'")
-            else:
-                vm = VirmenTank(file)
-
-            trials = vm.virmen_trials
-            starts = [x / vm.vm_rate for x in vm.trials_start_indices]
-
-            print("Successfully loaded: " + file)
-            error_div.text = ""  # Clear any previous error messages
-
-            if trials:
-                # Enable the widgets now that data is loaded
-                trial_slider.disabled = False
-                progress_slider.disabled = False
-                play_button.disabled = False
-                previous_button.disabled = False
-                next_button.disabled = False
-
-                initial_trial = trials[0]
-                new_data = {'x': [initial_trial['x'][0]],
-                            'y': [initial_trial['y'][0]],
-                            'face_angle': [initial_trial['face_angle'][0]]}
-                source.data = new_data
-
-                trial_slider.end = len(trials) - 1
-                trial_slider.value = 0
-
-                progress_slider.end = 100
-                progress_slider.value = 0
-
-                starts_div.text = f"Start Time: {starts[0]}"
-
-        except ValueError as e:
+        trials, starts = result
+        if trials:
+            # Enable the widgets now that data is loaded
+            trial_slider.disabled = False
+            progress_slider.disabled = False
+            play_button.disabled = False
+            previous_button.disabled = False
+            next_button.disabled = False
+
+            initial_trial = trials[0]
+            new_data = {'x': [initial_trial['x'][0]],
+                        'y': [initial_trial['y'][0]],
+                        'face_angle': [initial_trial['face_angle'][0]]}
+            source.data = new_data
+
+            trial_slider.end = len(trials) - 1
+            trial_slider.value = 0
+
+            progress_slider.end = 100
+            progress_slider.value = 0
+
+            starts_div.text = f"Start Time: {starts[0]}"
+
+    def show_error(e):
+        if isinstance(e, ValueError):
             error_div.text = f"Error: {str(e)}"
-            # Disable widgets if data loading fails
-            trial_slider.disabled = True
-            progress_slider.disabled = True
-            play_button.disabled = True
-            previous_button.disabled = True
-            next_button.disabled = True
-        except Exception as e:
+        else:
             error_div.text = f"An unexpected error occurred: {str(e)}"
-            # Disable widgets if data loading fails
-            trial_slider.disabled = True
-            progress_slider.disabled = True
-            play_button.disabled = True
-            previous_button.disabled = True
-            next_button.disabled = True
+        # Disable widgets if data loading fails
+        trial_slider.disabled = True
+        progress_slider.disabled = True
+        play_button.disabled = True
+        previous_button.disabled = True
+        next_button.disabled = True
 
     load_button.on_click(load_data)
 
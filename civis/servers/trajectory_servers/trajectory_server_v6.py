@@ -18,6 +18,8 @@ sys.path.append(project_root)
 
 def trajectory_bkapp_v6(doc):
     from civis.src.VirmenTank import VirmenTank
+    from civis.src.SessionLoader import SessionLoader
+
     global source, trials, confusion_matrix_source, correct_array
 
     trials = []
@@ -127,124 +129,124 @@ def trajectory_bkapp_v6(doc):
 
     accuracy_tab = TabPanel(child=accuracy_plot, title="Accuracy")
 
-    def load_data():
-        global source, trials, starts, confusion_matrix_source, correct_array, accuracy_trials, vm_rate, pstcr
-
-        try:
-            config_path = os.path.join(project_root, 'config.json')
-            with open(config_path, 'r') as file:
-                config = json.load(file)
-
-            session_name = filename_input.value
-            if ".txt" in session_name:
-                file = os.path.join(config['VirmenFilePath'], session_name)
-            else:
-                file = os.path.join(config['VirmenFilePath'], f'{session_name}.txt')
-
-            # Check if the maze type is correct
-            if VirmenTank.determine_maze_type(file).lower() != "turnv1":
-                raise ValueError(
-                    f"Invalid maze type. Expected 'TurnV1', but got '{VirmenTank.determine_maze_type(file)}'")
-            else:
-                vm = VirmenTank(session_name)
-
-            trials = vm.virmen_trials
-
-            data_array = np.array(vm.virmen_data)
-            start_indicies = vm.trials_start_indices
-            end_indicies = vm.trials_end_indices_all
-
+    loader = SessionLoader(doc, status=error_div)
 
-            pstcr = {}
+    def read_data(session_name, progress):
+        config_path = os.path.join(project_root, 'config.json')
+        with open(config_path, 'r') as file:
+            config = json.load(file)
 
-            for i in range(len(vm.virmen_trials)):
-                dx = np.diff(data_array[start_indicies[i]: end_indicies[i] + 1, 0])
-                dx = np.insert(dx, 0, dx[0])
-                dy = np.diff(data_array[start_indicies[i]: end_indicies[i] + 1, 1])
-                dy = np.insert(dy, 0, dy[0])
-                pstcr[i] = np.sqrt(dx ** 2 + dy ** 2)
-
-            vm_rate = vm.vm_rate
-            starts = [x / vm_rate for x in vm.trials_start_indices]
-            correct_array = vm.extend_data.correct_array
-
-            print("Successfully loaded: " + file)
-            error_div.text = ""  # Clear any previous error messages
-
-            if trials:
-                # Enable the widgets now that data is loaded
-                trial_slider.disabled = False
-                progress_slider.disabled = False
-                play_button.disabled = False
-                previous_button.disabled = False
-                next_button.disabled = False
-                correct_trials_dropdown.disabled = False
-                incorrect_trials_dropdown.disabled = False
-
-                initial_trial = trials[0]
-                new_data = {'x': [initial_trial['x'][0]],
-                            'y': [initial_trial['y'][0]],
-                            'face_angle': [initial_trial['face_angle'][0]]}
-                source.data = new_data
-
-                accuracy_trials = vm.extend_data.current_accuracy()
-                accuracy_source.data = {'x': list(accuracy_trials.keys()), 'y': list(accuracy_trials.values())}
+        if ".txt" in session_name:
+            file = os.path.join(config['VirmenFilePath'], session_name)
+        else:
+            file = os.path.join(config['VirmenFilePath'], f'{session_name}.txt')
 
-                trial_slider.end = len(trials) - 1
-                trial_slider.value = 0
+        # Check if the maze type is correct
+        progress("Checking the maze type of " + file + "...")
+        if VirmenTank.determine_maze_type(file).lower() != "turnv1":
+            raise ValueError(
+                f"Invalid maze type. Expected 'TurnV1', but got '{VirmenTank.determine_maze_type(file)}'")
+        else:
+            progress("Loading " + file + "...")
+            vm = VirmenTank(session_name)
 
-                progress_slider.end = 100
-                progress_slider.value = 0
+        data_array = np.array(vm.virmen_data)
+        start_indicies = vm.trials_start_indices
+        end_indicies = vm.trials_end_indices_all
 
-                starts_div.text = f"Start Time: {starts[0]}"
 
-                if correct_array[0]:
-                    correctness_div.text = f"Trial Correctness: Correct"
-                else:
-                    correctness_div.text = f"Trial Correctness: Wrong"
+        pstcr = {}
 
-                # Update confusion matrix plot
-                new_confusion_matrix = vm.extend_data.confusion_matrix
-                confusion_matrix_source.data.update({
-                    'value': new_confusion_matrix.flatten().tolist()
-                })
-                color_mapper.low = new_confusion_matrix.min()
-                color_mapper.high = new_confusion_matrix.max()
+        for i in range(len(vm.virmen_trials)):
+            dx = np.diff(data_array[start_indicies[i]: end_indicies[i] + 1, 0])
+            dx = np.insert(dx, 0, dx[0])
+            dy = np.diff(data_array[start_indicies[i]: end_indicies[i] + 1, 1])
+            dy = np.insert(dy, 0, dy[0])
+            pstcr[i] = np.sqrt(dx ** 2 + dy ** 2)
 
-                # Update dropdown menus
-                correct_trials = [f"Trial {i}" for i, correct in enumerate(correct_array) if correct]
-                incorrect_trials = [f"Trial {i}" for i, correct in enumerate(correct_array) if not correct]
+        print("Successfully loaded: " + file)
+        return vm, pstcr
 
-                correct_trials_dropdown.options = correct_trials
-                incorrect_trials_dropdown.options = incorrect_trials
+    def load_data():
+        session_name = filename_input.value
+        loader.load(lambda progress: read_data(session_name, progress), show_data, label=session_name,
+                    on_error=show_error)
 
-                if correct_trials:
-                    correct_trials_dropdown.value = correct_trials[0]
-                if incorrect_trials:
-                    incorrect_trials_dropdown.value = incorrect_trials[0]
+    def show_data(result):
+        global source, trials, starts, confusion_matrix_source, correct_array, accuracy_trials, vm_rate, pstcr
 
-        except ValueError as e:
+        vm, pstcr = result
+        trials = vm.virmen_trials
+        vm_rate = vm.vm_rate
+        starts = [x / vm_rate for x in vm.trials_start_indices]
+        correct_array = vm.extend_data.correct_array
+
+        if trials:
+            # Enable the widgets now that data is loaded
+            trial_slider.disabled = False
+            progress_slider.disabled = False
+            play_button.disabled = False
+            previous_button.disabled = False
+            next_button.disabled = False
+            correct_trials_dropdown.disabled = False
+            incorrect_trials_dropdown.disabled = False
+
+            initial_trial = trials[0]
+            new_data = {'x': [initial_trial['x'][0]],
+                        'y': [initial_trial['y'][0]],
+                        'face_angle': [initial_trial['face_angle'][0]]}
+            source.data = new_data
+
+            accuracy_trials = vm.extend_data.current_accuracy()
+            accuracy_source.data = {'x': list(accuracy_trials.keys()), 'y': list(accuracy_trials.values())}
+
+            trial_slider.end = len(trials) - 1
+            trial_slider.value = 0
+
+            progress_slider.end = 100
+            progress_slider.value = 0
+
+            starts_div.text = f"Start Time: {starts[0]}"
+
+            if correct_array[0]:
+                correctness_div.text = f"Trial Correctness: Correct"
+            else:
+                correctness_div.text = f"Trial Correctness: Wrong"
+
+            # Update confusion matrix plot
+            new_confusion_matrix = vm.extend_data.confusion_matrix
+            confusion_matrix_source.data.update({
+                'value': new_confusion_matrix.flatten().tolist()
+            })
+            color_mapper.low = new_confusion_matrix.min()
+            color_mapper.high = new_confusion_matrix.max()
+
+            # Update dropdown menus
+            correct_trials = [f"Trial {i}" for i, correct in enumerate(correct_array) if correct]
+            incorrect_trials = [f"Trial {i}" for i, correct in enumerate(correct_array) if not correct]
+
+            correct_trials_dropdown.options = correct_trials
+            incorrect_trials_dropdown.options = incorrect_trials
+
+            if correct_trials:
+                correct_trials_dropdown.value = correct_trials[0]
+            if incorrect_trials:
+                incorrect_trials_dropdown.value = incorrect_trials[0]
+
+    def show_error(e):
+        if isinstance(e, ValueError):
             error_div.text = f"Error: {str(e)}"
-            # Disable widgets if data loading fails
-            trial_slider.disabled = True
-            progress_slider.disabled = True
-            play_button.disabled = True
-            previous_button.disabled = True
-            next_button.disabled = True
-            correct_trials_dropdown.disabled = True
-            incorrect_trials_dropdown.disabled = True
-
-        except Exception as e:
+        else:
             error_div.text = f"An unexpected error occurred: {str(e)}"
             print(e)
-            # Disable widgets if data loading fails
-            trial_slider.disabled = True
-            progress_slider.disabled = True
-            play_button.disabled = True
-            previous_button.disabled = True
-            next_button.disabled = True
-            correct_trials_dropdown.disabled = True
-            incorrect_trials_dropdown.disabled = True
+        # Disable widgets if data loading fails
+        trial_slider.disabled = True
+        progress_slider.disabled = True
+        play_button.disabled = True
+        previous_button.disabled = True
+        next_button.disabled = True
+        correct_trials_dropdown.disabled = True
+        incorrect_trials_dropdown.disabled = True
 
     load_button.on_click(load_data)
 
@@ -0,0 +1,312 @@
+import os
+import sys
+import json
+import contextlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def population_centered_table(tank, signal_type='zsc', time_window=3.0):
+    """Population-centered mean and SEM traces of every cell type at the peaks of every cell type."""
+    columns = {'center': [], 'cell_type': [], 'time': [], 'mean': [], 'sem': [], 'n_peaks': []}
+    for center in ('D1', 'D2', 'CHI'):
+        average = tank.population_centered_average(center, signal_type=signal_type, time_window=time_window)
+        traces = [(cell_type, average['avg'][cell_type], average['sem'][cell_type]) for cell_type in average['avg']]
+        if average['velocity_avg'] is not None:
+            traces.append(('velocity', average['velocity_avg'], average['velocity_sem']))
+        for cell_type, mean, sem in traces:
+            n = len(mean)
+            columns['center'] += [center] * n
+            columns['cell_type'] += [cell_type] * n
+            columns['time'].append(average['time_axis'])
+            columns['mean'].append(mean)
+            columns['sem'].append(sem)
+            columns['n_peaks'].append(np.full(n, average['n_valid']))
+    return columns
+
+
+def neuron_centered_table(tank, signal_type='zsc', time_window=3.0, activity_window=1.0):
+    """Neuron-centered mean and SEM traces at the peaks of every cell type with activity from the others."""
+    columns = {'center': [], 'cell_type': [], 'time': [], 'mean': [], 'sem': [], 'n_peaks': []}
+    for center in ('D1', 'D2', 'CHI'):
+        activity = tank.compute_neuron_centered_activity(center, signal_type=signal_type, time_window=time_window,
+                                                         activity_window=activity_window)
+        if activity is None:
+            continue
+        traces = [(center, activity['center_avg'], activity['center_sem'])]
+        traces += [(cell_type, activity['avg'][cell_type], activity['sem'][cell_type]) for cell_type in activity['avg']]
+        for cell_type, mean, sem in traces:
+            n = len(mean)
+            columns['center'] += [center] * n
+            columns['cell_type'] += [cell_type] * n
+            columns['time'].append(activity['time_axis'])
+            columns['mean'].append(mean)
+            columns['sem'].append(sem)
+            columns['n_peaks'].append(np.full(n, activity['stats']['n_traces_averaged']))
+    return columns
+
+
+def connectivity_table(tank, neuron_level=False):
+    """Population connectivity metrics of the NeuralConnectivityAnalyzer, one row per metric and pair."""
+    analyzer = tank.create_connectivity_analyzer(neuron_level=neuron_level)
+    rows = []
+    for window_key, probs in analyzer.conditional_probs.items():
+        window = int(window_key.split('_')[1])
+        rows += [('conditional_probability', pair, window, prob) for pair, prob in probs.items()]
+    for pair, data in analyzer.cross_correlations.items():
+        rows.append(('peak_correlation', pair, -1, data['peak_correlation']))
+        rows.append(('peak_lag', pair, -1, data['peak_lag']))
+    rows += [('mutual_information', pair, -1, mi) for pair, mi in analyzer.mutual_information.items()]
+    rows += [('coactivation_proportion', pattern, -1, stats['proportion'])
+             for pattern, stats in analyzer.coactivation_patterns.items()]
+    if analyzer.neuron_connectivity is not None:
+        grouped = analyzer.neuron_connectivity['by_cell_type']
+        for window_key, probs in grouped['conditional_probs'].items():
+            window = int(window_key.split('_')[1])
+            rows += [('neuron_conditional_probability', pair, window, prob) for pair, prob in probs.items()]
+        rows += [('neuron_mutual_information', pair, -1, mi) for pair, mi in grouped['mutual_information'].items()]
+
+    metric, pair, window, value = zip(*rows) if rows else ((), (), (), ())
+    return {'metric': list(metric), 'pair': list(pair), 'window': list(window), 'value': list(value)}
+
+
+def event_activity_table(tank, cut_interval=50):
+    """Mean calcium traces of every cell type and velocity around movement onsets, velocity peaks and offsets."""
+    columns = {'event': [], 'cell_type': [], 'time': [], 'mean': []}
+    for event in ('movement_onset', 'velocity_peak', 'movement_offset'):
+        activity = tank.compute_cell_activity_at_events(event, cut_interval=cut_interval)
+        traces = list(activity['avg'].items()) + [('velocity', activity['velocity_avg'])]
+        for cell_type, mean in traces:
+            columns['event'] += [event] * len(mean)
+            columns['cell_type'] += [cell_type] * len(mean)
+            columns['time'].append(activity['time_axis'])
+            columns['mean'].append(mean)
+    return columns
+
+
+def movement_psth_table(tank, pre_window=-3, post_window=3, bin_width=0.1):
+    """Peri-event time histograms of every cell type around movement onsets, velocity peaks and offsets."""
+    columns = {'event': [], 'cell_type': [], 'time': [], 'rate': [], 'n_spikes': []}
+    for event in ('movement_onset', 'velocity_peak', 'movement_offset'):
+        if len(getattr(tank, f'{event}_indices')) == 0:
+            continue
+        activity = tank.compute_movement_related_activity(event_type=event, pre_window=pre_window,
+                                                          post_window=post_window, bin_width=bin_width)
+        for cell_type, rate in activity['psth'].items():
+            n = len(rate)
+            columns['event'] += [event] * n
+            columns['cell_type'] += [cell_type] * n
+            columns['time'].append(activity['bin_centers'])
+            columns['rate'].append(rate)
+            columns['n_spikes'].append(np.full(n, activity['n_spikes'][cell_type]))
+    return columns
+
+
+def spike_triggered_velocity_table(tank, time_window=4.0, height=0.5):
+    """Mean and SEM of the smoothed velocity around the C_denoised peaks of every cell type."""
+    results = tank.compute_signal_around_cell_type_spikes(time_window=time_window, height=height)
+    columns = {'cell_type': [], 'time': [], 'mean': [], 'sem': [], 'n_spikes': []}
+    for cell_type in ('d1', 'd2', 'chi'):
+        if f'{cell_type}_avg_signal' not in results:
+            continue
+        n = len(results['time_axis'])
+        columns['cell_type'] += [cell_type.upper()] * n
+        columns['time'].append(results['time_axis'])
+        columns['mean'].append(results[f'{cell_type}_avg_signal'])
+        columns['sem'].append(results[f'{cell_type}_sem_signal'])
+        columns['n_spikes'].append(np.full(n, results[f'{cell_type}_sample_count']))
+    return columns
+
+
+def neuron_table(tank):
+    """Peak and rising edge counts of every neuron."""
+    labels = np.full(tank.neuron_num, 'unlabelled', dtype=object)
+    for cell_type, block in tank.cell_type_slices.items():
+        labels[block] = cell_type
+    n_peaks = np.array([len(p) for p in tank.peak_indices])
+    duration = tank.C_raw.shape[1] / tank.ci_rate
+    return {'neuron': np.arange(tank.neuron_num), 'cnmf_index': tank.neuron_order, 'cell_type': labels,
+            'n_peaks': n_peaks, 'peak_rate': n_peaks / duration,
+            'n_rising_edges': np.array([len(e) for e in tank.rising_edges_starts])}
+
+
+# analysis name -> function(tank, **kwargs) returning a dict of equal-length columns
+ANALYSES = {
+    'population_centered': population_centered_table,
+    'neuron_centered': neuron_centered_table,
+    'connectivity': connectivity_table,
+    'event_activity': event_activity_table,
+    'movement_psth': movement_psth_table,
+    'spike_triggered_velocity': spike_triggered_velocity_table,
+    'neurons': neuron_table,
+}
+
+
+class BatchRunner:
+    """
+    Run numeric CellTypeTank analyses over many sessions in a process pool.
+
+    Each (analysis, session) result is a table of columns saved as one .npz fragment in
+    output_dir/<analysis>/<session>.npz, written atomically, so an interrupted batch resumes by skipping the
+    fragments that already exist. load() concatenates the fragments of an analysis into a tidy DataFrame
+    with a session column. Nothing is plotted; the output of each session goes to output_dir/logs.
+
+    The analysis spec maps names of ANALYSES to their keyword arguments, e.g.
+    {'population_centered': {'signal_type': 'zsc', 'time_window': 3.0}, 'connectivity': {}}.
+    Workers may be started with spawn, so scripts should call run() under if __name__ == '__main__'.
+    """
+
+    def __init__(self, session_names, analyses, output_dir, tank_kwargs=None, max_workers=None,
+                 memory_budget_gb=None, memory_per_session_gb=4.0):
+        """
+        :param session_names: list of session names
+        :param analyses: dict of analysis name to keyword arguments, or a list of analysis names
+        :param output_dir: directory of the result store
+        :param tank_kwargs: keyword arguments of the CellTypeTank constructor, shared by all sessions
+        :param max_workers: upper bound on the number of worker processes, os.cpu_count() if None
+        :param memory_budget_gb: memory available to the workers, physical memory if None
+        :param memory_per_session_gb: estimated peak memory of one session
+        """
+        if not isinstance(analyses, dict):
+            analyses = {name: {} for name in analyses}
+        unknown = set(analyses) - set(ANALYSES)
+        if unknown:
+            raise ValueError(f"Unknown analyses {sorted(unknown)}, choose from {sorted(ANALYSES)}")
+
+        self.session_names = list(session_names)
+        self.analyses = analyses
+        self.output_dir = output_dir
+        self.tank_kwargs = tank_kwargs or {}
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.memory_budget_gb = memory_budget_gb
+        self.memory_per_session_gb = memory_per_session_gb
+
+    @property
+    def n_workers(self):
+        """Number of worker processes allowed by max_workers and the memory budget."""
+        budget = self.memory_budget_gb
+        if budget is None:
+            try:
+                budget = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1024 ** 3
+            except (ValueError, OSError, AttributeError):
+                return self.max_workers
+        return max(1, min(self.max_workers, int(budget // self.memory_per_session_gb)))
+
+    def fragment_path(self, analysis, session_name):
+        return os.path.join(self.output_dir, analysis, f"{session_name}.npz")
+
+    def pending(self):
+        """dict of session name to the analyses without a saved result."""
+        pending = {}
+        for session_name in self.session_names:
+            todo = [name for name in self.analyses if not os.path.exists(self.fragment_path(name, session_name))]
+            if todo:
+                pending[session_name] = todo
+        return pending
+
+    def _check_spec(self):
+        # fragments computed with other parameters must not be mixed into the same table
+        for name, kwargs in self.analyses.items():
+            spec_path = os.path.join(self.output_dir, name, 'spec.json')
+            os.makedirs(os.path.dirname(spec_path), exist_ok=True)
+            if os.path.exists(spec_path):
+                with open(spec_path, 'r') as f:
+                    saved = json.load(f)
+                if saved != json.loads(json.dumps(kwargs)):
+                    raise ValueError(f"{name} results in {self.output_dir} were computed with {saved}, "
+                                     f"use another output_dir for {kwargs}")
+            else:
+                with open(spec_path, 'w') as f:
+                    json.dump(kwargs, f)
+
+    def run(self):
+        """
+        Process the pending sessions, n_workers at a time.
+        :return: dict of session name to error message for the sessions that failed
+        """
+        self._check_spec()
+        os.makedirs(os.path.join(self.output_dir, 'logs'), exist_ok=True)
+
+        pending = self.pending()
+        print(f"{len(self.session_names) - len(pending)} of {len(self.session_names)} sessions already done, "
+              f"running {len(pending)} with {self.n_workers} workers...")
+
+        pool_kwargs = {'max_workers': self.n_workers}
+        if sys.version_info >= (3, 11):
+            # a fresh process per session returns its memory to the system
+            pool_kwargs['max_tasks_per_child'] = 1
+
+        failed = {}
+        with ProcessPoolExecutor(**pool_kwargs) as executor:
+            futures = {executor.submit(_run_session, session_name, {name: self.analyses[name] for name in todo},
+                                       self.tank_kwargs, self.output_dir): session_name
+                       for session_name, todo in pending.items()}
+            for i, future in enumerate(as_completed(futures), 1):
+                session_name = futures[future]
+                try:
+                    errors = future.result()
+                except Exception as e:
+                    errors = {'session': repr(e)}
+                if errors:
+                    failed[session_name] = errors
+                    print(f"[{i}/{len(futures)}] {session_name} failed: {errors}")
+                else:
+                    print(f"[{i}/{len(futures)}] {session_name} done")
+
+        return failed
+
+    def load(self, analysis):
+        """
+        All saved results of an analysis.
+        :param analysis: analysis name
+        :return: pandas DataFrame with a session column
+        """
+        import pandas as pd
+
+        tables = []
+        for session_name in self.session_names:
+            path = self.fragment_path(analysis, session_name)
+            if not os.path.exists(path):
+                continue
+            with np.load(path) as data:
+                table = pd.DataFrame({column: data[column] for column in data.files})
+            table.insert(0, 'session', session_name)
+            tables.append(table)
+
+        if not tables:
+            return pd.DataFrame(columns=['session'])
+        return pd.concat(tables, ignore_index=True)
+
+
+def _run_session(session_name, analyses, tank_kwargs, output_dir):
+    # module level so it can be pickled by ProcessPoolExecutor
+    from .CellTypeTank import CellTypeTank
+
+    errors = {}
+    log_path = os.path.join(output_dir, 'logs', f"{session_name}.log")
+    with open(log_path, 'a') as log, contextlib.redirect_stdout(log):
+        tank = CellTypeTank(session_name, **tank_kwargs)
+        for name, kwargs in analyses.items():
+            try:
+                columns = ANALYSES[name](tank, **kwargs)
+                columns = {column: _column_array(values) for column, values in columns.items()}
+            except Exception as e:
+                print(f"{name} failed: {e!r}")
+                errors[name] = repr(e)
+                continue
+
+            path = os.path.join(output_dir, name, f"{session_name}.npz")
+            tmp_path = f"{path[:-4]}.tmp.npz"
+            np.savez(tmp_path, **columns)
+            os.replace(tmp_path, path)
+    return errors
+
+
+def _column_array(values):
+    # a column is a list of scalars, or a list of arrays to concatenate
+    if len(values) and isinstance(values[0], np.ndarray):
+        values = np.concatenate(values)
+    array = np.asarray(values)
+    if array.dtype == object:
+        array = array.astype(str)
+    return array
@@ -4,6 +4,10 @@ import h5py
 import json
 import os
 from .VirmenTank import VirmenTank
+from .ContourGeometry import ContourGeometry
+from .PopulationActivity import PopulationActivity
+from .TrialTensor import TrialTensor
+from .SessionCache import SessionCache
 from scipy.signal import savgol_filter
 
 
@@ -56,6 +60,8 @@ class CITank(VirmenTank):
         self.ca_all = self.normalize_signal(self.shift_signal_single(np.mean(self.C_zsc, axis=0)))
         self.peak_indices = self._find_peaks_in_traces()
         self.rising_edges_starts = self._find_rising_edges_starts()
+        self._population_activity = None
+        self._trial_tensors = {}
         
 
     @staticmethod
@@ -73,30 +79,51 @@ class CITank(VirmenTank):
         with open(config_path, 'r') as config_file:
             config = json.load(config_file)
 
-        print(f"Opening: {filename}...")
-        with h5py.File(filename, 'r') as file:
-            data = file['data']
-            Cn = np.transpose(data['Cn'][()])
-            ids = data['ids'][()] - 1
-            Coor_cell_array = data['Coor']
-            Coor = []
-            C = np.transpose(data['C'][()])
-            C_raw = np.transpose(data['C_raw'][()])
-            C_denoised = np.transpose(data['C_denoised'][()])
-            C_deconvolved = np.transpose(data['C_deconvolved'][()])
-            C_baseline = np.transpose(data['C_baseline'][()])
-            C_reraw = np.transpose(data['C_reraw'][()])
-            centroids = np.transpose(data['centroids'][()])
-            A = data['A'][()]
-
-            for i in range(Coor_cell_array.shape[1]):
-                ref = Coor_cell_array[0, i]  # Get the reference
-                coor_data = file[ref]  # Use the reference to access the data
-                coor_matrix = np.array(coor_data)  # Convert to a NumPy array
-
-                Coor.append(np.transpose(coor_matrix))
-
-        return C, C_raw, Cn, ids, Coor, centroids, C_denoised, C_deconvolved, C_baseline, C_reraw, A
+        arrays, Coor = CITank.read_session_arrays(
+            filename, ('C', 'C_raw', 'Cn', 'ids', 'centroids', 'C_denoised', 'C_deconvolved', 'C_baseline',
+                       'C_reraw', 'A'))
+
+        return (arrays['C'], arrays['C_raw'], arrays['Cn'], arrays['ids'], Coor, arrays['centroids'],
+                arrays['C_denoised'], arrays['C_deconvolved'], arrays['C_baseline'], arrays['C_reraw'], arrays['A'])
+
+    # transposed arrays of the 'data' group of a session .mat file read by read_session_arrays()
+    SESSION_ARRAYS = ('Cn', 'C', 'C_raw', 'C_denoised', 'C_deconvolved', 'C_baseline', 'C_reraw', 'centroids')
+
+    @staticmethod
+    def read_session_arrays(filename, names=None):
+        """
+        Arrays of a session .mat file, shared by the tanks and the Bokeh apps that read the file themselves.
+
+        SESSION_ARRAYS, 'ids' (0-based), 'A' and the UTF-16 code units of 'virmenPath' are read when present
+        in the file. With a session cache (multi-process serving) they are memory maps shared by all workers.
+        :param filename: .mat file containing config, spatial, Cn, Coor, ids, etc...
+        :param names: names the caller needs, a cache entry without them is read again
+        :return: (dict of array name to array, packed ContourGeometry contours)
+        """
+        Coor = None
+
+        def read_arrays():
+            nonlocal Coor
+            print(f"Opening: {filename}...")
+            with h5py.File(filename, 'r') as file:
+                data = file['data']
+                arrays = {name: np.transpose(data[name][()]) for name in CITank.SESSION_ARRAYS if name in data}
+                arrays['ids'] = data['ids'][()] - 1
+                for name in ('A', 'virmenPath'):
+                    if name in data:
+                        arrays[name] = data[name][()]
+
+                # packed contours, indexable like the former list of 2 x k Coor arrays
+                Coor = ContourGeometry.load(filename, file, height=arrays['Cn'].shape[0])
+            return arrays
+
+        cache = SessionCache.from_env()
+        arrays = cache.get(filename, read_arrays, names=names) if cache is not None else read_arrays()
+
+        if Coor is None:
+            Coor = ContourGeometry.load(filename, height=arrays['Cn'].shape[0])
+
+        return arrays, Coor
 
     @staticmethod
     def calculate_delta_f_over_f(signal, baseline_percentile=10):
@@ -283,6 +310,40 @@ class CITank(VirmenTank):
 
         return C_avg, C_avg_normalized, C_avg_normalized_sorted, C_avg_mean, sorted_indices
 
+    @staticmethod
+    def spike_triggered_segments(signal, peak_lists, samples_window):
+        """
+        Segments of a signal centered on spikes, skipping spikes too close to either end of the signal.
+        :param signal: 1D signal
+        :param peak_lists: list of spike index arrays, one per neuron
+        :param samples_window: samples kept before and after each spike
+        :return: (n_spikes, 2 * samples_window + 1) array, spikes in neuron then time order
+        """
+        signal = np.asarray(signal)
+        peaks = np.concatenate([np.asarray(p, dtype=int) for p in peak_lists]) if len(peak_lists) else np.empty(0, int)
+        peaks = peaks[(peaks - samples_window >= 0) & (peaks + samples_window < len(signal))]
+        return signal[peaks[:, None] + np.arange(-samples_window, samples_window + 1)]
+
+    def rows_of(self, neuron_indices):
+        """
+        Rows of the tank data of neurons given by their CNMF index, the indices themselves here since the rows
+        are in CNMF order. Subclasses that reorder the neurons translate them.
+        :param neuron_indices: CNMF indices of the neurons
+        :return: array of rows
+        """
+        return np.asarray(neuron_indices, dtype=int)
+
+    def denoised_peaks(self, neuron_indices, height=0.5):
+        """
+        Peaks of C_denoised above a height, as used by the spike-triggered signal analyses.
+        :param neuron_indices: neuron rows to search
+        :param height: height threshold of scipy.signal.find_peaks
+        :return: list of peak index arrays, one per neuron
+        """
+        from scipy.signal import find_peaks
+
+        return [find_peaks(self.C_denoised[i], height=height)[0] for i in neuron_indices]
+
     @staticmethod
     def ensure_tensor(data, device):
         """
@@ -557,6 +618,37 @@ class CITank(VirmenTank):
 
         return real_cor_all
 
+    def compute_pairwise_correlation_graph(self, outliers_pairwise_raw, save_path=None):
+        """
+        Compute the bootstrapping pairwise correlations as a sparse graph, keeping only significant pairs.
+        :param outliers_pairwise_raw: raw outliers from compute_outliers_pairwise()
+        :param save_path: where to save the graph, defaults to <ProcessedFilePath>/<session>/<session>_cor_graph.npz;
+                          pass False to skip saving
+        :return: ConnectivityGraph
+        """
+        from .ConnectivityGraph import ConnectivityGraph
+
+        rows, cols, weights = [], [], []
+        for i in range(self.neuron_num):
+            for j in range(i + 1, self.neuron_num):
+                outliers = outliers_pairwise_raw[i][j]
+                if len(outliers) > 0:
+                    rows.append(i)
+                    cols.append(j)
+                    weights.append(outliers[np.argmax(abs(outliers))])
+
+        graph = ConnectivityGraph.from_edges(rows, cols, weights, self.neuron_num)
+
+        if save_path is None:
+            save_path = self.correlation_graph_path()
+        if save_path:
+            graph.save(save_path)
+
+        return graph
+
+    def correlation_graph_path(self):
+        return os.path.join(self.config['ProcessedFilePath'], self.session_name, f"{self.session_name}_cor_graph.npz")
+
     @staticmethod
     def find_neurons_with_peaks_near_indices(peak_indices, dependent_indices, window=10, choice='before'):
         """
@@ -591,17 +683,55 @@ class CITank(VirmenTank):
 
         return neurons_with_peaks_near_trial
 
+    def get_population_activity(self, peak_indices=None):
+        """
+        Population spike statistics (counts, binned rates, synchrony, trial rates) of a set of peaks.
+        :param peak_indices: list of peak index arrays, one per neuron, or a flat array; self.peak_indices if None
+        :return: PopulationActivity, cached for self.peak_indices
+        """
+        if peak_indices is None or peak_indices is self.peak_indices:
+            if self._population_activity is None:
+                self._population_activity = PopulationActivity.from_peak_indices(self.peak_indices, len(self.t),
+                                                                                 self.ci_rate)
+            return self._population_activity
+        return PopulationActivity.from_peak_indices(peak_indices, len(self.t), self.ci_rate)
+
+    def get_trial_tensor(self, peak_indices=None, signal='deltaF_over_F', position='y', position_bins=100,
+                         position_range=None):
+        """
+        Trials x neurons (x position bins) activity of the session, see TrialTensor.
+        :param peak_indices: list of peak index arrays, one per neuron; self.peak_indices if None
+        :param signal: 'deltaF_over_F', 'zsc' or 'raw', the signal averaged per trial and position bin
+        :param position: virmen_data column used as the position
+        :param position_bins: number of position bins
+        :param position_range: (min, max) of the position bins, range of the in-trial positions if None
+        :return: TrialTensor, cached per parameters for self.peak_indices
+        """
+        signals = {'deltaF_over_F': self.C_raw_deltaF_over_F, 'zsc': self.C_zsc, 'raw': self.C_raw}
+        if signal not in signals:
+            raise ValueError(f"signal must be one of {list(signals)}")
+
+        key = (signal, position, position_bins, None if position_range is None else tuple(position_range))
+        cached = peak_indices is None or peak_indices is self.peak_indices
+        if cached and key in self._trial_tensors:
+            return self._trial_tensors[key]
+
+        tensor = TrialTensor.build(self.compute_trial_bounds(),
+                                   self.peak_indices if peak_indices is None else peak_indices,
+                                   signals[signal], self.virmen_data[position].to_numpy(), self.ci_rate,
+                                   position_bins=position_bins, position_range=position_range)
+        if cached:
+            self._trial_tensors[key] = tensor
+        return tensor
+
     def get_spike_statistics(self, peak_indices):
         """
-        :param peak_indices: the indices when a neuron activated, use ci.find_peaks_in_traces()
+        :param peak_indices: the indices when a neuron activated, use ci.peak_indices; either a list of
+            arrays, one per neuron, or a single flat array. Every entry is counted, including repeats.
 
         :return spike_stats: time series of spike counts in each time point
         """
-        spike_stats = np.zeros_like(self.t)
-        for i in peak_indices:
-            spike_stats[i] += 1
-
-        return spike_stats
+        return self.get_population_activity(peak_indices).spike_counts().astype(float)
 
     def plot_t_ca_all(self, notebook=False, save_path=None, overwrite=False, font_size=None):
         """
@@ -1003,43 +1133,45 @@ class CITank(VirmenTank):
 
         return p
 
+    def compute_calcium_trace_around_indices(self, cut_interval=50):
+        """
+        Population mean calcium trace around each kind of behavioral event.
+        :param cut_interval: interval to cut around the indices, in samples
+        :return: dict with time_points (s) and the mean traces velocity_peak, lick_edge, movement_onset and
+            movement_offset
+        """
+        results = {'time_points': (np.arange(2 * cut_interval) - cut_interval) / self.ci_rate}
+        for event, indices in [('velocity_peak', self.velocity_peak_indices),
+                               ('lick_edge', self.lick_edge_indices),
+                               ('movement_onset', self.movement_onset_indices),
+                               ('movement_offset', self.movement_offset_indices)]:
+            results[event] = self.average_across_indices(indices, cut_interval=cut_interval)[3]
+
+        return results
+
     def plot_calcium_trace_around_indices(self, cut_interval=50, save_path=None,
                                           title="Average Calcium Trace around Indices",
                                           notebook=False, overwrite=False, font_size=None):
 
         from bokeh.plotting import figure
-        from bokeh.models import CustomJSTickFormatter
 
-        [_, _, _, C_avg_mean_velocity_peak, _] = self.average_across_indices(self.velocity_peak_indices,
-                                                                             cut_interval=cut_interval)
-        [_, _, _, C_avg_mean_lick_edge, _] = self.average_across_indices(self.lick_edge_indices,
-                                                                         cut_interval=cut_interval)
-        [_, _, _, C_avg_mean_movement_onset, _] = self.average_across_indices(self.movement_onset_indices,
-                                                                              cut_interval=cut_interval)
-        [_, _, _, C_avg_mean_movement_offset, _] = self.average_across_indices(self.movement_offset_indices,
-                                                                              cut_interval=cut_interval)
+        traces = self.compute_calcium_trace_around_indices(cut_interval=cut_interval)
+        time_points = traces['time_points']
 
         p = figure(width=800, height=400, active_scroll="wheel_zoom", title="Average Calcium Trace around Indices")
-        
-        # Convert time points from samples to seconds
-        time_points = (np.array(range(2 * cut_interval)) - cut_interval) / self.ci_rate
-        
-        p.line(time_points, C_avg_mean_velocity_peak, line_width=2,
+
+        p.line(time_points, traces['velocity_peak'], line_width=2,
                legend_label='Velocity Peak', color='red')
-        p.line(time_points, C_avg_mean_lick_edge, line_width=2,
+        p.line(time_points, traces['lick_edge'], line_width=2,
                legend_label='Lick', color='navy')
-        p.line(time_points, C_avg_mean_movement_onset, line_width=2,
+        p.line(time_points, traces['movement_onset'], line_width=2,
                legend_label='Movement Onset', color='brown')
-        p.line(time_points, C_avg_mean_movement_offset, line_width=2,
+        p.line(time_points, traces['movement_offset'], line_width=2,
                legend_label='Movement Offset', color='purple')
 
         # Configure legend to be outside the plot
         p.legend.click_policy = 'hide'
 
-        # p.xaxis.formatter = CustomJSTickFormatter(code="""
-        #     return (tick / 20).toFixed(2);
-        # """)
-
         self.output_bokeh_plot(p, save_path=save_path, title=title, notebook=notebook, overwrite=overwrite, font_size=font_size)
 
         return p
@@ -1400,6 +1532,40 @@ class CITank(VirmenTank):
         return masks, labels
     
 
+    def compute_signal_around_spikes(self, d1_indices, d2_indices, signal, time_window=4.0, height=0.5):
+        """
+        Average a signal before and after spikes in D1 and D2 neurons, without plotting.
+
+        Parameters:
+        -----------
+        d1_indices : array-like
+            CNMF indices of D1 neurons
+        d2_indices : array-like
+            CNMF indices of D2 neurons
+        signal : numpy.ndarray
+            Signal array to analyze (e.g., self.smoothed_velocity, self.acceleration)
+        time_window : float
+            Time window in seconds before and after spike to analyze
+        height : float
+            Height threshold for peak detection
+
+        Returns:
+        --------
+        dict : time_axis, d1/d2_avg_signal, d1/d2_sem_signal and d1/d2_sample_count
+        """
+        samples_window = int(time_window * self.ci_rate)
+
+        results = {'time_axis': np.linspace(-time_window, time_window, 2 * samples_window + 1)}
+        for cell_type, neuron_indices in [('d1', d1_indices), ('d2', d2_indices)]:
+            segments = self.spike_triggered_segments(signal, self.denoised_peaks(self.rows_of(neuron_indices),
+                                                                                 height=height),
+                                                     samples_window)
+            results[f'{cell_type}_avg_signal'] = np.mean(segments, axis=0)
+            results[f'{cell_type}_sem_signal'] = np.std(segments, axis=0) / np.sqrt(len(segments))
+            results[f'{cell_type}_sample_count'] = len(segments)
+
+        return results
+
     def analyze_signal_around_spikes(self, d1_indices, d2_indices, signal, signal_name="Signal", time_window=4.0, height=0.5, 
                                     save_path=None, title=None, notebook=False, overwrite=False):
         """
@@ -1408,9 +1574,9 @@ class CITank(VirmenTank):
         Parameters:
         -----------
         d1_indices : array-like
-            Indices of D1 neurons
+            CNMF indices of D1 neurons
         d2_indices : array-like
-            Indices of D2 neurons
+            CNMF indices of D2 neurons
         signal : numpy.ndarray
             Signal array to analyze (e.g., self.smoothed_velocity, self.acceleration)
         signal_name : str
@@ -1434,65 +1600,21 @@ class CITank(VirmenTank):
         """
         from bokeh.plotting import figure
         from bokeh.layouts import gridplot
-        from bokeh.models import ColumnDataSource, Span
-        from scipy.signal import find_peaks
-        
+        from bokeh.models import Span
+
         # Set default title if not provided
         if title is None:
             title = f"{signal_name} around D1 and D2 Neuron Spikes"
-        
-        # Convert time window to samples
-        samples_window = int(time_window * self.ci_rate)
-        
-        # Find peaks for D1 and D2 neurons
-        d1_peak_indices = []
-        for i in d1_indices:
-            x, _ = find_peaks(self.C_denoised[i], height=height)
-            d1_peak_indices.append(x)
-        
-        d2_peak_indices = []
-        for i in d2_indices:
-            x, _ = find_peaks(self.C_denoised[i], height=height)
-            d2_peak_indices.append(x)
-        
-        # Initialize arrays to store signal profiles around spikes
-        d1_signals = []
-        d2_signals = []
-        
-        # Extract signal profiles for D1 neurons
-        for neuron_spikes in d1_peak_indices:
-            for spike_idx in neuron_spikes:
-                # Check if we have enough data before and after the spike
-                if spike_idx - samples_window >= 0 and spike_idx + samples_window < len(signal):
-                    signal_segment = signal[spike_idx - samples_window:spike_idx + samples_window + 1]
-                    d1_signals.append(signal_segment)
-        
-        # Extract signal profiles for D2 neurons
-        for neuron_spikes in d2_peak_indices:
-            for spike_idx in neuron_spikes:
-                # Check if we have enough data before and after the spike
-                if spike_idx - samples_window >= 0 and spike_idx + samples_window < len(signal):
-                    signal_segment = signal[spike_idx - samples_window:spike_idx + samples_window + 1]
-                    d2_signals.append(signal_segment)
-        
-        # Convert to numpy arrays
-        d1_signals = np.array(d1_signals)
-        d2_signals = np.array(d2_signals)
-        
-        # Calculate average signal profiles
-        d1_avg_signal = np.mean(d1_signals, axis=0)
-        d2_avg_signal = np.mean(d2_signals, axis=0)
-        
-        # Calculate standard error of the mean
-        d1_sem_signal = np.std(d1_signals, axis=0) / np.sqrt(len(d1_signals))
-        d2_sem_signal = np.std(d2_signals, axis=0) / np.sqrt(len(d2_signals))
-        
-        # Create time axis in seconds relative to spike
-        time_axis = np.linspace(-time_window, time_window, len(d1_avg_signal))
-        
+
+        results = self.compute_signal_around_spikes(d1_indices, d2_indices, signal,
+                                                    time_window=time_window, height=height)
+        time_axis = results['time_axis']
+        d1_avg_signal, d1_sem_signal = results['d1_avg_signal'], results['d1_sem_signal']
+        d2_avg_signal, d2_sem_signal = results['d2_avg_signal'], results['d2_sem_signal']
+
         # Create plots using Bokeh
         p1 = figure(width=900, height=400, 
-                title=f"{signal_name} around D1 Neuron Spikes (n={len(d1_signals)})",
+                title=f"{signal_name} around D1 Neuron Spikes (n={results['d1_sample_count']})",
                 x_axis_label="Time relative to spike (s)",
                 y_axis_label=signal_name)
         
@@ -1520,7 +1642,7 @@ class CITank(VirmenTank):
         p1.ygrid.grid_line_color = None
         
         p2 = figure(width=900, height=400, 
-                title=f"{signal_name} around D2 Neuron Spikes (n={len(d2_signals)})",
+                title=f"{signal_name} around D2 Neuron Spikes (n={results['d2_sample_count']})",
                 x_axis_label="Time relative to spike (s)",
                 y_axis_label=signal_name,
                 x_range=p1.x_range)
@@ -1582,19 +1704,9 @@ class CITank(VirmenTank):
         # Output the plot
         self.output_bokeh_plot(layout, save_path=save_path, title=title, notebook=notebook, overwrite=overwrite)
         
-        # Store results
-        results = {
-            'time_axis': time_axis,
-            'd1_avg_signal': d1_avg_signal,
-            'd2_avg_signal': d2_avg_signal,
-            'd1_sem_signal': d1_sem_signal,
-            'd2_sem_signal': d2_sem_signal,
-            'd1_sample_count': len(d1_signals),
-            'd2_sample_count': len(d2_signals),
-            'signal_name': signal_name,
-            'plot': layout
-        }
-        
+        results['signal_name'] = signal_name
+        results['plot'] = layout
+
         return results
 
     # Going to remove this function
@@ -1761,6 +1873,50 @@ class CITank(VirmenTank):
         
         return p
 
+    def compute_d1_d2_spike_statistics(self, d1_peaks, d2_peaks):
+        """
+        Spike count and inter-spike interval distributions and raster coordinates of D1 and D2 neurons.
+
+        Parameters:
+        -----------
+        d1_peaks : list of arrays
+            List of peak indices for each D1 neuron
+        d2_peaks : list of arrays
+            List of peak indices for each D2 neuron
+
+        Returns:
+        --------
+        dict
+            count_edges and isi_edges shared by both cell types, and per cell type ('d1', 'd2') a dict with
+            counts, count_hist, isis (s), isi_hist, mean_count, mean_isi and the raster columns x (s), y, neuron
+        """
+        stats = {}
+        for cell_type, peaks, y_offset in [('d1', d1_peaks, 0), ('d2', d2_peaks, len(d1_peaks) + 2)]:
+            peaks = [np.asarray(p) for p in peaks]
+            counts = np.array([len(p) for p in peaks])
+            isis = [np.diff(np.sort(p)) / self.ci_rate for p in peaks if len(p) > 1]
+            isis = np.concatenate(isis) if isis else np.empty(0)
+            neuron = np.repeat(np.arange(len(peaks)), counts)
+            stats[cell_type] = {'counts': counts, 'isis': isis,
+                                'mean_count': np.mean(counts), 'mean_isi': np.mean(isis) if len(isis) else 0,
+                                'x': np.concatenate(peaks) / self.ci_rate if peaks else np.empty(0),
+                                'y': neuron + y_offset, 'neuron': neuron + 1}
+
+        d1, d2 = stats['d1'], stats['d2']
+        stats['count_edges'] = np.linspace(min(d1['counts'].min(), d2['counts'].min()),
+                                           max(d1['counts'].max(), d2['counts'].max()), 21)  # 20 bins
+        if len(d1['isis']) and len(d2['isis']):
+            isi_range = (min(d1['isis'].min(), d2['isis'].min()), max(d1['isis'].max(), d2['isis'].max()))
+        else:
+            isi_range = (0, 1)
+        stats['isi_edges'] = np.linspace(*isi_range, 31)  # 30 bins
+
+        for cell_type in ('d1', 'd2'):
+            stats[cell_type]['count_hist'] = np.histogram(stats[cell_type]['counts'], bins=stats['count_edges'])[0]
+            stats[cell_type]['isi_hist'] = np.histogram(stats[cell_type]['isis'], bins=stats['isi_edges'])[0]
+
+        return stats
+
     def create_d1_d2_spike_visualizations(self, d1_peaks, d2_peaks, save_path=None, title="D1D2SpikePlots", notebook=False, overwrite=False, font_size=None):
         """
         Create comprehensive visualizations of D1 and D2 neural spike data.
@@ -1789,34 +1945,21 @@ class CITank(VirmenTank):
         from bokeh.layouts import column, row
         from bokeh.models import ColumnDataSource, HoverTool, Legend, LegendItem
         
-        def convert_to_seconds(indices):
-            """Convert sample indices to seconds"""
-            return np.array(indices) / self.ci_rate
-        
+        stats = self.compute_d1_d2_spike_statistics(d1_peaks, d2_peaks)
+        d1, d2 = stats['d1'], stats['d2']
+
         # Create figure for firing rate histogram
         p1 = figure(width=400, height=300, title='Distribution of Spike Counts')
         
         # Remove grid
         p1.grid.grid_line_color = None
         
-        # Calculate spike counts per neuron
-        d1_counts = [len(peaks) for peaks in d1_peaks]
-        d2_counts = [len(peaks) for peaks in d2_peaks]
-        
-        # Create histograms with shared bins
-        # Find the overall min and max for both datasets
-        min_count = min(min(d1_counts), min(d2_counts))
-        max_count = max(max(d1_counts), max(d2_counts))
-        shared_edges = np.linspace(min_count, max_count, 21)  # 20 bins
-        
-        # Create histograms using shared edges
-        hist1, _ = np.histogram(d1_counts, bins=shared_edges)
-        hist2, _ = np.histogram(d2_counts, bins=shared_edges)
+        shared_edges = stats['count_edges']
         
         # Plot histograms (without specifying legend_label in the glyph)
-        d1_hist_plot = p1.quad(top=hist1, bottom=0, left=shared_edges[:-1], right=shared_edges[1:],
+        d1_hist_plot = p1.quad(top=d1['count_hist'], bottom=0, left=shared_edges[:-1], right=shared_edges[1:],
                 fill_color='navy', alpha=0.5, line_color='navy')
-        d2_hist_plot = p1.quad(top=hist2, bottom=0, left=shared_edges[:-1], right=shared_edges[1:],
+        d2_hist_plot = p1.quad(top=d2['count_hist'], bottom=0, left=shared_edges[:-1], right=shared_edges[1:],
                 fill_color='crimson', alpha=0.5, line_color='crimson')
         
         # Create legend items
@@ -1839,34 +1982,12 @@ class CITank(VirmenTank):
         # Remove grid
         p2.grid.grid_line_color = None
         
-        # Calculate inter-spike intervals in seconds
-        d1_isis = []
-        d2_isis = []
-        
-        for peaks in d1_peaks:
-            if len(peaks) > 1:
-                isis = np.diff(np.sort(peaks)) / self.ci_rate  # Convert to seconds
-                d1_isis.extend(isis)
-                
-        for peaks in d2_peaks:
-            if len(peaks) > 1:
-                isis = np.diff(np.sort(peaks)) / self.ci_rate  # Convert to seconds
-                d2_isis.extend(isis)
-        
-        # Create histograms for ISIs with shared bins
-        # Find the overall min and max for ISIs
-        min_isi = min(min(d1_isis), min(d2_isis)) if d1_isis and d2_isis else 0
-        max_isi = max(max(d1_isis), max(d2_isis)) if d1_isis and d2_isis else 1
-        shared_isi_edges = np.linspace(min_isi, max_isi, 31)  # 30 bins
-        
-        # Create histograms using shared edges
-        hist3, _ = np.histogram(d1_isis, bins=shared_isi_edges)
-        hist4, _ = np.histogram(d2_isis, bins=shared_isi_edges)
+        shared_isi_edges = stats['isi_edges']
         
         # Plot ISI histograms (without specifying legend_label in the glyph)
-        d1_isi_plot = p2.quad(top=hist3, bottom=0, left=shared_isi_edges[:-1], right=shared_isi_edges[1:],
+        d1_isi_plot = p2.quad(top=d1['isi_hist'], bottom=0, left=shared_isi_edges[:-1], right=shared_isi_edges[1:],
                 fill_color='navy', alpha=0.5, line_color='navy')
-        d2_isi_plot = p2.quad(top=hist4, bottom=0, left=shared_isi_edges[:-1], right=shared_isi_edges[1:],
+        d2_isi_plot = p2.quad(top=d2['isi_hist'], bottom=0, left=shared_isi_edges[:-1], right=shared_isi_edges[1:],
                 fill_color='crimson', alpha=0.5, line_color='crimson')
         
         # Create legend items
@@ -1889,33 +2010,9 @@ class CITank(VirmenTank):
         # Remove grid
         p3.grid.grid_line_color = None
         
-        # Create data for D1 neurons with time in seconds
-        d1_data = []
-        for i, peaks in enumerate(d1_peaks):
-            times = convert_to_seconds(peaks)
-            y_values = [i for _ in peaks]
-            d1_data.extend(list(zip(times, y_values, [i+1]*len(peaks))))
-        
-        # Create data for D2 neurons with time in seconds
-        d2_data = []
-        max_d1 = len(d1_peaks)
-        for i, peaks in enumerate(d2_peaks):
-            times = convert_to_seconds(peaks)
-            y_values = [i + max_d1 + 2 for _ in peaks]
-            d2_data.extend(list(zip(times, y_values, [i+1]*len(peaks))))
-        
-        # Create ColumnDataSource for both types
-        d1_source = ColumnDataSource(data=dict(
-            x=[d[0] for d in d1_data],
-            y=[d[1] for d in d1_data],
-            neuron=[d[2] for d in d1_data]
-        ))
-        
-        d2_source = ColumnDataSource(data=dict(
-            x=[d[0] for d in d2_data],
-            y=[d[1] for d in d2_data],
-            neuron=[d[2] for d in d2_data]
-        ))
+        # Create ColumnDataSource for both types, D2 neurons are drawn above the D1 neurons
+        d1_source = ColumnDataSource(data=dict(x=d1['x'], y=d1['y'], neuron=d1['neuron']))
+        d2_source = ColumnDataSource(data=dict(x=d2['x'], y=d2['y'], neuron=d2['neuron']))
         
         # Add scatter plots (without specifying legend_label in the glyph)
         d1_scatter = p3.scatter('x', 'y', source=d1_source, color='navy', alpha=0.6, size=3)
@@ -1960,11 +2057,9 @@ class CITank(VirmenTank):
         legend4 = Legend(items=legend_items4, location="center")
         p4.add_layout(legend4, 'right')
         
-        # Calculate and print summary statistics
-        d1_mean_count = np.mean(d1_counts)
-        d2_mean_count = np.mean(d2_counts)
-        d1_mean_isi = np.mean(d1_isis) if d1_isis else 0
-        d2_mean_isi = np.mean(d2_isis) if d2_isis else 0
+        # Print summary statistics
+        d1_mean_count, d2_mean_count = d1['mean_count'], d2['mean_count']
+        d1_mean_isi, d2_mean_isi = d1['mean_isi'], d2['mean_isi']
         
         print(f"\nSummary Statistics:") 
         print(f"D1 Neurons:")
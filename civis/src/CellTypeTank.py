@@ -8,6 +8,10 @@ class CellTypeTank(CITank):
     A class for analyzing and visualizing different cell types (D1, D2, and Cholinergic neurons) in 
     calcium imaging data.
     Inherits from CITank and adds cell type classification and analysis capabilities.
+    
+    The neurons are reordered into contiguous D1, D2, CHI and unlabelled blocks, so row i of the tank data
+    is the neuron of CNMF index neuron_order[i], and cnmf_to_row maps CNMF indices back to rows. Methods
+    taking explicit neuron indices expect CNMF indices, as in the label files, and translate them.
     """
     
     def __init__(self,
@@ -64,49 +68,59 @@ class CellTypeTank(CITank):
             session_duration=session_duration
         )
         
-        # Get cell type indices
-        [self.d1_indices, self.d2_indices, self.chi_indices, _] = self._load_cell_type_labels(cell_type_label_file)
+        # Get cell type indices (rows of the CNMF output)
+        [d1_indices, d2_indices, chi_indices, _] = self._load_cell_type_labels(cell_type_label_file)
+        
+        # Reorder all neurons once into contiguous D1, D2, CHI blocks, so that the per-type attributes below
+        # are slice views of the tank data instead of copies
+        self._group_neurons_by_cell_type(d1_indices, d2_indices, chi_indices)
+        d1, d2, chi = (self.cell_type_slices[cell_type] for cell_type in ('D1', 'D2', 'CHI'))
+        
+        # Cell type indices (CNMF indices, their rows are the cell_type_slices blocks)
+        self.d1_indices = self.neuron_order[d1]
+        self.d2_indices = self.neuron_order[d2]
+        self.chi_indices = self.neuron_order[chi]
         
         # Process signals for each cell type
         # Raw calcium signals
-        self.d1_raw = self.C_raw[self.d1_indices]
-        self.d2_raw = self.C_raw[self.d2_indices]
-        self.chi_raw = self.C_raw[self.chi_indices]
+        self.d1_raw = self.C_raw[d1]
+        self.d2_raw = self.C_raw[d2]
+        self.chi_raw = self.C_raw[chi]
         
         # Denoised signals
-        self.d1_denoised = self.C_denoised[self.d1_indices]
-        self.d2_denoised = self.C_denoised[self.d2_indices]
-        self.chi_denoised = self.C_denoised[self.chi_indices]
+        self.d1_denoised = self.C_denoised[d1]
+        self.d2_denoised = self.C_denoised[d2]
+        self.chi_denoised = self.C_denoised[chi]
         
         # Deconvolved signals
-        self.d1_deconvolved = self.C_deconvolved[self.d1_indices]
-        self.d2_deconvolved = self.C_deconvolved[self.d2_indices]
-        self.chi_deconvolved = self.C_deconvolved[self.chi_indices]
+        self.d1_deconvolved = self.C_deconvolved[d1]
+        self.d2_deconvolved = self.C_deconvolved[d2]
+        self.chi_deconvolved = self.C_deconvolved[chi]
         
         # Baseline signals
-        self.d1_baseline = self.C_baseline[self.d1_indices]
-        self.d2_baseline = self.C_baseline[self.d2_indices]
-        self.chi_baseline = self.C_baseline[self.chi_indices]
+        self.d1_baseline = self.C_baseline[d1]
+        self.d2_baseline = self.C_baseline[d2]
+        self.chi_baseline = self.C_baseline[chi]
         
         # Reraw signals
-        self.d1_reraw = self.C_reraw[self.d1_indices]
-        self.d2_reraw = self.C_reraw[self.d2_indices]
-        self.chi_reraw = self.C_reraw[self.chi_indices]
+        self.d1_reraw = self.C_reraw[d1]
+        self.d2_reraw = self.C_reraw[d2]
+        self.chi_reraw = self.C_reraw[chi]
         
         # Spatial components
-        self.d1_A = self.A[self.d1_indices]
-        self.d2_A = self.A[self.d2_indices]
-        self.chi_A = self.A[self.chi_indices]
+        self.d1_A = self.A[d1]
+        self.d2_A = self.A[d2]
+        self.chi_A = self.A[chi]
         
         # Centroids
-        self.d1_centroids = self.centroids[self.d1_indices]
-        self.d2_centroids = self.centroids[self.d2_indices]
-        self.chi_centroids = self.centroids[self.chi_indices]
+        self.d1_centroids = self.centroids[d1]
+        self.d2_centroids = self.centroids[d2]
+        self.chi_centroids = self.centroids[chi]
         
         # Coordinates
-        self.d1_Coor = [self.Coor[i] for i in self.d1_indices]
-        self.d2_Coor = [self.Coor[i] for i in self.d2_indices]
-        self.chi_Coor = [self.Coor[i] for i in self.chi_indices]
+        self.d1_Coor = [self.Coor[i] for i in range(d1.start, d1.stop)]
+        self.d2_Coor = [self.Coor[i] for i in range(d2.start, d2.stop)]
+        self.chi_Coor = [self.Coor[i] for i in range(chi.start, chi.stop)]
         
         # Calculate average signals for each cell type
         self.d1_ca_all = self.normalize_signal(self.shift_signal_single(np.mean(self.d1_raw, axis=0)))
@@ -114,20 +128,92 @@ class CellTypeTank(CITank):
         self.chi_ca_all = self.normalize_signal(self.shift_signal_single(np.mean(self.chi_raw, axis=0)))
 
         # Z-scored signals
-        self.d1_zsc = self.C_zsc[self.d1_indices]
-        self.d2_zsc = self.C_zsc[self.d2_indices]
-        self.chi_zsc = self.C_zsc[self.chi_indices]
+        self.d1_zsc = self.C_zsc[d1]
+        self.d2_zsc = self.C_zsc[d2]
+        self.chi_zsc = self.C_zsc[chi]
+
+        # Rising edges starts (views into rising_edges_flat)
+        self.d1_rising_edges_starts = self.rising_edges_starts[d1]
+        self.d2_rising_edges_starts = self.rising_edges_starts[d2]
+        self.chi_rising_edges_starts = self.rising_edges_starts[chi]
+        
+        # Peak indices for each cell type (views into peak_indices_flat)
+        self.d1_peak_indices = self.peak_indices[d1]
+        self.d2_peak_indices = self.peak_indices[d2]
+        self.chi_peak_indices = self.peak_indices[chi]
 
-        # Rising edges starts
-        self.d1_rising_edges_starts = [self.rising_edges_starts[i] for i in self.d1_indices]
-        self.d2_rising_edges_starts = [self.rising_edges_starts[i] for i in self.d2_indices]
-        self.chi_rising_edges_starts = [self.rising_edges_starts[i] for i in self.chi_indices]
+        # Population-centered averages of the last (signal_type, time_window)
+        self._population_centered_cache = {}
+        
+    def _group_neurons_by_cell_type(self, d1_indices, d2_indices, chi_indices):
+        """
+        Permute all per-neuron data of the tank once into contiguous D1, D2, CHI and unlabelled blocks.
+        
+        Rows of the signal matrices, spatial components, centroids, contours, peak indices and rising edges
+        are renumbered consistently; neuron_order[i] is the CNMF row of neuron i, cnmf_to_row its inverse,
+        and cell_type_slices gives the block of each cell type, whose CNMF rows are given by d1_indices,
+        d2_indices and chi_indices. Peak indices and rising edges are packed into one flat array each, the
+        per-neuron lists holding views into it.
         
-        # Peak indices for each cell type
-        self.d1_peak_indices = [self.peak_indices[i] for i in self.d1_indices]
-        self.d2_peak_indices = [self.peak_indices[i] for i in self.d2_indices]
-        self.chi_peak_indices = [self.peak_indices[i] for i in self.chi_indices]
+        The permuted arrays are copies, so with a SessionCache (multi-process serving) a CellTypeTank holds
+        private arrays instead of the memory maps shared by the workers.
+        """
+        labelled = np.concatenate([d1_indices, d2_indices, chi_indices]).astype(int)
+        # a repeated or out of range index would give neuron_order duplicate rows and misalign every block
+        if len(np.unique(labelled)) != len(labelled):
+            raise ValueError("Cell type labels must be unique, a neuron is labelled more than once")
+        out_of_range = labelled[(labelled < 0) | (labelled >= self.neuron_num)]
+        if len(out_of_range):
+            raise ValueError(f"Cell type labels {out_of_range.tolist()} are out of range "
+                             f"for {self.neuron_num} neurons")
+        unlabelled = np.setdiff1d(np.arange(self.neuron_num), labelled)
+        self.neuron_order = np.concatenate([labelled, unlabelled])
+        self.cnmf_to_row = np.argsort(self.neuron_order)
+
+        bounds = np.cumsum([0, len(d1_indices), len(d2_indices), len(chi_indices)])
+        self.cell_type_slices = {cell_type: slice(int(bounds[i]), int(bounds[i + 1]))
+                                 for i, cell_type in enumerate(['D1', 'D2', 'CHI'])}
+
+        # rebinding each attribute frees the original array before the next copy is made
+        for name in ('C', 'C_raw', 'C_denoised', 'C_deconvolved', 'C_baseline', 'C_reraw',
+                     'C_raw_deltaF_over_F', 'C_zsc', 'A', 'centroids'):
+            setattr(self, name, getattr(self, name)[self.neuron_order])
+
+        ids = np.asarray(self.ids)
+        if ids.size == self.neuron_num:
+            self.ids = ids.reshape(-1)[self.neuron_order].reshape(ids.shape)
+
+        self.Coor = self.Coor.take(self.neuron_order)
+
+        self.peak_indices_flat, self.peak_indices = self._pack_events(self.peak_indices, self.neuron_order)
+        self.rising_edges_flat, self.rising_edges_starts = self._pack_events(self.rising_edges_starts,
+                                                                             self.neuron_order)
+
+    def rows_of(self, neuron_indices):
+        """
+        Tank rows of neurons given by their CNMF index.
+        
+        Parameters:
+        -----------
+        neuron_indices : array-like
+            CNMF indices of the neurons, e.g. the d1_indices of a label JSON
         
+        Returns:
+        --------
+        numpy.ndarray : Rows of the neurons in the reordered tank data
+        """
+        return self.cnmf_to_row[np.asarray(neuron_indices, dtype=int)]
+
+    @staticmethod
+    def _pack_events(events, order):
+        """
+        Pack per-neuron event index arrays, in the given neuron order, into one flat array.
+        :return: (flat array, list of per-neuron views into it)
+        """
+        counts = np.array([len(events[i]) for i in order], dtype=np.int64)
+        flat = np.concatenate([np.asarray(events[i], dtype=np.int64) for i in order] + [np.zeros(0, dtype=np.int64)])
+        return flat, np.split(flat, np.cumsum(counts)[:-1])
+
     def _load_cell_type_labels(self, cell_type_label_file):
         """
         Load cell type labels from either a dictionary or a file.
@@ -177,6 +263,56 @@ class CellTypeTank(CITank):
             raise ValueError("cell_type_label_file must be a string path to a JSON file")
         
 
+    def compute_cell_activity_at_events(self, event_type='movement_onset',
+                                        show_d1=True, show_d2=True, show_chi=True,
+                                        d1_signal=None, d2_signal=None, chi_signal=None, cut_interval=50):
+        """
+        Average calcium traces of the D1, D2 and/or CHI populations and velocity around specific events.
+        
+        Parameters:
+        -----------
+        event_type : str
+            Type of event to average around. Options: 'movement_onset', 'velocity_peak', 'movement_offset'
+        show_d1, show_d2, show_chi : bool
+            Which cell types to average
+        d1_signal, d2_signal, chi_signal : numpy.ndarray, optional
+            Signals of each cell type. If None, will use self.d1_zsc, self.d2_zsc and self.chi_zsc
+        cut_interval : int
+            Interval to cut around the indices (in samples)
+        
+        Returns:
+        --------
+        dict
+            'event_type', 'time_axis' (s), 'avg' {cell_type: mean trace} and 'velocity_avg'
+        """
+        event_indices = {'movement_onset': self.movement_onset_indices,
+                         'velocity_peak': self.velocity_peak_indices,
+                         'movement_offset': self.movement_offset_indices}
+        if event_type not in event_indices:
+            raise ValueError("event_type must be one of: 'movement_onset', 'velocity_peak', 'movement_offset'")
+        
+        # Check if we need to show at least one cell type
+        if not (show_d1 or show_d2 or show_chi):
+            raise ValueError("At least one of show_d1, show_d2, or show_chi must be True")
+        
+        indices = event_indices[event_type]
+        activity = {'event_type': event_type,
+                    'time_axis': (np.arange(2 * cut_interval) - cut_interval) / self.ci_rate,
+                    'avg': {}}
+        for cell_type, show, signal, default in [('D1', show_d1, d1_signal, self.d1_zsc),
+                                                 ('D2', show_d2, d2_signal, self.d2_zsc),
+                                                 ('CHI', show_chi, chi_signal, self.chi_zsc)]:
+            if show:
+                signal = default if signal is None else signal
+                activity['avg'][cell_type] = self.average_across_indices(indices, signal=signal,
+                                                                         cut_interval=cut_interval)[3]
+        
+        # Always include velocity
+        activity['velocity_avg'] = self.average_across_indices(indices, signal=self.smoothed_velocity,
+                                                               cut_interval=cut_interval)[3]
+        
+        return activity
+
     def plot_cell_activity_at_events(self, event_type='movement_onset', 
                                      show_d1=True, show_d2=True, show_chi=True,
                                      d1_signal=None, d2_signal=None, chi_signal=None,
@@ -223,53 +359,20 @@ class CellTypeTank(CITank):
         from bokeh.plotting import figure
         from bokeh.models import LinearAxis, Range1d, Legend
         
-        # Select indices based on event type
-        if event_type == 'movement_onset':
-            indices = self.movement_onset_indices
-            default_title = "Average Calcium Trace around Movement Onsets"
-        elif event_type == 'velocity_peak':
-            indices = self.velocity_peak_indices
-            default_title = "Average Calcium Trace around Velocity Peaks"
-        elif event_type == 'movement_offset':
-            indices = self.movement_offset_indices
-            default_title = "Average Calcium Trace around Movement Offsets"
-        else:
-            raise ValueError("event_type must be one of: 'movement_onset', 'velocity_peak', 'movement_offset'")
-        
-        # Check if we need to show at least one cell type
-        if not (show_d1 or show_d2 or show_chi):
-            raise ValueError("At least one of show_d1, show_d2, or show_chi must be True")
-        
-        # Set default signals if not provided
-        if show_d1 and d1_signal is None:
-            d1_signal = self.d1_zsc
-        if show_d2 and d2_signal is None:
-            d2_signal = self.d2_zsc
-        if show_chi and chi_signal is None:
-            chi_signal = self.chi_zsc
+        activity = self.compute_cell_activity_at_events(event_type, show_d1=show_d1, show_d2=show_d2,
+                                                        show_chi=show_chi, d1_signal=d1_signal, d2_signal=d2_signal,
+                                                        chi_signal=chi_signal, cut_interval=cut_interval)
+        time_axis = activity['time_axis']
+        velocity_mean = activity['velocity_avg']
+        C_avg_mean_d1 = activity['avg'].get('D1')
+        C_avg_mean_d2 = activity['avg'].get('D2')
+        C_avg_mean_chi = activity['avg'].get('CHI')
         
         # Use provided title or generate default
-        plot_title = title or default_title
-        
-        # Calculate average signals around the event for each cell type
-        C_avg_mean_d1 = None
-        C_avg_mean_d2 = None
-        C_avg_mean_chi = None
-        
-        if show_d1:
-            [C_avg_d1, _, _, C_avg_mean_d1, _] = self.average_across_indices(indices, signal=d1_signal, cut_interval=cut_interval)
-            
-        if show_d2:
-            [_, _, _, C_avg_mean_d2, _] = self.average_across_indices(indices, signal=d2_signal, cut_interval=cut_interval)
-            
-        if show_chi:
-            [_, _, _, C_avg_mean_chi, _] = self.average_across_indices(indices, signal=chi_signal, cut_interval=cut_interval)
-        
-        # Always include velocity
-        [_, _, _, velocity_mean, _] = self.average_across_indices(indices, signal=self.smoothed_velocity, cut_interval=cut_interval)
-        
-        # Create time axis in seconds
-        time_axis = (np.array(range(2 * cut_interval)) - cut_interval) / self.ci_rate
+        default_titles = {'movement_onset': "Average Calcium Trace around Movement Onsets",
+                          'velocity_peak': "Average Calcium Trace around Velocity Peaks",
+                          'movement_offset': "Average Calcium Trace around Movement Offsets"}
+        plot_title = title or default_titles[event_type]
         
         # Calculate optimal y-axis ranges for calcium signals with padding
         # Collect all the signals we're going to plot
@@ -1685,15 +1788,13 @@ class CellTypeTank(CITank):
         return layout
 
 
-    def movement_related_activity_analysis(self, event_indices=None, event_type='movement_onset',
-                                        d1_peak_indices=None, d2_peak_indices=None, chi_peak_indices=None,
-                                        show_d1=True, show_d2=True, show_chi=True,
-                                        pre_window=-3, post_window=3, bin_width=0.1,
-                                        max_neurons_to_plot=20,
-                                        save_path=None, title=None, notebook=False, overwrite=False, font_size=None):
+    def compute_movement_related_activity(self, event_indices=None, event_type='movement_onset',
+                                          d1_peak_indices=None, d2_peak_indices=None, chi_peak_indices=None,
+                                          show_d1=True, show_d2=True, show_chi=True,
+                                          pre_window=-3, post_window=3, bin_width=0.1):
         """
-        Analyze neural activity in relation to any specified event indices. Creates multiple visualizations
-        showing how different neuron types (D1, D2, CHI) activate around these events.
+        Align the peaks of every D1, D2 and/or CHI neuron and the velocity to events and compute the
+        peri-event time histogram of each cell type.
 
         Parameters:
         -----------
@@ -1701,47 +1802,25 @@ class CellTypeTank(CITank):
             Indices of events to analyze around. If None, will use predefined indices based on event_type.
         event_type : str, optional
             Type of event to use if event_indices is None. Options: 'movement_onset', 'velocity_peak', 'movement_offset'
-            Only used when event_indices is None.
-        d1_peak_indices : list of arrays, optional
-            List of peak indices for each D1 neuron. If None and show_d1 is True, will use self.peak_indices for D1 neurons.
-        d2_peak_indices : list of arrays, optional
-            List of peak indices for each D2 neuron. If None and show_d2 is True, will use self.peak_indices for D2 neurons.
-        chi_peak_indices : list of arrays, optional
-            List of peak indices for each CHI neuron. If None and show_chi is True, will use self.peak_indices for CHI neurons.
-        show_d1 : bool
-            Whether to include D1 neurons in the analysis
-        show_d2 : bool
-            Whether to include D2 neurons in the analysis
-        show_chi : bool
-            Whether to include CHI neurons in the analysis
+        d1_peak_indices, d2_peak_indices, chi_peak_indices : list of arrays, optional
+            Peak indices of each neuron. If None, will use self.d1_peak_indices, self.d2_peak_indices and
+            self.chi_peak_indices
+        show_d1, show_d2, show_chi : bool
+            Which cell types to include
         pre_window : float
             Time window before event (in seconds, negative value)
         post_window : float
             Time window after event (in seconds, positive value)
         bin_width : float
             Width of time bins for PSTH histogram (in seconds)
-        max_neurons_to_plot : int
-            Maximum number of neurons to include in the raster plot
-        save_path : str, optional
-            Path to save the visualization
-        title : str, optional
-            Title for the visualization. If None, will generate based on event_type.
-        notebook : bool
-            Flag to indicate if the visualization is for a Jupyter notebook
-        overwrite : bool
-            Flag to indicate whether to overwrite existing file
 
         Returns:
         --------
-        bokeh.layouts.layout
-            The created visualization layout
+        dict
+            'event_indices', 'bins', 'bin_centers' (s), 'aligned' {cell_type: per neuron list of
+            (event number, time relative to the event)}, 'psth' {cell_type: firing rate per neuron (Hz)},
+            'n_spikes' {cell_type: number of aligned spikes}, 'velocity_time' (s) and 'velocity_avg'
         """
-        import numpy as np
-        from scipy import stats
-        from bokeh.plotting import figure
-        from bokeh.layouts import column, row
-        from bokeh.models import ColumnDataSource, Span, Legend, LegendItem, BoxAnnotation
-
         # Determine event indices to use
         if event_indices is None:
             # Use indices based on event_type if no explicit indices are provided
@@ -1749,156 +1828,155 @@ class CellTypeTank(CITank):
                 if not hasattr(self, 'movement_onset_indices') or len(self.movement_onset_indices) == 0:
                     raise ValueError("No movement onset indices available. Please run movement detection first.")
                 event_indices = self.movement_onset_indices
-                default_title = "Movement Onset-Related Neural Activity"
             elif event_type == 'velocity_peak':
                 if not hasattr(self, 'velocity_peak_indices') or len(self.velocity_peak_indices) == 0:
                     raise ValueError("No velocity peak indices available.")
                 event_indices = self.velocity_peak_indices
-                default_title = "Velocity Peak-Related Neural Activity"
             elif event_type == 'movement_offset':
                 if not hasattr(self, 'movement_offset_indices') or len(self.movement_offset_indices) == 0:
                     raise ValueError("No movement offset indices available.")
                 event_indices = self.movement_offset_indices
-                default_title = "Movement Offset-Related Neural Activity"
             else:
                 raise ValueError("event_type must be one of: 'movement_onset', 'velocity_peak', 'movement_offset'")
-        else:
-            # Use the provided event indices
-            if len(event_indices) == 0:
-                raise ValueError("event_indices cannot be empty")
-            default_title = "Event-Related Neural Activity"
-
-        # Set title if not provided
-        if title is None:
-            title = default_title
+        elif len(event_indices) == 0:
+            raise ValueError("event_indices cannot be empty")
 
         # Check if at least one cell type is selected
         if not any([show_d1, show_d2, show_chi]):
             raise ValueError("At least one cell type (show_d1, show_d2, or show_chi) must be set to True")
 
-        # Use pre-computed peak indices for each cell type if not provided
-        if show_d1 and d1_peak_indices is None:
-            d1_peak_indices = self.d1_peak_indices
-
-        if show_d2 and d2_peak_indices is None:
-            d2_peak_indices = self.d2_peak_indices
-
-        if show_chi and chi_peak_indices is None:
-            chi_peak_indices = self.chi_peak_indices
-
         # Convert time window to samples
         pre_samples = int(pre_window * self.ci_rate)
         post_samples = int(post_window * self.ci_rate)
-        window_size = post_samples - pre_samples
 
         # Function to align spikes to events
-        def align_spikes_to_events(spike_indices, event_indices, pre_samples, post_samples, ci_rate):
+        def align_spikes_to_events(spike_indices):
             aligned_spikes = []
-            event_windows = []
-
-            # For each event, create a window
-            for event in event_indices:
-                window_start = event + pre_samples  # negative pre_samples
-                window_end = event + post_samples
-                event_windows.append((window_start, window_end))
-
             # For each neuron's spikes, find those within event windows
             for neuron_spikes in spike_indices:
                 neuron_aligned = []
-
-                for event_idx, (window_start, window_end) in enumerate(event_windows):
-                    # Find spikes within this window
-                    in_window = [spike for spike in neuron_spikes
-                                if window_start <= spike < window_end]
-
-                    # Convert to time relative to event (in seconds)
-                    relative_times = [(spike - event_indices[event_idx]) / ci_rate
-                                    for spike in in_window]
-
-                    # Add to this neuron's aligned spikes
-                    neuron_aligned.extend([(event_idx, t) for t in relative_times])
-
+                for event_idx, event in enumerate(event_indices):
+                    window_start = event + pre_samples  # negative pre_samples
+                    window_end = event + post_samples
+                    # Convert spikes within this window to time relative to event (in seconds)
+                    neuron_aligned.extend([(event_idx, (spike - event) / self.ci_rate) for spike in neuron_spikes
+                                           if window_start <= spike < window_end])
                 aligned_spikes.append(neuron_aligned)
-
             return aligned_spikes
 
         # Calculate average velocity aligned to events
-        def align_velocity_to_events(velocity, event_indices, pre_samples, post_samples, ci_rate):
-            window_size = post_samples - pre_samples
-            aligned_velocity = np.zeros((len(event_indices), window_size))
-
-            for i, event in enumerate(event_indices):
-                window_start = event + pre_samples
-                window_end = event + post_samples
+        aligned_velocity = np.zeros((len(event_indices), post_samples - pre_samples))
+        for i, event in enumerate(event_indices):
+            window_start = event + pre_samples
+            window_end = event + post_samples
+            # Check if window is within the velocity array bounds
+            if window_start >= 0 and window_end < len(self.smoothed_velocity):
+                aligned_velocity[i, :] = self.smoothed_velocity[window_start:window_end]
+        avg_velocity = np.mean(aligned_velocity, axis=0)
 
-                # Check if window is within the velocity array bounds
-                if window_start >= 0 and window_end < len(velocity):
-                    aligned_velocity[i, :] = velocity[window_start:window_end]
-
-            # Average across all events
-            avg_velocity = np.mean(aligned_velocity, axis=0)
-
-            # Create time points
-            time_points = np.linspace(pre_window, post_window, len(avg_velocity))
+        # Calculate spike density over time (PSTH)
+        bins = np.arange(pre_window, post_window + bin_width, bin_width)
+        bin_centers = bins[:-1] + bin_width / 2
 
-            return time_points, avg_velocity
+        activity = {'event_indices': event_indices, 'bins': bins, 'bin_centers': bin_centers,
+                    'aligned': {}, 'psth': {}, 'n_spikes': {},
+                    'velocity_time': np.linspace(pre_window, post_window, len(avg_velocity)),
+                    'velocity_avg': avg_velocity}
+        for cell_type, show, peak_indices, default in [('D1', show_d1, d1_peak_indices, self.d1_peak_indices),
+                                                       ('D2', show_d2, d2_peak_indices, self.d2_peak_indices),
+                                                       ('CHI', show_chi, chi_peak_indices, self.chi_peak_indices)]:
+            if not show:
+                continue
+            aligned = align_spikes_to_events(default if peak_indices is None else peak_indices)
+            # Aggregate spikes across neurons
+            all_times = [t for neuron_spikes in aligned for _, t in neuron_spikes]
+            hist = np.zeros_like(bin_centers)
+            if all_times:
+                # Normalize by number of neurons and bin width to get firing rate (spikes/s)
+                hist = np.histogram(all_times, bins=bins)[0] / (len(aligned) * bin_width)
+            activity['aligned'][cell_type] = aligned
+            activity['psth'][cell_type] = hist
+            activity['n_spikes'][cell_type] = len(all_times)
+
+        return activity
 
-        # Align spikes to events
-        d1_aligned = align_spikes_to_events(d1_peak_indices, event_indices,
-                                            pre_samples, post_samples, self.ci_rate) if show_d1 else []
-        d2_aligned = align_spikes_to_events(d2_peak_indices, event_indices,
-                                            pre_samples, post_samples, self.ci_rate) if show_d2 else []
-        chi_aligned = align_spikes_to_events(chi_peak_indices, event_indices,
-                                            pre_samples, post_samples, self.ci_rate) if show_chi else []
+    def movement_related_activity_analysis(self, event_indices=None, event_type='movement_onset',
+                                        d1_peak_indices=None, d2_peak_indices=None, chi_peak_indices=None,
+                                        show_d1=True, show_d2=True, show_chi=True,
+                                        pre_window=-3, post_window=3, bin_width=0.1,
+                                        max_neurons_to_plot=20,
+                                        save_path=None, title=None, notebook=False, overwrite=False, font_size=None):
+        """
+        Analyze neural activity in relation to any specified event indices. Creates multiple visualizations
+        showing how different neuron types (D1, D2, CHI) activate around these events.
 
-        # Get average velocity aligned to events
-        time_points, avg_velocity = align_velocity_to_events(self.smoothed_velocity,
-                                                            event_indices,
-                                                            pre_samples, post_samples,
-                                                            self.ci_rate)
+        Parameters:
+        -----------
+        event_indices : array-like, optional
+            Indices of events to analyze around. If None, will use predefined indices based on event_type.
+        event_type : str, optional
+            Type of event to use if event_indices is None. Options: 'movement_onset', 'velocity_peak', 'movement_offset'
+            Only used when event_indices is None.
+        d1_peak_indices : list of arrays, optional
+            List of peak indices for each D1 neuron. If None and show_d1 is True, will use self.peak_indices for D1 neurons.
+        d2_peak_indices : list of arrays, optional
+            List of peak indices for each D2 neuron. If None and show_d2 is True, will use self.peak_indices for D2 neurons.
+        chi_peak_indices : list of arrays, optional
+            List of peak indices for each CHI neuron. If None and show_chi is True, will use self.peak_indices for CHI neurons.
+        show_d1 : bool
+            Whether to include D1 neurons in the analysis
+        show_d2 : bool
+            Whether to include D2 neurons in the analysis
+        show_chi : bool
+            Whether to include CHI neurons in the analysis
+        pre_window : float
+            Time window before event (in seconds, negative value)
+        post_window : float
+            Time window after event (in seconds, positive value)
+        bin_width : float
+            Width of time bins for PSTH histogram (in seconds)
+        max_neurons_to_plot : int
+            Maximum number of neurons to include in the raster plot
+        save_path : str, optional
+            Path to save the visualization
+        title : str, optional
+            Title for the visualization. If None, will generate based on event_type.
+        notebook : bool
+            Flag to indicate if the visualization is for a Jupyter notebook
+        overwrite : bool
+            Flag to indicate whether to overwrite existing file
 
-        # Calculate spike density over time (PSTH)
-        bins = np.arange(pre_window, post_window + bin_width, bin_width)
-        bin_centers = bins[:-1] + bin_width / 2
+        Returns:
+        --------
+        bokeh.layouts.layout
+            The created visualization layout
+        """
+        import numpy as np
+        from scipy import stats
+        from bokeh.plotting import figure
+        from bokeh.layouts import column, row
+        from bokeh.models import ColumnDataSource, Span, Legend, LegendItem, BoxAnnotation
 
-        # Aggregate spikes across neurons
-        d1_all_times = []
-        d2_all_times = []
-        chi_all_times = []
-
-        if show_d1 and d1_aligned:
-            # Collect all spike times across all D1 neurons
-            spikes_list = [[t for _, t in neuron_spikes] for neuron_spikes in d1_aligned if neuron_spikes]
-            if spikes_list:  # Make sure there's data
-                d1_all_times = np.concatenate(spikes_list)
-
-        if show_d2 and d2_aligned:
-            spikes_list = [[t for _, t in neuron_spikes] for neuron_spikes in d2_aligned if neuron_spikes]
-            if spikes_list:
-                d2_all_times = np.concatenate(spikes_list)
-
-        if show_chi and chi_aligned:
-            spikes_list = [[t for _, t in neuron_spikes] for neuron_spikes in chi_aligned if neuron_spikes]
-            if spikes_list:
-                chi_all_times = np.concatenate(spikes_list)
-
-        # Create histograms
-        d1_hist = np.zeros_like(bin_centers)
-        d2_hist = np.zeros_like(bin_centers)
-        chi_hist = np.zeros_like(bin_centers)
-
-        if len(d1_all_times) > 0:
-            d1_hist, _ = np.histogram(d1_all_times, bins=bins)
-            # Normalize by number of neurons and bin width to get firing rate (spikes/s)
-            d1_hist = d1_hist / (len(d1_aligned) * bin_width) if len(d1_aligned) > 0 else d1_hist
-
-        if len(d2_all_times) > 0:
-            d2_hist, _ = np.histogram(d2_all_times, bins=bins)
-            d2_hist = d2_hist / (len(d2_aligned) * bin_width) if len(d2_aligned) > 0 else d2_hist
-
-        if len(chi_all_times) > 0:
-            chi_hist, _ = np.histogram(chi_all_times, bins=bins)
-            chi_hist = chi_hist / (len(chi_aligned) * bin_width) if len(chi_aligned) > 0 else chi_hist
+        activity = self.compute_movement_related_activity(event_indices, event_type, d1_peak_indices=d1_peak_indices,
+                                                          d2_peak_indices=d2_peak_indices,
+                                                          chi_peak_indices=chi_peak_indices, show_d1=show_d1,
+                                                          show_d2=show_d2, show_chi=show_chi, pre_window=pre_window,
+                                                          post_window=post_window, bin_width=bin_width)
+        if title is None:
+            default_titles = {'movement_onset': "Movement Onset-Related Neural Activity",
+                              'velocity_peak': "Velocity Peak-Related Neural Activity",
+                              'movement_offset': "Movement Offset-Related Neural Activity"}
+            title = default_titles[event_type] if event_indices is None else "Event-Related Neural Activity"
+
+        bin_centers = activity['bin_centers']
+        time_points = activity['velocity_time']
+        avg_velocity = activity['velocity_avg']
+        d1_aligned = activity['aligned'].get('D1', [])
+        d2_aligned = activity['aligned'].get('D2', [])
+        chi_aligned = activity['aligned'].get('CHI', [])
+        d1_hist = activity['psth'].get('D1', np.zeros_like(bin_centers))
+        d2_hist = activity['psth'].get('D2', np.zeros_like(bin_centers))
+        chi_hist = activity['psth'].get('CHI', np.zeros_like(bin_centers))
 
         # Normalize velocity for plotting (scale to match firing rate range)
         max_firing_rate = max(np.max(d1_hist) if len(d1_hist) > 0 else 0,
@@ -1954,17 +2032,17 @@ class CellTypeTank(CITank):
         # Plot histograms as bars without legend labels
         legend_items1 = []
 
-        if show_d1 and len(d1_all_times) > 0:
+        if activity['n_spikes'].get('D1', 0) > 0:
             d1_hist_plot = p1.vbar(x='bin_centers', top='d1_hist', width=bin_width * 0.8, source=source_hist,
                                 color='navy', alpha=0.5)
             legend_items1.append(LegendItem(label="D1 Neurons", renderers=[d1_hist_plot]))
 
-        if show_d2 and len(d2_all_times) > 0:
+        if activity['n_spikes'].get('D2', 0) > 0:
             d2_hist_plot = p1.vbar(x='bin_centers', top='d2_hist', width=bin_width * 0.8, source=source_hist,
                                 color='crimson', alpha=0.5)
             legend_items1.append(LegendItem(label="D2 Neurons", renderers=[d2_hist_plot]))
 
-        if show_chi and len(chi_all_times) > 0:
+        if activity['n_spikes'].get('CHI', 0) > 0:
             chi_hist_plot = p1.vbar(x='bin_centers', top='chi_hist', width=bin_width * 0.8, source=source_hist,
                                     color='green', alpha=0.5)
             legend_items1.append(LegendItem(label="CHI Neurons", renderers=[chi_hist_plot]))
@@ -2528,6 +2606,54 @@ class CellTypeTank(CITank):
 
             return layout
 
+    def compute_signal_around_cell_type_spikes(self, d1_indices=None, d2_indices=None, chi_indices=None,
+                                               signal=None, time_window=4.0, height=0.5,
+                                               show_d1=True, show_d2=True, show_chi=True):
+        """
+        Average a signal before and after spikes in D1, D2, and CHI neurons, without plotting.
+        
+        Parameters:
+        -----------
+        d1_indices, d2_indices, chi_indices : array-like, optional
+            CNMF indices of the neurons of each cell type. If None, uses self.d1_indices, self.d2_indices
+            and self.chi_indices
+        signal : numpy.ndarray, optional
+            Signal array to analyze. If None, uses self.smoothed_velocity
+        time_window : float
+            Time window in seconds before and after spike to analyze
+        height : float
+            Height threshold for peak detection
+        show_d1, show_d2, show_chi : bool
+            Which cell types to analyze
+        
+        Returns:
+        --------
+        dict
+            'time_axis', and '<type>_avg_signal', '<type>_sem_signal', '<type>_sample_count' for every
+            analyzed cell type with at least one spike
+        """
+        if signal is None:
+            signal = self.smoothed_velocity
+        
+        samples_window = int(time_window * self.ci_rate)
+        results = {'time_axis': np.linspace(-time_window, time_window, 2 * samples_window + 1)}
+        
+        for cell_type, show, neuron_indices, default in [('d1', show_d1, d1_indices, self.d1_indices),
+                                                         ('d2', show_d2, d2_indices, self.d2_indices),
+                                                         ('chi', show_chi, chi_indices, self.chi_indices)]:
+            neuron_indices = self.rows_of(default if neuron_indices is None else neuron_indices)
+            if not show or len(neuron_indices) == 0:
+                continue
+            
+            segments = self.spike_triggered_segments(signal, self.denoised_peaks(neuron_indices, height=height),
+                                                     samples_window)
+            if len(segments) > 0:
+                results[f'{cell_type}_avg_signal'] = np.mean(segments, axis=0)
+                results[f'{cell_type}_sem_signal'] = np.std(segments, axis=0) / np.sqrt(len(segments))
+                results[f'{cell_type}_sample_count'] = len(segments)
+        
+        return results
+
     def analyze_signal_around_cell_type_spikes(self, d1_indices=None, d2_indices=None, chi_indices=None, 
                                               signal=None, signal_name="Signal", time_window=4.0, height=0.5,
                                               show_d1=True, show_d2=True, show_chi=True,
@@ -2538,11 +2664,11 @@ class CellTypeTank(CITank):
         Parameters:
         -----------
         d1_indices : array-like, optional
-            Indices of D1 neurons. If None, uses self.d1_indices
+            CNMF indices of D1 neurons. If None, uses self.d1_indices
         d2_indices : array-like, optional
-            Indices of D2 neurons. If None, uses self.d2_indices
+            CNMF indices of D2 neurons. If None, uses self.d2_indices
         chi_indices : array-like, optional
-            Indices of CHI neurons. If None, uses self.chi_indices
+            CNMF indices of CHI neurons. If None, uses self.chi_indices
         signal : numpy.ndarray, optional
             Signal array to analyze (e.g., self.smoothed_velocity, self.acceleration)
             If None, uses self.smoothed_velocity
@@ -2575,20 +2701,7 @@ class CellTypeTank(CITank):
         """
         from bokeh.plotting import figure
         from bokeh.layouts import gridplot
-        from bokeh.models import ColumnDataSource, Span
-        from scipy.signal import find_peaks
-        
-        # Use default indices if not provided
-        if d1_indices is None:
-            d1_indices = self.d1_indices
-        if d2_indices is None:
-            d2_indices = self.d2_indices
-        if chi_indices is None:
-            chi_indices = self.chi_indices
-            
-        # Use default signal if not provided
-        if signal is None:
-            signal = self.smoothed_velocity
+        from bokeh.models import Span
         
         # Set default title if not provided
         if title is None:
@@ -2598,197 +2711,63 @@ class CellTypeTank(CITank):
             if show_chi: cell_types.append("CHI")
             title = f"{signal_name} around {', '.join(cell_types)} Neuron Spikes"
         
-        # Convert time window to samples
-        samples_window = int(time_window * self.ci_rate)
-        
-        # Initialize results dictionary
-        results = {
-            'time_axis': np.linspace(-time_window, time_window, 2 * samples_window + 1),
-            'signal_name': signal_name
-        }
+        results = self.compute_signal_around_cell_type_spikes(d1_indices, d2_indices, chi_indices, signal=signal,
+                                                              time_window=time_window, height=height,
+                                                              show_d1=show_d1, show_d2=show_d2, show_chi=show_chi)
+        results['signal_name'] = signal_name
         
         plots = []
         
-        # Process D1 neurons if requested
-        if show_d1 and len(d1_indices) > 0:
-            d1_peak_indices = []
-            for i in d1_indices:
-                x, _ = find_peaks(self.C_denoised[i], height=height)
-                d1_peak_indices.append(x)
-            
-            d1_signals = []
-            for neuron_spikes in d1_peak_indices:
-                for spike_idx in neuron_spikes:
-                    if spike_idx - samples_window >= 0 and spike_idx + samples_window < len(signal):
-                        signal_segment = signal[spike_idx - samples_window:spike_idx + samples_window + 1]
-                        d1_signals.append(signal_segment)
-            
-            if len(d1_signals) > 0:
-                d1_signals = np.array(d1_signals)
-                d1_avg_signal = np.mean(d1_signals, axis=0)
-                d1_sem_signal = np.std(d1_signals, axis=0) / np.sqrt(len(d1_signals))
-                
-                # Store results
-                results['d1_avg_signal'] = d1_avg_signal
-                results['d1_sem_signal'] = d1_sem_signal
-                results['d1_sample_count'] = len(d1_signals)
-                
-                # Create D1 plot
-                p1 = figure(width=900, height=400, 
-                        title=f"{signal_name} around D1 Neuron Spikes (n={len(d1_signals)})",
-                        x_axis_label="Time relative to spike (s)",
-                        y_axis_label=signal_name)
-                
-                p1.line(results['time_axis'], d1_avg_signal, line_width=3, color='navy', legend_label="D1 Average")
-                p1.patch(
-                    np.concatenate([results['time_axis'], results['time_axis'][::-1]]),
-                    np.concatenate([
-                        d1_avg_signal + d1_sem_signal,
-                        (d1_avg_signal - d1_sem_signal)[::-1]
-                    ]),
-                    color='navy', alpha=0.2
-                )
-                
-                # Add vertical line at spike time
-                p1.line([0, 0], [np.min(d1_avg_signal)-1, np.max(d1_avg_signal) * 1.2], 
-                       line_width=2, color='black', line_dash='dashed')
-                
-                # Add horizontal line at y=0 for acceleration signals
-                if signal_name.lower() == "acceleration":
-                    zero_line = Span(location=0, dimension='width', line_color='black', line_width=2, line_dash='dotted')
-                    p1.add_layout(zero_line)
-                
-                p1.xgrid.grid_line_color = None
-                p1.ygrid.grid_line_color = None
-                p1.legend.location = "top_right"
-                p1.legend.click_policy = "hide"
-                
-                plots.append(p1)
-        
-        # Process D2 neurons if requested
-        if show_d2 and len(d2_indices) > 0:
-            d2_peak_indices = []
-            for i in d2_indices:
-                x, _ = find_peaks(self.C_denoised[i], height=height)
-                d2_peak_indices.append(x)
-            
-            d2_signals = []
-            for neuron_spikes in d2_peak_indices:
-                for spike_idx in neuron_spikes:
-                    if spike_idx - samples_window >= 0 and spike_idx + samples_window < len(signal):
-                        signal_segment = signal[spike_idx - samples_window:spike_idx + samples_window + 1]
-                        d2_signals.append(signal_segment)
-            
-            if len(d2_signals) > 0:
-                d2_signals = np.array(d2_signals)
-                d2_avg_signal = np.mean(d2_signals, axis=0)
-                d2_sem_signal = np.std(d2_signals, axis=0) / np.sqrt(len(d2_signals))
-                
-                # Store results
-                results['d2_avg_signal'] = d2_avg_signal
-                results['d2_sem_signal'] = d2_sem_signal
-                results['d2_sample_count'] = len(d2_signals)
-                
-                # Create D2 plot
-                p2 = figure(width=900, height=400, 
-                        title=f"{signal_name} around D2 Neuron Spikes (n={len(d2_signals)})",
-                        x_axis_label="Time relative to spike (s)",
-                        y_axis_label=signal_name,
-                        x_range=plots[0].x_range if plots else None)
-                
-                p2.line(results['time_axis'], d2_avg_signal, line_width=3, color='crimson', legend_label="D2 Average")
-                p2.patch(
-                    np.concatenate([results['time_axis'], results['time_axis'][::-1]]),
-                    np.concatenate([
-                        d2_avg_signal + d2_sem_signal,
-                        (d2_avg_signal - d2_sem_signal)[::-1]
-                    ]),
-                    color='crimson', alpha=0.2
-                )
-                
-                # Add vertical line at spike time
-                p2.line([0, 0], [np.min(d2_avg_signal)-1, np.max(d2_avg_signal) * 1.2], 
-                       line_width=2, color='black', line_dash='dashed')
-                
-                # Add horizontal line at y=0 for acceleration signals
-                if signal_name.lower() == "acceleration":
-                    zero_line = Span(location=0, dimension='width', line_color='black', line_width=2, line_dash='dotted')
-                    p2.add_layout(zero_line)
-                
-                p2.xgrid.grid_line_color = None
-                p2.ygrid.grid_line_color = None
-                p2.legend.location = "top_right"
-                p2.legend.click_policy = "hide"
-                
-                plots.append(p2)
-        
-        # Process CHI neurons if requested
-        if show_chi and len(chi_indices) > 0:
-            chi_peak_indices = []
-            for i in chi_indices:
-                x, _ = find_peaks(self.C_denoised[i], height=height)
-                chi_peak_indices.append(x)
-            
-            chi_signals = []
-            for neuron_spikes in chi_peak_indices:
-                for spike_idx in neuron_spikes:
-                    if spike_idx - samples_window >= 0 and spike_idx + samples_window < len(signal):
-                        signal_segment = signal[spike_idx - samples_window:spike_idx + samples_window + 1]
-                        chi_signals.append(signal_segment)
-            
-            if len(chi_signals) > 0:
-                chi_signals = np.array(chi_signals)
-                chi_avg_signal = np.mean(chi_signals, axis=0)
-                chi_sem_signal = np.std(chi_signals, axis=0) / np.sqrt(len(chi_signals))
-                
-                # Store results
-                results['chi_avg_signal'] = chi_avg_signal
-                results['chi_sem_signal'] = chi_sem_signal
-                results['chi_sample_count'] = len(chi_signals)
-                
-                # Create CHI plot
-                p3 = figure(width=900, height=400, 
-                        title=f"{signal_name} around CHI Neuron Spikes (n={len(chi_signals)})",
-                        x_axis_label="Time relative to spike (s)",
-                        y_axis_label=signal_name,
-                        x_range=plots[0].x_range if plots else None)
-                
-                p3.line(results['time_axis'], chi_avg_signal, line_width=3, color='limegreen', legend_label="CHI Average")
-                p3.patch(
-                    np.concatenate([results['time_axis'], results['time_axis'][::-1]]),
-                    np.concatenate([
-                        chi_avg_signal + chi_sem_signal,
-                        (chi_avg_signal - chi_sem_signal)[::-1]
-                    ]),
-                    color='limegreen', alpha=0.2
-                )
-                
-                # Add vertical line at spike time
-                p3.line([0, 0], [np.min(chi_avg_signal)-1, np.max(chi_avg_signal) * 1.2], 
-                       line_width=2, color='black', line_dash='dashed')
-                
-                # Add horizontal line at y=0 for acceleration signals
-                if signal_name.lower() == "acceleration":
-                    zero_line = Span(location=0, dimension='width', line_color='black', line_width=2, line_dash='dotted')
-                    p3.add_layout(zero_line)
-                
-                p3.xgrid.grid_line_color = None
-                p3.ygrid.grid_line_color = None
-                p3.legend.location = "top_right"
-                p3.legend.click_policy = "hide"
-                
-                plots.append(p3)
-        
-        # Create comparison plot if multiple cell types are shown
-        if len(plots) > 1:
-            comparison_plot = figure(width=900, height=500, 
-                    title=f"Comparison of {signal_name} around Cell Type Spikes",
+        for key, label, color in [('d1', 'D1', 'navy'), ('d2', 'D2', 'crimson'), ('chi', 'CHI', 'limegreen')]:
+            if f'{key}_avg_signal' not in results:
+                continue
+            avg_signal = results[f'{key}_avg_signal']
+            sem_signal = results[f'{key}_sem_signal']
+            
+            # share the time axis with the first plot
+            shared_range = {'x_range': plots[0].x_range} if plots else {}
+            p = figure(width=900, height=400, 
+                    title=f"{signal_name} around {label} Neuron Spikes (n={results[f'{key}_sample_count']})",
                     x_axis_label="Time relative to spike (s)",
                     y_axis_label=signal_name,
-                    x_range=plots[0].x_range if plots else None)
+                    **shared_range)
+            
+            p.line(results['time_axis'], avg_signal, line_width=3, color=color, legend_label=f"{label} Average")
+            p.patch(
+                np.concatenate([results['time_axis'], results['time_axis'][::-1]]),
+                np.concatenate([
+                    avg_signal + sem_signal,
+                    (avg_signal - sem_signal)[::-1]
+                ]),
+                color=color, alpha=0.2
+            )
             
-            # Add lines for each cell type
-            if show_d1 and 'd1_avg_signal' in results:
+            # Add vertical line at spike time
+            p.line([0, 0], [np.min(avg_signal)-1, np.max(avg_signal) * 1.2], 
+                   line_width=2, color='black', line_dash='dashed')
+            
+            # Add horizontal line at y=0 for acceleration signals
+            if signal_name.lower() == "acceleration":
+                zero_line = Span(location=0, dimension='width', line_color='black', line_width=2, line_dash='dotted')
+                p.add_layout(zero_line)
+            
+            p.xgrid.grid_line_color = None
+            p.ygrid.grid_line_color = None
+            p.legend.location = "top_right"
+            p.legend.click_policy = "hide"
+            
+            plots.append(p)
+        
+        # Create comparison plot if multiple cell types are shown
+        if len(plots) > 1:
+            comparison_plot = figure(width=900, height=500, 
+                    title=f"Comparison of {signal_name} around Cell Type Spikes",
+                    x_axis_label="Time relative to spike (s)",
+                    y_axis_label=signal_name,
+                    x_range=plots[0].x_range if plots else None)
+            
+            # Add lines for each cell type
+            if show_d1 and 'd1_avg_signal' in results:
                 comparison_plot.line(results['time_axis'], results['d1_avg_signal'], 
                                    line_width=3, color='navy', legend_label="D1 Average")
             if show_d2 and 'd2_avg_signal' in results:
@@ -2894,13 +2873,13 @@ class CellTypeTank(CITank):
         
         return results
 
-    def _plot_neuron_centered_activity_core(self, center_cell_type, center_signals, center_peak_indices,
-                                           other_signals_dict, other_peak_indices_dict,
-                                           ci_rate=None, time_window=3.0, activity_window=1.0,
-                                           save_path=None, title=None, notebook=False, overwrite=False, font_size=None):
+    def _compute_neuron_centered_activity_core(self, center_cell_type, center_signals, center_peak_indices,
+                                               other_signals_dict, other_peak_indices_dict,
+                                               ci_rate=None, time_window=3.0, activity_window=1.0):
         """
-        Core function for plotting neuron-centered activity analysis with active neurons from other cell types.
-        This reduces code redundancy across D1, D2, and CHI centered analyses.
+        Core computation of the neuron-centered activity analysis, without plotting: the average trace of the
+        center cell type at its peaks with activity from other cell types, and the average traces of the
+        active neurons of the other cell types.
         
         Parameters:
         -----------
@@ -2917,28 +2896,16 @@ class CellTypeTank(CITank):
         ci_rate : float, optional
             Sampling rate of calcium imaging data (Hz). If None, uses self.ci_rate
         time_window : float
-            Time window in seconds before and after each peak for plotting
+            Time window in seconds before and after each peak
         activity_window : float
             Time window in seconds to look for other cell type activities around center peaks
-        save_path : str, optional
-            Path to save the HTML file
-        title : str, optional
-            Title for the plot
-        notebook : bool
-            Whether to display in notebook
-        overwrite : bool
-            Whether to overwrite existing file
-        font_size : str, optional
-            Font size for plot text elements
         
         Returns:
         --------
-        tuple
-            (bokeh.plotting.figure, dict) - The created figure and summary statistics
+        dict or None
+            'time_axis', 'center_avg', 'center_sem', 'avg' and 'sem' {cell_type: trace}, 'stats' and
+            'peaks_info' (one dict per averaged peak); None if no center peak has activity from other cell types
         """
-        import numpy as np
-        from bokeh.plotting import figure
-        
         if ci_rate is None:
             ci_rate = self.ci_rate
         
@@ -3037,8 +3004,8 @@ class CellTypeTank(CITank):
                         valid_peaks_info.append(peak_info)
         
         if not all_center_traces:
-            print(f"No {center_cell_type} peaks with activity from other cell types found for plotting.")
-            return None, None
+            print(f"No {center_cell_type} peaks with activity from other cell types found.")
+            return None
         
         # Calculate average traces
         avg_center_trace = np.mean(all_center_traces, axis=0)
@@ -3072,6 +3039,64 @@ class CellTypeTank(CITank):
         for cell_type in other_signals_dict.keys():
             stats[f'peaks_with_{cell_type.lower()}_activity'] = peaks_with_activity[cell_type]
         
+        return {'time_axis': time_axis, 'center_avg': avg_center_trace, 'center_sem': sem_center_trace,
+                'avg': avg_other_traces, 'sem': sem_other_traces, 'stats': stats, 'peaks_info': valid_peaks_info}
+
+    def _plot_neuron_centered_activity_core(self, center_cell_type, center_signals, center_peak_indices,
+                                           other_signals_dict, other_peak_indices_dict,
+                                           ci_rate=None, time_window=3.0, activity_window=1.0,
+                                           save_path=None, title=None, notebook=False, overwrite=False, font_size=None):
+        """
+        Core function for plotting neuron-centered activity analysis with active neurons from other cell types.
+        This reduces code redundancy across D1, D2, and CHI centered analyses.
+        
+        Parameters:
+        -----------
+        center_cell_type : str
+            The cell type being centered ('D1', 'D2', or 'CHI')
+        center_signals : numpy.ndarray
+            Signals for the center cell type (shape: n_neurons x n_timepoints)
+        center_peak_indices : list
+            List of arrays containing peak indices for each center neuron
+        other_signals_dict : dict
+            Dictionary with other cell type signals {'D1': signals, 'D2': signals, 'CHI': signals}
+        other_peak_indices_dict : dict
+            Dictionary with other cell type peak indices {'D1': indices, 'D2': indices, 'CHI': indices}
+        ci_rate : float, optional
+            Sampling rate of calcium imaging data (Hz). If None, uses self.ci_rate
+        time_window : float
+            Time window in seconds before and after each peak for plotting
+        activity_window : float
+            Time window in seconds to look for other cell type activities around center peaks
+        save_path : str, optional
+            Path to save the HTML file
+        title : str, optional
+            Title for the plot
+        notebook : bool
+            Whether to display in notebook
+        overwrite : bool
+            Whether to overwrite existing file
+        font_size : str, optional
+            Font size for plot text elements
+        
+        Returns:
+        --------
+        tuple
+            (bokeh.plotting.figure, dict) - The created figure and summary statistics
+        """
+        from bokeh.plotting import figure
+        
+        activity = self._compute_neuron_centered_activity_core(
+            center_cell_type, center_signals, center_peak_indices, other_signals_dict, other_peak_indices_dict,
+            ci_rate=ci_rate, time_window=time_window, activity_window=activity_window)
+        if activity is None:
+            return None, None
+        
+        time_axis = activity['time_axis']
+        avg_center_trace, sem_center_trace = activity['center_avg'], activity['center_sem']
+        avg_other_traces, sem_other_traces = activity['avg'], activity['sem']
+        stats = activity['stats']
+        
         # Create the plot
         other_types_str = "/".join([ct for ct in other_signals_dict.keys() if ct != center_cell_type])
         plot_title = (f"{title or f'{center_cell_type}-Centered Analysis'}\n"
@@ -3093,7 +3118,7 @@ class CellTypeTank(CITank):
         # Plot the center trace (main signal) with thicker line
         center_color = colors.get(center_cell_type, 'black')
         p.line(time_axis, avg_center_trace, line_width=3, color=center_color, 
-               legend_label=f"{center_cell_type} Average (n={len(all_center_traces)})")
+               legend_label=f"{center_cell_type} Average (n={stats['n_traces_averaged']})")
         p.patch(np.concatenate([time_axis, time_axis[::-1]]), 
                 np.concatenate([avg_center_trace - sem_center_trace, (avg_center_trace + sem_center_trace)[::-1]]),
                 alpha=0.2, color=center_color)
@@ -3134,6 +3159,68 @@ class CellTypeTank(CITank):
         
         return p, stats
 
+    def _neuron_centered_inputs(self, center_cell_type, signal_type):
+        """
+        Signals and peak indices of the center cell type and of the other cell types.
+        
+        Returns:
+        --------
+        tuple
+            (center_signals, center_peak_indices, other_signals_dict, other_peak_indices_dict)
+        """
+        # Validate inputs
+        if center_cell_type not in ['D1', 'D2', 'CHI']:
+            raise ValueError("center_cell_type must be one of: 'D1', 'D2', 'CHI'")
+        
+        if signal_type not in ['zsc', 'denoised']:
+            raise ValueError("signal_type must be one of: 'zsc', 'denoised'")
+        
+        signal_suffix = '_zsc' if signal_type == 'zsc' else '_denoised'
+        
+        # Get center signals and peak indices
+        center_signals = getattr(self, f'{center_cell_type.lower()}{signal_suffix}')
+        center_peak_indices = getattr(self, f'{center_cell_type.lower()}_peak_indices')
+        
+        # Get other cell type signals and peak indices
+        other_cell_types = [ct for ct in ['D1', 'D2', 'CHI'] if ct != center_cell_type]
+        other_signals_dict = {}
+        other_peak_indices_dict = {}
+        
+        for cell_type in other_cell_types:
+            other_signals_dict[cell_type] = getattr(self, f'{cell_type.lower()}{signal_suffix}')
+            other_peak_indices_dict[cell_type] = getattr(self, f'{cell_type.lower()}_peak_indices')
+        
+        return center_signals, center_peak_indices, other_signals_dict, other_peak_indices_dict
+
+    def compute_neuron_centered_activity(self, center_cell_type='D1', signal_type='zsc',
+                                         time_window=3.0, activity_window=1.0):
+        """
+        Average activity of the center cell type at its peaks with activity from other cell types, along with
+        the average signals of the active neurons of the other cell types, without plotting.
+        
+        Parameters:
+        -----------
+        center_cell_type : str
+            The cell type to center the analysis on ('D1', 'D2', or 'CHI')
+        signal_type : str
+            Type of signal to use ('zsc' for z-score normalized, 'denoised' for denoised signals)
+        time_window : float
+            Time window in seconds before and after each peak
+        activity_window : float
+            Time window in seconds to look for activities from other cell types around center peaks
+        
+        Returns:
+        --------
+        dict or None
+            See _compute_neuron_centered_activity_core
+        """
+        center_signals, center_peak_indices, other_signals_dict, other_peak_indices_dict = \
+            self._neuron_centered_inputs(center_cell_type, signal_type)
+        return self._compute_neuron_centered_activity_core(center_cell_type, center_signals, center_peak_indices,
+                                                           other_signals_dict, other_peak_indices_dict,
+                                                           ci_rate=self.ci_rate, time_window=time_window,
+                                                           activity_window=activity_window)
+
     def plot_neuron_centered_activity(self, center_cell_type='D1', signal_type='zsc',
                                      time_window=3.0, activity_window=1.0,
                                      save_path=None, title=None, notebook=False, overwrite=False, font_size=None):
@@ -3167,37 +3254,13 @@ class CellTypeTank(CITank):
         tuple
             (bokeh.plotting.figure, dict) - The created figure and summary statistics
         """
-        # Validate inputs
-        if center_cell_type not in ['D1', 'D2', 'CHI']:
-            raise ValueError("center_cell_type must be one of: 'D1', 'D2', 'CHI'")
-        
-        if signal_type not in ['zsc', 'denoised']:
-            raise ValueError("signal_type must be one of: 'zsc', 'denoised'")
-        
-        # Get signals based on signal type
-        if signal_type == 'zsc':
-            signal_suffix = '_zsc'
-            signal_description = 'Z-score'
-        else:
-            signal_suffix = '_denoised'
-            signal_description = 'Denoised'
-        
-        # Get center signals and peak indices
-        center_signals = getattr(self, f'{center_cell_type.lower()}{signal_suffix}')
-        center_peak_indices = getattr(self, f'{center_cell_type.lower()}_peak_indices')
-        
-        # Get other cell type signals and peak indices
-        other_cell_types = [ct for ct in ['D1', 'D2', 'CHI'] if ct != center_cell_type]
-        other_signals_dict = {}
-        other_peak_indices_dict = {}
-        
-        for cell_type in other_cell_types:
-            other_signals_dict[cell_type] = getattr(self, f'{cell_type.lower()}{signal_suffix}')
-            other_peak_indices_dict[cell_type] = getattr(self, f'{cell_type.lower()}_peak_indices')
+        center_signals, center_peak_indices, other_signals_dict, other_peak_indices_dict = \
+            self._neuron_centered_inputs(center_cell_type, signal_type)
         
         # Generate title if not provided
         if title is None:
-            other_types_str = "/".join(other_cell_types)
+            other_types_str = "/".join(other_signals_dict)
+            signal_description = 'Z-score' if signal_type == 'zsc' else 'Denoised'
             title = f"{center_cell_type}-Centered Analysis: Average {center_cell_type} Activity with Active {other_types_str} ({signal_description})"
         
         # Call the core function
@@ -3450,7 +3513,9 @@ class CellTypeTank(CITank):
         Directly accesses parent CellTypeTank data without redundant property declarations.
         """
         
-        def __init__(self, parent_tank, save_dir=None, use_rising_edges=True):
+        CELL_TYPES = ['D1', 'D2', 'CHI']
+
+        def __init__(self, parent_tank, save_dir=None, use_rising_edges=True, neuron_level=False):
             """
             Initialize analyzer with reference to parent CellTypeTank and optionally run full analysis
             
@@ -3462,8 +3527,8 @@ class CellTypeTank(CITank):
                 Directory to save results
             use_rising_edges : bool
                 Whether to use rising edges instead of peak indices
-            run_analysis : bool
-                Whether to run the full analysis during initialization
+            neuron_level : bool
+                Whether to also compute neuron-to-neuron connectivity matrices
             """
             self.tank = parent_tank
 
@@ -3481,6 +3546,9 @@ class CellTypeTank(CITank):
             self.peak_timing_relationships = self.calculate_peak_timing_relationships()
             self.mutual_information = self.calculate_mutual_information_from_peaks(bins=10)
             self.network = self.create_connectivity_network(threshold=0.1)
+            self.neuron_connectivity = None
+            if neuron_level:
+                self.neuron_connectivity = self.calculate_neuron_connectivity(time_windows=[5, 10, 20, 50])
             
             self.generate_summary_report()
             self.analysis_results = self.get_analysis_results()
@@ -3502,7 +3570,8 @@ class CellTypeTank(CITank):
                 'coactivation_patterns': self.coactivation_patterns,
                 'peak_timing_relationships': self.peak_timing_relationships,
                 'mutual_information': self.mutual_information,
-                'network': self.network
+                'network': self.network,
+                'neuron_connectivity': self.neuron_connectivity
             }
         
         def create_binary_signals_from_peaks(self, window_size=5, use_rising_edges=True):
@@ -3518,7 +3587,7 @@ class CellTypeTank(CITank):
             
             Returns:
             --------
-            dict : Contains binary signals for each neural type
+            dict : Sparse boolean (n_neurons, n_samples) activation matrix for each neural type
             """
             print("Creating binary activation signals from existing peak indices...")
             
@@ -3534,39 +3603,27 @@ class CellTypeTank(CITank):
                 chi_events = self.tank.chi_peak_indices
                 print("Using peak indices data")
             
-            signal_length = len(self.tank.d1_denoised[0])
-            
-            # Create D1 binary signals
-            d1_binary = np.zeros((len(d1_events), signal_length))
-            for i, events in enumerate(d1_events):
-                for event in events:
-                    start = max(0, event - window_size//2)
-                    end = min(signal_length, event + window_size//2 + 1)
-                    d1_binary[i, start:end] = 1
-            
-            # Create D2 binary signals
-            d2_binary = np.zeros((len(d2_events), signal_length))
-            for i, events in enumerate(d2_events):
-                for event in events:
-                    start = max(0, event - window_size//2)
-                    end = min(signal_length, event + window_size//2 + 1)
-                    d2_binary[i, start:end] = 1
-            
-            # Create CHI binary signals
-            chi_binary = np.zeros((len(chi_events), signal_length))
-            for i, events in enumerate(chi_events):
-                for event in events:
-                    start = max(0, event - window_size//2)
-                    end = min(signal_length, event + window_size//2 + 1)
-                    chi_binary[i, start:end] = 1
-            
             binary_signals = {
-                'D1': d1_binary,
-                'D2': d2_binary,
-                'CHI': chi_binary
+                'D1': self._event_matrix(d1_events, window_size),
+                'D2': self._event_matrix(d2_events, window_size),
+                'CHI': self._event_matrix(chi_events, window_size)
             }
             
             return binary_signals
+
+        def _event_matrix(self, events, window_size):
+            """Sparse boolean neurons x time matrix, True within window_size around each event"""
+            counts = np.array([len(e) for e in events], dtype=int)
+            flat_events = np.concatenate([np.asarray(e, dtype=int).ravel() for e in events] + [np.zeros(0, dtype=int)])
+            rows = np.repeat(np.arange(len(events)), counts)
+
+            signal_length = len(self.tank.d1_denoised[0])
+            return self._interval_matrix(rows, flat_events - window_size // 2, flat_events + window_size // 2 + 1,
+                                         (len(events), signal_length))
+
+        def population_counts(self):
+            """Number of active neurons of each cell type at each time point"""
+            return {cell_type: self.binary_signals[cell_type].getnnz(axis=0) for cell_type in self.CELL_TYPES}
         
         def calculate_conditional_probabilities(self, time_windows=[5, 10, 20, 50]):
             """
@@ -3583,51 +3640,35 @@ class CellTypeTank(CITank):
             """
             print("Calculating conditional activation probabilities...")
             
+            cell_types = ['D1', 'D2', 'CHI']
+            time_windows = np.asarray(time_windows, dtype=int)
+
+            # Population activation (at least one neuron active), computed once for all windows
+            population = self.population_counts()
+            active = np.array([population[cell_type] > 0 for cell_type in cell_types])
+            signal_length = active.shape[1]
+
+            # B is active within (t, t + window] iff the cumulative sum of B increases over that range
+            # hits: (n_types, n_windows, n_times)
+            cumulative = np.concatenate([np.zeros((len(cell_types), 1), dtype=int), np.cumsum(active, axis=1)], axis=1)
+            starts = np.minimum(np.arange(signal_length) + 1, signal_length)
+            ends = np.minimum(np.arange(signal_length)[np.newaxis, :] + time_windows[:, np.newaxis] + 1, signal_length)
+            hits = (cumulative[:, ends] - cumulative[:, starts][:, np.newaxis, :]) > 0
+
+            # P(B activated | A activated) for all pairs and windows at once: (n_sources, n_targets, n_windows)
+            n_events = active.sum(axis=1)
+            counts = np.tensordot(active.astype(float), hits.astype(float), axes=([1], [2]))
+            probs = np.divide(counts, n_events[:, np.newaxis, np.newaxis],
+                              out=np.zeros_like(counts), where=n_events[:, np.newaxis, np.newaxis] > 0)
+
             results = {}
-            
-            for window in time_windows:
-                window_results = {}
-                
-                # Calculate population activation signals (how many neurons are active at each time point)
-                d1_population = np.sum(self.binary_signals['D1'], axis=0)
-                d2_population = np.sum(self.binary_signals['D2'], axis=0)
-                chi_population = np.sum(self.binary_signals['CHI'], axis=0)
-                
-                # Binarize population signals (at least one neuron active)
-                d1_active = (d1_population > 0).astype(int)
-                d2_active = (d2_population > 0).astype(int)
-                chi_active = (chi_population > 0).astype(int)
-                
-                # Calculate conditional probability P(B activated | A activated)
-                def calc_conditional_prob(signal_a, signal_b, window_size):
-                    """Calculate probability of B activation within window_size time after A activation"""
-                    a_events = np.where(signal_a == 1)[0]
-                    if len(a_events) == 0:
-                        return 0.0
-                    
-                    conditional_activations = 0
-                    for event in a_events:
-                        # Check time window after the event
-                        start = event + 1
-                        end = min(len(signal_b), event + window_size + 1)
-                        if start < len(signal_b) and np.any(signal_b[start:end]):
-                            conditional_activations += 1
-                    
-                    return conditional_activations / len(a_events)
-                
-                # Calculate conditional probabilities for all pairs
-                pairs = [('D1', 'D2'), ('D1', 'CHI'), ('D2', 'D1'), 
-                        ('D2', 'CHI'), ('CHI', 'D1'), ('CHI', 'D2')]
-                
-                signals = {'D1': d1_active, 'D2': d2_active, 'CHI': chi_active}
-                
-                for source, target in pairs:
-                    prob = calc_conditional_prob(signals[source], signals[target], window)
-                    window_results[f'{source}_to_{target}'] = prob
-                
-                results[f'window_{window}'] = window_results
-            
-            
+            for w, window in enumerate(time_windows):
+                results[f'window_{window}'] = {
+                    f'{source}_to_{target}': float(probs[i, j, w])
+                    for i, source in enumerate(cell_types)
+                    for j, target in enumerate(cell_types) if i != j
+                }
+
             return results
         
         def calculate_cross_correlations_from_peaks(self, max_lag=100):
@@ -3646,15 +3687,7 @@ class CellTypeTank(CITank):
             print("Calculating time-lagged cross-correlations from peak indices...")
             
             # Calculate population activation signals
-            d1_population = np.sum(self.binary_signals['D1'], axis=0)
-            d2_population = np.sum(self.binary_signals['D2'], axis=0)
-            chi_population = np.sum(self.binary_signals['CHI'], axis=0)
-            
-            signals = {
-                'D1': d1_population,
-                'D2': d2_population,
-                'CHI': chi_population
-            }
+            signals = {cell_type: counts.astype(float) for cell_type, counts in self.population_counts().items()}
             
             results = {}
             lags = np.arange(-max_lag, max_lag + 1)
@@ -3706,9 +3739,10 @@ class CellTypeTank(CITank):
             print("Identifying co-activation patterns from peak indices...")
             
             # Calculate population activation signals
-            d1_active = (np.sum(self.binary_signals['D1'], axis=0) > 0).astype(int)
-            d2_active = (np.sum(self.binary_signals['D2'], axis=0) > 0).astype(int)
-            chi_active = (np.sum(self.binary_signals['CHI'], axis=0) > 0).astype(int)
+            population = self.population_counts()
+            d1_active = (population['D1'] > 0).astype(int)
+            d2_active = (population['D2'] > 0).astype(int)
+            chi_active = (population['CHI'] > 0).astype(int)
             
             # Create combination activation patterns
             patterns = {
@@ -3745,108 +3779,146 @@ class CellTypeTank(CITank):
             
             return results
         
-        def calculate_peak_timing_relationships(self):
+        def typed_event_array(self, cell_types=None):
             """
-            Analyze peak timing relationships between different neural types
+            All peak times of the given cell types in one sorted array
+            
+            Parameters:
+            -----------
+            cell_types : list, optional
+                Subset of CELL_TYPES, all cell types if None
             
             Returns:
             --------
-            dict : Peak timing relationship analysis results
+            tuple : (sorted peak times in seconds, int8 code of each event, its index in CELL_TYPES)
+                Simultaneous events keep the CELL_TYPES order
             """
-            print("Analyzing peak timing relationships...")
+            cell_types = self.CELL_TYPES if cell_types is None else cell_types
+
+            times, codes = [], []
+            for cell_type in cell_types:
+                peaks = getattr(self.tank, f'{cell_type.lower()}_peak_indices')
+                flat_peaks = np.concatenate([np.asarray(p, dtype=float).ravel() for p in peaks] + [np.zeros(0)])
+                times.append(np.sort(flat_peaks) / self.tank.ci_rate)
+                codes.append(np.full(len(flat_peaks), self.CELL_TYPES.index(cell_type), dtype=np.int8))
+
+            times = np.concatenate(times)
+            codes = np.concatenate(codes)
+            order = np.argsort(times, kind='stable')
+            return times[order], codes[order]
+
+        def find_sequential_activations(self, window=1.0, max_sequence_length=5, cell_types=None):
+            """
+            Count the activation sequences starting at each peak: the cell types of the following peaks
+            within window seconds, up to max_sequence_length peaks
             
-            # Convert all peaks to time series
-            def peaks_to_times(peak_indices_list):
-                """Convert peak indices to time points (seconds)"""
-                all_times = []
-                for peaks in peak_indices_list:
-                    times = peaks / self.tank.ci_rate
-                    all_times.extend(times)
-                return np.array(sorted(all_times))
+            Each sequence is a row of cell type codes padded with -1, so that counting the sequences is a
+            single np.unique over the rows.
             
-            d1_times = peaks_to_times(self.tank.d1_peak_indices)
-            d2_times = peaks_to_times(self.tank.d2_peak_indices)
-            chi_times = peaks_to_times(self.tank.chi_peak_indices)
+            Parameters:
+            -----------
+            window : float
+                Time window after the first peak (in seconds)
+            max_sequence_length : int
+                Maximum number of peaks per sequence
+            cell_types : list, optional
+                Subset of CELL_TYPES to include, all cell types if None
             
-            results = {}
+            Returns:
+            --------
+            dict : Count of each sequence of at least 2 peaks, keyed by the tuple of cell types
+            """
+            times, codes = self.typed_event_array(cell_types)
+            n_events = len(times)
+            if n_events < 2 or max_sequence_length < 2:
+                return {}
+
+            # the sequence of each peak ends at the last peak with t <= t_start + window
+            starts = np.arange(n_events)
+            ends = np.searchsorted(times, times + window, side='right')
+
+            lengths = np.minimum(ends - starts, max_sequence_length)
+            starts, lengths = starts[lengths >= 2], lengths[lengths >= 2]
+            if len(starts) == 0:
+                return {}
+
+            offsets = np.arange(int(lengths.max()))
+            present = offsets < lengths[:, None]
+            code_matrix = np.where(present, codes[np.minimum(starts[:, None] + offsets, n_events - 1)], -1)
+            code_matrix = code_matrix.astype(np.int8)
+
+            # first occurrence order, like counting the sequences in time order
+            unique_rows, first_index, counts = np.unique(code_matrix, axis=0, return_index=True,
+                                                         return_counts=True)
+            order = np.argsort(first_index)
+
+            sequences = {}
+            for row, count in zip(unique_rows[order], counts[order]):
+                sequences[tuple(self.CELL_TYPES[code] for code in row if code >= 0)] = int(count)
+            return sequences
+
+        @staticmethod
+        def calc_peak_proximity(times1, times2, max_distance=2.0):
+            """
+            Distance from each peak of times1 to the nearest peak of times2, for the ones within max_distance
             
-            # Calculate inter-peak interval distributions
-            def calc_inter_peak_intervals(times):
-                if len(times) > 1:
-                    return np.diff(times)
+            Parameters:
+            -----------
+            times1, times2 : np.ndarray
+                Sorted peak times (in seconds)
+            max_distance : float
+                Maximum distance (in seconds)
+            
+            Returns:
+            --------
+            np.ndarray : Distances in the order of times1
+            """
+            if len(times1) == 0 or len(times2) == 0:
                 return np.array([])
+
+            right = np.clip(np.searchsorted(times2, times1), 0, len(times2) - 1)
+            left = np.clip(right - 1, 0, len(times2) - 1)
+            distances = np.minimum(np.abs(times2[right] - times1), np.abs(times1 - times2[left]))
+            return distances[distances <= max_distance]
+
+        def calculate_peak_timing_relationships(self, window=1.0, max_sequence_length=5, cell_types=None):
+            """
+            Analyze peak timing relationships between different neural types
             
-            results['inter_peak_intervals'] = {
-                'D1': calc_inter_peak_intervals(d1_times),
-                'D2': calc_inter_peak_intervals(d2_times),
-                'CHI': calc_inter_peak_intervals(chi_times)
-            }
+            Parameters:
+            -----------
+            window : float
+                Time window of the sequential activation patterns (in seconds)
+            max_sequence_length : int
+                Maximum number of peaks per sequential activation pattern
+            cell_types : list, optional
+                Cell types included in the sequential activation patterns, all if None
             
+            Returns:
+            --------
+            dict : Peak timing relationship analysis results
+            """
+            print("Analyzing peak timing relationships...")
+
+            times, codes = self.typed_event_array()
+            type_times = {cell_type: times[codes == i] for i, cell_type in enumerate(self.CELL_TYPES)}
+
+            results = {}
+
+            # Calculate inter-peak interval distributions
+            results['inter_peak_intervals'] = {cell_type: np.diff(type_times[cell_type])
+                                               for cell_type in self.CELL_TYPES}
+
             # Calculate temporal proximity between different types
-            def calc_peak_proximity(times1, times2, max_distance=2.0):
-                """Calculate temporal proximity between two peak time groups (within seconds)"""
-                proximities = []
-                for t1 in times1:
-                    distances = np.abs(times2 - t1)
-                    min_distance = np.min(distances) if len(distances) > 0 else np.inf
-                    if min_distance <= max_distance:
-                        proximities.append(min_distance)
-                return np.array(proximities)
-            
             results['peak_proximities'] = {
-                'D1_to_D2': calc_peak_proximity(d1_times, d2_times),
-                'D1_to_CHI': calc_peak_proximity(d1_times, chi_times),
-                'D2_to_D1': calc_peak_proximity(d2_times, d1_times),
-                'D2_to_CHI': calc_peak_proximity(d2_times, chi_times),
-                'CHI_to_D1': calc_peak_proximity(chi_times, d1_times),
-                'CHI_to_D2': calc_peak_proximity(chi_times, d2_times)
+                f'{source}_to_{target}': self.calc_peak_proximity(type_times[source], type_times[target])
+                for source in self.CELL_TYPES for target in self.CELL_TYPES if source != target
             }
-            
-            # Calculate sequential activation patterns (activation order within time window) - optimized version
-            def find_sequential_activations(times1, times2, times3, window=1.0, max_sequence_length=5):
-                """Find sequential activation patterns within time window, limiting sequence length"""
-                sequences = []
-                
-                # Combine all time points and mark types
-                all_events = []
-                for t in times1:
-                    all_events.append((t, 'D1'))
-                for t in times2:
-                    all_events.append((t, 'D2'))
-                for t in times3:
-                    all_events.append((t, 'CHI'))
-                
-                # Sort by time
-                all_events.sort(key=lambda x: x[0])
-                
-                # Find sequences within window, limiting sequence length
-                for i, (start_time, start_type) in enumerate(all_events):
-                    window_events = [(start_time, start_type)]
-                    
-                    for j in range(i+1, len(all_events)):
-                        event_time, event_type = all_events[j]
-                        if event_time - start_time <= window:
-                            window_events.append((event_time, event_type))
-                            # Limit sequence length
-                            if len(window_events) >= max_sequence_length:
-                                break
-                        else:
-                            break
-                    
-                    if len(window_events) >= 2:
-                        sequence = tuple([event[1] for event in window_events])
-                        sequences.append(sequence)
-                
-                return sequences
-            
-            sequences = find_sequential_activations(d1_times, d2_times, chi_times, 
-                                                  window=1.0, max_sequence_length=5)
-            
-            # Count sequence patterns
-            from collections import Counter
-            sequence_counts = Counter(sequences)
-            results['sequential_patterns'] = dict(sequence_counts)
-            
+
+            # Count sequential activation patterns (activation order within time window)
+            results['sequential_patterns'] = self.find_sequential_activations(
+                window=window, max_sequence_length=max_sequence_length, cell_types=cell_types)
+
             return results
         
         def calculate_mutual_information_from_peaks(self, bins=10):
@@ -3865,9 +3937,10 @@ class CellTypeTank(CITank):
             print("Calculating mutual information from peak data...")
             
             # Calculate population activation strength
-            d1_strength = np.sum(self.binary_signals['D1'], axis=0)
-            d2_strength = np.sum(self.binary_signals['D2'], axis=0)
-            chi_strength = np.sum(self.binary_signals['CHI'], axis=0)
+            population = self.population_counts()
+            d1_strength = population['D1']
+            d2_strength = population['D2']
+            chi_strength = population['CHI']
             
             # Discretize signals
             def discretize(signal, bins):
@@ -3898,6 +3971,151 @@ class CellTypeTank(CITank):
             self.mutual_information = results
             return results
         
+        @staticmethod
+        def _interval_matrix(rows, starts, stops, shape):
+            """
+            Sparse boolean matrix that is True over [starts, stops) in the given rows.
+            Intervals are clipped to the matrix and may overlap.
+            """
+            from scipy.sparse import csr_matrix
+
+            n_rows, n_cols = shape
+            starts = np.clip(starts, 0, n_cols)
+            stops = np.clip(stops, 0, n_cols)
+            keep = stops > starts
+            rows, starts, stops = rows[keep], starts[keep], stops[keep]
+            if len(rows) == 0:
+                return csr_matrix(shape, dtype=bool)
+
+            order = np.lexsort((starts, rows))
+            rows, starts, stops = rows[order], starts[order], stops[order]
+
+            # merge overlapping intervals; offsetting by row keeps the running end from leaking across rows
+            row_offset = rows.astype(np.int64) * (n_cols + 1)
+            running_end = np.maximum.accumulate(stops + row_offset)
+            new_group = np.ones(len(rows), dtype=bool)
+            new_group[1:] = starts[1:] + row_offset[1:] > running_end[:-1]
+            group_starts = np.flatnonzero(new_group)
+
+            rows, starts = rows[group_starts], starts[group_starts]
+            lengths = np.maximum.reduceat(stops, group_starts) - starts
+            cols = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, weights=lengths, minlength=n_rows))])
+
+            return csr_matrix((np.ones(len(cols), dtype=bool), cols, indptr.astype(np.int64)), shape=shape)
+
+        @staticmethod
+        def _matrix_runs(matrix):
+            """Rows, starts and (exclusive) stops of the runs of True values of a sparse boolean matrix"""
+            matrix = matrix.tocsr()
+            matrix.sort_indices()
+            rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+            cols = matrix.indices
+            new_run = np.ones(len(cols), dtype=bool)
+            new_run[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1] + 1)
+            run_starts = np.flatnonzero(new_run)
+            run_stops = np.append(run_starts[1:], len(cols))
+            return rows[run_starts], cols[run_starts], cols[run_stops - 1] + 1
+
+        def group_by_cell_type(self, matrix, labels, separator='_to_', exclude_self=True):
+            """
+            Split a neuron x neuron matrix into cell type blocks
+            
+            Parameters:
+            -----------
+            matrix : np.ndarray
+                (n_neurons, n_neurons) matrix, rows are sources and columns are targets
+            labels : np.ndarray
+                Cell type label of each neuron
+            separator : str
+                Separator of the block keys, e.g. 'D1_to_D2'
+            exclude_self : bool
+                Whether to leave the diagonal (neuron with itself) out of the block means
+            
+            Returns:
+            --------
+            tuple : (dict of blocks, dict of block means ignoring NaN)
+            """
+            blocks, means = {}, {}
+            for source in self.CELL_TYPES:
+                for target in self.CELL_TYPES:
+                    block = matrix[np.ix_(labels == source, labels == target)].astype(float)
+                    if exclude_self and source == target:
+                        np.fill_diagonal(block, np.nan)
+                    key = f'{source}{separator}{target}'
+                    blocks[key] = block
+                    means[key] = float(np.nanmean(block)) if np.any(np.isfinite(block)) else 0.0
+            return blocks, means
+
+        def calculate_neuron_connectivity(self, time_windows=[5, 10, 20, 50]):
+            """
+            Calculate neuron-to-neuron conditional activation probabilities and mutual information
+            
+            All pairwise counts come from sparse matrix products of the binary signals of all cell types stacked
+            into one activation matrix A (neurons x time):
+            A @ A.T counts the samples where both neurons are active, and A @ H.T, where H marks the samples
+            followed by an activation within the time window, counts the lagged co-activations.
+            
+            Parameters:
+            -----------
+            time_windows : list
+                Different time window sizes (in samples)
+            
+            Returns:
+            --------
+            dict : Neuron-level matrices (rows are sources, columns targets) and their cell type averages
+            """
+            print("Calculating neuron-level connectivity...")
+
+            from scipy.sparse import vstack
+
+            activity = vstack([self.binary_signals[cell_type] for cell_type in self.CELL_TYPES], format='csr')
+            labels = np.concatenate([np.full(self.binary_signals[cell_type].shape[0], cell_type)
+                                     for cell_type in self.CELL_TYPES])
+            n_samples = activity.shape[1]
+            activity_f = activity.astype(np.float64)
+            n_active = np.asarray(activity_f.sum(axis=1)).ravel()
+
+            coactivation = (activity_f @ activity_f.T).toarray()
+
+            # P(target activated within window | source activated) for every pair
+            rows, starts, stops = self._matrix_runs(activity)
+            conditional_probs = {}
+            for window in time_windows:
+                hits = self._interval_matrix(rows, starts - window, stops - 1, activity.shape).astype(np.float64)
+                counts = (activity_f @ hits.T).toarray()
+                conditional_probs[f'window_{window}'] = np.divide(counts, n_active[:, np.newaxis],
+                                                                  out=np.zeros_like(counts),
+                                                                  where=n_active[:, np.newaxis] > 0)
+
+            # Mutual information (nats) of the binary activation states from the 2x2 contingency of each pair
+            p_a = n_active / n_samples
+            joint = np.stack([coactivation,
+                              n_active[:, np.newaxis] - coactivation,
+                              n_active[np.newaxis, :] - coactivation,
+                              n_samples - n_active[:, np.newaxis] - n_active[np.newaxis, :] + coactivation]) / n_samples
+            marginal = np.stack([np.outer(p_a, p_a), np.outer(p_a, 1 - p_a),
+                                 np.outer(1 - p_a, p_a), np.outer(1 - p_a, 1 - p_a)])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                terms = np.where(joint > 0, joint * np.log(joint / marginal), 0.0)
+            mutual_information = terms.sum(axis=0)
+
+            grouped_probs = {window_key: self.group_by_cell_type(probs, labels)[1]
+                             for window_key, probs in conditional_probs.items()}
+            grouped_mi = self.group_by_cell_type(mutual_information, labels, separator='_vs_')[1]
+
+            return {
+                'cell_types': labels,
+                'n_active': n_active,
+                'coactivation_counts': coactivation,
+                'conditional_probs': conditional_probs,
+                'mutual_information': mutual_information,
+                'by_cell_type': {
+                    'conditional_probs': grouped_probs,
+                    'mutual_information': grouped_mi
+                }
+            }
+        
         def create_connectivity_network(self, threshold=0.1):
             """
             Create functional connectivity network
@@ -3994,6 +4212,13 @@ class CellTypeTank(CITank):
             print("\n6. Mutual Information:")
             for pair, mi in self.mutual_information.items():
                 print(f"   {pair}: {mi:.3f}")
+
+            if self.neuron_connectivity is not None:
+                print("\n7. Neuron-level Conditional Probabilities (mean over neuron pairs, shortest time window):")
+                grouped = self.neuron_connectivity['by_cell_type']['conditional_probs']
+                for connection, prob in grouped[list(grouped.keys())[0]].items():
+                    source, target = connection.split('_to_')
+                    print(f"   P({target} neuron activated|{source} neuron activated) = {prob:.3f}")
             
             print("\n" + "="*60)
         
@@ -4689,18 +4914,206 @@ class CellTypeTank(CITank):
             
             return results
 
-    def create_connectivity_analyzer(self):
+    def create_connectivity_analyzer(self, neuron_level=False):
         """
         Create and return a NeuralConnectivityAnalyzer instance for this tank
         
+        Parameters:
+        -----------
+        neuron_level : bool
+            Whether to also compute neuron-to-neuron connectivity matrices
+        
         Returns:
         --------
         NeuralConnectivityAnalyzer : Analyzer instance
         """
-        return self.NeuralConnectivityAnalyzer(self)
+        return self.NeuralConnectivityAnalyzer(self, neuron_level=neuron_level)
+
+    def _population_signals(self, signal_type):
+        if signal_type == 'zsc':
+            return {'D1': self.d1_zsc, 'D2': self.d2_zsc, 'CHI': self.chi_zsc}
+        elif signal_type == 'denoised':
+            return {'D1': self.d1_denoised, 'D2': self.d2_denoised, 'CHI': self.chi_denoised}
+        raise ValueError("signal_type must be 'zsc' or 'denoised'")
 
-    def _plot_population_centered_activity_core(self, center_cell_type, center_signals, center_peak_indices,
-                                               all_signals_dict, ci_rate=None, time_window=3.0,
+    def compute_population_centered_activity(self, signal_type='zsc', time_window=3.0):
+        """
+        Population-centered averages of every cell type at the peaks of every cell type.
+        
+        Averaging all neurons of a type at each peak time equals cutting the window out of the population
+        mean signal, so each population is averaged once and all windows are taken with one fancy index.
+        Only the in-bounds peaks and the mean and SEM traces are kept, the epochs of one (center, cell type)
+        pair at a time are cut while averaging; population_centered_epochs() cuts them on demand. The result
+        of the last (signal_type, time_window) is memoized, so the plot_*_population_analysis family costs a
+        single extraction; call clear_population_centered_cache() to free it.
+        
+        Parameters:
+        -----------
+        signal_type : str
+            Type of signal to use ('zsc' for z-score normalized, 'denoised' for denoised signals)
+        time_window : float
+            Time window in seconds before and after each peak
+        
+        Returns:
+        --------
+        dict
+            'time_axis', 'offsets' (samples), 'n_neurons' per cell type, 'has_velocity', 'population_means'
+            {cell_type: mean signal} and, per center cell type, a dict with 'n_peaks' (all peaks), 'peaks'
+            (the peaks whose window lies within the signals), 'velocity_valid' (the mask of those whose
+            window also lies within the velocity), 'n_valid', 'in_bounds_avg' {cell_type: mean over all
+            in-bounds peaks}, 'avg' and 'sem' {cell_type: trace over the valid peaks}, 'velocity_avg' and
+            'velocity_sem' (None without velocity)
+        """
+        key = (signal_type, time_window)
+        if key in self._population_centered_cache:
+            return self._population_centered_cache[key]
+
+        all_signals_dict = self._population_signals(signal_type)
+        window_samples = int(time_window * self.ci_rate)
+        offsets = np.arange(-window_samples, window_samples + 1)
+
+        signal_length = max(len(signals[0]) for signals in all_signals_dict.values() if len(signals) > 0)
+        population_means = {cell_type: np.mean(signals, axis=0) if len(signals) > 0 else np.zeros(signal_length)
+                            for cell_type, signals in all_signals_dict.items()}
+
+        has_velocity = hasattr(self, 'smoothed_velocity') and self.smoothed_velocity is not None
+
+        activity = {
+            'time_axis': np.linspace(-time_window, time_window, 2 * window_samples + 1),
+            'offsets': offsets,
+            'n_neurons': {cell_type: len(signals) for cell_type, signals in all_signals_dict.items()},
+            'has_velocity': has_velocity,
+            'population_means': population_means
+        }
+
+        for center_cell_type in all_signals_dict:
+            peak_indices = getattr(self, f'{center_cell_type.lower()}_peak_indices', [])
+            peaks = np.concatenate([np.asarray(p, dtype=int).ravel() for p in peak_indices] + [np.zeros(0, dtype=int)])
+
+            # window [peak - w, peak + w + 1) must start at 0 or later and end strictly before the last sample
+            in_bounds = peaks[(peaks - window_samples >= 0) & (peaks + window_samples + 1 < signal_length)]
+            windows = in_bounds[:, np.newaxis] + offsets
+
+            valid = np.ones(len(in_bounds), dtype=bool)
+            if has_velocity:
+                velocity = np.asarray(self.smoothed_velocity)
+                valid = in_bounds + window_samples + 1 < len(velocity)
+            n_valid = int(valid.sum())
+
+            center = {'n_peaks': len(peaks), 'peaks': in_bounds, 'velocity_valid': valid, 'n_valid': n_valid,
+                      'in_bounds_avg': {}, 'avg': {}, 'sem': {}, 'velocity_avg': None, 'velocity_sem': None}
+            for cell_type, mean_signal in population_means.items():
+                epochs = mean_signal[windows]
+                if len(in_bounds) > 0:
+                    center['in_bounds_avg'][cell_type] = epochs.mean(axis=0)
+                if n_valid > 0:
+                    center['avg'][cell_type] = epochs[valid].mean(axis=0)
+                    center['sem'][cell_type] = epochs[valid].std(axis=0) / np.sqrt(n_valid)
+            if has_velocity and n_valid > 0:
+                velocity_epochs = velocity[windows[valid]]
+                center['velocity_avg'] = velocity_epochs.mean(axis=0)
+                center['velocity_sem'] = velocity_epochs.std(axis=0) / np.sqrt(n_valid)
+            activity[center_cell_type] = center
+
+        # keep only the last result, the plots of one analysis share signal_type and time_window
+        self._population_centered_cache = {key: activity}
+        return activity
+
+    def population_centered_epochs(self, center_cell_type, cell_type, signal_type='zsc', time_window=3.0):
+        """
+        Population mean signal of a cell type around each in-bounds peak of the center cell type.
+        
+        Parameters:
+        -----------
+        center_cell_type : str
+            The cell type being centered ('D1', 'D2', or 'CHI')
+        cell_type : str
+            The cell type whose population mean is cut, or 'velocity'
+        signal_type : str
+            Type of signal to use ('zsc' for z-score normalized, 'denoised' for denoised signals)
+        time_window : float
+            Time window in seconds before and after each peak
+        
+        Returns:
+        --------
+        numpy.ndarray
+            (n_in_bounds, n_samples) epochs, for 'velocity' only the rows of the velocity_valid peaks
+        """
+        activity = self.compute_population_centered_activity(signal_type, time_window)
+        center = activity[center_cell_type]
+        windows = center['peaks'][:, np.newaxis] + activity['offsets']
+        if cell_type == 'velocity':
+            return np.asarray(self.smoothed_velocity)[windows[center['velocity_valid']]]
+        return activity['population_means'][cell_type][windows]
+
+    def clear_population_centered_cache(self):
+        """
+        Free the population-centered averages memoized by compute_population_centered_activity.
+        """
+        self._population_centered_cache.clear()
+
+    def population_centered_average(self, center_cell_type, signal_type='zsc', time_window=3.0):
+        """
+        Mean and SEM across center peaks of the population-centered epochs.
+        
+        Parameters:
+        -----------
+        center_cell_type : str
+            The cell type being centered ('D1', 'D2', or 'CHI')
+        signal_type : str
+            Type of signal to use ('zsc' for z-score normalized, 'denoised' for denoised signals)
+        time_window : float
+            Time window in seconds before and after each peak
+        
+        Returns:
+        --------
+        dict
+            'time_axis', 'n_peaks', 'n_valid', 'avg' and 'sem' {cell_type: trace}, 'velocity_avg' and
+            'velocity_sem' (None without velocity)
+        """
+        activity = self.compute_population_centered_activity(signal_type, time_window)
+        center = activity[center_cell_type]
+        return {'time_axis': activity['time_axis'], 'n_peaks': center['n_peaks'], 'n_valid': center['n_valid'],
+                'avg': center['avg'], 'sem': center['sem'],
+                'velocity_avg': center['velocity_avg'], 'velocity_sem': center['velocity_sem']}
+
+    def population_baseline_corrections(self, signal_type='zsc', time_window=3.0, baseline_window=(-3.0, -1.0)):
+        """
+        Correction factors shifting the baseline of every cell type to the lowest one.
+        
+        The baseline of a cell type is the mean over baseline_window of its population-centered average,
+        averaged over the center cell types.
+        
+        Parameters:
+        -----------
+        signal_type : str
+            Type of signal to use ('zsc' for z-score normalized, 'denoised' for denoised signals)
+        time_window : float
+            Time window in seconds before and after each peak
+        baseline_window : tuple
+            Time window (start, end) in seconds for baseline calculation (relative to peak time)
+        
+        Returns:
+        --------
+        tuple
+            (baseline values, correction factors), both {cell_type: value}
+        """
+        activity = self.compute_population_centered_activity(signal_type, time_window)
+        time_axis = activity['time_axis']
+        baseline_mask = (time_axis >= baseline_window[0]) & (time_axis <= baseline_window[1])
+
+        baselines = {}
+        for cell_type, n_neurons in activity['n_neurons'].items():
+            values = [activity[center_cell_type]['in_bounds_avg'][cell_type][baseline_mask].mean()
+                      for center_cell_type in activity['n_neurons']
+                      if n_neurons > 0 and cell_type in activity[center_cell_type]['in_bounds_avg']]
+            baselines[cell_type] = np.mean(values) if values else 0.0
+
+        target_baseline = min(baselines.values()) if baselines else 0.0
+        correction_factors = {cell_type: target_baseline - baseline for cell_type, baseline in baselines.items()}
+        return baselines, correction_factors
+
+    def _plot_population_centered_activity_core(self, center_cell_type, signal_type='zsc', time_window=3.0,
                                                save_path=None, title=None, notebook=False, overwrite=False, font_size=None,
                                                baseline_correct=False, correction_factors=None):
         """
@@ -4714,14 +5127,8 @@ class CellTypeTank(CITank):
         -----------
         center_cell_type : str
             The cell type being centered ('D1', 'D2', or 'CHI')
-        center_signals : numpy.ndarray
-            Signals for the center cell type (shape: n_neurons x n_timepoints)
-        center_peak_indices : list
-            List of arrays containing peak indices for each center neuron
-        all_signals_dict : dict
-            Dictionary with all cell type signals {'D1': signals, 'D2': signals, 'CHI': signals}
-        ci_rate : float, optional
-            Sampling rate of calcium imaging data (Hz). If None, uses self.ci_rate
+        signal_type : str
+            Type of signal to use ('zsc' for z-score normalized, 'denoised' for denoised signals)
         time_window : float
             Time window in seconds before and after each peak for plotting
         save_path : str, optional
@@ -4748,122 +5155,43 @@ class CellTypeTank(CITank):
         from bokeh.plotting import figure
         from bokeh.models import LinearAxis, Range1d
         
-        if ci_rate is None:
-            ci_rate = self.ci_rate
-        
         if correction_factors is None:
             correction_factors = {'D1': 0, 'D2': 0, 'CHI': 0}
         
-        # Convert time window to samples
-        plot_window_samples = int(time_window * ci_rate)
-        
-        # Collect all center peak time indices
-        all_center_peak_times = []
-        for neuron_idx, peaks in enumerate(center_peak_indices):
-            for peak_idx in peaks:
-                all_center_peak_times.append(peak_idx)
+        activity = self.compute_population_centered_activity(signal_type, time_window)
+        average = self.population_centered_average(center_cell_type, signal_type, time_window)
+        has_velocity = activity['has_velocity']
         
-        if not all_center_peak_times:
+        if average['n_peaks'] == 0:
             print(f"No {center_cell_type} peaks found for analysis.")
             return None, None
         
-        print(f"Found {len(all_center_peak_times)} total {center_cell_type} peaks for population analysis")
-        
-        # Collect traces for each cell type at all center peak times
-        all_cell_type_traces = {cell_type: [] for cell_type in all_signals_dict.keys()}
-        all_velocity_traces = []
-        valid_peak_count = 0
-        
-        # Check if velocity data is available
-        has_velocity = hasattr(self, 'smoothed_velocity') and self.smoothed_velocity is not None
-        if has_velocity:
-            velocity_data = self.smoothed_velocity
-            # Convert velocity sampling rate if needed (assuming velocity is at vm_rate)
-            if hasattr(self, 'vm_rate') and self.vm_rate != ci_rate:
-                # Resample velocity to match ci_rate if needed
-                # For now, assume they're aligned or close enough
-                pass
-        
-        for peak_idx in all_center_peak_times:
-            start_idx = peak_idx - plot_window_samples
-            end_idx = peak_idx + plot_window_samples + 1
-            
-            # Check if the window is within bounds for all signal types
-            valid_window = True
-            for cell_type, signals in all_signals_dict.items():
-                if len(signals) > 0:
-                    signal_length = len(signals[0])  # Assuming all neurons have same length
-                    if start_idx < 0 or end_idx >= signal_length:
-                        valid_window = False
-                        break
-            
-            # Also check velocity bounds if available
-            if has_velocity and valid_window:
-                if start_idx < 0 or end_idx >= len(velocity_data):
-                    valid_window = False
-            
-            if valid_window:
-                valid_peak_count += 1
-                
-                # For each cell type, average ALL neurons at this time point
-                for cell_type, signals in all_signals_dict.items():
-                    if len(signals) > 0:
-                        # Extract traces from ALL neurons of this cell type
-                        traces_at_peak = []
-                        for neuron_signal in signals:
-                            trace = neuron_signal[start_idx:end_idx]
-                            traces_at_peak.append(trace)
-                        
-                        # Average across all neurons of this cell type at this peak time
-                        avg_trace_at_peak = np.mean(traces_at_peak, axis=0)
-                        all_cell_type_traces[cell_type].append(avg_trace_at_peak)
-                    else:
-                        # If no neurons of this type, add zeros
-                        trace_length = 2 * plot_window_samples + 1
-                        all_cell_type_traces[cell_type].append(np.zeros(trace_length))
-                
-                # Extract velocity trace at this peak time
-                if has_velocity:
-                    velocity_trace = velocity_data[start_idx:end_idx]
-                    all_velocity_traces.append(velocity_trace)
+        print(f"Found {average['n_peaks']} total {center_cell_type} peaks for population analysis")
         
+        valid_peak_count = average['n_valid']
         if valid_peak_count == 0:
             print(f"No valid {center_cell_type} peaks found within signal bounds.")
             return None, None
         
-        # Calculate final average traces across all peak events
-        final_avg_traces = {}
-        final_sem_traces = {}
+        final_avg_traces = {cell_type: trace.copy() for cell_type, trace in average['avg'].items()}
+        final_sem_traces = average['sem']
         
-        for cell_type in all_signals_dict.keys():
-            if all_cell_type_traces[cell_type]:
-                final_avg_traces[cell_type] = np.mean(all_cell_type_traces[cell_type], axis=0)
-                final_sem_traces[cell_type] = np.std(all_cell_type_traces[cell_type], axis=0) / np.sqrt(len(all_cell_type_traces[cell_type]))
-                
-                # Apply baseline correction if requested
-                if baseline_correct and cell_type in correction_factors:
+        # Apply baseline correction if requested
+        if baseline_correct:
+            for cell_type in final_avg_traces:
+                if cell_type in correction_factors:
                     correction_factor = correction_factors[cell_type]
                     final_avg_traces[cell_type] += correction_factor
                     # Note: SEM doesn't need correction as it's a relative measure
                     print(f"Applied baseline correction to {cell_type}: {correction_factor:.4f}")
-            else:
-                trace_length = 2 * plot_window_samples + 1
-                final_avg_traces[cell_type] = np.zeros(trace_length)
-                final_sem_traces[cell_type] = np.zeros(trace_length)
-        
-        # Calculate average velocity trace
-        avg_velocity_trace = None
-        sem_velocity_trace = None
-        if has_velocity and all_velocity_traces:
-            avg_velocity_trace = np.mean(all_velocity_traces, axis=0)
-            sem_velocity_trace = np.std(all_velocity_traces, axis=0) / np.sqrt(len(all_velocity_traces))
         
-        # Create time axis
-        time_axis = np.linspace(-time_window, time_window, 2 * plot_window_samples + 1)
+        avg_velocity_trace = average['velocity_avg']
+        sem_velocity_trace = average['velocity_sem']
+        time_axis = average['time_axis']
         
         # Create summary statistics
         stats = {
-            f'total_{center_cell_type.lower()}_peaks': len(all_center_peak_times),
+            f'total_{center_cell_type.lower()}_peaks': average['n_peaks'],
             'valid_peaks_analyzed': valid_peak_count,
             'n_traces_averaged': valid_peak_count,
             'has_velocity': has_velocity,
@@ -4875,8 +5203,8 @@ class CellTypeTank(CITank):
             stats['correction_factors'] = correction_factors.copy()
         
         # Add neuron counts for each cell type
-        for cell_type, signals in all_signals_dict.items():
-            stats[f'n_{cell_type.lower()}_neurons'] = len(signals)
+        for cell_type, n_neurons in activity['n_neurons'].items():
+            stats[f'n_{cell_type.lower()}_neurons'] = n_neurons
         
         # Create the plot
         plot_title = (f"{title or f'{center_cell_type}-Centered Population Analysis'}\n"
@@ -4916,7 +5244,7 @@ class CellTypeTank(CITank):
         colors = {'D1': 'blue', 'D2': 'red', 'CHI': 'green'}
         
         # Plot traces for each cell type (on left y-axis)
-        for cell_type in all_signals_dict.keys():
+        for cell_type in activity['n_neurons']:
             if cell_type in final_avg_traces:
                 color = colors.get(cell_type, 'black')
                 line_width = 3 if cell_type == center_cell_type else 2
@@ -4985,8 +5313,8 @@ class CellTypeTank(CITank):
         print(f"\n{center_cell_type}-Centered Population Analysis Summary:")
         print(f"Total {center_cell_type} peaks found: {stats[f'total_{center_cell_type.lower()}_peaks']}")
         print(f"Valid peaks analyzed: {stats['valid_peaks_analyzed']}")
-        for cell_type, signals in all_signals_dict.items():
-            print(f"{cell_type} neurons included: {len(signals)}")
+        for cell_type, n_neurons in activity['n_neurons'].items():
+            print(f"{cell_type} neurons included: {n_neurons}")
         if has_velocity:
             print(f"Velocity data included: Yes (smoothed)")
         else:
@@ -5037,42 +5365,11 @@ class CellTypeTank(CITank):
         tuple
             (bokeh.plotting.figure, dict) - The created figure and summary statistics
         """
-        # Get signals based on type
-        if signal_type == 'zsc':
-            d1_signals = self.d1_zsc
-            d2_signals = self.d2_zsc
-            chi_signals = self.chi_zsc
-            signal_description = 'Z-score Normalized'
-        elif signal_type == 'denoised':
-            d1_signals = self.d1_denoised
-            d2_signals = self.d2_denoised
-            chi_signals = self.chi_denoised
-            signal_description = 'Denoised'
-        else:
+        if signal_type not in ('zsc', 'denoised'):
             raise ValueError("signal_type must be 'zsc' or 'denoised'")
+        signal_description = 'Z-score Normalized' if signal_type == 'zsc' else 'Denoised'
         
-        # Get peak indices
-        d1_peak_indices = self.d1_peak_indices if hasattr(self, 'd1_peak_indices') else []
-        d2_peak_indices = self.d2_peak_indices if hasattr(self, 'd2_peak_indices') else []
-        chi_peak_indices = self.chi_peak_indices if hasattr(self, 'chi_peak_indices') else []
-        
-        # Prepare signals and peak indices based on center cell type
-        all_signals_dict = {
-            'D1': d1_signals,
-            'D2': d2_signals, 
-            'CHI': chi_signals
-        }
-        
-        if center_cell_type == 'D1':
-            center_signals = d1_signals
-            center_peak_indices = d1_peak_indices
-        elif center_cell_type == 'D2':
-            center_signals = d2_signals
-            center_peak_indices = d2_peak_indices
-        elif center_cell_type == 'CHI':
-            center_signals = chi_signals
-            center_peak_indices = chi_peak_indices
-        else:
+        if center_cell_type not in ('D1', 'D2', 'CHI'):
             raise ValueError("center_cell_type must be 'D1', 'D2', or 'CHI'")
         
         # Generate title if not provided
@@ -5082,10 +5379,7 @@ class CellTypeTank(CITank):
         # Call the core function
         return self._plot_population_centered_activity_core(
             center_cell_type=center_cell_type,
-            center_signals=center_signals,
-            center_peak_indices=center_peak_indices,
-            all_signals_dict=all_signals_dict,
-            ci_rate=self.ci_rate,
+            signal_type=signal_type,
             time_window=time_window,
             save_path=save_path,
             title=title,
@@ -5130,107 +5424,23 @@ class CellTypeTank(CITank):
             Dictionary containing plots and statistics for all three analyses
         """
         from bokeh.layouts import column
-        from bokeh.io import output_file, save
-        import numpy as np
         
         results = {}
         signal_description = 'Z-score' if signal_type == 'zsc' else 'Denoised'
         
-        # First pass: collect all traces to calculate global baseline correction
-        all_traces = {'D1': [], 'D2': [], 'CHI': []}
-        
         if baseline_correct:
             print(f"Calculating baseline correction factors...")
             
-            # Get signals based on type
-            if signal_type == 'zsc':
-                d1_signals = self.d1_zsc
-                d2_signals = self.d2_zsc
-                chi_signals = self.chi_zsc
-            elif signal_type == 'denoised':
-                d1_signals = self.d1_denoised
-                d2_signals = self.d2_denoised
-                chi_signals = self.chi_denoised
-            else:
-                raise ValueError("signal_type must be 'zsc' or 'denoised'")
-            
-            # Get peak indices
-            d1_peak_indices = self.d1_peak_indices if hasattr(self, 'd1_peak_indices') else []
-            d2_peak_indices = self.d2_peak_indices if hasattr(self, 'd2_peak_indices') else []
-            chi_peak_indices = self.chi_peak_indices if hasattr(self, 'chi_peak_indices') else []
-            
-            all_signals_dict = {
-                'D1': d1_signals,
-                'D2': d2_signals, 
-                'CHI': chi_signals
-            }
-            
-            all_peak_indices_dict = {
-                'D1': d1_peak_indices,
-                'D2': d2_peak_indices,
-                'CHI': chi_peak_indices
-            }
-            
-            # Calculate average traces for each cell type across all analysis types
-            for center_type in ['D1', 'D2', 'CHI']:
-                center_peak_indices = all_peak_indices_dict[center_type]
-                
-                # Collect all center peak times
-                all_center_peak_times = []
-                for neuron_idx, peaks in enumerate(center_peak_indices):
-                    for peak_idx in peaks:
-                        all_center_peak_times.append(peak_idx)
-                
-                if all_center_peak_times:
-                    plot_window_samples = int(time_window * self.ci_rate)
-                    
-                    # Collect traces for each cell type at center peak times
-                    for cell_type, signals in all_signals_dict.items():
-                        if len(signals) > 0:
-                            cell_type_traces = []
-                            for peak_idx in all_center_peak_times:
-                                start_idx = peak_idx - plot_window_samples
-                                end_idx = peak_idx + plot_window_samples + 1
-                                
-                                # Check bounds
-                                if start_idx >= 0 and end_idx < len(signals[0]):
-                                    # Average all neurons of this cell type at this peak time
-                                    traces_at_peak = [neuron_signal[start_idx:end_idx] for neuron_signal in signals]
-                                    avg_trace_at_peak = np.mean(traces_at_peak, axis=0)
-                                    cell_type_traces.append(avg_trace_at_peak)
-                            
-                            if cell_type_traces:
-                                # Calculate final average trace for this cell type in this analysis
-                                final_avg_trace = np.mean(cell_type_traces, axis=0)
-                                all_traces[cell_type].append(final_avg_trace)
-            
-            # Calculate baseline values for each cell type
-            baseline_corrections = {}
-            time_axis = np.linspace(-time_window, time_window, 2 * int(time_window * self.ci_rate) + 1)
-            baseline_mask = (time_axis >= baseline_window[0]) & (time_axis <= baseline_window[1])
-            
-            for cell_type in ['D1', 'D2', 'CHI']:
-                if all_traces[cell_type]:
-                    # Calculate average baseline across all analysis types for this cell type
-                    all_baselines = []
-                    for trace in all_traces[cell_type]:
-                        baseline_value = np.mean(trace[baseline_mask])
-                        all_baselines.append(baseline_value)
-                    baseline_corrections[cell_type] = np.mean(all_baselines)
-                else:
-                    baseline_corrections[cell_type] = 0.0
-            
-            # Calculate the target baseline (minimum baseline to shift all to)
+            # The epochs extracted here are reused by the three analyses below
+            baseline_corrections, correction_factors = self.population_baseline_corrections(
+                signal_type=signal_type, time_window=time_window, baseline_window=baseline_window)
             target_baseline = min(baseline_corrections.values()) if baseline_corrections else 0.0
             
             print(f"Baseline values: D1={baseline_corrections.get('D1', 0):.4f}, "
                   f"D2={baseline_corrections.get('D2', 0):.4f}, CHI={baseline_corrections.get('CHI', 0):.4f}")
             print(f"Target baseline: {target_baseline:.4f}")
             
-            # Calculate correction factors
-            correction_factors = {}
             for cell_type in ['D1', 'D2', 'CHI']:
-                correction_factors[cell_type] = target_baseline - baseline_corrections.get(cell_type, 0)
                 print(f"{cell_type} correction factor: {correction_factors[cell_type]:.4f}")
         else:
             correction_factors = {'D1': 0, 'D2': 0, 'CHI': 0}
@@ -0,0 +1,213 @@
+import numpy as np
+
+
+class ConnectivityGraph:
+    """
+    Sparse store of significant pairwise correlations between neurons.
+
+    Edges are kept in CSR form (indptr, indices, weights) so memory scales with the
+    number of significant pairs instead of N^2. Every undirected edge is stored in both
+    directions, which makes the neighbours of neuron i a contiguous slice
+    indptr[i]:indptr[i + 1].
+    """
+
+    def __init__(self, indptr, indices, weights, neuron_num):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.signs = np.sign(self.weights).astype(np.int8)
+        self.neuron_num = int(neuron_num)
+        self.rows = np.repeat(np.arange(self.neuron_num, dtype=np.int32), np.diff(self.indptr))
+
+        # per-group edge indices sorted by descending |weight|, filled in by build_group_index()
+        self.group_index = {}
+
+        # per-edge segment endpoints, filled in by attach_coordinates()
+        self.x0 = self.y0 = self.x1 = self.y1 = None
+
+    @property
+    def edge_num(self):
+        """Number of stored (directed) edges."""
+        return len(self.indices)
+
+    @classmethod
+    def from_edges(cls, rows, cols, weights, neuron_num, symmetric=True):
+        """
+        Build a graph from an edge list.
+        :param rows: source neuron index of each edge
+        :param cols: target neuron index of each edge
+        :param weights: correlation value of each edge
+        :param neuron_num: total number of neurons
+        :param symmetric: if True, each (i, j) edge is mirrored as (j, i)
+        :return: ConnectivityGraph
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float32)
+
+        keep = (rows != cols) & (weights != 0)
+        rows, cols, weights = rows[keep], cols[keep], weights[keep]
+
+        if symmetric:
+            rows, cols = np.concatenate([rows, cols]), np.concatenate([cols, rows])
+            weights = np.concatenate([weights, weights])
+
+        order = np.lexsort((cols, rows))
+        rows, cols, weights = rows[order], cols[order], weights[order]
+
+        # drop duplicated pairs (e.g. when both (i, j) and (j, i) were given)
+        if len(rows) > 0:
+            unique = np.ones(len(rows), dtype=bool)
+            unique[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+            rows, cols, weights = rows[unique], cols[unique], weights[unique]
+
+        indptr = np.zeros(neuron_num + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=neuron_num), out=indptr[1:])
+
+        return cls(indptr, cols, weights, neuron_num)
+
+    @classmethod
+    def from_dense(cls, correlation_matrix, threshold=0.0):
+        """
+        Build a graph from a dense N x N correlation matrix, keeping |r| > threshold.
+        :param correlation_matrix: dense correlation matrix (e.g. the legacy *_cor.npy)
+        :param threshold: absolute correlation below or equal to which edges are dropped
+        :return: ConnectivityGraph
+        """
+        correlation_matrix = np.asarray(correlation_matrix)
+        rows, cols = np.nonzero(np.abs(correlation_matrix) > threshold)
+        return cls.from_edges(rows, cols, correlation_matrix[rows, cols], correlation_matrix.shape[0],
+                              symmetric=False)
+
+    def to_dense(self):
+        """Expand the graph back into a dense N x N matrix."""
+        dense = np.zeros((self.neuron_num, self.neuron_num), dtype=np.float32)
+        dense[self.rows, self.indices] = self.weights
+        return dense
+
+    def save(self, path):
+        """Save the graph to a compressed .npz file."""
+        np.savez_compressed(path, indptr=self.indptr, indices=self.indices, weights=self.weights,
+                            neuron_num=self.neuron_num)
+
+    @classmethod
+    def load(cls, path):
+        """Load a graph previously written by save()."""
+        with np.load(path) as data:
+            return cls(data['indptr'], data['indices'], data['weights'], int(data['neuron_num']))
+
+    def neighbors(self, index):
+        """
+        Neighbours of a neuron.
+        :param index: neuron index
+        :return: (neighbour indices, weights) as views into the CSR arrays
+        """
+        start, end = self.indptr[index], self.indptr[index + 1]
+        return self.indices[start:end], self.weights[start:end]
+
+    def attach_coordinates(self, coordinates):
+        """
+        Precompute the segment endpoints of every edge so that adjacency lookups return
+        ready-to-plot arrays.
+        :param coordinates: (N, 2) array of neuron positions (e.g. flipped centroids)
+        """
+        coordinates = np.asarray(coordinates, dtype=np.float32)
+        self.x0, self.y0 = coordinates[self.rows, 0], coordinates[self.rows, 1]
+        self.x1, self.y1 = coordinates[self.indices, 0], coordinates[self.indices, 1]
+
+    def segments(self, index):
+        """
+        Segment arrays for all edges of a neuron; requires attach_coordinates() first.
+        :param index: neuron index
+        :return: dict with x0, y0, x1, y1, weights and signs, all views into prebuilt arrays
+        """
+        if self.x0 is None:
+            raise ValueError("Coordinates not attached, call attach_coordinates() first.")
+
+        sl = slice(self.indptr[index], self.indptr[index + 1])
+        return dict(x0=self.x0[sl], y0=self.y0[sl], x1=self.x1[sl], y1=self.y1[sl],
+                    weights=self.weights[sl], signs=self.signs[sl])
+
+    def edges_incident(self, nodes):
+        """
+        Edges touching any of the given neurons, each undirected edge listed once.
+        :param nodes: neuron indices
+        :return: edge indices into the CSR arrays
+        """
+        nodes = np.unique(np.asarray(nodes, dtype=np.int64))
+        if len(nodes) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        starts = self.indptr[nodes]
+        lengths = self.indptr[nodes + 1] - starts
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        edge_idx = offsets + np.arange(lengths.sum())
+
+        # an edge between two given neurons shows up in both rows, keep the (low, high) copy
+        mask = np.zeros(self.neuron_num, dtype=bool)
+        mask[nodes] = True
+        cols = self.indices[edge_idx]
+        return edge_idx[~mask[cols] | (self.rows[edge_idx] < cols)]
+
+    def edges_among(self, nodes):
+        """
+        Edges with both endpoints in the given neurons, each undirected edge listed once.
+        :param nodes: neuron indices
+        :return: edge indices into the CSR arrays
+        """
+        mask = np.zeros(self.neuron_num, dtype=bool)
+        mask[np.asarray(nodes, dtype=np.int64)] = True
+        return np.flatnonzero(mask[self.rows] & mask[self.indices] & (self.rows < self.indices))
+
+    def prune_edges(self, edge_idx, threshold=0.0, max_edges=None):
+        """
+        Keep the strongest edges so the number of rendered glyphs stays bounded.
+        :param edge_idx: edge indices into the CSR arrays
+        :param threshold: minimum |weight| to keep
+        :param max_edges: maximum number of edges to keep, strongest first
+        :return: pruned edge indices, sorted by descending |weight|
+        """
+        edge_idx = np.asarray(edge_idx, dtype=np.int64)
+        strengths = np.abs(self.weights[edge_idx])
+        order = np.argsort(-strengths, kind='stable')
+        count = np.searchsorted(-strengths[order], -threshold, side='right')
+        if max_edges is not None:
+            count = min(count, max_edges)
+        return edge_idx[order[:count]]
+
+    def build_group_index(self, groups):
+        """
+        Precompute the edges within each group (e.g. neuron category), strongest first, so that
+        switching between groups only slices precomputed arrays.
+        :param groups: dict mapping group name to neuron indices
+        """
+        self.group_index = {}
+        for name, nodes in groups.items():
+            edge_idx = self.prune_edges(self.edges_among(nodes))
+            self.group_index[name] = (edge_idx, np.abs(self.weights[edge_idx]))
+
+    def group_edges(self, name, threshold=0.0, max_edges=None):
+        """
+        Edges within a group from the precomputed index.
+        :param name: group name passed to build_group_index()
+        :param threshold: minimum |weight| to keep
+        :param max_edges: maximum number of edges to keep, strongest first
+        :return: edge indices into the CSR arrays
+        """
+        edge_idx, strengths = self.group_index[name]
+        count = np.searchsorted(-strengths, -threshold, side='right')
+        if max_edges is not None:
+            count = min(count, max_edges)
+        return edge_idx[:count]
+
+    def edge_segments(self, edge_idx):
+        """
+        Segment arrays for an arbitrary set of edges; requires attach_coordinates() first.
+        :param edge_idx: edge indices into the CSR arrays
+        :return: dict with x0, y0, x1, y1, weights and signs
+        """
+        if self.x0 is None:
+            raise ValueError("Coordinates not attached, call attach_coordinates() first.")
+
+        return dict(x0=self.x0[edge_idx], y0=self.y0[edge_idx], x1=self.x1[edge_idx], y1=self.y1[edge_idx],
+                    weights=self.weights[edge_idx], signs=self.signs[edge_idx])
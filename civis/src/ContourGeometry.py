@@ -0,0 +1,139 @@
+import os
+import numpy as np
+
+
+class ContourGeometry:
+    """
+    Packed ROI contour geometry.
+
+    All contours are stored in one flat float32 (V, 2) vertex buffer plus an offsets array,
+    contour i being vertices[offsets[i]:offsets[i + 1]]. A y-flipped copy (height - y, for
+    plotting with the image origin at the bottom left) is precomputed when the image height
+    is known.
+
+    Indexing returns a (2, k) array view like the entries of the former Coor list, so a
+    ContourGeometry can be used wherever a list of Coor arrays was expected.
+    """
+
+    def __init__(self, vertices, offsets, height=None):
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 2)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.height = None
+        self.flipped_vertices = None
+        if height is not None:
+            self.set_height(height)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.vertices[self.offsets[index]:self.offsets[index + 1]].T
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def take(self, indices):
+        """
+        Contours of the given ROIs, in that order, packed in a new ContourGeometry.
+        :param indices: ROI indices
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        sizes = self.offsets[indices + 1] - self.offsets[indices]
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+
+        vertex_index = np.repeat(self.offsets[indices] - offsets[:-1], sizes) + np.arange(offsets[-1])
+        return ContourGeometry(self.vertices[vertex_index], offsets, self.height)
+
+    @classmethod
+    def from_h5(cls, file, height=None):
+        """
+        Read all contours of the 'data/Coor' cell array in one pass over the references.
+        :param file: open h5py.File of the *_v7.mat file
+        :param height: image height, used to precompute the flipped vertices
+        :return: ContourGeometry
+        """
+        refs = file['data']['Coor'][()].ravel()
+        datasets = [file[ref] for ref in refs]
+
+        # MATLAB stores each 2 x k contour as a (k, 2) dataset, empty contours as a 1-D shape array
+        sizes = np.array([ds.shape[0] if ds.ndim == 2 else 0 for ds in datasets], dtype=np.int64)
+        offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+
+        vertices = np.empty((offsets[-1], 2), dtype=np.float32)
+        for ds, start, end in zip(datasets, offsets[:-1], offsets[1:]):
+            if end > start:
+                ds.read_direct(vertices, dest_sel=np.s_[start:end])
+
+        return cls(vertices, offsets, height)
+
+    @staticmethod
+    def cache_path(filename):
+        return f"{os.path.splitext(filename)[0]}_contours.npz"
+
+    @classmethod
+    def load(cls, filename, file=None, height=None, use_cache=True):
+        """
+        Load the contours of a *_v7.mat file, using the packed .npz cache next to it when it is up to date.
+        :param filename: path to the .mat file
+        :param file: already open h5py.File for filename, opened here if None and the cache is stale
+        :param height: image height, used to precompute the flipped vertices
+        :param use_cache: read and write the .npz cache
+        :return: ContourGeometry
+        """
+        cache_path = cls.cache_path(filename)
+        if use_cache and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(filename):
+            with np.load(cache_path) as data:
+                return cls(data['vertices'], data['offsets'], height)
+
+        if file is None:
+            import h5py
+            with h5py.File(filename, 'r') as h5_file:
+                contours = cls.from_h5(h5_file, height)
+        else:
+            contours = cls.from_h5(file, height)
+
+        if use_cache:
+            try:
+                contours.save(cache_path)
+            except OSError as e:
+                print(f"Could not cache contours: {e}")
+
+        return contours
+
+    def save(self, path):
+        np.savez(path, vertices=self.vertices, offsets=self.offsets)
+
+    def set_height(self, height):
+        """Precompute the flipped vertices for a given image height."""
+        self.height = height
+        self.flipped_vertices = self.vertices.copy()
+        self.flipped_vertices[:, 1] = height - self.vertices[:, 1]
+
+    def xs(self, indices=None):
+        """
+        Per-ROI x coordinates as views into the vertex buffer (e.g. for Bokeh patches).
+        :param indices: ROI indices, all ROIs if None
+        """
+        return self._split(self.vertices[:, 0], indices)
+
+    def ys(self, flipped=False, indices=None):
+        """
+        Per-ROI y coordinates as views into the vertex buffer (e.g. for Bokeh patches).
+        :param flipped: return height - y, requires a known height
+        :param indices: ROI indices, all ROIs if None
+        """
+        if flipped:
+            if self.flipped_vertices is None:
+                raise ValueError("Image height unknown, pass height or call set_height() first.")
+            return self._split(self.flipped_vertices[:, 1], indices)
+        return self._split(self.vertices[:, 1], indices)
+
+    def _split(self, column, indices):
+        # one contiguous copy of the column so every per-ROI slice is a contiguous view
+        column = np.ascontiguousarray(column)
+        if indices is None:
+            return np.split(column, self.offsets[1:-1])
+        return [column[self.offsets[i]:self.offsets[i + 1]] for i in indices]
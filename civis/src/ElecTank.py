@@ -1,7 +1,30 @@
 import numpy as np
-import tdt
 import os
+import hashlib
 from .VirmenTank import VirmenTank
+from .LFPIngest import LFPIngest
+from .TFRPyramid import TFRPyramid
+
+# Default frequency grid and time decimation of the session-wide TFR cache
+DEFAULT_TFR_FREQS = np.arange(1, 100, 0.5)
+DEFAULT_TFR_DECIM = 5
+# Number of frequencies passed to tfr_array_morlet at once, bounds peak memory while filling the cache
+TFR_FREQ_CHUNK = 20
+
+# Fields of the structured array returned by ElecTank.detect_bursts(), times in seconds
+BURST_DTYPE = np.dtype([('onset', 'f8'), ('offset', 'f8'), ('duration', 'f8'), ('peak_time', 'f8'),
+                        ('peak_power', 'f8'), ('peak_freq', 'f8')])
+
+# Sliding window (length, hop) in seconds used for each band by calculate_band_powers: long windows for
+# frequency resolution at low frequencies, short ones for temporal resolution at high frequencies
+BAND_WINDOW_CONFIGS = {
+    'delta': (2.0, 0.25),
+    'theta': (2.0, 0.2),
+    'alpha': (1.0, 0.1),
+    'beta': (1.0, 0.05),
+    'gamma_low': (0.5, 0.025),
+    'gamma_high': (0.5, 0.025)
+}
 
 
 class ElecTank(VirmenTank):
@@ -14,7 +37,12 @@ class ElecTank(VirmenTank):
                  resample_fs=200,
                  session_duration=30 * 60,
                  notch_fs=[60],
-                 notch_Q=30
+                 notch_Q=30,
+                 cache_dir=None,
+                 tfr_decim=DEFAULT_TFR_DECIM,
+                 tdt_store='Wav1',
+                 chunk_sec=60,
+                 channel=0
                  ):
 
         self.session_name = session_name
@@ -32,17 +60,22 @@ class ElecTank(VirmenTank):
             session_duration=session_duration)
 
         self.elec_path = elec_path
+        self.cache_dir = f"{os.path.normpath(elec_path)}_cache" if cache_dir is None else cache_dir
+        self.tfr_decim = tfr_decim
+        self._tfr_cache = {}
+        # artifact intervals per detection parameters, see get_artifact_intervals()
+        self._artifact_cache = {}
         self.session_duration = session_duration
         self.fs = resample_fs
-        self.tdt_data = tdt.read_block(self.elec_path)
-        self.tdt_fs = self.tdt_data.streams.Wav1.fs
-        self.tdt_signal = self.tdt_data.streams.Wav1.data
-        self.tdt_signal_filtered = self.butter_lowpass_filter(self.tdt_signal, 100, self.tdt_fs)
-        self.tdt_t = (np.linspace(0, len(self.tdt_signal) - 1, len(self.tdt_signal)) / self.tdt_fs -
-                      self.tdt_data.epocs.PC0_.onset[0] - 0.02)
+        # the raw TDT stream is read in chunks and decimated, the LFP is cached in self.cache_dir
+        self.ingest = LFPIngest(self.elec_path, self.cache_dir, fs=self.fs, store=tdt_store, chunk_sec=chunk_sec)
         self.elc_t = np.arange(0, session_duration, 1 / self.fs)
-        self.signal_raw = self.resample_data()
-        self.signal = self.notch_filter(notch_freqs=notch_fs, notch_Q=notch_Q)
+        # LFP of all recorded channels, (n_channels, n_times)
+        self.signals_raw = self.resample_data()
+        self.signals = self.notch_filter(notch_freqs=notch_fs, notch_Q=notch_Q)
+        self.n_channels = self.signals.shape[0]
+        # default channel of the analysis methods when their channel argument is None
+        self.channel = channel
 
         # Define standard frequency bands as class property
         self.frequency_bands = {
@@ -55,22 +88,41 @@ class ElecTank(VirmenTank):
         }
 
     def resample_data(self):
-        indices = np.searchsorted(self.tdt_t, self.elc_t, side='left')
-        LFP_data_raw = self.tdt_signal_filtered[indices]
+        LFP_data_raw = self.ingest.load(self.session_duration)
 
         return LFP_data_raw
 
     def notch_filter(self, notch_freqs, notch_Q):
         from scipy.signal import iirnotch, lfilter
 
-        LFP_data = self.signal_raw
+        LFP_data = self.signals_raw
 
+        # all channels at once, along the time axis
         for f0 in notch_freqs:
             b, a = iirnotch(w0=f0 / (self.fs / 2), Q=notch_Q)
-            LFP_data = lfilter(b, a, LFP_data)
+            LFP_data = lfilter(b, a, LFP_data, axis=-1)
 
         return LFP_data
 
+    @property
+    def signal(self):
+        """Notch filtered LFP of the default channel."""
+        return self.signals[self.channel]
+
+    @property
+    def signal_raw(self):
+        """Resampled LFP of the default channel, before the notch filter."""
+        return self.signals_raw[self.channel]
+
+    def get_signal(self, channel=None, raw=False):
+        """
+        LFP of one channel.
+        :param channel: channel index, self.channel if None
+        :param raw: return the signal before the notch filter
+        """
+        channel = self.channel if channel is None else channel
+        return (self.signals_raw if raw else self.signals)[channel]
+
     @staticmethod
     def convert_t_freq_domain(signal, fs, decimation_factor=1):
         from scipy.signal import get_window
@@ -93,23 +145,24 @@ class ElecTank(VirmenTank):
 
         return freq[:len(freq) // 2], power[:len(freq) // 2]
 
-    def convert_t_freq_domain_welch(self, window=5):
+    def convert_t_freq_domain_welch(self, window=5, channel=None):
         """
         Use mne to convert signal from time domain to frequency domain
         Args:
             window: how many seconds to use in multitaper
+            channel: channel index, self.channel if None
 
         Returns: [psd_welch, freq_welch]
 
         """
         import mne
-        [psd_welch, freq_welch] = mne.time_frequency.psd_array_welch(self.signal, self.fs, fmin=1, fmax=100,
+        [psd_welch, freq_welch] = mne.time_frequency.psd_array_welch(self.get_signal(channel), self.fs, fmin=1, fmax=100,
                                                                      n_fft=self.fs * window)
 
         return psd_welch, freq_welch
 
     def plot_resample_demo(self, start=70, stop=72,
-                           notebook=False, save_path=None, overwrite=False, font_size=None):
+                           notebook=False, save_path=None, overwrite=False, font_size=None, channel=None):
         """
         Plot a short demo showing the resampling result
 
@@ -118,21 +171,25 @@ class ElecTank(VirmenTank):
         :param notebook: Flag to indicate if the plot is for a Jupyter notebook.
         :param save_path: Path to save the plot as an HTML file.
         :param overwrite: Flag to overwrite the file or not
+        :param channel: channel index, self.channel if None
         :return: plotting element
 
         """
         from bokeh.plotting import figure
 
-        sample_indices = np.where((self.tdt_t >= start) & (self.tdt_t <= stop))
+        # only this time range of the raw stream is read from the block
+        tdt_t, tdt_signal, tdt_fs = self.ingest.read_raw(start, stop)
+        tdt_signal = tdt_signal[self.channel if channel is None else channel]
+        tdt_signal_filtered = self.butter_lowpass_filter(tdt_signal, self.ingest.lowpass_cutoff, tdt_fs)
 
         p = figure(width=800, height=300, active_scroll='wheel_zoom', title="Resampling Demo")
-        p.line(self.tdt_t[sample_indices], self.tdt_signal[sample_indices], color='blue', alpha=0.7, legend_label="raw")
-        p.line(self.tdt_t[sample_indices], self.tdt_signal_filtered[sample_indices], color='green', alpha=0.7,
+        p.line(tdt_t, tdt_signal, color='blue', alpha=0.7, legend_label="raw")
+        p.line(tdt_t, tdt_signal_filtered, color='green', alpha=0.7,
                legend_label="band tdt")
-        p.line(self.elc_t[start * self.fs:stop * self.fs], self.signal_raw[start * self.fs:stop * self.fs], color='red',
+        p.line(self.elc_t[start * self.fs:stop * self.fs], self.get_signal(channel, raw=True)[start * self.fs:stop * self.fs], color='red',
                alpha=0.7,
                legend_label="resample")
-        p.line(self.elc_t[start * self.fs:stop * self.fs], self.signal[start * self.fs:stop * self.fs], color='orange',
+        p.line(self.elc_t[start * self.fs:stop * self.fs], self.get_signal(channel)[start * self.fs:stop * self.fs], color='orange',
                alpha=0.7,
                legend_label="resample filtered")
 
@@ -142,7 +199,8 @@ class ElecTank(VirmenTank):
 
         return p
 
-    def plot_raw_vs_notch(self, start=10, stop=14, save_path=None, notebook=False, overwrite=False, font_size=None):
+    def plot_raw_vs_notch(self, start=10, stop=14, save_path=None, notebook=False, overwrite=False, font_size=None,
+                          channel=None):
         """
         Plot raw resampled signal with notch filtered resampled signal
 
@@ -151,6 +209,7 @@ class ElecTank(VirmenTank):
         :param notebook: Flag to indicate if the plot is for a Jupyter notebook.
         :param save_path: Path to save the plot as an HTML file.
         :param overwrite: Flag to overwrite the file or not
+        :param channel: channel index, self.channel if None
         :return: bokeh.plotting element
 
         """
@@ -159,8 +218,8 @@ class ElecTank(VirmenTank):
 
         p = figure(width=800, height=300, x_range=(start, stop),
                    active_scroll='wheel_zoom', title="Raw vs Notch")
-        p.line(self.elc_t, self.signal_raw, color='blue', alpha=0.7, line_width=2, legend_label="raw")
-        p.line(self.elc_t, self.signal, color='red', alpha=0.7, line_width=2, legend_label="filtered")
+        p.line(self.elc_t, self.get_signal(channel, raw=True), color='blue', alpha=0.7, line_width=2, legend_label="raw")
+        p.line(self.elc_t, self.get_signal(channel), color='red', alpha=0.7, line_width=2, legend_label="filtered")
 
         p.legend.click_policy = 'hide'
 
@@ -168,13 +227,14 @@ class ElecTank(VirmenTank):
 
         return p
 
-    def plot_velocity_with_signal(self, save_path=None, notebook=False, overwrite=False, font_size=None):
+    def plot_velocity_with_signal(self, save_path=None, notebook=False, overwrite=False, font_size=None, channel=None):
         """
         Plot velocity from virmen with resampled, filtered signal
         Args:
             save_path: (str) path to save
             notebook: (bool) whether to show in notebook or not
             overwrite: (bool) whether to overwrite existing file
+            channel: (int) channel index, self.channel if None
 
         Returns:
             bokeh.plotting element
@@ -184,7 +244,7 @@ class ElecTank(VirmenTank):
         from bokeh.plotting import figure
 
         p = figure(width=800, height=300, active_scroll='wheel_zoom', title="velocity with signal (normalized)")
-        p.line(self.elc_t, self.normalize_signal(self.signal) - 0.7, color='blue', alpha=0.7, legend_label="signal")
+        p.line(self.elc_t, self.normalize_signal(self.get_signal(channel)) - 0.7, color='blue', alpha=0.7, legend_label="signal")
         p.line(self.t, self.lick, color='red', alpha=0.7, legend_label="lick")
         p.line(self.t, self.normalize_signal(self.smoothed_velocity), color='green', alpha=0.7,
                legend_label="sm_velocity")
@@ -196,24 +256,294 @@ class ElecTank(VirmenTank):
 
         return p
 
-    def generate_time_frequency_spectrogram(self, freq_start=1, freq_stop=100, freq_step=0.1):
+    def generate_time_frequency_spectrogram(self, freq_start=1, freq_stop=100, freq_step=0.1, n_cycles=7,
+                                            channel=None):
+        """
+        Full resolution Morlet power of the whole session, served from the session TFR cache.
+
+        :param channel: channel index, self.channel if None
+        :return: (freqs, tfr) with tfr shaped (1, 1, n_freqs, n_times) like mne's tfr_array_morlet output
+        """
+        freqs = np.arange(start=freq_start, stop=freq_stop, step=freq_step)
+        freqs, _, power = self.get_session_tfr(freqs, n_cycles=n_cycles, decim=1, channel=channel)
+
+        return freqs, power[np.newaxis, np.newaxis]
+
+    def get_session_tfr(self, freqs=None, n_cycles=7, decim=None, persist=True, channel=None, n_jobs=1):
+        """
+        Session-wide Morlet power, computed once per (freq grid, n_cycles, decim, channel) and cached.
+
+        The power of each requested channel is computed in frequency chunks straight into its own float32 .npy
+        file in self.cache_dir, and memory-mapped, so later calls (and later ElecTank instances of the same
+        recording) only slice it. Channels that are never asked for are never transformed.
+
+        :param freqs: frequency grid in Hz, DEFAULT_TFR_FREQS if None
+        :param n_cycles: number of wavelet cycles, scalar or one per frequency
+        :param decim: time decimation factor, self.tfr_decim if None
+        :param persist: write the power to disk, otherwise keep it in memory only
+        :param channel: channel index (or indices / slice) into the channels axis, self.channel if None
+        :param n_jobs: number of parallel jobs passed to tfr_array_morlet
+        :return: (freqs, times, power) with power a float32 (n_freqs, n_times) array for a single channel,
+                 (n_channels, n_freqs, n_times) for several
+        """
+        freqs = DEFAULT_TFR_FREQS if freqs is None else np.asarray(freqs, dtype=float)
+        decim = self.tfr_decim if decim is None else int(decim)
+        n_cycles = np.broadcast_to(np.asarray(n_cycles, dtype=float), freqs.shape)
+        channel = self.channel if channel is None else channel
+
+        channels = np.arange(self.n_channels)[channel]
+        for ch in np.atleast_1d(channels):
+            key = self._tfr_cache_key(freqs, n_cycles, decim, ch)
+            if key not in self._tfr_cache:
+                self._tfr_cache[key] = self._load_or_compute_tfr(key, freqs, n_cycles, decim, ch, persist, n_jobs)
+
+        if np.ndim(channels) == 0:
+            power = self._tfr_cache[self._tfr_cache_key(freqs, n_cycles, decim, channels)]
+        else:
+            power = np.stack([self._tfr_cache[self._tfr_cache_key(freqs, n_cycles, decim, ch)] for ch in channels])
+        times = self.elc_t[::decim][:power.shape[-1]]
+
+        return freqs, times, power
 
+    def _tfr_cache_key(self, freqs, n_cycles, decim, channel):
+        digest = hashlib.sha1()
+        for item in (freqs, n_cycles, np.asarray([decim, self.fs], dtype=float), self.signals[channel]):
+            digest.update(np.ascontiguousarray(item).tobytes())
+        return digest.hexdigest()[:16]
+
+    def _load_or_compute_tfr(self, key, freqs, n_cycles, decim, channel, persist, n_jobs=1):
         import mne
 
-        freqs = np.arange(start=freq_start, stop=freq_stop, step=freq_step)
-        tfr = mne.time_frequency.tfr_array_morlet(self.signal.reshape(1, 1, -1), self.fs, freqs, n_cycles=7,
-                                                  zero_mean=True,
-                                                  output='power')
+        shape = (len(freqs), len(range(0, self.signals.shape[-1], decim)))
+        path = os.path.join(self.cache_dir, f"tfr_{key}.npy")
+
+        if persist and os.path.exists(path):
+            return np.load(path, mmap_mode='r')
+
+        power = None
+        if persist:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{path}.tmp"
+                power = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=shape)
+            except OSError as e:
+                print(f"Could not create TFR cache in {self.cache_dir}: {e}")
+        if power is None:
+            persist = False
+            power = np.empty(shape, dtype=np.float32)
+
+        signal = self.signals[channel].reshape(1, 1, -1)
+        for start in range(0, len(freqs), TFR_FREQ_CHUNK):
+            chunk = slice(start, start + TFR_FREQ_CHUNK)
+            power[chunk] = mne.time_frequency.tfr_array_morlet(signal, self.fs, freqs[chunk],
+                                                               n_cycles=n_cycles[chunk], zero_mean=True,
+                                                               output='power', decim=decim, n_jobs=n_jobs)[0, 0]
+
+        if not persist:
+            return power
+
+        power.flush()
+        del power
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode='r')
+
+    def get_event_tfr_segments(self, event_indices, window_sec=5, freqs=None, n_cycles=7, decim=None,
+                               channel=None):
+        """
+        Event-centered views of the session TFR cache.
+
+        :param event_indices: event indices at the virmen rate
+        :param window_sec: half-width of the window in seconds
+        :param channel: channel index, self.channel if None
+        :return: (valid_events, times, freqs, segments) with segments shaped (n_events, n_freqs, n_times)
+        """
+        freqs, _, power = self.get_session_tfr(freqs, n_cycles=n_cycles, decim=decim, channel=channel)
+        decim = self.tfr_decim if decim is None else int(decim)
+
+        half_width = int(window_sec * self.fs / decim)
+        event_indices = np.asarray(event_indices, dtype=int)
+        centers = (event_indices / self.vm_rate * self.fs / decim).astype(int)
+        valid = (centers - half_width >= 0) & (centers + half_width < power.shape[-1])
+
+        offsets = np.arange(-half_width, half_width)
+        segments = power[:, centers[valid, np.newaxis] + offsets]  # (n_freqs, n_events, n_times)
+        times = offsets * decim / self.fs
+
+        return event_indices[valid], times, freqs, np.moveaxis(segments, 1, 0)
+
+    def get_tfr_pyramid(self, freqs=None, n_cycles=7, decim=None, channel=None, use_cache=True):
+        """
+        Multi-resolution tile pyramid of the session TFR of one channel, for interactive browsing.
+
+        :param freqs: frequency grid in Hz, DEFAULT_TFR_FREQS if None
+        :param n_cycles: number of wavelet cycles, scalar or one per frequency
+        :param decim: time decimation of level 0, self.tfr_decim if None
+        :param channel: channel index, self.channel if None
+        :param use_cache: read and write the pyramid .npz in self.cache_dir
+        :return: TFRPyramid
+        """
+        freqs = DEFAULT_TFR_FREQS if freqs is None else np.asarray(freqs, dtype=float)
+        decim = self.tfr_decim if decim is None else int(decim)
+        channel = self.channel if channel is None else channel
+
+        key = self._tfr_cache_key(freqs, np.broadcast_to(np.asarray(n_cycles, dtype=float), freqs.shape), decim,
+                                  channel)
+        path = os.path.join(self.cache_dir, f"tfr_pyramid_{key}.npz")
+        if use_cache and os.path.exists(path):
+            return TFRPyramid.load(path)
+
+        freqs, times, power = self.get_session_tfr(freqs, n_cycles=n_cycles, decim=decim, channel=channel)
+        pyramid = TFRPyramid.from_power(power, freqs, times)
+
+        if use_cache:
+            try:
+                pyramid.save(path)
+            except OSError as e:
+                print(f"Could not cache TFR pyramid: {e}")
+
+        return pyramid
+
+    @staticmethod
+    def contiguous_regions(condition):
+        """
+        Run-length encode a boolean array.
+        :param condition: 1-D boolean array
+        :return: (starts, stops) index arrays of the True runs, stops exclusive
+        """
+        padded = np.concatenate([[False], np.asarray(condition, dtype=bool), [False]])
+        edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+        return edges[0::2], edges[1::2]
+
+    def detect_bursts(self, freq_range=(15, 30), threshold_std=1.5, min_duration=0.0, time_range=None,
+                      freqs=None, n_cycles=7, decim=None, channel=None):
+        """
+        Detect bursts of band power (e.g. beta bursts) on the session TFR.
+
+        The band power is the mean dB power over the frequencies of the band; a burst is a run of time
+        points where it exceeds mean + threshold_std * std, computed over time_range.
+
+        Parameters:
+        -----------
+        freq_range : tuple
+            (min_freq, max_freq) of the band in Hz
+        threshold_std : float
+            Threshold in standard deviations above the mean band power
+        min_duration : float
+            Bursts shorter than this (in seconds) are discarded
+        time_range : tuple or None
+            (start, end) in seconds to analyse, whole session if None
+        freqs, n_cycles, decim, channel :
+            Session TFR parameters, see get_session_tfr()
+
+        Returns:
+        --------
+        bursts : structured array
+            One row per burst with the fields of BURST_DTYPE: onset, offset (time of the last point above
+            threshold), duration, peak_time, peak_power (dB) and peak_freq (Hz)
+        """
+        freqs, times, power = self.get_session_tfr(freqs, n_cycles=n_cycles, decim=decim, channel=channel)
+
+        time_mask = np.ones(len(times), dtype=bool) if time_range is None else \
+            (times >= time_range[0]) & (times < time_range[1])
+        band_mask = (freqs >= freq_range[0]) & (freqs <= freq_range[1])
+        if not np.any(band_mask) or not np.any(time_mask):
+            return np.zeros(0, dtype=BURST_DTYPE)
+
+        times = times[time_mask]
+        band_freqs = freqs[band_mask]
+        band_db = 10 * np.log10(power[band_mask][:, time_mask])
+        band_power = band_db.mean(axis=0)
+
+        threshold = band_power.mean() + threshold_std * band_power.std()
+        starts, stops = self.contiguous_regions(band_power > threshold)
+
+        dt = times[1] - times[0] if len(times) > 1 else 1 / self.fs
+        keep = (stops - starts) * dt >= min_duration
+        starts, stops = starts[keep], stops[keep]
+        if len(starts) == 0:
+            return np.zeros(0, dtype=BURST_DTYPE)
+
+        # peak of each burst: sort the points of all bursts by (burst, -power) and take the first of each
+        lengths = stops - starts
+        burst_ids = np.repeat(np.arange(len(starts)), lengths)
+        points = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        order = np.lexsort((-band_power[points], burst_ids))
+        peaks = points[order[np.concatenate([[0], np.cumsum(lengths)[:-1]])]]
+
+        bursts = np.zeros(len(starts), dtype=BURST_DTYPE)
+        bursts['onset'] = times[starts]
+        bursts['offset'] = times[stops - 1]
+        bursts['duration'] = lengths * dt
+        bursts['peak_time'] = times[peaks]
+        bursts['peak_power'] = band_power[peaks]
+        bursts['peak_freq'] = band_freqs[np.argmax(band_db[:, peaks], axis=0)]
+
+        return bursts
+
+    @staticmethod
+    def detect_bursts_across_sessions(session_names, tank_kwargs=None, burst_kwargs=None, max_workers=None):
+        """
+        Run detect_bursts() over many sessions in a process pool and tabulate the bursts.
+
+        :param session_names: list of session names
+        :param tank_kwargs: keyword arguments of the ElecTank constructor, shared by all sessions
+        :param burst_kwargs: keyword arguments of detect_bursts()
+        :param max_workers: number of worker processes, os.cpu_count() if None
+        :return: pandas DataFrame with one row per burst and a session column
+        """
+        import pandas as pd
+        from concurrent.futures import ProcessPoolExecutor
+
+        tank_kwargs = tank_kwargs or {}
+        burst_kwargs = burst_kwargs or {}
+
+        tables = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {session_name: executor.submit(_detect_session_bursts, session_name, tank_kwargs, burst_kwargs)
+                       for session_name in session_names}
+            for session_name, future in futures.items():
+                try:
+                    table = pd.DataFrame(future.result())
+                except Exception as e:
+                    print(f"Burst detection failed for {session_name}: {e}")
+                    continue
+                table.insert(0, 'session', session_name)
+                tables.append(table)
+
+        if not tables:
+            return pd.DataFrame(columns=['session'] + list(BURST_DTYPE.names))
+        return pd.concat(tables, ignore_index=True)
+
+    def _window_tfr(self, freqs, time_start, time_end, time_dec_factor, channel=None):
+        """
+        Morlet power (7 cycles) of one channel between time_start and time_end seconds, decimated in time by
+        time_dec_factor, for the spectrogram plots.
+
+        A window covering the whole session is sliced from the session TFR cache at self.tfr_decim when
+        time_dec_factor is a multiple of it; any other window is transformed alone, so that a plot never fills
+        a full resolution session cache.
+
+        :param channel: channel index, self.channel if None
+        :return: (1, 1, n_freqs, n_times) power
+        """
+        start, stop = int(time_start * self.fs), int(time_end * self.fs)
+        if start == 0 and stop >= self.signals.shape[-1] and time_dec_factor % self.tfr_decim == 0:
+            _, _, power = self.get_session_tfr(freqs, n_cycles=7, channel=channel)
+            return power[np.newaxis, np.newaxis, :, ::time_dec_factor // self.tfr_decim]
+
+        import mne
 
-        return freqs, tfr
+        signal = self.get_signal(channel)[start:stop]
+        return mne.time_frequency.tfr_array_morlet(signal.reshape(1, 1, -1), self.fs, freqs, n_cycles=7,
+                                                   zero_mean=True, output='power', decim=time_dec_factor)
 
     def plot_time_frequency_spectrogram(self, freqs=None, tfr=None,
                                         freq_start=1, freq_stop=100, freq_step=0.5,
                                         time_start=0, time_end=None,
                                         time_dec_factor=20, freq_dec_factor=1,
                                         palette="Turbo256",
-                                        save_path=None, notebook=False, overwrite=False, font_size=None):
-        import mne
+                                        save_path=None, notebook=False, overwrite=False, font_size=None,
+                                        channel=None):
         from bokeh.plotting import figure
         from bokeh.models import LinearColorMapper, ColorBar
         from bokeh.layouts import column
@@ -223,19 +553,17 @@ class ElecTank(VirmenTank):
 
         time_elc = self.elc_t[time_start * self.fs: time_end * self.fs]
         time_vm = self.t[time_start * self.vm_rate: time_end * self.vm_rate]
-        signal = self.signal[time_start * self.fs: time_end * self.fs]
+        signal = self.get_signal(channel)[time_start * self.fs: time_end * self.fs]
         velocity = self.smoothed_velocity[time_start * self.vm_rate: time_end * self.vm_rate]
 
+        # Decimate data for plotting
         if (freqs is None) & (tfr is None):
             freqs = np.arange(start=freq_start, stop=freq_stop, step=freq_step)
-            tfr = mne.time_frequency.tfr_array_morlet(signal.reshape(1, 1, -1), self.fs, freqs, n_cycles=7,
-                                                      zero_mean=True,
-                                                      output='power')
-
-        # Decimate data for plotting
+            tfr_dec = self._window_tfr(freqs, time_start, time_end, time_dec_factor, channel)[:, :, ::freq_dec_factor]
+        else:
+            tfr_dec = tfr[:, :, ::freq_dec_factor, ::time_dec_factor]
         time_dec = time_elc[::time_dec_factor]
         freqs_dec = freqs[::freq_dec_factor]
-        tfr_dec = tfr[:, :, ::freq_dec_factor, ::time_dec_factor]
 
         power = 10 * np.log10(tfr_dec.squeeze())
 
@@ -279,8 +607,8 @@ class ElecTank(VirmenTank):
                                                time_dec_factor=20, freq_dec_factor=1,
                                                beta_min=12, beta_max=30, threshold_std=1.5,
                                                palette="Turbo256",
-                                               save_path=None, notebook=False, overwrite=False, font_size=None):
-        import mne
+                                               save_path=None, notebook=False, overwrite=False, font_size=None,
+                                               channel=None):
         from bokeh.plotting import figure
         from bokeh.models import LinearColorMapper, ColorBar, BoxAnnotation, Span, Label
         from bokeh.layouts import gridplot
@@ -289,21 +617,16 @@ class ElecTank(VirmenTank):
             time_end = self.session_duration
         time_elc = self.elc_t[time_start * self.fs: time_end * self.fs]
         time_vm = self.t[time_start * self.vm_rate: time_end * self.vm_rate]
-        signal = self.signal[time_start * self.fs: time_end * self.fs]
+        signal = self.get_signal(channel)[time_start * self.fs: time_end * self.fs]
         velocity = self.smoothed_velocity[time_start * self.vm_rate: time_end * self.vm_rate]
 
         if (freqs is None) or (tfr is None):
             freqs = np.arange(start=freq_start, stop=freq_stop, step=freq_step)
-            tfr = mne.time_frequency.tfr_array_morlet(signal.reshape(1, 1, -1),
-                                                      self.fs,
-                                                      freqs,
-                                                      n_cycles=7,
-                                                      zero_mean=True,
-                                                      output='power')
-
+            tfr_dec = self._window_tfr(freqs, time_start, time_end, time_dec_factor, channel)[:, :, ::freq_dec_factor]
+        else:
+            tfr_dec = tfr[:, :, ::freq_dec_factor, ::time_dec_factor]
         time_dec = time_elc[::time_dec_factor]
         freqs_dec = freqs[::freq_dec_factor]
-        tfr_dec = tfr[:, :, ::freq_dec_factor, ::time_dec_factor]
 
         power = 10 * np.log10(tfr_dec.squeeze())
 
@@ -382,29 +705,7 @@ class ElecTank(VirmenTank):
 
         significant_increases = beta_power > threshold
 
-        def contiguous_regions(condition):
-            """Find contiguous True regions of the boolean array "condition". Returns a list of (start, end) indices."""
-            d = np.diff(condition)
-            idx, = d.nonzero()
-
-            idx += 1
-
-            if condition[0]:
-                start = [0]
-            else:
-                start = []
-            start += idx.tolist()
-
-            if condition[-1]:
-                end = [len(condition)]
-            else:
-                end = []
-            end += idx.tolist()
-
-            regions = list(zip(start, end))
-            return regions
-
-        regions = contiguous_regions(significant_increases)
+        regions = zip(*self.contiguous_regions(significant_increases))
 
         p2 = figure(
             title="Beta Band Power with Significant Increases",
@@ -478,6 +779,79 @@ class ElecTank(VirmenTank):
         return layout
     
 
+    def compute_event_centered_tfr(self, event_indices, freqs, half_window_sec, n_cycles=7, n_jobs=1,
+                                   baseline=(-5, -3), channel=None):
+        """
+        Event-centered Morlet power of all events in one batched wavelet transform.
+
+        Valid event segments are stacked into a (n_events, 1, n_times) epochs array, converted to dB,
+        z-scored per frequency across all events and times, baseline corrected per event and frequency,
+        then averaged over events.
+
+        Parameters:
+        -----------
+        event_indices : list or array
+            Indices of events (at the virmen rate) to center the analysis around
+        freqs : array
+            Frequencies in Hz
+        half_window_sec : float
+            Half-width of the analysed segment in seconds
+        n_cycles : float or array
+            Number of wavelet cycles, scalar or one per frequency
+        n_jobs : int
+            Number of parallel jobs passed to tfr_array_morlet
+        baseline : tuple
+            (start, end) of the baseline period in seconds relative to the event
+        channel : int or None
+            Channel index, self.channel if None
+
+        Returns:
+        --------
+        (valid_events, full_times, avg_tfr) with avg_tfr shaped (n_freqs, n_times), or None if no event
+        has enough data around it
+        """
+        import mne
+
+        signal = self.get_signal(channel)
+        half_window = int(half_window_sec * self.fs)
+        event_indices = np.asarray(event_indices, dtype=int)
+        event_samples = (event_indices / self.vm_rate * self.fs).astype(int)
+        valid = (event_samples - half_window >= 0) & (event_samples + half_window < len(signal))
+        if not np.any(valid):
+            print("No valid events found.")
+            return None
+
+        # (n_events, 1, n_times) epochs gathered with one fancy index
+        epochs = signal[event_samples[valid, np.newaxis] + np.arange(-half_window, half_window)]
+        epochs = epochs[:, np.newaxis, :]
+
+        try:
+            tfr = mne.time_frequency.tfr_array_morlet(epochs, sfreq=self.fs, freqs=freqs, n_cycles=n_cycles,
+                                                      zero_mean=True, output='power', n_jobs=n_jobs)
+        except ValueError as e:
+            print(f"Warning: Error computing event spectrograms: {e}")
+            return None
+
+        # Convert to dB, shape [n_events, n_freqs, n_times]
+        tfr_db = 10 * np.log10(tfr[:, 0])
+        del tfr
+
+        # 1. Z-score each frequency over all events and times
+        freq_mean = tfr_db.mean(axis=(0, 2), keepdims=True)
+        freq_std = tfr_db.std(axis=(0, 2), keepdims=True)
+        tfr_db -= freq_mean
+        np.divide(tfr_db, freq_std, out=tfr_db, where=freq_std > 0)
+        tfr_db[:, (freq_std == 0).ravel(), :] = 0
+
+        # 2. Subtract each event's and frequency's mean over the baseline period
+        full_times = np.linspace(-half_window_sec, half_window_sec, tfr_db.shape[2])
+        baseline_start = np.where(full_times >= baseline[0])[0][0]
+        baseline_end = np.where(full_times >= baseline[1])[0][0]
+        tfr_db -= tfr_db[:, :, baseline_start:baseline_end].mean(axis=2, keepdims=True)
+
+        # 3. Average over events
+        return event_indices[valid], full_times, tfr_db.mean(axis=0)
+
     def plot_event_centered_spectrogram(self, event_indices, window_sec=5,
                                     analysis_padding=5,
                                     freq_start=1, freq_stop=100, freq_step=0.5,
@@ -486,7 +860,7 @@ class ElecTank(VirmenTank):
                                     title="Event-centered Spectrogram", notebook=False,
                                     plot_signal=True, plot_velocity=True, plot_lick=True,
                                     show_legend=True,
-                                    save_path=None, overwrite=False):
+                                    save_path=None, overwrite=False, n_jobs=1, channel=None):
         """
         Improved version that uses z-score normalization and baseline correction rather than min-max normalization.
         Still uses Morlet wavelets with optimizations for low frequency issues.
@@ -521,9 +895,12 @@ class ElecTank(VirmenTank):
             Path to save the plot
         overwrite : bool
             Whether to overwrite existing file
+        n_jobs : int
+            Number of parallel jobs for the wavelet transform
+        channel : int or None
+            Channel index, self.channel if None
         """
         import numpy as np
-        import mne
         from bokeh.plotting import figure
         from bokeh.models import ColorBar, LinearColorMapper
         from bokeh.layouts import column
@@ -548,7 +925,6 @@ class ElecTank(VirmenTank):
             
         # Convert window lengths to sample counts
         window_samples = int(window_sec * self.fs)
-        analysis_window_samples = int((window_sec + analysis_padding) * self.fs) 
         window_samples_vm = int(window_sec * self.vm_rate)
 
         # Ensure frequency upper limit doesn't exceed Nyquist frequency
@@ -570,95 +946,15 @@ class ElecTank(VirmenTank):
             print(f"Recommended window length of at least {min_window_for_lowest_freq} s to capture complete waveforms.")
             print("Proceeding, but low frequency results may be inaccurate.")
         
-        # Collect all valid event segments, processing individual events rather than global signal
-        all_tfrs = []
-        valid_events = []
-        
-        # Adjust wavelet cycles for each frequency
-        n_cycles = freqs / 2  # Adaptive cycle count: fewer for low frequencies
-        n_cycles = np.clip(n_cycles, 3, 10)  # Min 3 cycles, max 10 cycles
-        
-        for event_idx in event_indices:
-            event_sample = int(event_idx / self.vm_rate * self.fs)
-            
-            # Check if we have sufficient data
-            if (event_sample - analysis_window_samples >= 0 and 
-                event_sample + analysis_window_samples < len(self.signal)):
-                
-                # Extract signal segment around event
-                signal_segment = self.signal[event_sample - analysis_window_samples:
-                                            event_sample + analysis_window_samples]
-                
-                # Reshape for MNE format
-                signal_segment = signal_segment.reshape(1, 1, -1)
-                
-                try:
-                    # Calculate time-frequency representation
-                    tfr = mne.time_frequency.tfr_array_morlet(
-                        signal_segment,
-                        sfreq=self.fs,
-                        freqs=freqs,
-                        n_cycles=n_cycles,
-                        zero_mean=True,
-                        output='power'
-                    )
-                    
-                    # Convert to dB
-                    tfr_db = 10 * np.log10(tfr.squeeze())
-                    
-                    # Store this TFR
-                    all_tfrs.append(tfr_db)
-                    valid_events.append(event_idx)
-                    
-                except ValueError as e:
-                    print(f"Warning: Error processing event {event_idx}: {e}")
-                    continue
-        
-        if not all_tfrs:
-            print("No valid events found.")
+        # Adaptive cycle count: fewer for low frequencies, min 3 cycles, max 10 cycles
+        n_cycles = np.clip(freqs / 2, 3, 10)
+
+        # Batched wavelet transform of all event segments, z-scored and baseline corrected
+        result = self.compute_event_centered_tfr(event_indices, freqs, window_sec + analysis_padding,
+                                                 n_cycles=n_cycles, n_jobs=n_jobs, channel=channel)
+        if result is None:
             return None
-        
-        # Stack all TFRs into one large array for global normalization
-        # Shape will be [n_events, n_freqs, n_times]
-        stacked_tfrs = np.stack(all_tfrs)
-        
-        # 1. Z-score normalization instead of min-max
-        normalized_tfrs = np.zeros_like(stacked_tfrs)
-        for freq_idx in range(stacked_tfrs.shape[1]):
-            # Extract this frequency row for all events
-            all_events_this_freq = stacked_tfrs[:, freq_idx, :]
-            
-            # Calculate mean and std for this frequency
-            freq_mean = np.mean(all_events_this_freq)
-            freq_std = np.std(all_events_this_freq)
-            
-            if freq_std > 0:  # Avoid division by zero
-                # Apply z-score normalization to this frequency for all events
-                normalized_tfrs[:, freq_idx, :] = (stacked_tfrs[:, freq_idx, :] - freq_mean) / freq_std
-            else:
-                normalized_tfrs[:, freq_idx, :] = 0  # Default value if no variation
-        
-        # Create time axis for baseline correction
-        full_times = np.linspace(-window_sec-analysis_padding, window_sec+analysis_padding, 
-                               normalized_tfrs.shape[2])
-        
-        # 2. Apply baseline correction
-        # Define baseline period (e.g., -5 to -3 seconds)
-        baseline_start = np.where(full_times >= -5)[0][0]
-        baseline_end = np.where(full_times >= -3)[0][0]
-        
-        baseline_corrected_tfrs = np.zeros_like(normalized_tfrs)
-        for event_idx in range(normalized_tfrs.shape[0]):
-            for freq_idx in range(normalized_tfrs.shape[1]):
-                # Get baseline period for this event and frequency
-                baseline = normalized_tfrs[event_idx, freq_idx, baseline_start:baseline_end]
-                baseline_mean = np.mean(baseline)
-                
-                # Subtract baseline mean
-                baseline_corrected_tfrs[event_idx, freq_idx, :] = normalized_tfrs[event_idx, freq_idx, :] - baseline_mean
-        
-        # 3. Average the baseline-corrected TFRs
-        avg_normalized_tfr = np.mean(baseline_corrected_tfrs, axis=0)
+        valid_events, full_times, avg_normalized_tfr = result
         
         # Determine how many samples to crop from analysis window to get display window
         padding_samples = int(analysis_padding * self.fs / 2)  # Crop half padding from each side
@@ -732,6 +1028,7 @@ class ElecTank(VirmenTank):
         # Only perform signal analysis and create second plot if needed
         if plot_signal or plot_velocity or plot_lick:
             # Calculate average LFP and velocity around events
+            signal = self.get_signal(channel)
             avg_signal = np.zeros(2 * window_samples)
             avg_velocity = np.zeros(2 * window_samples_vm)
             avg_lick = np.zeros(2 * window_samples_vm)
@@ -743,8 +1040,8 @@ class ElecTank(VirmenTank):
 
                 # LFP segment
                 if plot_signal and (event_sample - window_samples >= 0 and
-                        event_sample + window_samples < len(self.signal)):
-                    signal_segment = self.signal[event_sample - window_samples:
+                        event_sample + window_samples < len(signal)):
+                    signal_segment = signal[event_sample - window_samples:
                                                 event_sample + window_samples]
                     avg_signal += signal_segment
 
@@ -856,7 +1153,7 @@ class ElecTank(VirmenTank):
                                 palette="turbo",
                                 title="Event-Centered Spectrogram", notebook=False,
                                 plot_signal=True, plot_velocity=True, plot_lick=True,
-                                show_legend=True, save_path=None, overwrite=False):
+                                show_legend=True, save_path=None, overwrite=False, n_jobs=1, channel=None):
         """
         Improved version that uses z-score normalization, baseline correction,
         and custom frequency band representation with proper log-scale alignment.
@@ -892,9 +1189,12 @@ class ElecTank(VirmenTank):
             Path to save the plot
         overwrite : bool
             Whether to overwrite existing file
+        n_jobs : int
+            Number of parallel jobs for the wavelet transform
+        channel : int or None
+            Channel index, self.channel if None
         """
         import numpy as np
-        import mne
         from bokeh.plotting import figure
         from bokeh.models import ColorBar, LinearColorMapper, LogTicker, FixedTicker
         from bokeh.layouts import column
@@ -919,7 +1219,6 @@ class ElecTank(VirmenTank):
             
         # Convert window lengths to sample counts
         window_samples = int(window_sec * self.fs)
-        analysis_window_samples = int((window_sec + analysis_padding) * self.fs) 
         window_samples_vm = int(window_sec * self.vm_rate)
 
         # Ensure frequency upper limit doesn't exceed Nyquist frequency
@@ -976,96 +1275,15 @@ class ElecTank(VirmenTank):
             print(f"Recommended window length of at least {min_window_for_lowest_freq} s to capture complete waveforms.")
             print("Proceeding, but low frequency results may be inaccurate.")
         
-        # Collect all valid event segments, processing individual events rather than global signal
-        all_tfrs = []
-        valid_events = []
-        
-        # Adjust wavelet cycles for each frequency (adaptive)
-        # Lower frequencies get fewer cycles, higher frequencies get more
-        n_cycles = freqs / 2  # Adaptive cycle count
-        n_cycles = np.clip(n_cycles, 3, 10)  # Min 3 cycles, max 10 cycles
-        
-        for event_idx in event_indices:
-            event_sample = int(event_idx / self.vm_rate * self.fs)
-            
-            # Check if we have sufficient data
-            if (event_sample - analysis_window_samples >= 0 and 
-                event_sample + analysis_window_samples < len(self.signal)):
-                
-                # Extract signal segment around event
-                signal_segment = self.signal[event_sample - analysis_window_samples:
-                                            event_sample + analysis_window_samples]
-                
-                # Reshape for MNE format
-                signal_segment = signal_segment.reshape(1, 1, -1)
-                
-                try:
-                    # Calculate time-frequency representation
-                    tfr = mne.time_frequency.tfr_array_morlet(
-                        signal_segment,
-                        sfreq=self.fs,
-                        freqs=freqs,
-                        n_cycles=n_cycles,
-                        zero_mean=True,
-                        output='power'
-                    )
-                    
-                    # Convert to dB
-                    tfr_db = 10 * np.log10(tfr.squeeze())
-                    
-                    # Store this TFR
-                    all_tfrs.append(tfr_db)
-                    valid_events.append(event_idx)
-                    
-                except ValueError as e:
-                    print(f"Warning: Error processing event {event_idx}: {e}")
-                    continue
-        
-        if not all_tfrs:
-            print("No valid events found.")
+        # Adaptive cycle count: fewer for low frequencies, min 3 cycles, max 10 cycles
+        n_cycles = np.clip(freqs / 2, 3, 10)
+
+        # Batched wavelet transform of all event segments, z-scored and baseline corrected
+        result = self.compute_event_centered_tfr(event_indices, freqs, window_sec + analysis_padding,
+                                                 n_cycles=n_cycles, n_jobs=n_jobs, channel=channel)
+        if result is None:
             return None
-        
-        # Stack all TFRs into one large array for global normalization
-        # Shape will be [n_events, n_freqs, n_times]
-        stacked_tfrs = np.stack(all_tfrs)
-        
-        # 1. Z-score normalization instead of min-max
-        normalized_tfrs = np.zeros_like(stacked_tfrs)
-        for freq_idx in range(stacked_tfrs.shape[1]):
-            # Extract this frequency row for all events
-            all_events_this_freq = stacked_tfrs[:, freq_idx, :]
-            
-            # Calculate mean and std for this frequency
-            freq_mean = np.mean(all_events_this_freq)
-            freq_std = np.std(all_events_this_freq)
-            
-            if freq_std > 0:  # Avoid division by zero
-                # Apply z-score normalization to this frequency for all events
-                normalized_tfrs[:, freq_idx, :] = (stacked_tfrs[:, freq_idx, :] - freq_mean) / freq_std
-            else:
-                normalized_tfrs[:, freq_idx, :] = 0  # Default value if no variation
-        
-        # Create time axis for baseline correction
-        full_times = np.linspace(-window_sec-analysis_padding, window_sec+analysis_padding, 
-                            normalized_tfrs.shape[2])
-        
-        # 2. Apply baseline correction
-        # Define baseline period (e.g., -5 to -3 seconds)
-        baseline_start = np.where(full_times >= -5)[0][0]
-        baseline_end = np.where(full_times >= -3)[0][0]
-        
-        baseline_corrected_tfrs = np.zeros_like(normalized_tfrs)
-        for event_idx in range(normalized_tfrs.shape[0]):
-            for freq_idx in range(normalized_tfrs.shape[1]):
-                # Get baseline period for this event and frequency
-                baseline = normalized_tfrs[event_idx, freq_idx, baseline_start:baseline_end]
-                baseline_mean = np.mean(baseline)
-                
-                # Subtract baseline mean
-                baseline_corrected_tfrs[event_idx, freq_idx, :] = normalized_tfrs[event_idx, freq_idx, :] - baseline_mean
-        
-        # 3. Average the baseline-corrected TFRs
-        avg_normalized_tfr = np.mean(baseline_corrected_tfrs, axis=0)
+        valid_events, full_times, avg_normalized_tfr = result
         
         # Determine how many samples to crop from analysis window to get display window
         padding_samples = int(analysis_padding * self.fs / 2)  # Crop half padding from each side
@@ -1195,6 +1413,7 @@ class ElecTank(VirmenTank):
         # Only perform signal analysis and create second plot if needed
         if plot_signal or plot_velocity or plot_lick:
             # Calculate average LFP and velocity around events
+            signal = self.get_signal(channel)
             avg_signal = np.zeros(2 * window_samples)
             avg_velocity = np.zeros(2 * window_samples_vm)
             avg_lick = np.zeros(2 * window_samples_vm)
@@ -1206,8 +1425,8 @@ class ElecTank(VirmenTank):
 
                 # LFP segment
                 if plot_signal and (event_sample - window_samples >= 0 and
-                        event_sample + window_samples < len(self.signal)):
-                    signal_segment = self.signal[event_sample - window_samples:
+                        event_sample + window_samples < len(signal)):
+                    signal_segment = signal[event_sample - window_samples:
                                                 event_sample + window_samples]
                     avg_signal += signal_segment
 
@@ -1310,8 +1529,91 @@ class ElecTank(VirmenTank):
 
         return final_layout
     
+    def compute_band_power_time_courses(self, segments, bands=None, band_windows=None):
+        """
+        Band power time courses of a stack of signal segments, in dB.
+
+        One short-time spectrogram is computed per (window, hop) class over the whole stack, each window
+        giving the same Hann/constant-detrend one-sided PSD as welch() on that window alone with
+        nfft = 2 * window. Band powers are reduced with precomputed frequency masks, assigned to the
+        window centers and linearly interpolated (and extrapolated at the edges) to every sample.
+
+        Parameters:
+        -----------
+        segments : array
+            Signal segments, shape (..., n_samples), e.g. (n_events, n_samples) or (n_events, n_channels, n_samples)
+        bands : dict or None
+            {band_name: (low, high)} in Hz, self.frequency_bands if None
+        band_windows : dict or None
+            {band_name: (window_sec, hop_sec)}, BAND_WINDOW_CONFIGS if None; bands missing from it use
+            the beta configuration
+
+        Returns:
+        --------
+        band_powers : dict
+            {band_name: array of the same shape as segments}
+        """
+        from scipy.signal import stft
+
+        if bands is None:
+            bands = self.frequency_bands
+        if band_windows is None:
+            band_windows = BAND_WINDOW_CONFIGS
+
+        segments = np.atleast_2d(np.asarray(segments, dtype=float))
+        n_samples = segments.shape[-1]
+        sample_idx = np.arange(n_samples)
+
+        # group bands sharing the same window and hop so each spectrogram is computed once
+        classes = {}
+        for band_name in bands:
+            window_sec, hop_sec = band_windows.get(band_name, band_windows.get('beta', (1.0, 0.05)))
+            classes.setdefault((int(self.fs * window_sec), int(self.fs * hop_sec)), []).append(band_name)
+
+        band_powers = {}
+        for (window_size, hop_size), band_names in classes.items():
+            # Skip if window is larger than signal segment
+            if window_size > n_samples:
+                for band_name in band_names:
+                    band_powers[band_name] = np.zeros(segments.shape)
+                continue
+
+            freqs, _, spec = stft(segments, fs=self.fs, window='hann', nperseg=window_size,
+                                  noverlap=window_size - hop_size, nfft=2 * window_size, detrend='constant',
+                                  boundary=None, padded=False, scaling='psd', axis=-1)
+            psd = np.abs(spec) ** 2
+            # one-sided density, as in welch: double everything except DC and Nyquist
+            psd[..., 1:-1, :] *= 2
+
+            centers = np.arange(psd.shape[-1]) * hop_size + window_size // 2
+
+            # linear interpolation weights from window centers to samples, shared by all bands and segments
+            if len(centers) > 1:
+                left = np.clip(np.searchsorted(centers, sample_idx, side='right') - 1, 0, len(centers) - 2)
+                weight = (sample_idx - centers[left]) / (centers[left + 1] - centers[left])
+
+            for band_name in band_names:
+                low, high = bands[band_name]
+                band_mask = (freqs >= low) & (freqs <= high)
+                if not np.any(band_mask):
+                    band_powers[band_name] = np.zeros(segments.shape)
+                    continue
+
+                power = psd[..., band_mask, :].mean(axis=-2)
+                # Use -80 dB for zero power to avoid log(0)
+                power_db = np.full(power.shape, -80.0)
+                positive = power > 0
+                power_db[positive] = 10 * np.log10(power[positive])
+
+                if len(centers) > 1:
+                    band_powers[band_name] = (power_db[..., left] * (1 - weight) + power_db[..., left + 1] * weight)
+                else:
+                    band_powers[band_name] = np.repeat(power_db, n_samples, axis=-1)
+
+        return band_powers
+
     def calculate_band_powers(self, event_indices, bands=None, window_sec=5, notebook=False, title=None,
-                              save_path=None, overwrite=False):
+                              save_path=None, overwrite=False, channel=None):
         """
         Calculate and visualize power in different frequency bands around events
 
@@ -1329,6 +1631,8 @@ class ElecTank(VirmenTank):
             Path to save the plot
         overwrite : bool
             Whether to overwrite existing file
+        channel : int or None
+            Channel index, self.channel if None
 
         Returns:
         --------
@@ -1339,7 +1643,6 @@ class ElecTank(VirmenTank):
         from bokeh.plotting import figure
         from bokeh.models import Span, Legend, LegendItem
         from bokeh.layouts import row
-        from scipy.signal import welch
 
         if bands is None:
             bands = self.frequency_bands
@@ -1350,148 +1653,33 @@ class ElecTank(VirmenTank):
         times = np.linspace(-window_sec, window_sec, 2 * window_samples)
         velocity_times = np.linspace(-window_sec, window_sec, 2 * window_samples_vm)
 
-        # Store band powers for each time point
-        band_powers = {band: np.zeros(2 * window_samples) for band in bands}
-        avg_velocity = np.zeros(2 * window_samples_vm)
-
-        # Number of valid events
-        valid_count = 0
-        valid_velocity_count = 0
-
-        # Process each event
-        for event_idx in event_indices:
-            event_sample = int(event_idx / self.vm_rate * self.fs)
-
-            if (event_sample - window_samples >= 0 and
-                    event_sample + window_samples < len(self.signal)):
-
-                # Extract signal segment
-                signal_segment = self.signal[event_sample - window_samples:
-                                             event_sample + window_samples]
-
-                # Use different window sizes for different frequency bands
-                # For delta band (1-4 Hz), we need at least 2 seconds to get good frequency resolution
-                # For higher frequencies, we can use shorter windows for better temporal resolution
-                
-                # Delta bands: use 2-second windows with 0.25-second hop
-                delta_window_size = int(self.fs * 2.0)  # 2 seconds
-                delta_hop_size = int(self.fs * 0.25)     # 0.25 second hop
-
-                # Theta bands: use 2-second windows with 0.20-second hop
-                theta_window_size = int(self.fs * 2.0)  # 2 seconds
-                theta_hop_size = int(self.fs * 0.2)     # 0.2 second hop    
-
-                
-                # Alpha bands: use 1-second windows with 0.1-second hop  
-                alpha_window_size = int(self.fs * 1.0)   # 1 second
-                alpha_hop_size = int(self.fs * 0.1)     # 0.1 second hop
-
-                # Beta bands: use 1-second windows with 0.05-second hop  
-                beta_window_size = int(self.fs * 1.0)   # 1 second
-                beta_hop_size = int(self.fs * 0.05)     # 0.05 second hop
-
-                # Gamma-low bands: use 0.5-second windows with 0.025-second hop
-                gamma_low_window_size = int(self.fs * 0.5)        # 0.5 seconds
-                gamma_low_hop_size = int(self.fs * 0.025)           # 0.025 second hop
-
-                # Gamma-high bands: use 0.5-second windows with 0.025-second hop
-                gamma_high_window_size = int(self.fs * 0.5)        # 0.5 seconds
-                gamma_high_hop_size = int(self.fs * 0.025)           # 0.025 second hop
-                
-                # Create arrays to store band powers for this event
-                event_band_powers = {band: np.zeros(len(signal_segment)) for band in bands}
-                
-                # Process different frequency bands with appropriate window sizes
-                band_configs = {
-                    'delta': (delta_window_size, delta_hop_size),
-                    'theta': (theta_window_size, theta_hop_size),
-                    'alpha': (alpha_window_size, alpha_hop_size),
-                    'beta': (beta_window_size, beta_hop_size),
-                    'gamma_low': (gamma_low_window_size, gamma_low_hop_size),
-                    'gamma_high': (gamma_high_window_size, gamma_high_hop_size)
-                }
-                
-                for band_name, (low, high) in bands.items():
-                    window_size, hop_size = band_configs[band_name]
-                    
-                    # Skip if window is larger than signal segment
-                    if window_size > len(signal_segment):
-                        continue
-                        
-                    # Calculate the number of windows that fit in the signal segment
-                    n_windows = (len(signal_segment) - window_size) // hop_size + 1
-                    
-                    # Sliding window analysis for this band
-                    for i in range(n_windows):
-                        start_idx = i * hop_size
-                        end_idx = start_idx + window_size
-                        
-                        # Ensure we don't exceed signal bounds
-                        if end_idx <= len(signal_segment):
-                            window = signal_segment[start_idx:end_idx]
-
-                            # Calculate power spectrum with appropriate parameters for frequency resolution
-                            # Use nperseg equal to window_size for maximum frequency resolution
-                            freqs, psd = welch(window, fs=self.fs, nperseg=window_size, 
-                                             noverlap=window_size//2, nfft=window_size*2)
-
-                            # Calculate band power
-                            band_mask = (freqs >= low) & (freqs <= high)
-                            if np.any(band_mask):
-                                band_power = np.mean(psd[band_mask])
-                                # Convert to dB and assign to the center of the window
-                                center_idx = start_idx + window_size // 2
-                                if center_idx < len(signal_segment):
-                                    # Use log10 with a small epsilon to avoid log(0)
-                                    if band_power > 0:
-                                        event_band_powers[band_name][center_idx] = 10 * np.log10(band_power)
-                                    else:
-                                        event_band_powers[band_name][center_idx] = -80  # Very low power in dB
-                
-                # Interpolate to fill gaps and smooth the band power time series
-                for band_name in bands:
-                    # Find non-zero indices (where we have calculated values)
-                    non_zero_indices = np.where(event_band_powers[band_name] != 0)[0]
-                    
-                    if len(non_zero_indices) > 1:
-                        # Interpolate to fill the entire time series
-                        from scipy.interpolate import interp1d
-                        
-                        # Create interpolation function
-                        f = interp1d(non_zero_indices, 
-                                   event_band_powers[band_name][non_zero_indices],
-                                   kind='linear', 
-                                   bounds_error=False, 
-                                   fill_value='extrapolate')
-                        
-                        # Apply interpolation to all indices
-                        all_indices = np.arange(len(signal_segment))
-                        event_band_powers[band_name] = f(all_indices)
-                    elif len(non_zero_indices) == 1:
-                        # If only one value, fill the entire array with that value
-                        event_band_powers[band_name][:] = event_band_powers[band_name][non_zero_indices[0]]
-                    
-                    # Add to accumulated band powers
-                    band_powers[band_name] += event_band_powers[band_name]
-
-                valid_count += 1
-
-            # Extract velocity segment
-            if (event_idx - window_samples_vm >= 0 and
-                    event_idx + window_samples_vm < len(self.smoothed_velocity)):
-                velocity_segment = self.smoothed_velocity[event_idx - window_samples_vm:
-                                                          event_idx + window_samples_vm]
-                avg_velocity += velocity_segment
-                valid_velocity_count += 1
+        # Stack the signal segments of all valid events
+        signal = self.get_signal(channel)
+        event_indices = np.asarray(event_indices, dtype=int)
+        event_samples = (event_indices / self.vm_rate * self.fs).astype(int)
+        valid = (event_samples - window_samples >= 0) & (event_samples + window_samples < len(signal))
+        valid_count = int(np.sum(valid))
 
         # If no valid events, return None
         if valid_count == 0:
             print("No valid events found within signal bounds.")
             return None
 
-        # Average band powers
+        # Average band power time courses over events
+        segments = signal[event_samples[valid, np.newaxis] + np.arange(-window_samples, window_samples)]
+        band_powers = {band: power.mean(axis=0)
+                       for band, power in self.compute_band_power_time_courses(segments, bands).items()}
+
+        # Stack the velocity segments of all valid events
+        valid_velocity = ((event_indices - window_samples_vm >= 0) &
+                          (event_indices + window_samples_vm < len(self.smoothed_velocity)))
+        valid_velocity_count = int(np.sum(valid_velocity))
+        if valid_velocity_count > 0:
+            avg_velocity = self.smoothed_velocity[event_indices[valid_velocity, np.newaxis] +
+                                                  np.arange(-window_samples_vm, window_samples_vm)].mean(axis=0)
+
+        # Normalize band powers
         for band in bands:
-            band_powers[band] /= valid_count
             # Normalize for better visualization
             if np.max(band_powers[band]) > np.min(band_powers[band]):
                 band_powers[band] = (band_powers[band] - np.min(band_powers[band])) / \
@@ -1500,9 +1688,8 @@ class ElecTank(VirmenTank):
                 # Handle case where all values are the same
                 band_powers[band] = np.zeros_like(band_powers[band])
 
-        # Average and normalize velocity
+        # Normalize velocity
         if valid_velocity_count > 0:
-            avg_velocity /= valid_velocity_count
             if np.max(avg_velocity) > np.min(avg_velocity):
                 avg_velocity_norm = (avg_velocity - np.min(avg_velocity)) / \
                                     (np.max(avg_velocity) - np.min(avg_velocity))
@@ -1569,7 +1756,8 @@ class ElecTank(VirmenTank):
 
         return p
 
-    def detect_spectrogram_artifacts(self, threshold_factor=3.0, min_freqs_affected=0.75, freq_range=(1, 80)):
+    def detect_spectrogram_artifacts(self, threshold_factor=3.0, min_freqs_affected=0.75, freq_range=(1, 80),
+                                     decim=None, channel=None):
         """
         Detect exact time indices of artifacts in the spectrogram.
         
@@ -1581,24 +1769,62 @@ class ElecTank(VirmenTank):
             Minimum proportion of frequency bands that must exceed threshold
         freq_range : tuple
             (min_freq, max_freq) range to consider for artifact detection
+        decim : int or None
+            Time decimation of the session TFR to use, self.tfr_decim if None
+        channel : int or None
+            Channel index, self.channel if None
         
         Returns:
         --------
         artifact_time_indices : list
             List of time indices (in seconds) where artifacts occur
         """
-        # Generate time-frequency representation
-        freqs, tfr = self.generate_time_frequency_spectrogram(
-            freq_start=freq_range[0], 
-            freq_stop=freq_range[1], 
-            freq_step=0.5
-        )
+        runs, time_axis = self._artifact_runs(threshold_factor, min_freqs_affected, freq_range, decim, channel)
+
+        # Expand the runs back to the individual artifact time points
+        lengths = runs[:, 1] - runs[:, 0]
+        artifact_indices = np.repeat(runs[:, 0] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        artifact_time_points = time_axis[artifact_indices]
         
-        # Get time axis in seconds
-        time_axis = self.elc_t[:tfr.shape[-1]]
+        print(f"Detected {len(artifact_time_points)} artifact time points")
+        if len(artifact_time_points) > 0:
+            print(f"Artifact times range from {artifact_time_points[0]:.2f}s to {artifact_time_points[-1]:.2f}s")
+        
+        return artifact_time_points
+
+    def get_artifact_intervals(self, threshold_factor=3.0, min_freqs_affected=0.75, freq_range=(1, 80),
+                               decim=None, channel=None):
+        """
+        Artifact timeline as run-length intervals, computed once per set of detection parameters.
+
+        Parameters are the same as detect_spectrogram_artifacts().
+
+        Returns:
+        --------
+        intervals : array
+            (n_intervals, 2) array of [start, end] times in seconds, sorted and non-overlapping, each
+            covering a run of consecutive artifact time points (end inclusive)
+        """
+        runs, time_axis = self._artifact_runs(threshold_factor, min_freqs_affected, freq_range, decim, channel)
+        return np.column_stack([time_axis[runs[:, 0]], time_axis[runs[:, 1] - 1]])
+
+    def _artifact_runs(self, threshold_factor, min_freqs_affected, freq_range, decim, channel):
+        decim = self.tfr_decim if decim is None else int(decim)
+        channel = self.channel if channel is None else channel
+        key = (threshold_factor, min_freqs_affected, tuple(freq_range), decim, channel)
+        if key in self._artifact_cache:
+            return self._artifact_cache[key]
+
+        # Slice the session time-frequency representation
+        freqs, time_axis, tfr = self.get_session_tfr(
+            np.arange(freq_range[0], freq_range[1], 0.5),
+            n_cycles=7,
+            decim=decim,
+            channel=channel
+        )
         
         # Convert to dB scale if needed
-        power_db = 10 * np.log10(tfr.squeeze()) if np.min(tfr) >= 0 else tfr.squeeze()
+        power_db = 10 * np.log10(tfr) if np.min(tfr) >= 0 else np.asarray(tfr)
         
         # Get frequencies within our range
         freq_mask = (freqs >= freq_range[0]) & (freqs <= freq_range[1])
@@ -1617,20 +1843,33 @@ class ElecTank(VirmenTank):
         # Calculate proportion of frequencies affected at each time point
         freqs_affected_ratio = np.mean(exceeded_threshold, axis=0)
         
-        # Find time points where proportion exceeds minimum
-        artifact_indices = np.where(freqs_affected_ratio >= min_freqs_affected)[0]
-        
-        # Convert indices to actual time values (in seconds)
-        artifact_time_points = time_axis[artifact_indices]
-        
-        print(f"Detected {len(artifact_time_points)} artifact time points")
-        if len(artifact_time_points) > 0:
-            print(f"Artifact times range from {artifact_time_points[0]:.2f}s to {artifact_time_points[-1]:.2f}s")
-        
-        return artifact_time_points
+        # Run-length encode the time points where proportion exceeds minimum, as [start, stop) index pairs
+        runs = np.column_stack(self.contiguous_regions(freqs_affected_ratio >= min_freqs_affected))
+
+        self._artifact_cache[key] = (runs, time_axis)
+        return runs, time_axis
+
+    @staticmethod
+    def events_overlap_artifacts(event_times, window_sec, artifact_intervals):
+        """
+        Which event windows [t - window_sec, t + window_sec] overlap an artifact interval.
+
+        :param event_times: event times in seconds
+        :param window_sec: half-width of the window around each event in seconds
+        :param artifact_intervals: (n_intervals, 2) sorted, non-overlapping [start, end] times
+        :return: boolean array, True for events with an artifact in their window
+        """
+        event_times = np.asarray(event_times, dtype=float)
+        artifact_intervals = np.asarray(artifact_intervals, dtype=float).reshape(-1, 2)
+        if len(artifact_intervals) == 0:
+            return np.zeros(event_times.shape, dtype=bool)
+
+        # last interval starting before the window ends; it overlaps if it ends after the window starts
+        last = np.searchsorted(artifact_intervals[:, 0], event_times + window_sec, side='right') - 1
+        return (last >= 0) & (artifact_intervals[np.maximum(last, 0), 1] >= event_times - window_sec)
 
     def filter_events_with_window(self, event_indices, artifact_window_sec=0.5, 
-                                  artifact_times=None, threshold_factor=3.0):
+                                  artifact_times=None, threshold_factor=3.0, channel=None):
         """
         Filter event indices by checking if any artifacts fall within a window around each event.
         
@@ -1641,9 +1880,11 @@ class ElecTank(VirmenTank):
         artifact_window_sec : float
             Size of window around each event to check for artifacts (±seconds)
         artifact_times : array or None
-            Precomputed artifact time points (in seconds), if None will be detected
+            Precomputed artifact time points (in seconds), if None the cached artifact intervals are used
         threshold_factor : float
-            Passed to detect_spectrogram_artifacts if artifact_times is None
+            Passed to get_artifact_intervals if artifact_times is None
+        channel : int or None
+            Passed to get_artifact_intervals if artifact_times is None
             
         Returns:
         --------
@@ -1652,34 +1893,25 @@ class ElecTank(VirmenTank):
         excluded_indices : list
             Event indices that were excluded due to artifacts
         """
+        event_indices = np.asarray(event_indices)
+
         # Convert event indices to seconds
         event_times = event_indices / self.vm_rate
         
-        # Get artifact time points if not provided
         if artifact_times is None:
-            artifact_times = self.detect_spectrogram_artifacts(threshold_factor=threshold_factor)
+            artifact_intervals = self.get_artifact_intervals(threshold_factor=threshold_factor, channel=channel)
+        else:
+            # each artifact time point is a zero-length interval
+            artifact_times = np.sort(np.asarray(artifact_times, dtype=float))
+            artifact_intervals = np.column_stack([artifact_times, artifact_times])
         
-        if len(artifact_times) == 0:
+        if len(artifact_intervals) == 0:
             # No artifacts detected
-            return event_indices, []
+            return event_indices.tolist(), []
         
-        # Initialize lists for filtered and excluded events
-        filtered_indices = []
-        excluded_indices = []
-        
-        # For each event, check if any artifact falls within its window
-        for idx, event_time in zip(event_indices, event_times):
-            window_start = event_time - artifact_window_sec
-            window_end = event_time + artifact_window_sec
-            
-            # Check if any artifact falls in this window
-            artifacts_in_window = np.any((artifact_times >= window_start) & 
-                                        (artifact_times <= window_end))
-            
-            if artifacts_in_window:
-                excluded_indices.append(idx)
-            else:
-                filtered_indices.append(idx)
+        excluded = self.events_overlap_artifacts(event_times, artifact_window_sec, artifact_intervals)
+        filtered_indices = event_indices[~excluded].tolist()
+        excluded_indices = event_indices[excluded].tolist()
         
         print(f"Excluded {len(excluded_indices)} out of {len(event_indices)} events:")
         print(f"  - {len(filtered_indices)} clean events retained")
@@ -1687,10 +1919,14 @@ class ElecTank(VirmenTank):
         
         return filtered_indices, excluded_indices
 
-    def frequency_band_energy(self, freq_range, n_cycles=7, decim=1, window='hann'):
+    def frequency_band_energy(self, freq_range, n_cycles=7, decim=1, window='hann', channel=None):
         """
         Calculate energy of a specific frequency band over time using Morlet wavelets
         
+        The band is sampled every min(0.5, band width / 10) Hz. When decim is self.tfr_decim and that grid
+        lies on DEFAULT_TFR_FREQS, the power is sliced from the session TFR cache, otherwise only the band
+        is transformed.
+        
         Parameters:
         -----------
         freq_range : tuple
@@ -1702,6 +1938,8 @@ class ElecTank(VirmenTank):
             Decimation factor for time axis (1 = no decimation)
         window : str
             Not used in wavelet method, kept for compatibility
+        channel : int or None
+            Channel index, self.channel if None
         
         Returns:
         --------
@@ -1712,10 +1950,8 @@ class ElecTank(VirmenTank):
         f : array
             Frequency axis used for the analysis
         tfr : array
-            Complete time-frequency representation (for compatibility)
+            Time-frequency representation of the band (for compatibility)
         """
-        import mne
-        
         # Define frequency range
         freq_min, freq_max = freq_range
         
@@ -1728,42 +1964,33 @@ class ElecTank(VirmenTank):
         if len(freqs) == 0:
             freqs = np.array([freq_min])
         
-        # Reshape signal for MNE (expects 3D: n_epochs x n_channels x n_times)
-        signal_reshaped = self.signal.reshape(1, 1, -1)
-        
-        # Calculate time-frequency representation using Morlet wavelets
-        tfr = mne.time_frequency.tfr_array_morlet(
-            signal_reshaped, 
-            sfreq=self.fs, 
-            freqs=freqs, 
-            n_cycles=n_cycles,
-            zero_mean=True,
-            output='power'
-        )
-        
-        # Remove singleton dimensions and get power
-        tfr_power = tfr.squeeze()  # Shape: (n_freqs, n_times)
-        
-        # Calculate energy by summing across frequencies in the band
-        if len(freqs) > 1:
-            energy = np.mean(tfr_power, axis=0)  # Average across frequencies
+        session_index = np.searchsorted(DEFAULT_TFR_FREQS, freqs).clip(0, len(DEFAULT_TFR_FREQS) - 1)
+        if decim == self.tfr_decim and np.allclose(DEFAULT_TFR_FREQS[session_index], freqs):
+            # Slice the band out of the session-wide TFR instead of recomputing the wavelets
+            _, t, tfr_power = self.get_session_tfr(n_cycles=n_cycles, decim=decim, channel=channel)
+            tfr_power = tfr_power[session_index]
         else:
-            energy = tfr_power.squeeze()
-        
-        # Create time axis
-        t = self.elc_t[:len(energy)]
-        
-        # Apply decimation if requested
-        if decim > 1:
-            energy = energy[::decim]
-            t = t[::decim]
-            tfr_power = tfr_power[:, ::decim]
+            import mne
+
+            tfr_power = mne.time_frequency.tfr_array_morlet(
+                self.get_signal(channel).reshape(1, 1, -1),
+                sfreq=self.fs,
+                freqs=freqs,
+                n_cycles=n_cycles,
+                zero_mean=True,
+                output='power',
+                decim=decim
+            )[0, 0]
+            t = self.elc_t[::decim][:tfr_power.shape[-1]]
+        
+        # Calculate energy by averaging across frequencies in the band
+        energy = np.mean(tfr_power, axis=0)
         
         return t, energy, freqs, tfr_power
 
     def plot_frequency_band_analysis(self, freq_bands=None, n_cycles=12, 
                                    percentile_range=(5, 95), save_path=None, 
-                                   notebook=False, overwrite=False, font_size=None):
+                                   notebook=False, overwrite=False, font_size=None, channel=None):
         """
         Plot comprehensive frequency band analysis using Bokeh
         
@@ -1784,6 +2011,8 @@ class ElecTank(VirmenTank):
             Whether to overwrite existing file
         font_size : str
             Font size for the plot
+        channel : int or None
+            Channel index, self.channel if None
             
         Returns:
         --------
@@ -1809,7 +2038,7 @@ class ElecTank(VirmenTank):
                     x_axis_label="Time (s)", y_axis_label="Amplitude",
                     x_range=(0, 60),
                     tools=["pan", "wheel_zoom", "box_zoom", "reset", "save"])
-        p1.line(t_orig, self.signal, line_width=1, color='navy', alpha=0.8)
+        p1.line(t_orig, self.get_signal(channel), line_width=1, color='navy', alpha=0.8)
         
         # Create figure for frequency band energy analysis
         p2 = figure(width=1200, height=400, title="Normalized Frequency Band Energy vs Time",
@@ -1827,7 +2056,8 @@ class ElecTank(VirmenTank):
         # First pass: calculate all band energies
         for i, (freq_min, freq_max, label) in enumerate(freq_bands):
             # Using Morlet wavelets for better time-frequency resolution
-            t_energy, energy = self.frequency_band_energy((freq_min, freq_max), n_cycles=n_cycles)[:2]
+            t_energy, energy = self.frequency_band_energy((freq_min, freq_max), n_cycles=n_cycles,
+                                                          channel=channel)[:2]
             all_band_energies[label] = energy
             all_times[label] = t_energy
         
@@ -1883,18 +2113,19 @@ class ElecTank(VirmenTank):
                               notebook=notebook, overwrite=overwrite, font_size=font_size)
         
         # Print statistical analysis
-        self._print_frequency_band_statistics(freq_bands, n_cycles)
+        self._print_frequency_band_statistics(freq_bands, n_cycles, channel=channel)
         
         return grid
 
-    def _print_frequency_band_statistics(self, freq_bands, n_cycles=7):
+    def _print_frequency_band_statistics(self, freq_bands, n_cycles=7, channel=None):
         """Print statistical analysis of frequency bands"""
         print("=" * 60)
         print("FREQUENCY BAND ENERGY ANALYSIS RESULTS")
         print("=" * 60)
         
         for freq_min, freq_max, label in freq_bands:
-            t_energy, energy = self.frequency_band_energy((freq_min, freq_max), n_cycles=n_cycles)[:2]
+            t_energy, energy = self.frequency_band_energy((freq_min, freq_max), n_cycles=n_cycles,
+                                                          channel=channel)[:2]
             
             max_energy_idx = np.argmax(energy)
             max_energy_time = t_energy[max_energy_idx]
@@ -1907,6 +2138,11 @@ class ElecTank(VirmenTank):
             print()
 
 
+def _detect_session_bursts(session_name, tank_kwargs, burst_kwargs):
+    # module level so it can be pickled by ProcessPoolExecutor
+    return ElecTank(session_name, **tank_kwargs).detect_bursts(**burst_kwargs)
+
+
 if __name__ == "__main__":
     path=""
     ep = ElecTank(path)
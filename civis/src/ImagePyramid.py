@@ -0,0 +1,139 @@
+import os
+from collections import OrderedDict
+import numpy as np
+
+
+class ImagePyramid:
+    """
+    Multi-resolution uint8 pyramid of a single-channel background image (e.g. a max projection TIFF).
+
+    Level 0 is the full resolution image, each following level is 2x2 mean-pooled from the previous one
+    until the image fits in a single tile. Images are stored in the orientation used by the Bokeh image
+    glyphs of the servers: transposed and flipped up/down, so that row 0 is the bottom of the plot.
+    """
+
+    TILE_SIZE = 256
+
+    # in-process LRU cache shared by all documents, keyed by (path, modification time)
+    CACHE_SIZE = 4
+    _cache = OrderedDict()
+
+    def __init__(self, levels):
+        self.levels = levels
+        self.height, self.width = levels[0].shape
+
+    @classmethod
+    def from_image(cls, image):
+        """
+        Build a pyramid from a 2-D image already in plotting orientation.
+        :param image: 2-D array of any numeric dtype, normalized to 0-255 by its maximum
+        :return: ImagePyramid
+        """
+        image = np.asarray(image, dtype=np.float32)
+        max_value = image.max()
+        scale = 255 / max_value if max_value > 0 else 0
+        levels = [(image * scale).astype(np.uint8)]
+
+        current = levels[0].astype(np.float32)
+        while max(current.shape) > cls.TILE_SIZE:
+            # pad to even size by repeating the last row/column, then 2x2 mean pool
+            current = np.pad(current, ((0, current.shape[0] % 2), (0, current.shape[1] % 2)), mode='edge')
+            current = current.reshape(current.shape[0] // 2, 2, current.shape[1] // 2, 2).mean(axis=(1, 3))
+            levels.append(np.rint(current).astype(np.uint8))
+
+        return cls(levels)
+
+    @classmethod
+    def from_tiff(cls, image_path):
+        """
+        Build a pyramid from a TIFF file.
+        :param image_path: path to a single-channel TIFF
+        :return: ImagePyramid
+        """
+        from tifffile import imread
+
+        return cls.from_image(np.flipud(np.transpose(imread(image_path))))
+
+    @staticmethod
+    def cache_path(image_path):
+        return f"{os.path.splitext(image_path)[0]}_pyramid.npz"
+
+    @classmethod
+    def load(cls, image_path, use_cache=True):
+        """
+        Load the pyramid of a TIFF, from memory or the .npz cache next to it when they are up to date.
+        :param image_path: path to a single-channel TIFF
+        :param use_cache: read and write the .npz cache
+        :return: ImagePyramid
+        """
+        key = (os.path.abspath(image_path), os.path.getmtime(image_path))
+        if key in cls._cache:
+            cls._cache.move_to_end(key)
+            return cls._cache[key]
+
+        cache_path = cls.cache_path(image_path)
+        if use_cache and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= key[1]:
+            with np.load(cache_path) as data:
+                pyramid = cls([data[f'level_{i}'] for i in range(len(data.files))])
+        else:
+            pyramid = cls.from_tiff(image_path)
+            if use_cache:
+                try:
+                    pyramid.save(cache_path)
+                except OSError as e:
+                    print(f"Could not cache image pyramid: {e}")
+
+        # an older version of the same image is never requested again
+        for stale in [k for k in cls._cache if k[0] == key[0]]:
+            del cls._cache[stale]
+        cls._cache[key] = pyramid
+        while len(cls._cache) > cls.CACHE_SIZE:
+            cls._cache.popitem(last=False)
+        return pyramid
+
+    def save(self, path):
+        np.savez(path, **{f'level_{i}': level for i, level in enumerate(self.levels)})
+
+    def level_for_viewport(self, x_span, y_span, screen_width, screen_height):
+        """
+        Coarsest level that still has at least one image pixel per screen pixel.
+        :param x_span: visible width in full resolution pixels
+        :param y_span: visible height in full resolution pixels
+        :param screen_width: plot width in screen pixels
+        :param screen_height: plot height in screen pixels
+        :return: level index
+        """
+        pixels_per_screen_pixel = min(x_span / screen_width, y_span / screen_height)
+        if pixels_per_screen_pixel <= 1:
+            return 0
+        return int(min(np.floor(np.log2(pixels_per_screen_pixel)), len(self.levels) - 1))
+
+    def region(self, x_range, y_range, screen_width, screen_height):
+        """
+        The part of the matching pyramid level covering the viewport, snapped to the tile grid.
+        :param x_range: (start, end) of the visible x range in full resolution pixels
+        :param y_range: (start, end) of the visible y range in full resolution pixels
+        :param screen_width: plot width in screen pixels
+        :param screen_height: plot height in screen pixels
+        :return: dict with image, x, y, dw, dh (in full resolution pixels) and level
+        """
+        x0, x1 = max(x_range[0], 0), min(x_range[1], self.width)
+        y0, y1 = max(y_range[0], 0), min(y_range[1], self.height)
+        if x1 <= x0 or y1 <= y0:
+            x0, x1, y0, y1 = 0, self.width, 0, self.height
+
+        level = self.level_for_viewport(x1 - x0, y1 - y0, screen_width, screen_height)
+        factor = 2 ** level
+        image = self.levels[level]
+        tile = self.TILE_SIZE
+
+        col0 = int(x0 // factor // tile * tile)
+        row0 = int(y0 // factor // tile * tile)
+        col1 = min(int(-(-(x1 / factor) // tile) * tile), image.shape[1])
+        row1 = min(int(-(-(y1 / factor) // tile) * tile), image.shape[0])
+
+        return dict(image=image[row0:row1, col0:col1],
+                    x=col0 * factor, y=row0 * factor,
+                    dw=min(col1 * factor, self.width) - col0 * factor,
+                    dh=min(row1 * factor, self.height) - row0 * factor,
+                    level=level)
@@ -0,0 +1,183 @@
+import os
+import numpy as np
+
+
+class LFPIngest:
+    """
+    Chunked ingest of a TDT stream into a low-rate LFP cached as a binary .npy file.
+
+    The raw stream is read from the block a few seconds at a time and decimated in two stages so that only
+    one chunk of raw data is in memory at once:
+
+    1. a streaming polyphase FIR (the resample_poly Kaiser design) decimates by an integer factor to about
+       INTERMEDIATE_FACTOR times the target rate, carrying the unconsumed tail of each chunk into the next;
+    2. the small intermediate signal is low-pass filtered with a zero-phase SOS Butterworth and interpolated
+       onto the session time grid, which is aligned to the PC0_ epoc onset.
+
+    The result is cached in cache_dir, so later loads skip TDT parsing entirely.
+    """
+
+    INTERMEDIATE_FACTOR = 5
+
+    def __init__(self, elec_path, cache_dir, fs=200, store='Wav1', chunk_sec=60, lowpass_cutoff=None,
+                 onset_offset=0.02):
+        """
+        :param elec_path: path to the TDT block
+        :param cache_dir: directory of the cached LFP
+        :param fs: target sampling rate in Hz
+        :param store: name of the TDT stream store
+        :param chunk_sec: seconds of raw data read at once
+        :param lowpass_cutoff: anti-alias cutoff in Hz at the target rate, 0.45 * fs if None
+        :param onset_offset: seconds added to the PC0_ onset to get session time 0
+        """
+        self.elec_path = elec_path
+        self.cache_dir = cache_dir
+        self.fs = fs
+        self.store = store
+        self.chunk_sec = chunk_sec
+        self.lowpass_cutoff = 0.45 * fs if lowpass_cutoff is None else lowpass_cutoff
+        self.onset_offset = onset_offset
+        self._session_start = None
+
+    def cache_path(self, session_duration):
+        return os.path.join(self.cache_dir,
+                            f"{self.store}_{self.fs}Hz_{session_duration:g}s_lp{self.lowpass_cutoff:g}.npy")
+
+    def load(self, session_duration, use_cache=True):
+        """
+        LFP on the session time grid np.arange(0, session_duration, 1 / fs).
+        :param session_duration: session duration in seconds
+        :param use_cache: read and write the cached .npy
+        :return: float32 array, (n_channels, n_times)
+        """
+        cache_path = self.cache_path(session_duration)
+        if use_cache and os.path.exists(cache_path):
+            return np.load(cache_path)
+
+        lfp = self.ingest(session_duration)
+
+        if use_cache:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                np.save(cache_path, lfp)
+            except OSError as e:
+                print(f"Could not cache LFP: {e}")
+
+        return lfp
+
+    @property
+    def session_start(self):
+        """Block time in seconds of session time 0 (PC0_ onset plus onset_offset)."""
+        if self._session_start is None:
+            import tdt
+
+            epocs = tdt.read_block(self.elec_path, evtype=['epocs']).epocs
+            self._session_start = epocs.PC0_.onset[0] + self.onset_offset
+        return self._session_start
+
+    def read_chunks(self, t_start, t_stop):
+        """
+        Read the stream between two block times, one chunk at a time.
+        :return: generator of (data (n_channels, n_samples), index of the first sample in the block, stream fs)
+        """
+        import tdt
+
+        t1 = max(t_start, 0)
+        while t1 < t_stop:
+            t2 = min(t1 + self.chunk_sec, t_stop)
+            stream = tdt.read_block(self.elec_path, evtype=['streams'], store=self.store, t1=t1, t2=t2).streams
+            stream = stream[self.store]
+            data = np.atleast_2d(stream.data)
+            if data.shape[-1] == 0:
+                break
+            yield data, int(round(stream.start_time * stream.fs)), stream.fs
+            t1 = t2
+
+    def read_raw(self, start, stop):
+        """
+        Raw stream between two session times, for inspection.
+        :return: (session times, data (n_channels, n_samples), stream fs)
+        """
+        chunks = list(self.read_chunks(start + self.session_start, stop + self.session_start))
+        if not chunks:
+            return np.empty(0), np.empty((0, 0)), None
+        fs = chunks[0][2]
+        data = np.concatenate([chunk for chunk, _, _ in chunks], axis=-1)
+        t = (chunks[0][1] + np.arange(data.shape[-1])) / fs - self.session_start
+        return t, data, fs
+
+    def ingest(self, session_duration, pad_sec=1.0):
+        """
+        Read and decimate the stream, bypassing the cache.
+        :param session_duration: session duration in seconds
+        :param pad_sec: extra seconds read on both sides to absorb filter edge effects
+        :return: float32 array, (n_channels, n_times)
+        """
+        from scipy.signal import butter, sosfiltfilt
+        from scipy.interpolate import CubicSpline
+
+        t_start = self.session_start - pad_sec
+        intermediate, t_intermediate, fs_intermediate = self._stream_decimate(
+            t_start, self.session_start + session_duration + pad_sec)
+
+        sos = butter(8, self.lowpass_cutoff, fs=fs_intermediate, output='sos')
+        intermediate = sosfiltfilt(sos, intermediate, axis=-1)
+
+        elc_t = np.arange(0, session_duration, 1 / self.fs)
+        block_t = elc_t + self.session_start
+        if block_t[-1] > t_intermediate[-1] or block_t[0] < t_intermediate[0]:
+            print("Warning: session extends beyond the recording, edge values are held constant.")
+            block_t = np.clip(block_t, t_intermediate[0], t_intermediate[-1])
+
+        return CubicSpline(t_intermediate, intermediate, axis=-1)(block_t).astype(np.float32)
+
+    def _stream_decimate(self, t_start, t_stop):
+        from scipy.signal import firwin
+
+        outputs = []
+        h = q = half_len = None
+        carry = carry_start = first_index = fs = None
+
+        for data, start_index, fs in self.read_chunks(t_start, t_stop):
+            if h is None:
+                q = max(1, int(fs // (self.INTERMEDIATE_FACTOR * self.fs)))
+                half_len = 10 * q
+                h = firwin(2 * half_len + 1, 1.0 / q, window=('kaiser', 5.0))
+                first_index = start_index
+                # zero history before the first sample; carry_start stays a multiple of q away from first_index
+                carry = np.zeros((data.shape[0], half_len))
+                carry_start = start_index - half_len
+
+            # keep chunks contiguous even if the block boundaries overlap or leave a gap
+            expected = carry_start + carry.shape[-1]
+            if start_index > expected:
+                print(f"Warning: {start_index - expected} missing samples in {self.store}, zero filled.")
+                data = np.concatenate([np.zeros((data.shape[0], start_index - expected)), data], axis=-1)
+            elif start_index < expected:
+                data = data[:, expected - start_index:]
+
+            carry, carry_start = self._decimate_buffer(np.concatenate([carry, data], axis=-1), carry_start,
+                                                       h, q, half_len, outputs)
+
+        if h is None:
+            raise ValueError(f"No {self.store} data found in {self.elec_path}.")
+
+        # flush the tail with zero padding
+        self._decimate_buffer(np.concatenate([carry, np.zeros((carry.shape[0], half_len))], axis=-1),
+                              carry_start, h, q, half_len, outputs)
+
+        intermediate = np.concatenate(outputs, axis=-1)
+        t_intermediate = (first_index + np.arange(intermediate.shape[-1]) * q) / fs
+        return intermediate, t_intermediate, fs / q
+
+    @staticmethod
+    def _decimate_buffer(buffer, buffer_start, h, q, half_len, outputs):
+        from scipy.signal import upfirdn
+
+        # output m is centered on buffer[m * q + half_len] and needs buffer[m * q: m * q + 2 * half_len + 1]
+        n_out = (buffer.shape[-1] - 1 - 2 * half_len) // q + 1 if buffer.shape[-1] > 2 * half_len else 0
+        if n_out > 0:
+            # full convolution index m + 2 * half_len / q is the centered output m (h is symmetric)
+            offset = 2 * half_len // q
+            outputs.append(upfirdn(h, buffer, 1, q, axis=-1)[:, offset:offset + n_out])
+        return buffer[:, n_out * q:], buffer_start + n_out * q
@@ -0,0 +1,130 @@
+import numpy as np
+
+
+class PopulationActivity:
+    """
+    Population spike statistics computed from the flat peak index of a session.
+
+    The peaks of all neurons are kept in two flat arrays, the sample index of every peak and the neuron it
+    belongs to, so spike counts, binned rates, synchrony and per-trial rates are single np.bincount / np.add.at
+    passes instead of per-neuron loops. Binned results are cached per bin width.
+    """
+
+    def __init__(self, peaks, neurons, neuron_num, sample_num, ci_rate):
+        """
+        :param peaks: sample index of every peak
+        :param neurons: neuron index of every peak
+        :param neuron_num: total number of neurons
+        :param sample_num: number of samples in the session
+        :param ci_rate: sampling rate in Hz
+        """
+        self.peaks = np.asarray(peaks, dtype=np.int64)
+        self.neurons = np.asarray(neurons, dtype=np.int64)
+        self.neuron_num = int(neuron_num)
+        self.sample_num = int(sample_num)
+        self.ci_rate = ci_rate
+        self._cache = {}
+
+    @classmethod
+    def from_peak_indices(cls, peak_indices, sample_num, ci_rate):
+        """
+        :param peak_indices: list of peak index arrays, one per neuron, or a single flat array of peak indices
+        :param sample_num: number of samples in the session
+        :param ci_rate: sampling rate in Hz
+        :return: PopulationActivity
+        """
+        if isinstance(peak_indices, np.ndarray) and peak_indices.dtype != object:
+            peak_indices = [peak_indices.ravel()]
+        elif len(peak_indices) and np.isscalar(peak_indices[0]):
+            peak_indices = [np.asarray(peak_indices)]
+
+        lengths = [len(p) for p in peak_indices]
+        peaks = np.concatenate(peak_indices).astype(np.int64) if sum(lengths) else np.empty(0, dtype=np.int64)
+        neurons = np.repeat(np.arange(len(peak_indices)), lengths)
+        return cls(peaks, neurons, len(peak_indices), sample_num, ci_rate)
+
+    def bin_samples(self, bin_width):
+        """Number of samples per bin of bin_width seconds, at least one."""
+        return max(1, int(round(bin_width * self.ci_rate)))
+
+    def spike_counts(self):
+        """Number of peaks at every sample, over all neurons."""
+        return self.population_counts(1 / self.ci_rate)[1]
+
+    def population_counts(self, bin_width):
+        """
+        Number of peaks of all neurons in bins of bin_width seconds.
+        :param bin_width: bin width in seconds
+        :return: (bin start times in seconds, counts)
+        """
+        step = self.bin_samples(bin_width)
+        key = ('population_counts', step)
+        if key not in self._cache:
+            bin_num = -(-self.sample_num // step)
+            counts = np.bincount(self.peaks[self.peaks < self.sample_num] // step, minlength=bin_num)
+            self._cache[key] = (np.arange(bin_num) * step / self.ci_rate, counts)
+        return self._cache[key]
+
+    def population_rate(self, bin_width):
+        """
+        Mean firing rate per neuron in bins of bin_width seconds.
+        :param bin_width: bin width in seconds
+        :return: (bin start times in seconds, rates in Hz)
+        """
+        times, counts = self.population_counts(bin_width)
+        return times, counts / (max(self.neuron_num, 1) * self.bin_samples(bin_width) / self.ci_rate)
+
+    def synchrony(self, bin_width):
+        """
+        Synchrony of the population in bins of bin_width seconds.
+
+        chi is the Golomb-Rinzel synchrony measure, the square root of the variance of the population mean
+        count over the mean variance of the single neuron counts; it is 0 for independent neurons and 1 for
+        fully synchronous ones. Per-neuron variances are computed from the occupied (neuron, bin) pairs only,
+        so no dense neuron x bin matrix is built.
+        :param bin_width: bin width in seconds
+        :return: dict with times (s), active_fraction (fraction of neurons with a peak in each bin), chi and the
+            fano_factor of the population count
+        """
+        step = self.bin_samples(bin_width)
+        key = ('synchrony', step)
+        if key in self._cache:
+            return self._cache[key]
+
+        bin_num = -(-self.sample_num // step)
+        valid = self.peaks < self.sample_num
+        keys, counts = np.unique(self.neurons[valid] * bin_num + self.peaks[valid] // step, return_counts=True)
+        neurons, bins = np.divmod(keys, bin_num)
+
+        population = np.bincount(bins, weights=counts, minlength=bin_num)
+        active_fraction = np.bincount(bins, minlength=bin_num) / max(self.neuron_num, 1)
+
+        neuron_mean = np.bincount(neurons, weights=counts, minlength=self.neuron_num) / bin_num
+        neuron_square = np.bincount(neurons, weights=counts.astype(float) ** 2, minlength=self.neuron_num) / bin_num
+        neuron_var = neuron_square - neuron_mean ** 2
+
+        population_var = population.var()
+        chi = np.sqrt(population_var / (self.neuron_num * neuron_var.sum())) if neuron_var.sum() > 0 else np.nan
+        fano_factor = population_var / population.mean() if population.mean() > 0 else np.nan
+
+        self._cache[key] = {'times': np.arange(bin_num) * step / self.ci_rate, 'active_fraction': active_fraction,
+                            'chi': chi, 'fano_factor': fano_factor}
+        return self._cache[key]
+
+    def trial_rates(self, trial_bounds):
+        """
+        Firing rate of every neuron in every trial.
+        :param trial_bounds: (n_trials, 2) inclusive [start, end] sample indices, e.g. VirmenTank.compute_trial_bounds()
+        :return: (n_trials, neuron_num) rates in Hz
+        """
+        trial_bounds = np.asarray(trial_bounds, dtype=np.int64).reshape(-1, 2)
+        starts, ends = trial_bounds[:, 0], trial_bounds[:, 1]
+
+        trials = np.searchsorted(ends, self.peaks)
+        valid = trials < len(starts)
+        valid[valid] = starts[trials[valid]] <= self.peaks[valid]
+
+        counts = np.zeros((len(starts), self.neuron_num))
+        np.add.at(counts, (trials[valid], self.neurons[valid]), 1)
+        durations = (ends - starts + 1) / self.ci_rate
+        return counts / durations[:, None]
@@ -0,0 +1,107 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+
+class SessionCache:
+    """
+    Arrays read from session files, stored as .npy files and opened as read-only memory maps.
+
+    When the Bokeh apps are served by several worker processes, each worker that opens a session would
+    otherwise parse the same .mat file and hold its own copy of every array. With a SessionCache the first
+    worker writes the arrays once to cache_dir and every worker then maps the same files, so the arrays are
+    read lazily from the page cache the processes share.
+
+    Entries are keyed by the absolute path of the source file and are stale once the source is modified.
+    Each array is written to a temporary file and moved into place, and the manifest listing the arrays is
+    written last, so concurrent workers never map a partially written entry.
+
+    Arrays that are indexed with an integer array (fancy indexing) are copied out of the map into private
+    memory; CellTypeTank reorders all neurons that way, so its signal matrices are not shared.
+    """
+
+    # directory of the cache of the current process, set by civis.app for its workers
+    ENV_VAR = 'CIVIS_SESSION_CACHE'
+
+    def __init__(self, cache_dir):
+        """
+        :param cache_dir: directory of the cached arrays, shared by all workers
+        """
+        self.cache_dir = cache_dir
+
+    @classmethod
+    def from_env(cls):
+        """SessionCache of the directory in CIVIS_SESSION_CACHE, None if it is not set."""
+        cache_dir = os.environ.get(cls.ENV_VAR)
+        return cls(cache_dir) if cache_dir else None
+
+    def entry_dir(self, source_path):
+        source_path = os.path.abspath(source_path)
+        name = os.path.splitext(os.path.basename(source_path))[0]
+        digest = hashlib.sha1(source_path.encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"{name}_{digest}")
+
+    def load(self, source_path, names=None):
+        """
+        Memory maps of the cached arrays of a source file.
+        :param source_path: path of the file the arrays were read from
+        :param names: array names the entry must hold, any if None
+        :return: dict of array name to read-only np.memmap, None if there is no up to date entry
+        """
+        entry_dir = self.entry_dir(source_path)
+        manifest_path = os.path.join(entry_dir, 'manifest.json')
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+            if manifest['source_mtime'] != os.path.getmtime(source_path):
+                return None
+            if names is not None and not set(names) <= set(manifest['arrays']):
+                return None
+            return {name: np.load(os.path.join(entry_dir, f"{name}.npy"), mmap_mode='r')
+                    for name in manifest['arrays']}
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, source_path, arrays):
+        """
+        Store the arrays read from a source file, replacing any previous entry.
+        :param source_path: path of the file the arrays were read from
+        :param arrays: dict of array name to array
+        """
+        entry_dir = self.entry_dir(source_path)
+        os.makedirs(entry_dir, exist_ok=True)
+        suffix = f".{os.getpid()}.tmp"
+
+        for name, array in arrays.items():
+            path = os.path.join(entry_dir, f"{name}.npy")
+            with open(path + suffix, 'wb') as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(path + suffix, path)
+
+        manifest_path = os.path.join(entry_dir, 'manifest.json')
+        with open(manifest_path + suffix, 'w') as f:
+            json.dump({'source': os.path.abspath(source_path), 'source_mtime': os.path.getmtime(source_path),
+                       'arrays': sorted(arrays)}, f)
+        os.replace(manifest_path + suffix, manifest_path)
+
+    def get(self, source_path, read_fn, names=None):
+        """
+        Cached arrays of a source file, read with read_fn and stored when there is no up to date entry.
+        :param source_path: path of the file the arrays are read from
+        :param read_fn: function() returning a dict of array name to array
+        :param names: array names the entry must hold, any if None
+        :return: dict of array name to read-only np.memmap
+        """
+        arrays = self.load(source_path, names)
+        if arrays is not None:
+            print(f"Mapped cached arrays of {source_path}")
+            return arrays
+
+        arrays = read_fn()
+        try:
+            self.save(source_path, arrays)
+        except OSError as e:
+            print(f"Could not cache arrays of {source_path}: {e}")
+            return arrays
+        return self.load(source_path) or arrays
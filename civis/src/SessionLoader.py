@@ -0,0 +1,156 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class LoadCancelled(Exception):
+    """Raised by progress() inside a load function that was replaced by a newer load."""
+
+
+class SessionLoader:
+    """
+    Session loading for a Bokeh document that does not block the server event loop.
+
+    All apps share one Tornado IOLoop, so a tank built inside a Bokeh callback freezes every other document
+    until it returns. SessionLoader runs the load function in a thread pool shared by all documents instead.
+    The stage messages it reports and its result are handed back with doc.add_next_tick_callback, which is
+    the thread-safe way into a document, so the callbacks that update Bokeh models hold the document lock.
+
+    Starting a new load replaces the previous one of the same loader: the old load function stops at its
+    next progress() call with LoadCancelled, and anything it still produces is dropped. Loads run in threads
+    rather than processes because the tanks hold large arrays and DataFrames that are slow to pickle back.
+
+    Usage inside an app:
+
+        loader = SessionLoader(doc)
+
+        def read(progress):             # worker thread, must not touch Bokeh models
+            progress("Loading calcium data...")
+            ci = CITank(session_name)
+            progress("Finding peaks...")
+            return ci, ci.peak_indices
+
+        def show(result):               # document thread
+            ci, peak_indices = result
+            source.data = ...
+
+        loader.load(read, show, label=session_name)
+    """
+
+    MAX_WORKERS = 4
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    def __init__(self, doc, status=None, width=400):
+        """
+        :param doc: the Bokeh document
+        :param status: Div showing the load stages, a new one if None (add loader.status to the layout)
+        :param width: width of the new status Div
+        """
+        if status is None:
+            from bokeh.models import Div
+
+            status = Div(text="", width=width)
+
+        self.doc = doc
+        self.status = status
+        self._generation = 0
+        self._active = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def executor(cls):
+        with cls._executor_lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=cls.MAX_WORKERS, thread_name_prefix='civis-load')
+        return cls._executor
+
+    @property
+    def loading(self):
+        """True while a load started by this loader has not finished."""
+        return self._active is not None
+
+    def load(self, load_fn, on_done, label=None, on_error=None):
+        """
+        Run load_fn off the event loop, then on_done with its result on the document thread.
+        :param load_fn: function(progress) returning the loaded data. progress(message) shows a stage in the
+            status Div and raises LoadCancelled once a newer load has started
+        :param on_done: function(result) updating the Bokeh models
+        :param label: name of what is loaded, e.g. the session name, for the status messages
+        :param on_error: function(exception) called on the document thread if load_fn or on_done raises
+        :return: concurrent.futures.Future of load_fn
+        """
+        label = label or "data"
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._active = generation
+
+        self._set_status(f"Loading {label}...", 'blue')
+        future = self.executor().submit(self._run, generation, load_fn)
+        future.add_done_callback(lambda f: self._finish(generation, f, label, on_done, on_error))
+        return future
+
+    def cancel(self):
+        """Drop the running load, if any."""
+        with self._lock:
+            if self._active is None:
+                return
+            self._generation += 1
+            self._active = None
+        self._set_status("Loading cancelled", 'gray')
+
+    def _current(self, generation):
+        return generation == self._generation
+
+    def _run(self, generation, load_fn):
+        def progress(message):
+            if not self._current(generation):
+                raise LoadCancelled()
+            print(message)
+            self._push(generation, lambda: self._set_status(message, 'blue'))
+
+        return load_fn(progress)
+
+    def _finish(self, generation, future, label, on_done, on_error):
+        # runs in the worker thread when load_fn returns
+        error = future.exception()
+        if isinstance(error, LoadCancelled) or not self._current(generation):
+            return
+
+        if error is not None:
+            self._push(generation, lambda: self._fail(generation, label, error, on_error))
+            return
+
+        def done():
+            try:
+                on_done(future.result())
+            except Exception as e:
+                self._fail(generation, label, e, on_error)
+                return
+            self._active = None
+            self._set_status(f"Loaded {label}", 'green')
+
+        self._push(generation, done)
+
+    def _fail(self, generation, label, error, on_error):
+        self._active = None
+        print(f"Error loading {label}: {error}")
+        self._set_status(f"Error loading {label}: {error}", 'red')
+        if on_error is not None:
+            on_error(error)
+
+    def _push(self, generation, callback):
+        # run callback on the document thread, unless a newer load started in the meantime
+        def guarded():
+            if self._current(generation):
+                callback()
+
+        try:
+            self.doc.add_next_tick_callback(guarded)
+        except Exception as e:
+            # the document was closed while loading
+            print(f"Could not update the document: {e}")
+
+    def _set_status(self, message, color):
+        self.status.text = f"<span style='color: {color};'>{message}</span>"
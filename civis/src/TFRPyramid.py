@@ -0,0 +1,112 @@
+import numpy as np
+
+
+class TFRPyramid:
+    """
+    Multi-resolution pyramid of a session time-frequency power map, for browsing long recordings.
+
+    Level 0 is the session power in dB (n_freqs, n_times). Each following level halves the time resolution
+    by mean pooling the (linear) power over pairs of columns, until the whole session fits in a single tile.
+    Levels are split into tiles of TILE_COLUMNS columns; a region query returns only the tiles covering the
+    visible time range and the rows of the visible frequency range.
+    """
+
+    TILE_COLUMNS = 512
+
+    def __init__(self, levels, freqs, t0, dt):
+        """
+        :param levels: list of float32 (n_freqs, n_columns) dB arrays, level i pooled by 2 ** i in time
+        :param freqs: frequency of each row in Hz, uniformly spaced
+        :param t0: time in seconds of the first column
+        :param dt: column spacing of level 0 in seconds
+        """
+        self.levels = levels
+        self.freqs = np.asarray(freqs, dtype=float)
+        self.t0 = float(t0)
+        self.dt = float(dt)
+        self.df = self.freqs[1] - self.freqs[0] if len(self.freqs) > 1 else 1.0
+
+    @classmethod
+    def from_power(cls, power, freqs, times):
+        """
+        Build a pyramid from a session power array.
+        :param power: (n_freqs, n_times) linear power, e.g. the memmap returned by ElecTank.get_session_tfr()
+        :param freqs: frequency of each row in Hz
+        :param times: time of each column in seconds
+        :return: TFRPyramid
+        """
+        current = np.array(power, dtype=np.float32)
+        levels = [cls.to_db(current)]
+
+        while current.shape[1] > cls.TILE_COLUMNS:
+            # pad to an even number of columns by repeating the last one, then pool pairs of columns
+            if current.shape[1] % 2:
+                current = np.concatenate([current, current[:, -1:]], axis=1)
+            current = current.reshape(current.shape[0], -1, 2).mean(axis=2)
+            levels.append(cls.to_db(current))
+
+        return cls(levels, freqs, times[0], times[1] - times[0])
+
+    @staticmethod
+    def to_db(power):
+        return 10 * np.log10(np.maximum(power, np.finfo(np.float32).tiny))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            levels = [data[f'level_{i}'] for i in range(int(data['n_levels']))]
+            return cls(levels, data['freqs'], float(data['t0']), float(data['dt']))
+
+    def save(self, path):
+        np.savez(path, freqs=self.freqs, t0=self.t0, dt=self.dt, n_levels=len(self.levels),
+                 **{f'level_{i}': level for i, level in enumerate(self.levels)})
+
+    @property
+    def duration(self):
+        return self.levels[0].shape[1] * self.dt
+
+    def color_limits(self, percentiles=(5, 99)):
+        """dB range for a color mapper, estimated on the coarsest level."""
+        return tuple(np.percentile(self.levels[-1], percentiles))
+
+    def level_for_viewport(self, t_span, screen_width):
+        """
+        Coarsest level that still has at least one column per screen pixel.
+        :param t_span: visible duration in seconds
+        :param screen_width: plot width in screen pixels
+        :return: level index
+        """
+        columns_per_pixel = t_span / self.dt / screen_width
+        if columns_per_pixel <= 1:
+            return 0
+        return int(min(np.floor(np.log2(columns_per_pixel)), len(self.levels) - 1))
+
+    def region(self, t_range, f_range, screen_width):
+        """
+        The part of the matching level covering the viewport, snapped to the tile grid in time.
+        :param t_range: (start, end) of the visible time range in seconds
+        :param f_range: (start, end) of the visible frequency range in Hz
+        :param screen_width: plot width in screen pixels
+        :return: dict with image, x, y, dw, dh (in seconds and Hz) and level
+        """
+        t_start, t_end = max(t_range[0], self.t0), min(t_range[1], self.t0 + self.duration)
+        if t_end <= t_start:
+            t_start, t_end = self.t0, self.t0 + self.duration
+
+        level = self.level_for_viewport(t_end - t_start, screen_width)
+        image = self.levels[level]
+        column_dt = self.dt * 2 ** level
+        tile = self.TILE_COLUMNS
+
+        col0 = int((t_start - self.t0) // column_dt // tile * tile)
+        col1 = min(int(-(-((t_end - self.t0) / column_dt) // tile) * tile), image.shape[1])
+
+        row0 = max(int(np.searchsorted(self.freqs, f_range[0])) - 1, 0)
+        row1 = min(int(np.searchsorted(self.freqs, f_range[1])) + 1, len(self.freqs))
+        if row1 <= row0:
+            row0, row1 = 0, len(self.freqs)
+
+        return dict(image=np.ascontiguousarray(image[row0:row1, col0:col1]),
+                    x=self.t0 + col0 * column_dt, y=self.freqs[row0] - self.df / 2,
+                    dw=(col1 - col0) * column_dt, dh=(row1 - row0) * self.df,
+                    level=level)
@@ -0,0 +1,171 @@
+import numpy as np
+
+
+class TrialTensor:
+    """
+    Trial-aligned activity of a session, built once so trial-level analyses become array slices.
+
+    Holds trials x neurons arrays (peak counts, mean signal) and trials x neurons x position-bin arrays (peak
+    counts, mean signal) plus the per-trial occupancy of each position bin. Peaks are also kept flat, sorted
+    by neuron, with the trial, sample and position of every peak inside a trial.
+
+    Samples are assigned to trials with one np.searchsorted over the trial ends, and the per-trial and
+    per-position sums are a single sparse (sample -> trial / trial x bin) product with the signal.
+    """
+
+    def __init__(self, trial_bounds, position_edges, rate, peak_offsets, peak_samples, peak_trials,
+                 peak_positions, peak_counts, mean_signal, occupancy, position_peak_counts, position_signal):
+        """
+        :param trial_bounds: (n_trials, 2) inclusive [start, end] sample indices
+        :param position_edges: (n_bins + 1,) position bin edges
+        :param rate: sampling rate in Hz
+        :param peak_offsets: (n_neurons + 1,) offsets of each neuron in the flat peak arrays
+        :param peak_samples: sample index of every peak inside a trial
+        :param peak_trials: trial index of every peak
+        :param peak_positions: position of every peak
+        :param peak_counts: (n_trials, n_neurons) number of peaks
+        :param mean_signal: (n_trials, n_neurons) mean signal over the trial
+        :param occupancy: (n_trials, n_bins) seconds spent in each position bin
+        :param position_peak_counts: (n_trials, n_neurons, n_bins) number of peaks in each position bin
+        :param position_signal: (n_trials, n_neurons, n_bins) mean signal in each position bin, NaN if unvisited
+        """
+        self.trial_bounds = trial_bounds
+        self.position_edges = position_edges
+        self.rate = rate
+        self.peak_offsets = peak_offsets
+        self.peak_samples = peak_samples
+        self.peak_trials = peak_trials
+        self.peak_positions = peak_positions
+        self.peak_counts = peak_counts
+        self.mean_signal = mean_signal
+        self.occupancy = occupancy
+        self.position_peak_counts = position_peak_counts
+        self.position_signal = position_signal
+
+    @property
+    def trial_num(self):
+        return len(self.trial_bounds)
+
+    @property
+    def neuron_num(self):
+        return len(self.peak_offsets) - 1
+
+    @staticmethod
+    def assign_trials(trial_bounds, indices):
+        """
+        Trial of each sample index.
+        :param trial_bounds: (n_trials, 2) inclusive [start, end] sample indices, sorted and non-overlapping
+        :param indices: sample indices
+        :return: int64 array of trial indices, -1 for indices outside every trial
+        """
+        trial_bounds = np.asarray(trial_bounds, dtype=np.int64).reshape(-1, 2)
+        indices = np.asarray(indices, dtype=np.int64)
+
+        trials = np.searchsorted(trial_bounds[:, 1], indices)
+        inside = trials < len(trial_bounds)
+        inside[inside] = trial_bounds[trials[inside], 0] <= indices[inside]
+        return np.where(inside, trials, -1)
+
+    @classmethod
+    def build(cls, trial_bounds, peak_indices, signal, positions, rate, position_bins=100, position_range=None):
+        """
+        :param trial_bounds: (n_trials, 2) inclusive [start, end] sample indices
+        :param peak_indices: list of peak index arrays, one per neuron
+        :param signal: (n_neurons, n_samples) signal averaged per trial and position bin, e.g. ΔF/F
+        :param positions: position of every sample, e.g. the virmen y
+        :param rate: sampling rate in Hz
+        :param position_bins: number of position bins
+        :param position_range: (min, max) of the position bins, range of the in-trial positions if None
+        :return: TrialTensor
+        """
+        from scipy.sparse import csr_matrix
+
+        signal = np.asarray(signal)
+        neuron_num, sample_num = signal.shape
+        positions = np.asarray(positions, dtype=float)[:sample_num]
+        trial_bounds = np.asarray(trial_bounds, dtype=np.int64).reshape(-1, 2)
+        trial_num = len(trial_bounds)
+
+        samples = np.arange(len(positions))
+        sample_trials = cls.assign_trials(trial_bounds, samples)
+        in_trial = sample_trials >= 0
+
+        if position_range is None:
+            position_range = (positions[in_trial].min(), positions[in_trial].max()) if in_trial.any() else (0, 1)
+        position_edges = np.linspace(position_range[0], position_range[1], position_bins + 1)
+        sample_bins = cls._position_bins(positions, position_edges)
+        in_bin = in_trial & (sample_bins >= 0)
+
+        # per-trial sums and means, one sparse product each
+        to_trial = csr_matrix((np.ones(in_trial.sum()), (samples[in_trial], sample_trials[in_trial])),
+                              shape=(sample_num, trial_num))
+        trial_samples = np.asarray(to_trial.sum(axis=0)).ravel()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_signal = (to_trial.T @ signal.T) / trial_samples[:, None]
+
+        keys = sample_trials[in_bin] * position_bins + sample_bins[in_bin]
+        to_bin = csr_matrix((np.ones(len(keys)), (samples[in_bin], keys)), shape=(sample_num, trial_num * position_bins))
+        bin_samples = np.bincount(keys, minlength=trial_num * position_bins)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            position_signal = (to_bin.T @ signal.T) / bin_samples[:, None]
+        position_signal = position_signal.reshape(trial_num, position_bins, neuron_num).transpose(0, 2, 1)
+        occupancy = bin_samples.reshape(trial_num, position_bins) / rate
+
+        # flat peaks inside trials, sorted by neuron
+        lengths = [len(p) for p in peak_indices]
+        peaks = np.concatenate(peak_indices).astype(np.int64) if sum(lengths) else np.empty(0, dtype=np.int64)
+        neurons = np.repeat(np.arange(len(peak_indices)), lengths)
+        peak_trials = cls.assign_trials(trial_bounds, peaks)
+        keep = (peak_trials >= 0) & (peaks < len(positions))
+        peaks, neurons, peak_trials = peaks[keep], neurons[keep], peak_trials[keep]
+        peak_bins = sample_bins[peaks]
+
+        peak_counts = np.zeros((trial_num, neuron_num), dtype=np.int32)
+        np.add.at(peak_counts, (peak_trials, neurons), 1)
+        position_peak_counts = np.zeros((trial_num, neuron_num, position_bins), dtype=np.int32)
+        binned = peak_bins >= 0
+        np.add.at(position_peak_counts, (peak_trials[binned], neurons[binned], peak_bins[binned]), 1)
+
+        peak_offsets = np.concatenate([[0], np.cumsum(np.bincount(neurons, minlength=neuron_num))])
+        return cls(trial_bounds, position_edges, rate, peak_offsets, peaks, peak_trials, positions[peaks],
+                   peak_counts, mean_signal, occupancy, position_peak_counts, position_signal.astype(np.float32))
+
+    @staticmethod
+    def _position_bins(positions, edges):
+        # same bin convention as np.histogram: the last bin includes the right edge, outside values get -1
+        bins = np.searchsorted(edges, positions, side='right') - 1
+        bins[positions == edges[-1]] = len(edges) - 2
+        bins[(positions < edges[0]) | (positions > edges[-1]) | np.isnan(positions)] = -1
+        return bins
+
+    def neuron_peaks(self, neuron):
+        """
+        Peaks of a neuron that fall inside a trial.
+        :return: (sample indices, trial indices, positions)
+        """
+        sl = slice(self.peak_offsets[neuron], self.peak_offsets[neuron + 1])
+        return self.peak_samples[sl], self.peak_trials[sl], self.peak_positions[sl]
+
+    def active_trials(self, neuron):
+        """Trials in which a neuron has at least one peak."""
+        return np.flatnonzero(self.peak_counts[:, neuron])
+
+    def inactive_trials(self, neuron):
+        """Trials in which a neuron has no peak."""
+        return np.flatnonzero(self.peak_counts[:, neuron] == 0)
+
+    def trial_rates(self):
+        """(n_trials, n_neurons) peak rate in Hz."""
+        durations = (self.trial_bounds[:, 1] - self.trial_bounds[:, 0] + 1) / self.rate
+        return self.peak_counts / durations[:, None]
+
+    def rate_map(self, trials=None):
+        """
+        Peak rate of every neuron in every position bin, pooled over trials.
+        :param trials: trial indices or boolean mask to pool, all trials if None
+        :return: (n_neurons, n_bins) rates in Hz, 0 in unvisited bins
+        """
+        trials = slice(None) if trials is None else trials
+        counts = self.position_peak_counts[trials].sum(axis=0)
+        occupancy = self.occupancy[trials].sum(axis=0)
+        return np.divide(counts, occupancy, out=np.zeros(counts.shape), where=occupancy > 0)
@@ -3,6 +3,7 @@ import numpy as np
 import os
 import json
 from scipy.signal import find_peaks, savgol_filter
+from .TrialTensor import TrialTensor
 
 # Default parameters for movement detection
 DEFAULT_ONSET_PARAMS = {
@@ -211,11 +212,11 @@ class VirmenTank:
     def compute_trial_bounds(self):
         """
         Compute trial boundaries using existing start and end indices
+        :return: (n_trials, 2) int array of inclusive [start, end] indices
         """
-        trial_bounds = []
-        for start, end in zip(self.trials_start_indices, self.trials_end_indices):
-            trial_bounds.append([start, end])
-        return trial_bounds
+        trial_num = min(len(self.trials_start_indices), len(self.trials_end_indices))
+        return np.column_stack([np.asarray(self.trials_start_indices[:trial_num], dtype=np.int64),
+                                np.asarray(self.trials_end_indices[:trial_num], dtype=np.int64)])
 
     @staticmethod
     def find_trial_for_indices(trial_bounds, indices):
@@ -230,19 +231,14 @@ class VirmenTank:
             for indices in peak_indices:
                 trial_index = find_trial_for_indices(trial_bounds, indices)
                 trial_indices.append(trial_index)
-        """
-
-        # Convert trial_bounds into a suitable format for np.searchsorted
-        starts = np.array([bound[0] for bound in trial_bounds])
-        ends = np.array([bound[1] for bound in trial_bounds])
 
-        index_trial_map = {}
-        for index in indices:
-            pos = np.searchsorted(ends, index)
-            if pos < len(starts) and starts[pos] <= index <= ends[pos]:
-                index_trial_map[index] = pos
+        For whole-session trial x neuron queries, use CITank.get_trial_tensor() instead.
+        """
+        indices = np.asarray(indices)
+        trials = TrialTensor.assign_trials(trial_bounds, indices)
+        inside = trials >= 0
 
-        return index_trial_map
+        return dict(zip(indices[inside].tolist(), trials[inside].tolist()))
 
     @staticmethod
     def normalize_signal(signal):
@@ -0,0 +1,61 @@
+from collections import Counter
+from types import SimpleNamespace
+
+import numpy as np
+
+from civis.src.CellTypeTank import CellTypeTank
+
+
+def make_analyzer(ci_rate, d1_peaks, d2_peaks, chi_peaks):
+    analyzer = object.__new__(CellTypeTank.NeuralConnectivityAnalyzer)
+    analyzer.tank = SimpleNamespace(ci_rate=ci_rate, d1_peak_indices=d1_peaks,
+                                    d2_peak_indices=d2_peaks, chi_peak_indices=chi_peaks)
+    return analyzer
+
+
+def loop_sequential_activations(d1_times, d2_times, chi_times, window, max_sequence_length):
+    """Reference: the per-event loop find_sequential_activations replaced"""
+    all_events = [(t, 'D1') for t in d1_times] + [(t, 'D2') for t in d2_times] + [(t, 'CHI') for t in chi_times]
+    all_events.sort(key=lambda x: x[0])
+
+    sequences = []
+    for i, (start_time, start_type) in enumerate(all_events):
+        window_events = [(start_time, start_type)]
+        for event_time, event_type in all_events[i + 1:]:
+            if event_time > start_time + window:
+                break
+            window_events.append((event_time, event_type))
+            if len(window_events) >= max_sequence_length:
+                break
+        if len(window_events) >= 2:
+            sequences.append(tuple(event[1] for event in window_events))
+    return dict(Counter(sequences))
+
+
+def test_tied_peaks_at_window_edge():
+    # the window edge is inclusive: both D2 peaks on frame 12 are at 0.3 + 0.1 s, after the D1 peak on frame 9
+    analyzer = make_analyzer(30, [[9]], [[12], [12]], [])
+    assert analyzer.find_sequential_activations(window=0.1) == {('D1', 'D2', 'D2'): 1, ('D2', 'D2'): 1}
+
+
+def test_matches_loop_on_random_sessions():
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        ci_rate = rng.choice([10, 15.5, 20, 30])
+        window = rng.choice([0.1, 0.2, 0.3, 1.0])
+        max_sequence_length = int(rng.integers(2, 8))
+        peaks = [[np.sort(rng.integers(0, 200, rng.integers(0, 15))) for _ in range(rng.integers(1, 6))]
+                 for _ in range(3)]
+        times = [np.sort(np.concatenate([np.asarray(p, dtype=float) for p in cell_peaks])) / ci_rate
+                 for cell_peaks in peaks]
+
+        analyzer = make_analyzer(ci_rate, *peaks)
+        assert (analyzer.find_sequential_activations(window=window, max_sequence_length=max_sequence_length)
+                == loop_sequential_activations(*times, window, max_sequence_length))
+
+
+def test_long_sequences():
+    analyzer = make_analyzer(30, [[0] * 40], [], [])
+    sequences = analyzer.find_sequential_activations(window=1.0, max_sequence_length=32)
+    assert sequences[('D1',) * 32] == 9
+    assert sum(sequences.values()) == 39